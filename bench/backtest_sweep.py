@@ -0,0 +1,52 @@
+"""
+Benchmark: parameter sweep van bracket_buy over synthetische 1-min bars.
+Schrijft de bars in de lokale bar cache onder symbool BENCH (data/bars/BENCH).
+Run (vanuit project root):
+  python -m bench.backtest_sweep
+"""
+import time
+
+import numpy as np
+
+from server.modules.data.bars import import_bars
+from server.modules.backtest import service as backtest
+
+N_BARS = 100_000
+SYMBOL = "BENCH"
+
+
+def _synthetic_bars(n: int) -> dict:
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    open_ = np.concatenate([[100.0], close[:-1]]) + rng.normal(0, 0.01, n)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.03, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.03, n))
+    ts = 1_700_000_000 + np.arange(n) * 60.0
+    return {"ts": ts, "open": open_, "high": high, "low": low, "close": close, "volume": np.full(n, 100.0)}
+
+
+def main():
+    cols = _synthetic_bars(N_BARS)
+    import_bars(SYMBOL, "1 min", cols)
+    mid = float(np.median(cols["close"]))
+    grid = {
+        "target_price": [round(float(mid + d), 2) for d in np.linspace(0.5, 10, 50)],
+        "stop_price": [round(float(mid - d), 2) for d in np.linspace(0.5, 10, 40)],
+    }
+    opts = dict(params={"quantity": 100}, entry_every=30, horizon=240)
+
+    for workers in (1, None):  # None = os.cpu_count()
+        t0 = time.perf_counter()
+        res = backtest.sweep("bracket_buy", SYMBOL, "1 min", grid, workers=workers, top=3, **opts)
+        dt = time.perf_counter() - t0
+        print(
+            f"workers={res['workers']:>2}  combos={res['combinations']}  bars={res['bars']}  "
+            f"{dt:.2f}s  ({dt / res['combinations'] * 1e3:.2f} ms/combo)"
+        )
+    best = res["results"][0]
+    print("best:", best["params"], "pnl", best["pnl"], "win_rate", best["win_rate"])
+    backtest.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: order-pad via de broker-gateway (IPC round trip per order of per batch).
+- start een gateway-subprocess met de sim adapter op een tijdelijke socket
+- enqueue_order (1 round trip per order) en enqueue_orders (1 round trip per batch)
+- push-latency: tijd tot de eindstatus van de laatste order in de lokale RESULTS staat
+Run (vanuit project root):
+  python -m bench.gateway_roundtrip
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+N = 5_000
+BATCH = 100
+
+_addr = (
+    f"unix:{os.path.join(tempfile.mkdtemp(), 'gw.sock')}" if hasattr(socket, "AF_UNIX")
+    else "tcp:127.0.0.1:7791"
+)
+_env = {
+    "SIM_SPEED": "0",
+    "LEDGER_FLUSH_MS": "60000",
+    "RISK_ORDERS_PER_SEC": "0",
+    "RISK_SYMBOL_ORDERS_PER_SEC": "0",
+    "RISK_FALLBACK_PRICE": "100",       # MKT orders zonder quotes
+    "GATEWAY_ADDR": _addr,
+}
+os.environ.update(_env)
+os.environ["IBKR_ADAPTER"] = "gateway"
+
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting import service
+
+
+def _order(i: int) -> dict:
+    return {"symbol": f"S{i % 20:02d}", "side": "BUY" if i % 2 else "SELL", "order_type": "MKT", "quantity": 1}
+
+
+def main():
+    gw = subprocess.Popen(
+        [sys.executable, "-m", "server.modules.gateway"],
+        env={**os.environ, **_env, "IBKR_ADAPTER": "sim"}, stdout=subprocess.DEVNULL,
+    )
+    try:
+        service.start_worker_once()
+        deadline = time.time() + 10
+        while not service.readiness()["ready"]:
+            if time.time() > deadline:
+                raise SystemExit(f"gateway niet klaar: {service.readiness()}")
+            time.sleep(0.05)
+
+        t0 = time.perf_counter()
+        ids = [service.enqueue_order(_order(i)) for i in range(N)]
+        single = (time.perf_counter() - t0) / N * 1e6
+
+        t0 = time.perf_counter()
+        for k in range(0, N, BATCH):
+            ids += service.enqueue_orders([_order(i) for i in range(k, k + BATCH)])
+        batched = (time.perf_counter() - t0) / N * 1e6
+
+        last = ids[-1]
+        t0 = time.perf_counter()
+        while (RESULTS.get(last) or {}).get("status") != "filled":
+            if time.perf_counter() - t0 > 10:
+                break
+            time.sleep(0.0005)
+        push_ms = (time.perf_counter() - t0) * 1e3
+
+        print(f"gateway {_addr}")
+        print(f"enqueue_order     {single:8.1f} µs/order  (1 round trip per order)")
+        print(f"enqueue_orders    {batched:8.1f} µs/order  (batch {BATCH})")
+        print(f"push tot 'filled' {push_ms:8.1f} ms na de laatste send")
+        print(f"filled            {sum(1 for i in ids if (RESULTS.get(i) or {}).get('status') == 'filled')}/{len(ids)}")
+    finally:
+        gw.terminate()
+        gw.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: cancel van lopende graph runs (strategy_graph.runs.cancel + executor CancelToken).
+- RUNS async runs die elk op een time_condition (300 s) wachten, op RUNS worker-threads
+- cancel per run: latency tot de run 'cancelled' is en zijn worker vrij is
+- daarna moet een nieuwe run meteen een worker krijgen (geen thread meer bezet door een gecancelde run)
+Draait op een tijdelijke database (niet data/app.db).
+Run (vanuit project root):
+  python -m bench.graph_cancel
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+RUNS = 200
+os.environ.setdefault("GRAPH_RUN_WORKERS", str(RUNS))
+
+from server.modules.persistence import db
+
+db._DB_PATH = Path(tempfile.mkdtemp(prefix="graph-cancel-bench-")) / "app.db"
+
+from server.modules.strategy_graph import runs, store
+from server.modules.strategy_graph.triggers import TRIGGERS
+
+BUDGET_P99_MS = 50.0
+
+
+def main():
+    store.upsert_graph({"id": "wait", "name": "wait", "root": {"id": "s", "type": "sequence", "children": [
+        {"id": "t", "type": "time_condition", "delay_sec": 300}]}})
+    store.upsert_graph({"id": "noop", "name": "noop", "root": {"id": "s", "type": "sequence", "children": []}})
+    ids = [r["id"] for r in runs.submit_many([{"graph_id": "wait", "symbol": "AAA"} for _ in range(RUNS)])]
+    while TRIGGERS.snapshot()["pending"]["time"] < RUNS:
+        time.sleep(0.01)
+
+    lat = []
+    for rid in ids:
+        t0 = time.perf_counter()
+        r = runs.cancel(rid)
+        lat.append((time.perf_counter() - t0) * 1000)
+        if r["status"] != "cancelled":
+            raise SystemExit(f"FAIL: run {rid} status {r['status']}")
+    lat.sort()
+
+    t0 = time.perf_counter()
+    rid = runs.submit("noop", "AAA")["id"]
+    while runs.get_run(rid)["status"] != "done":
+        time.sleep(0.001)
+    free_ms = (time.perf_counter() - t0) * 1000
+
+    p50, p99 = lat[len(lat) // 2], lat[int(len(lat) * 0.99)]
+    print(f"cancel       p50 {p50:6.2f} ms   p99 {p99:6.2f} ms   max {lat[-1]:6.2f} ms  ({RUNS} wachtende runs)")
+    print(f"nieuwe run   {free_ms:6.2f} ms tot done  {TRIGGERS.snapshot()['pending']}  {runs.snapshot()}")
+    if p99 > BUDGET_P99_MS or TRIGGERS.snapshot()["pending"]["time"]:
+        raise SystemExit(f"FAIL: cancel p99 > {BUDGET_P99_MS:.0f} ms of triggers niet opgeruimd")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: strategy graph store (strategy_graph.store + persistence.db).
+- listing: 1 pagina metadata via ix_graphs_updated vs de oude volledige scan die elke body json.loads-t
+- get_graph: eerste keer (body parsen) vs daarna (LRU-cache, enkel de metadata-lookup)
+Draait op een tijdelijke database (niet data/app.db).
+Run (vanuit project root):
+  python -m bench.graph_store
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from server.modules.persistence import db
+from server.modules.strategy_graph import store
+
+db._DB_PATH = Path(tempfile.mkdtemp(prefix="graphs-bench-")) / "app.db"
+
+GRAPHS = 10_000
+NODES = 40          # sequence met zoveel children per graph (~4 KB JSON)
+PAGE = 100
+
+
+def _root(i: int) -> dict:
+    return {
+        "id": f"seq{i}", "type": "sequence",
+        "children": [
+            {"id": f"n{i}-{k}", "type": "single_order", "side": "BUY", "order_type": "LMT",
+             "quantity": 1 + k, "limit_price": 100.0 + k, "tif": "DAY"}
+            for k in range(NODES)
+        ],
+    }
+
+
+def _old_scan() -> int:
+    conn = db.get_conn()
+    try:
+        rows = conn.execute("SELECT id, name, description, json FROM graphs ORDER BY created_at ASC").fetchall()
+        return len([json.loads(r["json"]) for r in rows])
+    finally:
+        conn.close()
+
+
+def main():
+    conn = db.get_conn()
+    db.init_db()
+    t0 = time.perf_counter()
+    # bulk seed zonder 10k losse commits; daarna gewone saves via de store
+    with conn:
+        for i in range(GRAPHS):
+            body = json.dumps({"root": _root(i)})
+            conn.execute(
+                "INSERT INTO graphs (id, name, description, json, version, updated_at) VALUES (?, ?, '', ?, 1, ?)",
+                (f"g{i:05d}", f"graph {i}", body, 1e9 + i),
+            )
+    conn.close()
+    for i in range(50):
+        store.upsert_graph({"id": f"g{i:05d}", "name": f"graph {i}", "root": _root(i)})
+    seed = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n = _old_scan()
+    scan_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    pages, cursor, listed = 0, None, 0
+    while True:
+        page = store.list_graphs(limit=PAGE, cursor=cursor)
+        listed += len(page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    all_pages_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    store.list_graphs(limit=PAGE, order="desc")
+    page_ms = (time.perf_counter() - t0) * 1000
+
+    ids = [f"g{i:05d}" for i in range(0, GRAPHS, 50)]
+    t0 = time.perf_counter()
+    for gid in ids:
+        store.get_graph(gid)
+    cold_us = (time.perf_counter() - t0) / len(ids) * 1e6
+    hot = ids[:100]
+    t0 = time.perf_counter()
+    for gid in hot:
+        store.get_graph(gid)
+    hot_us = (time.perf_counter() - t0) / len(hot) * 1e6
+
+    print(f"seed       {GRAPHS} graphs in {seed:.1f} s")
+    print(f"oude scan  {scan_ms:8.1f} ms  ({n} bodies geparsed)")
+    print(f"1 pagina   {page_ms:8.1f} ms  ({PAGE} rijen metadata, nieuwste eerst)")
+    print(f"alles      {all_pages_ms:8.1f} ms  ({listed} rijen in {pages} pagina's)")
+    print(f"get koud   {cold_us:8.0f} µs  (metadata + body + json.loads)")
+    print(f"get cache  {hot_us:8.0f} µs  (enkel metadata-lookup)  {store.stats}")
+    if listed != GRAPHS or page_ms > scan_ms:
+        raise SystemExit("FAIL: listing onvolledig of trager dan de volledige scan")
+
+
+if __name__ == "__main__":
+    main()
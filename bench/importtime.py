@@ -0,0 +1,66 @@
+"""
+Import-time budget voor `import server.main` (python -X importtime in een schone subprocess).
+Faalt (exit code 1) als het budget overschreden wordt of als zware modules al bij import geladen worden.
+Run (vanuit project root):
+  python -m bench.importtime
+  IMPORT_BUDGET_MS=800 python -m bench.importtime
+"""
+import os
+import re
+import subprocess
+import sys
+
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+RUNS = 3
+# mogen niet bij startup geladen worden (lazy: eerste gebruik / achtergrond)
+FORBIDDEN = (
+    "ib_insync",
+    "numpy",
+    "server.modules.order_transmitting.adapters.ibkr.adapter",
+    "server.modules.backtest.engine",
+    "server.modules.data.bars",
+    "server.modules.strategy_types.strategies.",
+)
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _measure():
+    env = {**os.environ, "IBKR_ADAPTER": os.getenv("IBKR_ADAPTER", "sim")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server.main"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import server.main failed:\n{proc.stderr[-2000:]}")
+    rows = [m.groups() for m in map(_LINE.match, proc.stderr.splitlines()) if m]
+    cumulative = {name: int(cum) for _, cum, _, name in rows}
+    return cumulative
+
+
+def main():
+    results = [_measure() for _ in range(RUNS)]
+    best = min(results, key=lambda r: r["server.main"])
+    total_ms = best["server.main"] / 1000.0
+    top = sorted(
+        ((name, us) for name, us in best.items() if name.startswith("server.") and name != "server.main"),
+        key=lambda x: -x[1],
+    )[:10]
+    print(f"import server.main: {total_ms:.0f} ms (best of {RUNS}, budget {BUDGET_MS:.0f} ms)")
+    for name, us in top:
+        print(f"  {us / 1000.0:7.1f} ms  {name}")
+    loaded = [m for m in best if any(m == f or (f.endswith(".") and m.startswith(f)) for f in FORBIDDEN)]
+    ok = True
+    if loaded:
+        print(f"FAIL: loaded at import: {', '.join(sorted(loaded))}")
+        ok = False
+    if total_ms > BUDGET_MS:
+        print(f"FAIL: {total_ms:.0f} ms > budget {BUDGET_MS:.0f} ms")
+        ok = False
+    if ok:
+        print("OK")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
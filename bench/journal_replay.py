@@ -0,0 +1,74 @@
+"""
+Benchmark: order journal (results.journal).
+- append-kost per event op de schrijver-thread (submit + statuswijzigingen via de records-listener)
+- replay van een dag aan events zonder snapshot (worst case na een crash) en vanaf een snapshot
+Run (vanuit project root):
+  python -m bench.journal_replay
+"""
+import os
+import tempfile
+import time
+
+os.environ["JOURNAL_DIR"] = tempfile.mkdtemp(prefix="journal-bench-")
+os.environ["JOURNAL_SNAPSHOT_EVENTS"] = "0"     # enkel expliciete snapshots
+
+from server.modules.data.store import ORDERS, RESULTS
+from server.modules.results import journal
+from server.modules.results.records import ensure_record, notify, publish
+
+ORDERS_PER_DAY = 50_000
+BUDGET_MS = 1000.0
+# per order: submit + pendingsubmit, submitted, partial fill, filled
+_STEPS = (("pendingsubmit", 0), ("submitted", 0), ("submitted", 50), ("filled", 100))
+
+
+def _generate() -> int:
+    n = 0
+    for i in range(ORDERS_PER_DAY):
+        iid = f"{i:012x}"
+        order = {"symbol": f"S{i % 200:03d}", "side": "BUY", "order_type": "LMT", "quantity": 100, "limit_price": 100.0}
+        ORDERS[iid] = order
+        journal.submit(iid, order, "sim", "bench")
+        rec = ensure_record(iid, "sim", order)
+        for status, filled in _STEPS:
+            rec.update(status, filled, 100.0 if filled else None, i)
+            publish(rec)
+            notify([iid])
+        n += 1 + len(_STEPS)
+    return n
+
+
+def _reset() -> None:
+    ORDERS.clear()
+    RESULTS.clear()
+
+
+def main():
+    journal.start()
+    t0 = time.perf_counter()
+    events = _generate()
+    gen = time.perf_counter() - t0
+    journal.flush()
+    st = journal.stats()
+    print(f"append   {events} events, {st['bytes'] / 1e6:.1f} MB, {gen / events * 1e6:.2f} µs/event incl. publish/notify")
+    want = {k: dict(v) for k, v in RESULTS.items()}
+
+    # crash: geen snapshot bij afsluiten, alles uit het journal
+    journal.close(snapshot_on_close=False)
+    _reset()
+    crash = journal.start()
+    ok = RESULTS == want and len(ORDERS) == ORDERS_PER_DAY
+    print(f"replay   {crash['events']} events in {crash['ms']:.0f} ms (journal, geen snapshot)  consistent={ok}")
+
+    journal.close()
+    _reset()
+    snap = journal.start()
+    ok = ok and RESULTS == want
+    print(f"replay   snapshot in {snap['ms']:.0f} ms  consistent={RESULTS == want}")
+    journal.close(snapshot_on_close=False)
+    if max(crash["ms"], snap["ms"]) > BUDGET_MS or not ok:
+        raise SystemExit(f"FAIL: replay > {BUDGET_MS:.0f} ms of inconsistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: reconciliatie-pass (order_transmitting.reconcile) op de sim adapter.
+- ORDERS orders via de sim, daarna drift: DRIFT entries in RESULTS met een verkeerde status
+  (gemiste events) en DRIFT lokaal open orders die de broker niet kent
+- meet de volledige pass (lokale index + bulk-fetch + set-diff + correcties) en controleert
+  dat alle drift gevonden en (na 2 passes voor missing) rechtgezet is
+Run (vanuit project root):
+  python -m bench.reconcile
+"""
+import os
+import time
+
+os.environ.setdefault("SIM_SPEED", "0")
+os.environ.setdefault("SIM_LATENCY_MS", "0")
+
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting import reconcile
+from server.modules.order_transmitting.adapters import registry
+from server.modules.order_transmitting.adapters.sim.adapter import ENGINE
+
+ORDERS = 50_000
+DRIFT = 500
+BUDGET_MS = 1000.0
+
+
+def main():
+    ad = registry.get("sim")
+    ad.start()
+    order = {"symbol": "AAA", "side": "BUY", "order_type": "LMT", "quantity": 10, "limit_price": 1.0}
+    for k in range(0, ORDERS, 5000):
+        ad.send_many([(order, f"r{i:08d}") for i in range(k, k + 5000)])
+    while ENGINE.pending() or len(RESULTS) < ORDERS:
+        time.sleep(0.05)
+
+    clean = reconcile.run("sim")
+    for i in range(DRIFT):
+        iid = f"r{i:08d}"
+        RESULTS[iid] = {**RESULTS[iid], "status": "submitted", "filled_qty": 0}
+        RESULTS[f"ghost{i}"] = {"status": "submitted", "filled_qty": 0, "avg_price": None,
+                                "adapter": "sim", "ibkr_order_id": 10_000_000 + i}
+    first = reconcile.run("sim")
+    second = reconcile.run("sim")
+    c1, c2 = first["counts"], second["counts"]
+
+    print(f"pass zonder drift  {clean['ms']:7.1f} ms (fetch {clean['fetch_ms']:.1f} ms) voor {clean['counts']['broker']} orders")
+    print(f"pass met drift     {first['ms']:7.1f} ms  mismatched={c1['mismatched']} missing={c1['missing']} corrected={c1['corrected']}")
+    print(f"2e pass            {second['ms']:7.1f} ms  lost={c2['lost']} corrected={c2['corrected']}")
+    ok = (
+        c1["mismatched"] == DRIFT and c1["missing"] == DRIFT and c1["corrected"] == DRIFT
+        and c2["lost"] == DRIFT and c2["mismatched"] == 0
+        and all(RESULTS[f"r{i:08d}"]["status"] == "filled" for i in range(DRIFT))
+        and all(RESULTS[f"ghost{i}"]["status"] == "inactive" for i in range(DRIFT))
+    )
+    if max(clean["ms"], first["ms"], second["ms"]) > BUDGET_MS or not ok:
+        raise SystemExit(f"FAIL: pass > {BUDGET_MS:.0f} ms of drift niet (volledig) rechtgezet")
+
+
+if __name__ == "__main__":
+    main()
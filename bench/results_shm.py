@@ -0,0 +1,82 @@
+"""
+Benchmark: /results reads uit de shared-memory result-tabel (results.shared).
+- get() per id in een ander proces terwijl de schrijver continu updates doet (seqlock)
+- controleert dat geen enkele read een half geschreven record teruggeeft
+  (schrijver houdt filled_qty == ibkr_order_id en avg_price == 2 * filled_qty aan)
+- vergelijkt met een gewone dict-lookup in hetzelfde proces
+Run (vanuit project root):
+  python -m bench.results_shm
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from server.modules.results.shared import SharedResultTable
+
+IDS = [f"{i:012x}" for i in range(10_000)]
+READS = 200_000
+
+
+def _reader(name: str) -> None:
+    table = SharedResultTable.attach(name)
+    torn = missing = 0
+    t0 = time.perf_counter()
+    for n in range(READS):
+        r = table.get(IDS[n % len(IDS)])
+        if r is None:
+            missing += 1
+        elif r["ibkr_order_id"] != r["filled_qty"] or r["avg_price"] != 2.0 * r["filled_qty"]:
+            torn += 1
+    print((time.perf_counter() - t0) / READS * 1e9, torn, missing, table.stats["retries"])
+    table.close()
+
+
+def main():
+    table = SharedResultTable.create(name=f"bench_results_{os.getpid()}", slots=len(IDS) * 2)
+    for iid in IDS:
+        table.put(iid, "submitted", 0, 0.0, 0)
+    stop = threading.Event()
+    writes = [0]
+
+    def _writer():
+        k = 0
+        while not stop.is_set():
+            k += 1
+            for iid in IDS[:1000]:
+                table.put(iid, "submitted", k, 2.0 * k, k)
+            writes[0] += 1000
+
+    w = threading.Thread(target=_writer, daemon=True)
+    w.start()
+    # los proces (geen multiprocessing-kind: eigen resource_tracker), zoals een uvicorn worker
+    t0 = time.perf_counter()
+    line = subprocess.run(
+        [sys.executable, "-m", "bench.results_shm", "--reader", table.name],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    ns, torn, missing, retries = float(line[0]), int(line[1]), int(line[2]), int(line[3])
+    stop.set()
+    w.join()
+    write_us = (time.perf_counter() - t0) / max(writes[0], 1) * 1e6
+
+    local = {iid: {"status": "submitted"} for iid in IDS}
+    t0 = time.perf_counter()
+    for n in range(READS):
+        local.get(IDS[n % len(IDS)])
+    dict_ns = (time.perf_counter() - t0) / READS * 1e9
+
+    print(f"shm get (ander proces) {ns:8.0f} ns/read   torn={torn} missing={missing} seqlock retries={retries}")
+    print(f"dict get (lokaal)      {dict_ns:8.0f} ns/read")
+    print(f"put (schrijver)        {write_us:8.2f} µs/write ({writes[0]} writes tijdens de reads)")
+    table.close()
+    if torn:
+        raise SystemExit("FAIL: half geschreven records gelezen")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--reader":
+        _reader(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: CPU per trade-event in _update_results_from_trade (oud vs OrderRecord).
+Geen IB-verbinding nodig; gebruikt ib_insync dataclasses als fake trades.
+Run (vanuit project root):
+  python -m bench.results_update
+"""
+import time
+
+from ib_insync import Trade, Stock, LimitOrder, OrderStatus  # type: ignore
+
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting.adapters.ibkr.adapter import (
+    _update_results_from_trade, _get_limit_price, _get_stop_price,
+)
+
+N_ORDERS = 200
+N_EVENTS = 200_000
+
+
+def _legacy_coerce_filled(trade) -> int:
+    try:
+        val = getattr(trade, "filled", None)
+        if callable(val):
+            val = val()
+        if val is None:
+            val = getattr(trade.orderStatus, "filled", 0)
+        return int(val or 0)
+    except Exception:
+        return 0
+
+
+def _legacy_update(trade, internal_id: str):
+    """Kopie van de oude implementatie (volledige dict-rebuild per event)."""
+    status = (getattr(trade.orderStatus, "status", None) or "unknown").lower()
+    filled = _legacy_coerce_filled(trade)
+    avg    = getattr(trade.orderStatus, "avgFillPrice", None)
+    oid    = getattr(trade.order, "orderId", None)
+    RESULTS[internal_id] = {
+        "status": status,
+        "filled_qty": filled,
+        "avg_price": avg,
+        "detail": {
+            "action": trade.order.action,
+            "totalQuantity": trade.order.totalQuantity,
+            "orderType": trade.order.orderType,
+            "lmtPrice": _get_limit_price(trade.order),
+            "stopPrice": _get_stop_price(trade.order),
+            "tif": trade.order.tif,
+        },
+        "ibkr_order_id": oid,
+        "adapter": "ibkr",
+    }
+
+
+def _trades():
+    out = []
+    for i in range(N_ORDERS):
+        o = LimitOrder("BUY", 10_000, 100.0 + i)
+        o.orderId = 1000 + i
+        o.tif = "DAY"
+        out.append((f"bench{i:08d}", Trade(contract=Stock("AAPL", "SMART", "USD"), order=o,
+                                           orderStatus=OrderStatus(orderId=o.orderId, status="Submitted"))))
+    return out
+
+
+def _run(fn, trades) -> float:
+    RESULTS.clear()
+    t0 = time.perf_counter()
+    for n in range(N_EVENTS):
+        iid, tr = trades[n % N_ORDERS]
+        st = tr.orderStatus
+        # partial fills: 1 op 4 events verandert er echt iets (rest = dubbele status/fill events)
+        if n % 4 == 0:
+            st.filled += 1
+            st.avgFillPrice = 100.0 + (n % 7) * 0.01
+        fn(tr, iid)
+    return (time.perf_counter() - t0) / N_EVENTS * 1e6
+
+
+def main():
+    before = _run(_legacy_update, _trades())
+    after = _run(_update_results_from_trade, _trades())
+    print(f"events={N_EVENTS} orders={N_ORDERS}")
+    print(f"legacy rebuild : {before:6.2f} us/event")
+    print(f"OrderRecord    : {after:6.2f} us/event  (x{before / after:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: extra latency van de pre-trade risk check op het order-pad.
+- risk.check + release los (µs per order)
+- enqueue_order naar de sim adapter met en zonder risk check
+Run (vanuit project root):
+  python -m bench.risk_check
+"""
+import os
+import time
+
+os.environ["IBKR_ADAPTER"] = "sim"
+os.environ.setdefault("LEDGER_FLUSH_MS", "60000")   # SQLite flush buiten de meting houden
+os.environ.setdefault("RISK_ORDERS_PER_SEC", "0")   # rate limits zouden de meting afkappen
+os.environ.setdefault("RISK_SYMBOL_ORDERS_PER_SEC", "0")
+
+from server.modules.data.market import QUOTES
+from server.modules.order_transmitting import service
+from server.modules.risk import service as risk
+
+N = 20_000
+SYMBOLS = [f"S{i:03d}" for i in range(50)]
+
+
+def _orders():
+    for i in range(N):
+        sym = SYMBOLS[i % len(SYMBOLS)]
+        yield {"symbol": sym, "side": "BUY" if i % 2 else "SELL", "order_type": "LMT", "quantity": 1, "limit_price": 100.0}
+
+
+def _per_order_us(fn) -> float:
+    orders = list(_orders())
+    t0 = time.perf_counter()
+    for i, o in enumerate(orders):
+        fn(i, o)
+    return (time.perf_counter() - t0) / N * 1e6
+
+
+def main():
+    for sym in SYMBOLS:
+        QUOTES.update(sym, bid=99.99, ask=100.01, last=100.0)
+
+    def _check(i, o):
+        iid = f"b{i}"
+        if risk.check(iid, o) is None:
+            risk.release(iid)
+
+    print(f"risk.check+release : {_per_order_us(_check):7.2f} µs/order")
+
+    # engine niet starten: we meten enkel het pad tot en met adapter.send
+    enq = lambda i, o: service.enqueue_order(o)
+    with_risk = _per_order_us(enq)
+    risk._ENABLED = False
+    without = _per_order_us(enq)
+    risk._ENABLED = True
+    print(f"enqueue_order      : {without:7.2f} µs/order zonder risk, {with_risk:7.2f} met (+{with_risk - without:.2f})")
+    print(risk.state())
+
+
+if __name__ == "__main__":
+    main()
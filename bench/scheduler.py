@@ -0,0 +1,75 @@
+"""
+Benchmark: graph scheduler (strategy_graph.scheduler + runs).
+- Cron.next_after voor een paar typische expressies
+- SCHEDULES interval-schedules (zelfde fase) + evenveel cron-schedules in een tijdelijke database;
+  de scheduler draait DURATION seconden: jitter = started_at - scheduled_for uit de run-historiek
+- elke burst = 1 claim-transactie + 1 batch-insert, dus het aantal batches << het aantal runs
+Run (vanuit project root):
+  python -m bench.scheduler
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from server.modules.persistence import db
+
+db._DB_PATH = Path(tempfile.mkdtemp(prefix="scheduler-bench-")) / "app.db"
+
+from server.modules.strategy_graph import runs, store
+from server.modules.strategy_graph.scheduler import Cron, Scheduler
+
+SCHEDULES = 1_000
+INTERVAL = 2.0
+DURATION = 6.0
+BUDGET_P99_MS = 500.0
+
+
+def _cron_bench():
+    now = time.time()
+    for expr, tz in (("* * * * *", None), ("30 9 * * 1-5", "America/New_York"),
+                     ("*/15 9-16 * * MON-FRI", None), ("0 0 29 2 *", None)):
+        c = Cron(expr, tz)
+        n = 2000
+        t0 = time.perf_counter()
+        for k in range(n):
+            c.next_after(now + k * 61)
+        print(f"cron {expr:24s} {(time.perf_counter() - t0) / n * 1e6:7.1f} µs/next_after")
+
+
+def main():
+    _cron_bench()
+    store.upsert_graph({"id": "bench", "name": "bench", "root": {"id": "s", "type": "sequence", "children": []}})
+    sch = Scheduler()
+    # eerste occurrence pas na het aanmaken van alle schedules (upserts zijn elk 1 commit)
+    start_at = time.time() + 1.0 + SCHEDULES * 0.01
+    t0 = time.perf_counter()
+    for i in range(SCHEDULES):
+        sch.upsert({"id": f"i{i}", "graph_id": "bench", "symbol": "AAA", "interval_sec": INTERVAL, "start_at": start_at})
+        sch.upsert({"id": f"c{i}", "graph_id": "bench", "symbol": "AAA", "cron": "0 3 * * *"})
+    upsert_ms = (time.perf_counter() - t0) / (2 * SCHEDULES) * 1000
+
+    sch.start()
+    time.sleep(max(0.0, start_at - time.time()) + DURATION)
+    sch.stop()
+    while runs.snapshot()["active"]:
+        time.sleep(0.05)
+
+    lat = []
+    for i in range(SCHEDULES):
+        for r in runs.list_runs(schedule_id=f"i{i}")["items"]:
+            if r["started_at"] is not None:
+                lat.append((r["started_at"] - r["scheduled_for"]) * 1000)
+    lat.sort()
+    st = sch.snapshot()
+    p50 = lat[len(lat) // 2] if lat else float("nan")
+    p99 = lat[int(len(lat) * 0.99)] if lat else float("nan")
+    expected = SCHEDULES * int(DURATION // INTERVAL)
+    print(f"upsert       {upsert_ms:7.2f} ms/schedule  ({2 * SCHEDULES} schedules)")
+    print(f"runs         {len(lat)} (verwacht >= {expected}) in {st['batches']} batches, skipped={st['skipped']}")
+    print(f"jitter       p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   max {lat[-1] if lat else float('nan'):7.1f} ms")
+    if not lat or len(lat) < expected or p99 > BUDGET_P99_MS:
+        raise SystemExit(f"FAIL: te weinig runs of p99 jitter > {BUDGET_P99_MS:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark: orders/sec door enqueue_order -> sim-engine -> RESULTS (oud: 1 order per 2 s).
+Run (vanuit project root):
+  python -m bench.sim_throughput
+"""
+import os
+import time
+
+os.environ["IBKR_ADAPTER"] = "sim"
+os.environ.setdefault("SIM_LIQUIDITY", "0")
+os.environ.setdefault("LEDGER_FLUSH_MS", "60000")   # SQLite flush buiten de meting houden
+os.environ.setdefault("RISK_ORDERS_PER_SEC", "0")   # geen order-rate limiet in de benchmark
+os.environ.setdefault("RISK_SYMBOL_ORDERS_PER_SEC", "0")
+
+from server.modules.data.market import QUOTES
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting.service import enqueue_order, queue_size, start_worker_once
+
+N_ORDERS = 20_000
+SYMBOLS = [f"S{i:03d}" for i in range(50)]
+
+
+def main():
+    start_worker_once()
+    for sym in SYMBOLS:
+        # startprijs van de sim = referentieprijs uit de quote cache; LMT SELL 99 is dan marketable
+        QUOTES.update(sym, bid=99.99, ask=100.01, last=100.0)
+    t0 = time.perf_counter()
+    ids = []
+    for i in range(N_ORDERS):
+        sym = SYMBOLS[i % len(SYMBOLS)]
+        if i % 2:
+            order = {"symbol": sym, "side": "BUY", "order_type": "MKT", "quantity": 10}
+        else:
+            order = {"symbol": sym, "side": "SELL", "order_type": "LMT", "quantity": 10, "limit_price": 99.0}
+        ids.append(enqueue_order(order))
+    t_submit = time.perf_counter() - t0
+
+    deadline = time.time() + 60
+    while queue_size() and time.time() < deadline:
+        time.sleep(0.005)
+    t_all = time.perf_counter() - t0
+    done = sum(1 for i in ids if RESULTS.get(i, {}).get("status") == "filled")
+    print(f"submit: {N_ORDERS / t_submit:,.0f} orders/s ({t_submit:.2f}s)")
+    print(f"filled: {done}/{N_ORDERS} in {t_all:.2f}s -> {done / t_all:,.0f} orders/s end-to-end")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Benchmark: kost per order van strategy-validatie + order-opbouw.
+- build_from_strategy: /order-processing/build en /system-panel/place-order
+- build_order: /strategy-types/run en backtests
+Run (vanuit project root):
+  python -m bench.strategy_build
+"""
+import time
+
+from server.modules.order_processing.service import build_from_strategy
+from server.modules.strategy_types import build_order, list_ids
+
+N = 50_000
+
+
+def _us(fn) -> float:
+    t0 = time.perf_counter()
+    for _ in range(N):
+        fn()
+    return (time.perf_counter() - t0) / N * 1e6
+
+
+def main():
+    params = {"quantity": 10, "limit_price": 101.5}
+    alias = str(list_ids().index("lmt_buy") + 1)   # numerieke alias voor lmt_buy
+    cases = {
+        "build_from_strategy('lmt_buy')": lambda: build_from_strategy("AAPL", "lmt_buy", params),
+        "build_from_strategy(alias)    ": lambda: build_from_strategy("AAPL", alias, params),
+        "build_order('lmt_buy')        ": lambda: build_order("lmt_buy", "AAPL", params),
+        "build_order('bracket_buy')    ": lambda: build_order("bracket_buy", "AAPL", {"quantity": 10, "target_price": 110, "stop_price": 95}),
+    }
+    for name, fn in cases.items():
+        out = fn()
+        assert out and (not isinstance(out, tuple) or out[0]), out
+        print(f"{name}: {_us(fn):6.2f} µs/order")
+
+
+if __name__ == "__main__":
+    main()
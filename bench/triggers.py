@@ -0,0 +1,83 @@
+"""
+Benchmark: trigger engine van de strategy-graph conditie-nodes (strategy_graph.triggers).
+- TRIGGERS wachtende prijs-triggers (above/below) verspreid over SYMBOLS symbolen, plus sma-triggers
+- TICKS quote-updates via QUOTES.update (listener -> engine) zonder dat er iets vuurt:
+  kost per tick vs een naïeve scan over alle wachtende condities van dat symbool
+- daarna een prijssprong op 1 symbool: controleert dat exact de juiste triggers vuren
+Run (vanuit project root):
+  python -m bench.triggers
+"""
+import random
+import time
+
+from server.modules.data.market import QUOTES
+from server.modules.strategy_graph.triggers import TRIGGERS
+
+SYMBOLS = 500
+TRIGGERS_N = 100_000
+SMA = 1_000
+TICKS = 200_000
+
+
+def main():
+    rnd = random.Random(7)
+    syms = [f"S{i:03d}" for i in range(SYMBOLS)]
+    for s in syms:
+        QUOTES.update(s, last=100.0, bid=99.99, ask=100.01)
+
+    t0 = time.perf_counter()
+    naive = {s: [] for s in syms}
+    trigs = []
+    for k in range(TRIGGERS_N):
+        s = syms[k % SYMBOLS]
+        if (k // SYMBOLS) % 2:
+            op, lvl = "above", 101.0 + rnd.random() * 10
+        else:
+            op, lvl = "below", 99.0 - rnd.random() * 10
+        trigs.append(TRIGGERS.add_price(s, op, lvl))
+        naive[s].append((op, lvl))
+    for k in range(SMA):
+        TRIGGERS.add_indicator(syms[k % SYMBOLS], "sma", "above", 150.0, period=20)
+    reg_us = (time.perf_counter() - t0) / (TRIGGERS_N + SMA) * 1e6
+
+    # ticks binnen de band 99..101: niets vuurt
+    ticks = [(syms[rnd.randrange(SYMBOLS)], 99.5 + rnd.random()) for _ in range(TICKS)]
+    t0 = time.perf_counter()
+    for s, px in ticks:
+        QUOTES.update(s, last=px)
+    engine_us = (time.perf_counter() - t0) / TICKS * 1e6
+
+    base = TRIGGERS.stats["ticks"]
+    QUOTES.remove_listener(TRIGGERS._on_tick)
+    t0 = time.perf_counter()
+    for s, px in ticks:
+        QUOTES.update(s, last=px)
+    bare_us = (time.perf_counter() - t0) / TICKS * 1e6
+    QUOTES.add_listener(TRIGGERS._on_tick)
+
+    t0 = time.perf_counter()
+    hits = 0
+    for s, px in ticks[: TICKS // 10]:
+        for op, lvl in naive[s]:
+            if (px >= lvl) if op == "above" else (px <= lvl):
+                hits += 1
+    naive_us = (time.perf_counter() - t0) / (TICKS // 10) * 1e6
+
+    # sprong op S000: alle above-triggers van S000 <= 105 moeten vuren, niets anders
+    want = {t.id for t in trigs if t.spec["symbol"] == "S000" and t.op == "above" and t.level <= 105.0}
+    fired_before = TRIGGERS.stats["fired"]
+    QUOTES.update("S000", last=105.0)
+    got = {t.id for t in trigs if t.fired}
+    fired = TRIGGERS.stats["fired"] - fired_before
+
+    print(f"registreren  {reg_us:7.2f} µs/trigger  ({TRIGGERS_N} prijs + {SMA} sma, {SYMBOLS} symbolen)")
+    print(f"tick engine  {engine_us:7.2f} µs  (QUOTES.update + listener)")
+    print(f"tick kaal    {bare_us:7.2f} µs  (QUOTES.update zonder listener)")
+    print(f"naïeve scan  {naive_us:7.2f} µs  ({TRIGGERS_N // SYMBOLS} condities per symbool, hits={hits})")
+    print(f"sprong       {fired} gevuurd (verwacht {len(want)})  {TRIGGERS.snapshot()}")
+    if got != want or fired != len(want) or hits or base < TICKS or engine_us - bare_us > naive_us:
+        raise SystemExit("FAIL: verkeerde triggers gevuurd of engine niet sneller dan een scan")
+
+
+if __name__ == "__main__":
+    main()
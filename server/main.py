@@ -1,5 +1,6 @@
+import sys
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
 from server.routers import (
     system_panel,
@@ -11,11 +12,15 @@ from server.routers import (
     results,
     strategy_types,
     editor,
+    backtest,
+    risk,
 )
-from server.modules.order_transmitting.service import start_worker_once
-from server.routers import exit_types
-from server.routers import strategy_types
+from server.modules.order_transmitting.service import start_worker_once, readiness
+from server.modules.order_transmitting import reconcile
+from server.modules.results import journal, ledger
 from server.routers import strategy_graph
+from server.modules.strategy_graph.scheduler import SCHEDULER
+from server.modules.strategy_graph import runs as graph_runs
 
 # ---- maak eerst de app ----
 app = FastAPI(title="IBKR Server V6")
@@ -23,13 +28,37 @@ app = FastAPI(title="IBKR Server V6")
 # ---- lifecycle ----
 @app.on_event("startup")
 def _startup():
+    # order journal replay (ORDERS/RESULTS/OCA) vóór de adapters events beginnen te publiceren
+    journal.start()
+    # blokkeert niet: IBKR import + connect lopen op de achtergrond (zie /api/ready)
     start_worker_once()
+    # periodieke reconciliatie tegen de broker (RECONCILE_INTERVAL_SEC; niet achter de gateway)
+    reconcile.start()
+    # geplande graph runs (cron/interval/at uit SQLite; gemiste runs volgens de misfire policy)
+    SCHEDULER.start()
+
+@app.on_event("shutdown")
+def _shutdown():
+    reconcile.stop()
+    SCHEDULER.stop()
+    graph_runs.shutdown()
+    ledger.flush()
+    journal.close()
+    # backtests worden lazy geladen; enkel afsluiten als er een pool kan zijn
+    backtest_service = sys.modules.get("server.modules.backtest.service")
+    if backtest_service is not None:
+        backtest_service.shutdown()
 
 # ---- basic routes ----
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
-app.include_router(strategy_types.router)
+
+@app.get("/api/ready")
+def ready():
+    """Readiness probe: 200 als alle adapters in gebruik orders kunnen verwerken, anders 503."""
+    r = readiness()
+    return JSONResponse(r, status_code=200 if r["ready"] else 503)
 
 @app.get("/", response_class=HTMLResponse)
 def home():
@@ -45,5 +74,6 @@ app.include_router(order_transmitting.router)
 app.include_router(results.router)
 app.include_router(strategy_types.router)
 app.include_router(editor.router)
-app.include_router(exit_types.router)
-app.include_router(strategy_graph.router)
\ No newline at end of file
+app.include_router(strategy_graph.router)
+app.include_router(backtest.router)
+app.include_router(risk.router)
\ No newline at end of file
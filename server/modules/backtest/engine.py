@@ -0,0 +1,209 @@
+"""
+Gevectoriseerde backtest van strategy_types specs over bars (NumPy).
+
+Model (per entry-bar i een onafhankelijke trade):
+- entry order komt binnen bij de open van bar i
+    MKT: fill op open[i] (+ slippage)
+    LMT: eerste bar j >= i met low <= L (BUY) / high >= L (SELL); fill op min/max(open[j], L)
+    STP: eerste bar j >= i met high >= S (BUY) / low <= S (SELL); fill op max/min(open[j], S)
+  tif DAY: order vervalt na de laatste bar van die (UTC) dag; anders loopt hij tot het einde van het venster
+- bracket: parent MKT, daarna target LMT + stop STP als OCA vanaf de fill-bar;
+  raken beide in dezelfde bar, dan telt de stop (conservatief); ligt een niveau al voorbij de open, fill op de open
+- zonder exit: positie wordt gesloten op de close van de laatste bar van het venster (horizon)
+
+"Eerste bar >= i waar prijs het niveau raakt" = searchsorted op de indices van de hit-mask:
+O(n + m log n) voor m entries, zonder Python-loop over bars.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Optional
+
+try:
+    import numpy as np  # type: ignore
+except Exception as e:  # pragma: no cover
+    np = None  # type: ignore
+    _IMPORT_ERROR = e
+else:
+    _IMPORT_ERROR = None
+
+EXIT_TARGET, EXIT_STOP, EXIT_HORIZON = 1, 2, 3
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError(f"numpy not available: {_IMPORT_ERROR!r}")
+
+
+class Bars:
+    """OHLC kolommen (views volstaan, bv. memmap-slices uit data.bars) + afgeleide dag-grenzen."""
+
+    __slots__ = ("ts", "open", "high", "low", "close", "n", "day_end")
+
+    def __init__(self, ts, open, high, low, close):
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.n = len(self.ts)
+        day = (self.ts // 86400).astype(np.int64)
+        # index van de laatste bar van dezelfde dag, per bar
+        self.day_end = np.searchsorted(day, day, side="right") - 1
+
+    @classmethod
+    def from_columns(cls, cols: Dict[str, Any]) -> "Bars":
+        return cls(cols["ts"], cols["open"], cols["high"], cols["low"], cols["close"])
+
+
+def _next_hit(mask, start, n: int):
+    """Per start-index: eerste index >= start waar mask True is, anders n."""
+    pos = np.flatnonzero(mask)
+    k = np.searchsorted(pos, start)
+    out = np.full(len(start), n, dtype=np.int64)
+    ok = k < len(pos)
+    out[ok] = pos[k[ok]]
+    return out
+
+
+def _entry(bars: Bars, order: Dict[str, Any], starts, last):
+    """Fill-bar en fill-prijs van de entry order per start-index (bar = n als niet gevuld)."""
+    n = bars.n
+    side = (order.get("side") or "BUY").upper()
+    buy = side == "BUY"
+    typ = (order.get("order_type") or "MKT").upper()
+    if typ == "MKT":
+        j = starts.copy()
+        px = bars.open[np.minimum(j, n - 1)]
+    elif typ == "LMT":
+        lp = float(order.get("limit_price") or 0)
+        if lp <= 0:
+            raise ValueError("limit_price required for LMT")
+        j = _next_hit(bars.low <= lp if buy else bars.high >= lp, starts, n)
+        o = bars.open[np.minimum(j, n - 1)]
+        px = np.minimum(o, lp) if buy else np.maximum(o, lp)
+    elif typ == "STP":
+        sp = float(order.get("stop_price") or 0)
+        if sp <= 0:
+            raise ValueError("stop_price required for STP")
+        j = _next_hit(bars.high >= sp if buy else bars.low <= sp, starts, n)
+        o = bars.open[np.minimum(j, n - 1)]
+        px = np.maximum(o, sp) if buy else np.minimum(o, sp)
+    else:
+        raise ValueError(f"unsupported order_type: {typ}")
+    j = np.where(j <= last, j, n)
+    return j, px
+
+
+def simulate(
+    spec: Dict[str, Any],
+    bars: Bars,
+    entry_every: int = 1,
+    horizon: Optional[int] = None,
+    commission: float = 0.0,
+    slippage_bps: float = 0.0,
+    trades: bool = False,
+) -> Dict[str, Any]:
+    """
+    Speel 1 spec (output van strategy build()) af op elke `entry_every`-de bar.
+    horizon = max aantal bars per trade (None = tot het einde van de data).
+    commission = per stuk per fill; slippage_bps wordt tegen de trader gerekend op MKT/STP fills.
+    """
+    require_numpy()
+    n = bars.n
+    if n == 0:
+        return _stats(np.empty(0), np.empty(0, np.int8), np.empty(0), 0)
+
+    typ = spec.get("type")
+    if typ == "single":
+        order = spec["order"]
+        target = stop = None
+    elif typ == "bracket":
+        order = {**spec["base_order"], "order_type": "MKT"}
+        target, stop = float(spec["target_price"]), float(spec["stop_price"])
+    else:
+        raise ValueError(f"unsupported spec type: {typ}")
+
+    buy = (order.get("side") or "BUY").upper() == "BUY"
+    sign = 1.0 if buy else -1.0
+    qty = float(order.get("quantity") or 0)
+    if qty <= 0:
+        raise ValueError("quantity > 0 required")
+
+    starts = np.arange(0, n, max(1, int(entry_every)), dtype=np.int64)
+    window_end = np.full(len(starts), n - 1, np.int64) if horizon is None else np.minimum(starts + int(horizon) - 1, n - 1)
+    tif = (order.get("tif") or "DAY").upper()
+    entry_last = np.minimum(bars.day_end[starts], window_end) if tif == "DAY" else window_end
+
+    j, entry_px = _entry(bars, order, starts, entry_last)
+    filled = j < n
+    otype = (order.get("order_type") or "MKT").upper()
+    slip = slippage_bps / 1e4
+    if otype in ("MKT", "STP"):
+        entry_px = entry_px * (1.0 + sign * slip)
+
+    # exits: enkel voor gevulde entries
+    jf = j[filled]
+    wend = window_end[filled]
+    epx = entry_px[filled]
+    exit_bar = wend.copy()
+    exit_px = bars.close[wend]
+    reason = np.full(len(jf), EXIT_HORIZON, np.int8)
+
+    if target is not None:
+        # exits zijn tegengesteld: BUY-positie -> SELL LMT target (high >= tp) / SELL STP stop (low <= sp)
+        k_t = _next_hit(bars.high >= target if buy else bars.low <= target, jf, n)
+        k_s = _next_hit(bars.low <= stop if buy else bars.high >= stop, jf, n)
+        k_t = np.where(k_t <= wend, k_t, n)
+        k_s = np.where(k_s <= wend, k_s, n)
+        hit_s = (k_s < n) & (k_s <= k_t)
+        hit_t = (k_t < n) & ~hit_s
+        # parent is MKT (fill op de open): een niveau dat al voorbij de open ligt, vult meteen op de open
+        o_t = bars.open[np.minimum(k_t, n - 1)]
+        o_s = bars.open[np.minimum(k_s, n - 1)]
+        px_t = np.maximum(o_t, target) if buy else np.minimum(o_t, target)
+        px_s = np.minimum(o_s, stop) if buy else np.maximum(o_s, stop)
+        px_s = px_s * (1.0 - sign * slip)
+        exit_bar = np.where(hit_s, k_s, np.where(hit_t, k_t, exit_bar))
+        exit_px = np.where(hit_s, px_s, np.where(hit_t, px_t, exit_px))
+        reason = np.where(hit_s, EXIT_STOP, np.where(hit_t, EXIT_TARGET, reason)).astype(np.int8)
+
+    pnl = sign * (exit_px - epx) * qty - 2.0 * commission * qty
+    out = _stats(pnl, reason, (exit_bar - jf).astype(np.float64), len(starts))
+    if trades:
+        out["trades"] = {
+            "entry_ts": bars.ts[jf].tolist(),
+            "entry_price": epx.tolist(),
+            "exit_ts": bars.ts[exit_bar].tolist(),
+            "exit_price": exit_px.tolist(),
+            "exit_reason": reason.tolist(),
+            "pnl": pnl.tolist(),
+        }
+    return out
+
+
+def _stats(pnl, reason, held, n_entries: int) -> Dict[str, Any]:
+    n_filled = int(len(pnl))
+    if n_filled:
+        equity = np.cumsum(pnl)
+        max_dd = float(np.max(np.maximum.accumulate(np.concatenate([[0.0], equity]))[1:] - equity))
+        wins = pnl > 0
+        gross_win = float(pnl[wins].sum())
+        gross_loss = float(-pnl[pnl < 0].sum())
+    else:
+        max_dd = gross_win = gross_loss = 0.0
+    return {
+        "entries": int(n_entries),
+        "filled": n_filled,
+        "fill_ratio": round(n_filled / n_entries, 4) if n_entries else None,
+        "pnl": round(float(pnl.sum()), 4) if n_filled else 0.0,
+        "pnl_mean": round(float(pnl.mean()), 4) if n_filled else None,
+        "win_rate": round(float((pnl > 0).mean()), 4) if n_filled else None,
+        "profit_factor": round(gross_win / gross_loss, 4) if gross_loss > 0 else None,
+        "max_drawdown": round(max_dd, 4),
+        "exits": {
+            "target": int((reason == EXIT_TARGET).sum()),
+            "stop": int((reason == EXIT_STOP).sum()),
+            "horizon": int((reason == EXIT_HORIZON).sum()),
+        },
+        "bars_held_mean": round(float(held.mean()), 2) if n_filled else None,
+    }
@@ -0,0 +1,149 @@
+"""
+Backtest service: strategy_types specs x bars uit de lokale bar cache.
+- run(): 1 parameterset, optioneel met trade-lijst
+- sweep(): cartesisch product van een param-grid, verdeeld over een process pool.
+  Workers openen de bars zelf via memmap (gedeelde page cache, geen pickling van prijsarrays)
+  en houden ze per proces in een kleine cache.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import itertools
+import os
+import threading
+import time
+
+from server.modules.backtest.engine import Bars, simulate, require_numpy
+from server.modules.data import bars as bar_cache
+from server.modules.strategy_types import build_order
+
+# onder deze grootte is de pool-overhead groter dan de winst
+_MIN_POOL_COMBOS = 64
+_MAX_COMBOS = 100_000
+
+# (symbol, bar_size, start, end, n) -> Bars, per proces
+_BARS: Dict[Tuple, Bars] = {}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _bars_key(symbol: str, bar_size: str, start: Optional[float], end: Optional[float]) -> Tuple:
+    cols = bar_cache.series(symbol, bar_size).slice(start, end)
+    n = len(cols["ts"])
+    if n == 0:
+        raise ValueError(f"no cached bars for {symbol} {bar_size} in range (see GET/POST /data/bars)")
+    # vaste grenzen + lengte: een backfill in het venster geeft een nieuwe key
+    return (symbol.upper(), bar_size, float(cols["ts"][0]), float(cols["ts"][-1]), n)
+
+
+def _load(key: Tuple) -> Bars:
+    b = _BARS.get(key)
+    if b is None:
+        symbol, bar_size, start, end, _ = key
+        if len(_BARS) >= 8:
+            _BARS.clear()
+        b = _BARS[key] = Bars.from_columns(bar_cache.series(symbol, bar_size).slice(start, end))
+    return b
+
+
+def _run_one(bars: Bars, strategy_id: str, symbol: str, params: dict, opts: dict, trades: bool = False) -> Dict[str, Any]:
+    spec = build_order(strategy_id, symbol, params)
+    return simulate(spec, bars, trades=trades, **opts)
+
+
+def _run_chunk(key: Tuple, strategy_id: str, symbol: str, combos: List[dict], opts: dict) -> List[Dict[str, Any]]:
+    """Draait in een worker-proces (of inline bij kleine sweeps)."""
+    bars = _load(key)
+    out = []
+    for params in combos:
+        try:
+            res = _run_one(bars, strategy_id, symbol, params, opts)
+        except (ValueError, TypeError) as e:
+            res = {"error": f"{e.__class__.__name__}: {e}"}
+        res["params"] = params
+        out.append(res)
+    return out
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool._max_workers != workers:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run(
+    strategy_id: str, symbol: str, bar_size: str, params: dict,
+    start: Optional[float] = None, end: Optional[float] = None,
+    trades: bool = False, **opts: Any,
+) -> Dict[str, Any]:
+    require_numpy()
+    t0 = time.perf_counter()
+    key = _bars_key(symbol, bar_size, start, end)
+    res = _run_one(_load(key), strategy_id, symbol.upper(), params or {}, opts, trades=trades)
+    res.update({"bars": key[4], "from_ts": key[2], "to_ts": key[3], "elapsed_ms": round((time.perf_counter() - t0) * 1e3, 2)})
+    return res
+
+
+def sweep(
+    strategy_id: str, symbol: str, bar_size: str, grid: Dict[str, List[Any]], params: Optional[dict] = None,
+    start: Optional[float] = None, end: Optional[float] = None,
+    workers: Optional[int] = None, top: Optional[int] = 50, sort_by: str = "pnl", **opts: Any,
+) -> Dict[str, Any]:
+    """
+    Alle combinaties van `grid` (param -> lijst waarden), bovenop vaste `params`.
+    Resultaten gesorteerd op `sort_by` (aflopend); `top` = None geeft alles terug.
+    """
+    require_numpy()
+    t0 = time.perf_counter()
+    key = _bars_key(symbol, bar_size, start, end)
+    names = list(grid)
+    combos = [{**(params or {}), **dict(zip(names, vals))} for vals in itertools.product(*(grid[k] for k in names))]
+    if len(combos) > _MAX_COMBOS:
+        raise ValueError(f"too many combinations: {len(combos)} > {_MAX_COMBOS}")
+    symbol = symbol.upper()
+
+    workers = max(1, workers or (os.cpu_count() or 1))
+    if workers == 1 or len(combos) < _MIN_POOL_COMBOS:
+        results = _run_chunk(key, strategy_id, symbol, combos, opts)
+        used = 1
+    else:
+        # ~4 chunks per worker: goede load balancing zonder veel IPC
+        size = max(1, -(-len(combos) // (workers * 4)))
+        pool = _get_pool(workers)
+        futs = [
+            pool.submit(_run_chunk, key, strategy_id, symbol, combos[i:i + size], opts)
+            for i in range(0, len(combos), size)
+        ]
+        results = [r for f in futs for r in f.result()]
+        used = workers
+
+    ok = [r for r in results if "error" not in r]
+    errors = [r for r in results if "error" in r]
+    ok.sort(key=lambda r: (r.get(sort_by) is not None, r.get(sort_by) or 0), reverse=True)
+    return {
+        "strategy_id": strategy_id,
+        "symbol": symbol,
+        "bar_size": bar_size,
+        "bars": key[4],
+        "combinations": len(combos),
+        "workers": used,
+        "results": ok[:top] if top else ok,
+        "errors": errors[:20],
+        "error_count": len(errors),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1e3, 2),
+    }
@@ -0,0 +1,400 @@
+"""
+Historische bar cache: kolombestanden per symbool/bar-size.
+  data/bars/<SYMBOL>/<barsize>/CURRENT             naam van de actieve generatie
+  data/bars/<SYMBOL>/<barsize>/<gen>/{ts,open,high,low,close,volume}.f8
+  data/bars/<SYMBOL>/<barsize>/covered.f8          opgehaalde ranges (paren start, end)
+- lezen via np.memmap; range-queries zijn searchsorted + slice (views, geen kopie)
+- nieuwe bars achteraan: append; ervoor of ertussen: merge (dedup op ts) naar een nieuwe generatie
+- ontbrekende ranges (ook gaten in het midden) worden in chunks opgehaald op de low-priority IB lane
+- achter de broker-gateway (IBKR_ADAPTER=gateway) haalt en schrijft enkel de gateway (1 schrijver voor
+  alle workers, zelfde data/bars); een worker start de job daar en volgt hem op (ensure_status)
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import shutil
+import threading
+import time
+
+try:
+    import numpy as np  # type: ignore
+except Exception as e:  # pragma: no cover
+    np = None  # type: ignore
+    _IMPORT_ERROR = e
+else:
+    _IMPORT_ERROR = None
+
+from server.modules.order_transmitting.config import current_adapter_name
+
+_BARS_DIR = Path(__file__).resolve().parents[3] / "data" / "bars"
+
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+# series zonder covered.f8 (oud formaat): een gat groter dan dit (langer dan een lang weekend) telt als missing
+_LEGACY_GAP_SEC = 5 * 86400
+_REMOTE_POLL_SEC = 0.5
+
+# bar size -> (seconden per bar, IB duration per chunk, seconden per chunk)
+BAR_SIZES: Dict[str, Tuple[int, str, int]] = {
+    "1 min":   (60, "1 D", 86400),
+    "5 mins":  (300, "1 W", 7 * 86400),
+    "15 mins": (900, "2 W", 14 * 86400),
+    "1 hour":  (3600, "1 M", 30 * 86400),
+    "1 day":   (86400, "1 Y", 365 * 86400),
+}
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError(f"numpy not available: {_IMPORT_ERROR!r}")
+
+
+class _Series:
+    """
+    1 symbool/bar-size. Schrijvers serialiseren op lock; readers gebruiken de memmaps.
+    Kolommen staan in de generatie-map uit CURRENT (zonder CURRENT: in de map zelf, oud formaat).
+    Een rewrite schrijft een nieuwe generatie en publiceert die met 1 os.replace van CURRENT,
+    in dit proces met 1 referentie-swap van _state: readers zien oude of nieuwe kolommen, nooit een mix.
+    """
+
+    def __init__(self, symbol: str, bar_size: str):
+        self.symbol = symbol
+        self.bar_size = bar_size
+        self.dir = _BARS_DIR / symbol / bar_size.replace(" ", "")
+        self.lock = threading.RLock()
+        # (CURRENT inode/mtime, generatie-map, rijen, memmaps)
+        self._state: Tuple[Any, Path, int, Dict[str, Any]] = (None, self.dir, -1, {})
+
+    def _gen_dir(self) -> Tuple[Any, Path]:
+        cur = self.dir / "CURRENT"
+        try:
+            st = os.stat(cur)
+        except OSError:
+            return None, self.dir
+        key = (st.st_ino, st.st_mtime_ns)
+        state = self._state
+        if state[0] == key:
+            return key, state[1]
+        return key, self.dir / cur.read_text().strip()
+
+    def _path(self, col: str, d: Optional[Path] = None) -> Path:
+        return (d or self._gen_dir()[1]) / f"{col}.f8"
+
+    def view(self) -> Dict[str, Any]:
+        """Memmap views van alle kolommen (heropend enkel als het bestand groeide of de generatie wisselde)."""
+        for _ in range(3):
+            key, d = self._gen_dir()
+            try:
+                n = os.path.getsize(self._path("ts", d)) // 8
+            except OSError:
+                n = 0
+            state = self._state
+            if state[0] == key and state[1] == d and state[2] == n:
+                return state[3]
+            try:
+                if n:
+                    maps = {c: np.memmap(self._path(c, d), dtype="<f8", mode="r", shape=(n,)) for c in COLUMNS}
+                else:
+                    maps = {c: np.empty(0, "<f8") for c in COLUMNS}
+            except (OSError, ValueError):
+                continue     # generatie net vervangen en opgeruimd: opnieuw CURRENT lezen
+            self._state = (key, d, n, maps)
+            return maps
+        raise RuntimeError(f"bar cache {self.symbol} {self.bar_size}: kon geen consistente generatie openen")
+
+    def bounds(self) -> Optional[Tuple[float, float]]:
+        v = self.view()
+        if not len(v["ts"]):
+            return None
+        return float(v["ts"][0]), float(v["ts"][-1])
+
+    def append(self, cols: Dict[str, Any]) -> int:
+        """
+        Merge bars in de serie; enkel ts die nog niet aanwezig zijn worden toegevoegd (dedup op ts).
+        Alles na de laatste ts: append (ts als laatste geschreven, readers zien nooit meer rijen dan er
+        volledig zijn). Bars vóór of tussen bestaande bars: merge + rewrite naar een nieuwe generatie.
+        """
+        ts = np.asarray(cols["ts"], dtype="<f8")
+        if not len(ts):
+            return 0
+        ts, first_idx = np.unique(ts, return_index=True)     # gesorteerd, dubbels eruit
+        new = {c: np.asarray(cols[c], dtype="<f8")[first_idx] for c in COLUMNS}
+        new["ts"] = ts
+        with self.lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            cur = self.view()
+            cur_ts = cur["ts"]
+            n = len(cur_ts)
+            if n == 0:
+                return self._write(new)
+            pos = np.searchsorted(cur_ts, ts)
+            present = (pos < n) & (np.asarray(cur_ts)[np.minimum(pos, n - 1)] == ts)
+            if present.all():
+                return 0
+            keep = ~present
+            if ts[keep][0] > cur_ts[-1]:
+                return self._write({c: new[c][keep] for c in COLUMNS})
+            merged = {c: np.concatenate([np.asarray(cur[c]), new[c][keep]]) for c in COLUMNS}
+            order = np.argsort(merged["ts"], kind="stable")
+            self._rewrite({c: merged[c][order] for c in COLUMNS})
+            return int(keep.sum())
+
+    def _write(self, cols: Dict[str, Any]) -> int:
+        d = self._gen_dir()[1]
+        self._align(d)
+        try:
+            for c in COLUMNS[1:] + ("ts",):
+                with open(self._path(c, d), "ab") as f:
+                    f.write(np.ascontiguousarray(cols[c], dtype="<f8").tobytes())
+        except BaseException:
+            self._align(d)      # half gelukte append (disk vol e.d.) meteen terugdraaien
+            raise
+        return len(cols["ts"])
+
+    def _align(self, d: Path) -> None:
+        """Alle kolommen op de lengte van de kortste (normaal ts, die als laatste geschreven wordt)."""
+        sizes = {}
+        for c in COLUMNS:
+            try:
+                sizes[c] = os.path.getsize(self._path(c, d))
+            except OSError:
+                sizes[c] = 0
+        n = min(sizes.values()) // 8 * 8
+        for c, size in sizes.items():
+            if size != n:
+                os.truncate(self._path(c, d), n)
+
+    def _rewrite(self, cols: Dict[str, Any]) -> None:
+        """Volledige kolomset naar een nieuwe generatie-map, daarna 1 atomische swap van CURRENT."""
+        name = f"g{time.time_ns():x}"
+        d = self.dir / name
+        d.mkdir()
+        for c in COLUMNS:
+            with open(d / f"{c}.f8", "wb") as f:
+                f.write(np.ascontiguousarray(cols[c], dtype="<f8").tobytes())
+        tmp = self.dir / "CURRENT.tmp"
+        tmp.write_text(name)
+        os.replace(tmp, self.dir / "CURRENT")
+        self._state = (None, self.dir, -1, {})    # 1 referentie: volgende view() opent de nieuwe generatie
+        self._gc(name)
+
+    def _gc(self, keep: str) -> None:
+        """Oude generaties (en kolommen van het oude formaat) opruimen; nog gemapt (Windows) = later opnieuw."""
+        for p in self.dir.iterdir():
+            if p.name == keep:
+                continue
+            if p.is_dir() and p.name.startswith("g"):
+                shutil.rmtree(p, ignore_errors=True)
+            elif p.suffix == ".f8":
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    # ---- opgehaalde ranges (ook lege: markt dicht), zodat gaten in het midden zichtbaar blijven ----
+
+    def covered(self) -> List[Tuple[float, float]]:
+        try:
+            raw = np.fromfile(self.dir / "covered.f8", dtype="<f8")
+        except OSError:
+            return self._legacy_covered()
+        return [(float(a), float(b)) for a, b in raw.reshape(-1, 2)]
+
+    def _legacy_covered(self) -> List[Tuple[float, float]]:
+        """Serie zonder covered.f8: aaneengesloten stukken tussen gaten > _LEGACY_GAP_SEC."""
+        ts = np.asarray(self.view()["ts"])
+        if not len(ts):
+            return []
+        cut = np.flatnonzero(np.diff(ts) > _LEGACY_GAP_SEC)
+        starts = np.concatenate([ts[:1], ts[cut + 1]])
+        ends = np.concatenate([ts[cut], ts[-1:]])
+        return [(float(a), float(b)) for a, b in zip(starts, ends)]
+
+    def mark_covered(self, start: float, end: float) -> None:
+        """Onder lock. Voegt [start, end] toe en merget overlappende/aansluitende ranges."""
+        step = BAR_SIZES[self.bar_size][0]
+        spans = sorted(self.covered() + [(start, end)])
+        merged: List[List[float]] = []
+        for a, b in spans:
+            if merged and a <= merged[-1][1] + step:
+                merged[-1][1] = max(merged[-1][1], b)
+            else:
+                merged.append([a, b])
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / "covered.tmp"
+        np.asarray(merged, dtype="<f8").tofile(tmp)
+        os.replace(tmp, self.dir / "covered.f8")
+
+    def slice(self, start: Optional[float], end: Optional[float]) -> Dict[str, Any]:
+        """Zero-copy: views op de memmaps voor [start, end]."""
+        v = self.view()
+        ts = v["ts"]
+        i0 = int(np.searchsorted(ts, start, "left")) if start is not None else 0
+        i1 = int(np.searchsorted(ts, end, "right")) if end is not None else len(ts)
+        return {c: v[c][i0:i1] for c in COLUMNS}
+
+
+_series: Dict[Tuple[str, str], _Series] = {}
+_series_lock = threading.Lock()
+
+
+def series(symbol: str, bar_size: str) -> _Series:
+    _require_numpy()
+    if bar_size not in BAR_SIZES:
+        raise ValueError(f"unsupported bar_size: {bar_size} (supported: {', '.join(BAR_SIZES)})")
+    key = (symbol.upper(), bar_size)
+    s = _series.get(key)
+    if s is None:
+        with _series_lock:
+            s = _series.get(key)
+            if s is None:
+                s = _series[key] = _Series(*key)
+    return s
+
+
+def missing_ranges(symbol: str, bar_size: str, start: float, end: float) -> List[Tuple[float, float]]:
+    """[start, end] min de opgehaalde/geïmporteerde ranges: ook gaten tussen bestaande bars."""
+    step = BAR_SIZES[bar_size][0]
+    out = []
+    pos = start
+    for a, b in series(symbol, bar_size).covered():
+        if b < pos:
+            continue
+        if a > end:
+            break
+        if a > pos:
+            out.append((pos, min(a - step, end)))
+        pos = max(pos, b + step)
+        if pos > end:
+            break
+    if pos <= end:
+        out.append((pos, end))
+    return [(a, b) for a, b in out if b >= a]
+
+
+# ---- achtergrond-fetch (1 job per serie tegelijk) ----
+
+_jobs: Dict[Tuple[str, str], threading.Thread] = {}
+_errors: Dict[Tuple[str, str], str] = {}
+_jobs_lock = threading.Lock()
+
+
+def _fetch_range(symbol: str, bar_size: str, start: float, end: float) -> int:
+    from server.modules.order_transmitting.adapters.ibkr.adapter import fetch_historical_bars
+    _, duration, chunk = BAR_SIZES[bar_size]
+    s = series(symbol, bar_size)
+    added = 0
+    chunk_end = start + chunk
+    while True:
+        hi = min(chunk_end, end)
+        rows = fetch_historical_bars(symbol, bar_size, hi, duration)
+        with s.lock:
+            if rows:
+                arr = np.asarray(rows, dtype="<f8")
+                arr = arr[(arr[:, 0] >= start) & (arr[:, 0] <= end)]
+                added += s.append({c: arr[:, i] for i, c in enumerate(COLUMNS)})
+            # ook een lege chunk is opgehaald (markt dicht); een mislukte chunk blijft missing
+            s.mark_covered(max(start, chunk_end - chunk), hi)
+        if chunk_end >= end:
+            return added
+        chunk_end += chunk
+
+
+def _job(symbol: str, bar_size: str, ranges: List[Tuple[float, float]]) -> None:
+    key = (symbol, bar_size)
+    try:
+        for a, b in ranges:
+            _fetch_range(symbol, bar_size, a, b)
+        _errors.pop(key, None)
+    except Exception as e:
+        _errors[key] = f"{e.__class__.__name__}: {e}"
+    finally:
+        with _jobs_lock:
+            _jobs.pop(key, None)
+
+
+def _remote_job(symbol: str, bar_size: str, start: float, end: float) -> None:
+    """HTTP-worker: job in de gateway starten en volgen; de bars verschijnen via de gedeelde bestanden."""
+    from server.modules.order_transmitting.adapters.gateway.adapter import ensure_bars
+    key = (symbol, bar_size)
+    try:
+        st = ensure_bars(symbol, bar_size, start, end, True)
+        while st["fetching"]:
+            time.sleep(_REMOTE_POLL_SEC)
+            st = ensure_bars(symbol, bar_size, start, end, False)
+        if st["error"]:
+            _errors[key] = st["error"]
+        else:
+            _errors.pop(key, None)
+    except Exception as e:
+        _errors[key] = f"{e.__class__.__name__}: {e}"
+    finally:
+        with _jobs_lock:
+            _jobs.pop(key, None)
+
+
+def ensure_range(symbol: str, bar_size: str, start: float, end: float) -> Optional[threading.Thread]:
+    """Start (of hergebruik) een fetch-job voor wat ontbreekt. None als alles er al is of er geen feed is."""
+    symbol = symbol.upper()
+    adapter = current_adapter_name()
+    if adapter not in ("ibkr", "gateway"):
+        return None
+    todo = missing_ranges(symbol, bar_size, start, end)
+    if not todo:
+        return None
+    key = (symbol, bar_size)
+    with _jobs_lock:
+        t = _jobs.get(key)
+        if t is None:
+            if adapter == "gateway":
+                target, args = _remote_job, (symbol, bar_size, start, end)
+            else:
+                target, args = _job, (symbol, bar_size, todo)
+            t = threading.Thread(target=target, args=args, daemon=True, name=f"bars-{symbol}")
+            _jobs[key] = t
+            t.start()
+    return t
+
+
+def ensure_status(symbol: str, bar_size: str, start: float, end: float, start_job: bool = True) -> Dict[str, Any]:
+    """Gateway-kant van _remote_job: job starten (start_job) of enkel de status van de lopende job."""
+    symbol = symbol.upper()
+    key = (symbol, bar_size)
+    t = ensure_range(symbol, bar_size, start, end) if start_job else _jobs.get(key)
+    return {"fetching": t is not None and t.is_alive(), "error": _errors.get(key)}
+
+
+def get_bars(
+    symbol: str, bar_size: str, start: Optional[float] = None, end: Optional[float] = None,
+    fetch: bool = True, wait: float = 0.0,
+) -> Dict[str, Any]:
+    """Slice uit de cache + info over ontbrekende ranges / lopende fetch."""
+    symbol = symbol.upper()
+    s = series(symbol, bar_size)
+    end = end if end is not None else time.time()
+    job = None
+    if fetch and start is not None:
+        job = ensure_range(symbol, bar_size, start, end)
+        if job is not None and wait > 0:
+            job.join(wait)
+    cols = s.slice(start, end)
+    return {
+        "symbol": symbol,
+        "bar_size": bar_size,
+        "bars": cols,
+        "missing": missing_ranges(symbol, bar_size, start, end) if start is not None else [],
+        "fetching": job is not None and job.is_alive(),
+        "error": _errors.get((symbol, bar_size)),
+    }
+
+
+def import_bars(symbol: str, bar_size: str, cols: Dict[str, List[float]]) -> int:
+    """Bars van buitenaf toevoegen (bv. CSV-import of sim/backtest zonder IB); hun range telt als opgehaald."""
+    s = series(symbol, bar_size)
+    ts = cols.get("ts")
+    with s.lock:
+        added = s.append(cols)
+        if ts is not None and len(ts):
+            s.mark_covered(float(min(ts)), float(max(ts)))
+    return added
@@ -0,0 +1,269 @@
+"""
+Market data: gedeelde quote cache + reference-counted subscriptions.
+- 1 slot per symbool; kolommen zijn array('d') (geen dict per tick)
+- schrijver (IB-thread via pendingTickersEvent, of de sim) houdt een seqlock per slot bij;
+  HTTP-readers lezen lock-free en proberen opnieuw als ze een half geschreven slot zagen
+- subscribe/unsubscribe tellen referenties; enkel 0->1 en 1->0 gaan naar de broker, buiten de lock
+  (een trage IB-subscribe blokkeert enkel callers voor hetzelfde symbool)
+- tick-listeners (strategy_graph.triggers): fn(symbol, slot, vals) na elke update, op de schrijver-thread
+"""
+
+from __future__ import annotations
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import math
+import threading
+import time
+
+from server.modules.order_transmitting.config import current_adapter_name
+
+FIELDS = ("bid", "ask", "last", "bid_size", "ask_size", "last_size", "volume", "ts")
+
+
+class QuoteCache:
+    def __init__(self):
+        self._slot: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._cols: Dict[str, array] = {f: array("d") for f in FIELDS}
+        self._seq = array("Q")        # seqlock per slot: oneven = schrijven bezig
+        self._changed = array("Q")    # globale versie van de laatste update per slot
+        self._version = 0
+        self._wlock = threading.Lock()
+        self._listeners: Tuple[Callable[[str, int, Dict[str, Optional[float]]], None], ...] = ()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _alloc(self, symbol: str) -> int:
+        i = len(self._symbols)
+        for col in self._cols.values():
+            col.append(math.nan)
+        self._seq.append(0)
+        self._changed.append(0)
+        self._symbols.append(symbol)
+        self._slot[symbol] = i       # als laatste: readers zien de slot pas als hij volledig bestaat
+        return i
+
+    def ensure(self, symbol: str) -> int:
+        i = self._slot.get(symbol)
+        if i is None:
+            with self._wlock:
+                i = self._slot.get(symbol)
+                if i is None:
+                    i = self._alloc(symbol)
+        return i
+
+    def update(self, symbol: str, ts: Optional[float] = None, **vals: Optional[float]) -> None:
+        """Schrijf enkel de meegegeven (niet-None) velden."""
+        with self._wlock:
+            i = self._slot.get(symbol)
+            if i is None:
+                i = self._alloc(symbol)
+            cols, seq = self._cols, self._seq
+            seq[i] += 1
+            for k, v in vals.items():
+                if v is not None:
+                    cols[k][i] = v
+            cols["ts"][i] = ts if ts is not None else time.time()
+            self._version += 1
+            self._changed[i] = self._version
+            seq[i] += 1
+            # onder _wlock: listeners lezen de kolommen consistent (kort houden, zoals records-listeners)
+            for fn in self._listeners:
+                try:
+                    fn(symbol, i, vals)
+                except Exception:
+                    pass
+
+    def add_listener(self, fn: Callable[[str, int, Dict[str, Optional[float]]], None]) -> None:
+        with self._wlock:
+            if fn not in self._listeners:
+                self._listeners = self._listeners + (fn,)
+
+    def remove_listener(self, fn: Callable[[str, int, Dict[str, Optional[float]]], None]) -> None:
+        with self._wlock:
+            self._listeners = tuple(f for f in self._listeners if f != fn)
+
+    def value(self, i: int, field: str) -> Optional[float]:
+        """1 veld van slot i (listeners: onder _wlock, dus zonder seqlock)."""
+        v = self._cols[field][i]
+        return None if v != v else v
+
+    def _read_slot(self, i: int) -> Tuple[float, ...]:
+        seq, cols = self._seq, self._cols
+        while True:
+            s1 = seq[i]
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            vals = tuple(cols[f][i] for f in FIELDS)
+            if seq[i] == s1:
+                return vals
+
+    def _as_dict(self, i: int) -> Dict[str, Any]:
+        vals = self._read_slot(i)
+        out: Dict[str, Any] = {"symbol": self._symbols[i]}
+        for f, v in zip(FIELDS, vals):
+            out[f] = None if v != v else v
+        return out
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        i = self._slot.get(symbol)
+        return None if i is None else self._as_dict(i)
+
+    def snapshot(self, symbols: Optional[List[str]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        names = symbols if symbols is not None else list(self._symbols)
+        return {s: self.get(s) for s in names}
+
+    def changes_since(self, version: int, symbols: Optional[List[str]] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """Delta's voor SSE: slots met een update na `version`. Return (nieuwe versie, quotes)."""
+        now = self._version
+        if now == version:
+            return now, []
+        changed = self._changed
+        if symbols is None:
+            idx = [i for i in range(len(self._symbols)) if changed[i] > version]
+        else:
+            idx = [i for i in (self._slot.get(s) for s in symbols) if i is not None and changed[i] > version]
+        return now, [self._as_dict(i) for i in idx]
+
+
+QUOTES = QuoteCache()
+
+
+def reference_price(symbol: Optional[str]) -> Optional[float]:
+    """Mid als bid/ask geldig zijn, anders last; None als er niets in de cache zit."""
+    if not symbol:
+        return None
+    q = QUOTES.get(symbol)
+    if not q:
+        return None
+    bid, ask = q.get("bid"), q.get("ask")
+    if bid and ask and bid > 0 and ask > 0:
+        return (bid + ask) / 2.0
+    last = q.get("last")
+    return last if last and last > 0 else None
+
+
+# ---- subscriptions ----
+
+_refs: Dict[str, int] = {}
+_busy: Dict[str, threading.Event] = {}    # symbool -> broker-call (0->1 of 1->0) loopt, buiten _sub_lock
+_sub_lock = threading.Lock()
+
+
+def _feed() -> Optional[Tuple[Callable[[str], None], Callable[[str], None]]]:
+    """(subscribe, unsubscribe) van de feed van de actieve adapter (IBKR, de sim-engine of de broker-gateway)."""
+    name = current_adapter_name()
+    if name == "ibkr":
+        from server.modules.order_transmitting.adapters.ibkr.adapter import (
+            subscribe_market_data, unsubscribe_market_data,
+        )
+    elif name == "sim":
+        from server.modules.order_transmitting.adapters.sim.adapter import (
+            subscribe_market_data, unsubscribe_market_data,
+        )
+    elif name == "gateway":
+        from server.modules.order_transmitting.adapters.gateway.adapter import (
+            subscribe_market_data, unsubscribe_market_data,
+        )
+    else:
+        return None
+    return subscribe_market_data, unsubscribe_market_data
+
+
+def _subscribe_one(sym: str, feed) -> Tuple[int, Optional[str]]:
+    """+1 ref; de broker-call (enkel 0->1) gebeurt buiten _sub_lock, andere symbolen wachten er niet op."""
+    while True:
+        with _sub_lock:
+            ev = _busy.get(sym)
+            if ev is None:
+                n = _refs.get(sym, 0)
+                if n > 0 or feed is None:
+                    QUOTES.ensure(sym)
+                    _refs[sym] = n + 1
+                    return n + 1, None
+                ev = _busy[sym] = threading.Event()
+                break
+        ev.wait()      # 0->1 of 1->0 van een andere caller voor dit symbool: daarna opnieuw
+    err = None
+    try:
+        feed[0](sym)
+    except Exception as e:
+        err = str(e)
+    with _sub_lock:
+        del _busy[sym]
+        if err is None:
+            QUOTES.ensure(sym)
+            _refs[sym] = 1
+    ev.set()
+    return (0, err) if err is not None else (1, None)
+
+
+def _unsubscribe_one(sym: str, feed) -> Optional[int]:
+    while True:
+        with _sub_lock:
+            ev = _busy.get(sym)
+            if ev is None:
+                n = _refs.get(sym, 0)
+                if n <= 0:
+                    return None
+                if n > 1 or feed is None:
+                    if n > 1:
+                        _refs[sym] = n - 1
+                    else:
+                        _refs.pop(sym, None)
+                    return n - 1
+                _refs.pop(sym, None)
+                ev = _busy[sym] = threading.Event()
+                break
+        ev.wait()
+    try:
+        feed[1](sym)
+    except Exception:
+        pass
+    with _sub_lock:
+        del _busy[sym]
+    ev.set()
+    return 0
+
+
+def subscribe(symbols: List[str]) -> Dict[str, Any]:
+    feed = _feed()
+    out: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for sym in symbols:
+        n, err = _subscribe_one(sym, feed)
+        if err is not None:
+            errors[sym] = err
+        else:
+            out[sym] = n
+    return {"refs": out, "errors": errors}
+
+
+def unsubscribe(symbols: List[str]) -> Dict[str, Any]:
+    feed = _feed()
+    out: Dict[str, int] = {}
+    for sym in symbols:
+        n = _unsubscribe_one(sym, feed)
+        if n is not None:
+            out[sym] = n
+    return {"refs": out}
+
+
+def subscriptions() -> Dict[str, int]:
+    return dict(_refs)
+
+
+# ---- ib_insync ticker handler (IB-thread) ----
+
+def on_ib_tickers(tickers) -> None:
+    """pendingTickersEvent: 1 call per loop-iteratie met alle gewijzigde tickers."""
+    for t in tickers:
+        ts = t.time.timestamp() if getattr(t, "time", None) else None
+        QUOTES.update(
+            t.contract.symbol, ts=ts,
+            bid=t.bid, ask=t.ask, last=t.last,
+            bid_size=t.bidSize, ask_size=t.askSize, last_size=t.lastSize, volume=t.volume,
+        )
@@ -0,0 +1,149 @@
+"""
+Positie/exposure cache, zonder IB round trip leesbaar.
+- IB: positionEvent / updatePortfolioEvent (broker is autoritatief voor die accounts)
+- fill flow (ledger): houdt posities bij voor accounts zonder broker-feed (sim)
+Elke entry is een immutable dict die per update in 1 assign vervangen wordt,
+zodat HTTP-readers zonder lock een consistente snapshot zien.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+
+_LOCAL_ACCOUNT = "local"
+
+# (account, symbol) -> positie-dict
+_POS: Dict[Tuple[str, str], Dict[str, Any]] = {}
+# symbol -> netto positie over alle accounts (incrementeel bijgehouden: O(1) lookup voor risk)
+_NET: Dict[str, float] = {}
+# accounts waarvoor IB posities levert (fills wijzigen daar de hoeveelheid niet)
+_BROKER_ACCOUNTS: set[str] = set()
+_lock = threading.Lock()
+
+
+def _put(account: str, symbol: str, **fields: Any) -> None:
+    key = (account, symbol)
+    prev = _POS.get(key) or {
+        "account": account, "symbol": symbol, "position": 0.0, "avg_cost": None,
+        "market_price": None, "market_value": None, "unrealized_pnl": None, "realized_pnl": None,
+    }
+    new = {**prev, **fields, "updated": time.time()}
+    d = float(new.get("position") or 0.0) - float(prev.get("position") or 0.0)
+    if d:
+        _NET[symbol] = _NET.get(symbol, 0.0) + d
+    _POS[key] = new
+
+
+def set_position(account: str, symbol: str, position: float, avg_cost: Optional[float], source: str = "ibkr") -> None:
+    with _lock:
+        if source == "ibkr":
+            _BROKER_ACCOUNTS.add(account)
+        _put(account, symbol, position=float(position), avg_cost=avg_cost, source=source)
+
+
+def set_portfolio(
+    account: str, symbol: str, position: float, market_price: float, market_value: float,
+    avg_cost: float, unrealized_pnl: Optional[float], realized_pnl: Optional[float],
+) -> None:
+    with _lock:
+        _BROKER_ACCOUNTS.add(account)
+        _put(
+            account, symbol, position=float(position), market_price=market_price, market_value=market_value,
+            avg_cost=avg_cost, unrealized_pnl=unrealized_pnl, realized_pnl=realized_pnl, source="ibkr",
+        )
+
+
+def apply_fill(symbol: str, side: str, size: float, price: float, account: Optional[str] = None) -> None:
+    """Fill flow: signed qty + gemiddelde kost bijwerken (enkel voor niet-broker accounts)."""
+    acct = account or _LOCAL_ACCOUNT
+    with _lock:
+        if acct in _BROKER_ACCOUNTS:
+            prev = _POS.get((acct, symbol))
+            if prev is not None:
+                _put(acct, symbol, last_fill_price=float(price))
+            return
+        prev = _POS.get((acct, symbol)) or {}
+        pos = float(prev.get("position") or 0.0)
+        avg = prev.get("avg_cost")
+        realized = float(prev.get("realized_pnl") or 0.0)
+        d = float(size) if (side or "").upper() in ("BUY", "BOT") else -float(size)
+        new = pos + d
+        if pos == 0 or (pos > 0) == (d > 0):
+            # openen / bijkopen: gewogen gemiddelde
+            avg = ((avg or 0.0) * abs(pos) + float(price) * abs(d)) / abs(new) if new else None
+        else:
+            # (gedeeltelijk) sluiten: realized op het gesloten deel
+            closed = min(abs(d), abs(pos))
+            realized += closed * (float(price) - (avg or 0.0)) * (1 if pos > 0 else -1)
+            if new == 0:
+                avg = None
+            elif (new > 0) != (pos > 0):
+                avg = float(price)   # door nul heen: rest opent tegen fillprijs
+        _put(
+            acct, symbol, position=new, avg_cost=avg, realized_pnl=realized,
+            market_price=float(price), market_value=new * float(price), last_fill_price=float(price), source="fills",
+        )
+
+
+def apply_snapshot(entry: Dict[str, Any]) -> None:
+    """Positie-entry uit de broker-gateway overnemen (HTTP-worker: de gateway is autoritatief)."""
+    fields = {k: v for k, v in entry.items() if k not in ("account", "symbol", "updated")}
+    with _lock:
+        _put(entry["account"], entry["symbol"], **fields)
+
+
+def get_position(symbol: str, account: Optional[str] = None) -> float:
+    """Netto positie voor symbool (optioneel 1 account), 0 als onbekend."""
+    if account is None:
+        return _NET.get(symbol, 0.0)
+    total = 0.0
+    for (acct, sym), p in list(_POS.items()):
+        if sym == symbol and (account is None or acct == account):
+            total += float(p.get("position") or 0.0)
+    return total
+
+
+def list_positions(symbol: Optional[str] = None, include_flat: bool = False) -> List[Dict[str, Any]]:
+    out = []
+    for p in list(_POS.values()):
+        if symbol and p["symbol"] != symbol:
+            continue
+        if not include_flat and not p.get("position"):
+            continue
+        out.append(p)
+    return out
+
+
+def exposure() -> Dict[str, Any]:
+    per_symbol: Dict[str, Dict[str, float]] = {}
+    for p in list(_POS.values()):
+        qty = float(p.get("position") or 0.0)
+        if not qty:
+            continue
+        px = p.get("market_price") or p.get("avg_cost") or 0.0
+        mv = p.get("market_value")
+        if mv is None:
+            mv = qty * float(px)
+        e = per_symbol.setdefault(p["symbol"], {"position": 0.0, "net": 0.0, "gross": 0.0})
+        e["position"] += qty
+        e["net"] += float(mv)
+        e["gross"] += abs(float(mv))
+    return {
+        "symbols": per_symbol,
+        "net": sum(e["net"] for e in per_symbol.values()),
+        "gross": sum(e["gross"] for e in per_symbol.values()),
+    }
+
+
+# ---- ib_insync event handlers (draaien op de IB-thread) ----
+
+def on_ib_position(pos) -> None:
+    set_position(pos.account, pos.contract.symbol, pos.position, pos.avgCost)
+
+
+def on_ib_portfolio(item) -> None:
+    set_portfolio(
+        item.account, item.contract.symbol, item.position, item.marketPrice, item.marketValue,
+        item.averageCost, item.unrealizedPNL, item.realizedPNL,
+    )
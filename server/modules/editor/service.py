@@ -1,7 +1,7 @@
 import re
 import os
-import importlib
-from textwrap import indent
+
+from server.modules.strategy_types import registry
 
 STRATEGIES_DIR = os.path.join(
     os.path.dirname(__file__), "..", "strategy_types", "strategies"
@@ -10,21 +10,14 @@ STRATEGIES_DIR = os.path.join(
 VALID_TYPE = {"int": "int", "float": "float", "str": "str"}
 
 def _safe_id(s: str) -> bool:
-    return re.fullmatch(r"[a-z0-9_]+", s) is not None
+    # geen leading "_": zulke bestanden slaat de registry over
+    return re.fullmatch(r"[a-z0-9][a-z0-9_]*", s) is not None
 
 def _strategy_file_path(strategy_id: str) -> str:
     return os.path.abspath(os.path.join(STRATEGIES_DIR, f"{strategy_id}.py"))
 
-def create_strategy_file(strategy_id: str, name: str, fields: list[dict]) -> dict:
-    """
-    fields: list of {"name": str, "type": "int|float|str", "gt": number|None, "description": str|None}
-    """
-    if not _safe_id(strategy_id):
-        return {"ok": False, "error": "strategy_id alleen lowercase, cijfers en _"}
-    path = _strategy_file_path(strategy_id)
-    if os.path.exists(path):
-        return {"ok": False, "error": f"bestaat al: {path}"}
-
+def _render(strategy_id: str, name: str, fields: list[dict]) -> tuple[str | None, str | None]:
+    """(broncode, None) of (None, fout)."""
     # build Pydantic Params model
     lines = ["from pydantic import BaseModel, Field",
              "from ..base import BaseStrategy",
@@ -37,13 +30,13 @@ def create_strategy_file(strategy_id: str, name: str, fields: list[dict]) -> dic
         for f in fields:
             fname = f.get("name")
             ftype = VALID_TYPE.get(str(f.get("type", "")))
-            if not fname or not ftype:
-                return {"ok": False, "error": f"ongeldig veld: {f}"}
+            if not fname or not ftype or not fname.isidentifier():
+                return None, f"ongeldig veld: {f}"
             extras = []
             if ftype in ("int", "float") and f.get("gt") is not None:
                 extras.append(f"gt={float(f['gt'])}")
             if f.get("description"):
-                extras.append(f'description="{str(f["description"]).replace(chr(34), r"\\\"")}"')
+                extras.append(f"description={str(f['description'])!r}")
             extra = ", ".join(extras)
             if extra:
                 line = f"    {fname}: {ftype} = Field({extra})"
@@ -52,25 +45,74 @@ def create_strategy_file(strategy_id: str, name: str, fields: list[dict]) -> dic
             lines.append(line)
 
     # Strategy class
+    cls_name = strategy_id.title().replace("_", "")
     cls = f"""
-class {strategy_id.title().replace('_','')} (BaseStrategy):
+class {cls_name}(BaseStrategy):
     id = "{strategy_id}"
-    name = "{name}"
+    name = {name!r}
     Params = Params
 
-register({strategy_id.title().replace('_','')})
+register({cls_name})
 """.lstrip("\n")
 
-    content = "\n".join(lines) + "\n\n" + cls
+    return "\n".join(lines) + "\n\n" + cls, None
 
-    # ensure folder exists
-    os.makedirs(STRATEGIES_DIR, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+def _write(path: str, content: str) -> None:
+    # atomisch vervangen: de registry leest nooit een half geschreven bestand
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         f.write(content)
+    os.replace(tmp, path)
 
-    # hot-load the new module so it appears immediately
-    importlib.invalidate_caches()
-    mod_name = f"server.modules.strategy_types.strategies.{strategy_id}"
-    importlib.import_module(mod_name)
+def _write_and_load(strategy_id: str, content: str, previous: str | None) -> dict:
+    """Schrijf + laad; bij een laadfout het vorige bestand terugzetten (de vorige versie blijft actief)."""
+    path = _strategy_file_path(strategy_id)
+    os.makedirs(STRATEGIES_DIR, exist_ok=True)
+    _write(path, content)
+    try:
+        res = registry.load(strategy_id)
+    except Exception as e:
+        if previous is None:
+            os.remove(path)
+        else:
+            _write(path, previous)
+        return {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+    return {"ok": True, "path": path, **res}
 
-    return {"ok": True, "path": path, "module": mod_name}
+def create_strategy_file(strategy_id: str, name: str, fields: list[dict]) -> dict:
+    """
+    fields: list of {"name": str, "type": "int|float|str", "gt": number|None, "description": str|None}
+    """
+    if not _safe_id(strategy_id):
+        return {"ok": False, "error": "strategy_id alleen lowercase, cijfers en _"}
+    path = _strategy_file_path(strategy_id)
+    if os.path.exists(path):
+        return {"ok": False, "error": f"bestaat al: {path}"}
+    content, err = _render(strategy_id, name, fields)
+    if err:
+        return {"ok": False, "error": err}
+    return _write_and_load(strategy_id, content, None)
+
+def update_strategy_file(strategy_id: str, name: str, fields: list[dict]) -> dict:
+    """Herschrijf + herlaad; lopende orders werken af met de vorige versie."""
+    if not _safe_id(strategy_id):
+        return {"ok": False, "error": "strategy_id alleen lowercase, cijfers en _"}
+    path = _strategy_file_path(strategy_id)
+    if not os.path.exists(path):
+        return {"ok": False, "error": f"bestaat niet: {strategy_id}"}
+    content, err = _render(strategy_id, name, fields)
+    if err:
+        return {"ok": False, "error": err}
+    with open(path, encoding="utf-8") as f:
+        previous = f.read()
+    return _write_and_load(strategy_id, content, previous)
+
+def delete_strategy_file(strategy_id: str) -> dict:
+    if not _safe_id(strategy_id):
+        return {"ok": False, "error": "strategy_id alleen lowercase, cijfers en _"}
+    path = _strategy_file_path(strategy_id)
+    if not os.path.exists(path):
+        return {"ok": False, "error": f"bestaat niet: {strategy_id}"}
+    os.remove(path)
+    registry.unload(strategy_id)
+    return {"ok": True, "path": path}
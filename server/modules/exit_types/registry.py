@@ -1,16 +1,20 @@
 # --- snippet: voeg/controleer deze helpers ---
+from server.modules.results import journal
+
 _REGISTRY: dict[str, dict] = {}     # oca_group -> record {symbol, legs:[...], active: bool}
 _ACTIVE:   dict[str, bool] = {}     # oca_group -> bool
 
 def upsert_record(oca_group: str, record: dict) -> None:
     _REGISTRY[oca_group] = dict(record)
     _ACTIVE[oca_group]   = bool(record.get("active", True))
+    journal.oca(oca_group, _REGISTRY[oca_group])
 
 def mark_inactive(oca_group: str) -> None:
     if oca_group in _ACTIVE:
         _ACTIVE[oca_group] = False
     if oca_group in _REGISTRY:
         _REGISTRY[oca_group]["active"] = False
+        journal.oca(oca_group, _REGISTRY[oca_group])
 
 def list_active_ocas() -> dict[str, bool]:
     return {k: v for k, v in _ACTIVE.items() if v}
@@ -18,3 +22,15 @@ def list_active_ocas() -> dict[str, bool]:
 def get_record(oca_group: str) -> dict | None:
     # Geef snapshot terug, ook als inactive.
     return _REGISTRY.get(oca_group)
+
+def dump() -> dict[str, dict]:
+    """Kopie voor de journal-snapshot."""
+    return {k: dict(v) for k, v in _REGISTRY.items()}
+
+def restore(records: dict[str, dict | None]) -> None:
+    """Replay uit het journal (zonder opnieuw te journalen)."""
+    for oca_group, record in records.items():
+        if record is None:
+            continue
+        _REGISTRY[oca_group] = dict(record)
+        _ACTIVE[oca_group]   = bool(record.get("active", True))
@@ -1,12 +1,44 @@
 from fastapi import HTTPException
 from server.modules.data.store import RESULTS
 from server.modules.exit_types import registry
+from server.modules.order_transmitting.config import load_adapter
+
+_DONE = ("filled", "cancelled", "apicancelled", "inactive", "error", "rejected")
 
 def _status_from_results(internal_id: str) -> str | None:
     d = RESULTS.get(internal_id) or {}
     s = (d.get("status") or "").strip()
     return s or None
 
+def _refreshed_legs(rec: dict) -> tuple[list, bool]:
+    legs, changed = [], False
+    for leg in rec.get("legs", []):
+        st = _status_from_results(leg.get("internal_id", ""))
+        new_leg = dict(leg)
+        if st and st != leg.get("status"):
+            new_leg["status"] = st
+            changed = True
+        legs.append(new_leg)
+    return legs, changed
+
+def sync_active() -> list[str]:
+    """
+    Na een reconciliatie-pass: leg-statussen van actieve OCA-groepen bijwerken uit RESULTS,
+    groepen waarvan alle legs af zijn -> inactive. Return de gesloten groepen.
+    """
+    closed = []
+    for oca_group in list(registry.list_active_ocas()):
+        rec = registry.get_record(oca_group)
+        if not rec:
+            continue
+        legs, changed = _refreshed_legs(rec)
+        done = bool(legs) and all((leg.get("status") or "").lower() in _DONE for leg in legs)
+        if changed or done:
+            registry.upsert_record(oca_group, {**rec, "legs": legs, "active": not done})
+        if done:
+            closed.append(oca_group)
+    return closed
+
 def get_oca_detail(oca_group: str, refresh: bool = False) -> dict:
     rec = registry.get_record(oca_group)
     if not rec:
@@ -20,14 +52,17 @@ def get_oca_detail(oca_group: str, refresh: bool = False) -> dict:
             "legs": rec.get("legs", []),
         }
 
-    # refresh: vul statussen vanuit RESULTS
-    legs = []
-    for leg in rec.get("legs", []):
-        st = _status_from_results(leg.get("internal_id", ""))
-        new_leg = dict(leg)
-        if st:
-            new_leg["status"] = st
-        legs.append(new_leg)
+    # refresh: eerst RESULTS tegen de broker leggen (hooguit 1 bulk-fetch per RECONCILE_MAX_AGE_SEC),
+    # dan de statussen vanuit RESULTS
+    from server.modules.order_transmitting import reconcile
+    try:
+        reconcile.ensure_fresh(rec.get("adapter"))
+    except Exception:
+        # broker niet bereikbaar: dan blijft het bij de lokale RESULTS
+        pass
+    # de pass kan de groep al bijgewerkt/gesloten hebben
+    rec = registry.get_record(oca_group) or rec
+    legs, _ = _refreshed_legs(rec)
 
     rec_out = {"oca_group": oca_group, "symbol": rec.get("symbol"), "legs": legs}
     # snapshot bijwerken (maar zelfs zonder blijft detail werken)
@@ -40,8 +75,34 @@ def cancel_oca(oca_group: str) -> dict:
         raise HTTPException(status_code=404, detail="Unknown OCA group")
 
     ib_ids = [int(leg.get("ib_order_id")) for leg in rec.get("legs", []) if leg.get("ib_order_id") is not None]
-    # annuleren via adapter (zoals je al had)
-    from server.modules.order_transmitting.adapters.ibkr.adapter import ADAPTER
-    cnt = ADAPTER.cancel_bracket(ib_ids)
+    # annuleren via de adapter die de bracket plaatste
+    _, adapter = load_adapter(rec.get("adapter") or "ibkr")
+    cnt = adapter.cancel_bracket(ib_ids)
     registry.mark_inactive(oca_group)
     return {"oca_group": oca_group, "cancelled_count": cnt, "ib_order_ids": set(ib_ids), "method": "adapter.cancel_bracket"}
+
+def ensure_registered(
+    symbol: str,
+    ibkr_order_ids: dict,
+    internal_ids: dict,
+    oca_group: str | None = None,
+    adapter: str | None = None,
+) -> str | None:
+    """
+    Registreer de OCA-legs van een geplaatste bracket (idempotent).
+    Groepsnaam: door de adapter gegeven, anders OCA-<parent orderId> (zoals de manual bracket).
+    """
+    anchor = ibkr_order_ids.get("parent") or ibkr_order_ids.get("target")
+    oca = oca_group or (f"OCA-{anchor}" if anchor is not None else None)
+    if not oca:
+        return None
+    if registry.get_record(oca):
+        return oca
+    legs = [
+        {"role": role, "internal_id": internal_ids.get(role), "ib_order_id": ibkr_order_ids.get(role),
+         "status": _status_from_results(internal_ids.get(role) or "")}
+        for role in ("parent", "target", "stop")
+        if ibkr_order_ids.get(role) is not None
+    ]
+    registry.upsert_record(oca, {"symbol": symbol, "legs": legs, "adapter": adapter, "active": True})
+    return oca
@@ -0,0 +1,43 @@
+"""
+python -m server.modules.gateway
+
+Start de broker-gateway: de adapters van dit proces (IBKR_ADAPTER + ADAPTER_ROUTES) en de IPC-server
+op GATEWAY_ADDR. HTTP-workers draaien met IBKR_ADAPTER=gateway (zie docs/IBKR.md).
+"""
+
+import signal
+import sys
+
+from server.modules.order_transmitting import reconcile
+from server.modules.order_transmitting.adapters import registry
+from server.modules.order_transmitting.service import start_worker_once
+from server.modules.results import journal, ledger
+from .service import GatewayServer
+
+
+def main() -> int:
+    if registry.default_name() == "gateway":
+        print("gateway: IBKR_ADAPTER moet de broker-adapter zijn (bv. ibkr), niet 'gateway'", file=sys.stderr)
+        return 2
+    server = GatewayServer()
+    replayed = journal.start()
+    if replayed:
+        print(f"gateway: journal replay {replayed}", flush=True)
+    start_worker_once()
+    reconcile.start()
+    signal.signal(signal.SIGTERM, lambda *_: server.close())
+    print(f"gateway: adapter {registry.default_name()} op {server.address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reconcile.stop()
+        server.close()
+        ledger.flush()
+        journal.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+IPC-protocol tussen HTTP-workers en de broker-gateway.
+- frame = 10 bytes header (payload lengte u32, versie u8, soort u8, request id u32) + payload
+- payload = marshal (compact binair, enkel builtins: dict/list/tuple/str/bytes/int/float/bool/None);
+  beide kanten draaien dezelfde interpreter, het kanaal is lokaal (Unix socket 0600 of 127.0.0.1)
+- adres: GATEWAY_ADDR = "unix:<pad>" of "tcp:<host>:<port>"; default Unix socket in data/,
+  TCP als het platform geen AF_UNIX heeft (Windows)
+- HELLO van de client = ruwe token-bytes (geen marshal): de gateway unmarshalt pas na de authenticatie
+- TCP zonder GATEWAY_TOKEN: de gateway maakt per sessie een token in data/gateway.token (0600),
+  workers op dezelfde machine lezen dat bij elke (re)connect
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from secrets import token_hex
+from typing import Any, Optional, Tuple
+import marshal
+import os
+import socket
+import struct
+
+VERSION = 2
+
+# frame-soorten
+HELLO = 1      # client -> gateway: token (ruwe bytes) ; gateway -> client: info-dict
+CALL = 2       # (target adapter | None, methode, args, kwargs)
+REPLY = 3      # resultaat
+ERROR = 4      # (exception-klasse, bericht)
+EVENT = 5      # push: {"r": results, "q": quotes, "p": posities, "s": readiness}
+
+_HEADER = struct.Struct("!IBBI")
+HEADER_SIZE = _HEADER.size
+MAX_FRAME = int(os.getenv("GATEWAY_MAX_FRAME", str(64 * 1024 * 1024)))
+HELLO_MAX = 1024
+
+_DATA = Path(__file__).resolve().parents[3] / "data"
+_DEFAULT_SOCK = _DATA / "gateway.sock"
+TOKEN_FILE = _DATA / "gateway.token"
+
+
+class ProtocolError(ConnectionError):
+    pass
+
+
+class BadPayload(ValueError):
+    """Frame volledig gelezen maar de payload is geen geldige marshal: enkel dit frame is ongeldig."""
+
+    def __init__(self, kind: int, rid: int, error: Exception):
+        super().__init__(f"{error.__class__.__name__}: {error}")
+        self.kind = kind
+        self.rid = rid
+
+
+def server_token(address: str) -> Tuple[str, bool]:
+    """
+    (token, aangemaakt) voor de gateway: GATEWAY_TOKEN, anders bij TCP een nieuw token per sessie in
+    TOKEN_FILE; een Unix socket (0600) heeft geen token nodig.
+    """
+    env = os.getenv("GATEWAY_TOKEN", "")
+    if env:
+        return env, False
+    if parse_address(address)[0] != socket.AF_INET:
+        return "", False
+    token = token_hex(32)
+    TOKEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token, True
+
+
+def client_token() -> str:
+    """GATEWAY_TOKEN, anders het sessie-token van een lokale gateway (leeg als er geen is)."""
+    env = os.getenv("GATEWAY_TOKEN", "")
+    if env:
+        return env
+    try:
+        return TOKEN_FILE.read_text().strip()
+    except OSError:
+        return ""
+
+
+def default_address() -> str:
+    raw = os.getenv("GATEWAY_ADDR", "").strip()
+    if raw:
+        return raw
+    if hasattr(socket, "AF_UNIX"):
+        return f"unix:{_DEFAULT_SOCK}"
+    return "tcp:127.0.0.1:7790"
+
+
+def parse_address(addr: str) -> Tuple[int, Any]:
+    """(address family, sockaddr) voor "unix:<pad>" / "tcp:<host>:<port>"."""
+    kind, _, rest = addr.partition(":")
+    if kind == "unix":
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix sockets niet beschikbaar op dit platform; gebruik tcp:<host>:<port>")
+        return socket.AF_UNIX, rest
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    raise ValueError(f"ongeldig GATEWAY_ADDR: {addr!r} (unix:<pad> of tcp:<host>:<port>)")
+
+
+def pack(kind: int, rid: int, obj: Any) -> bytes:
+    body = marshal.dumps(obj)
+    return _HEADER.pack(len(body), VERSION, kind, rid) + body
+
+
+def pack_raw(kind: int, rid: int, body: bytes) -> bytes:
+    return _HEADER.pack(len(body), VERSION, kind, rid) + body
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytearray]:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            return None
+        got += k
+    return buf
+
+
+def read_frame(sock: socket.socket, raw: bool = False, max_size: int = MAX_FRAME) -> Optional[Tuple[int, int, Any]]:
+    """
+    (soort, request id, object) of None bij een gesloten verbinding.
+    raw: payload als bytes (geen marshal), bv. de HELLO van een nog niet geauthenticeerde client.
+    """
+    head = _recv_exact(sock, HEADER_SIZE)
+    if head is None:
+        return None
+    size, version, kind, rid = _HEADER.unpack(head)
+    if version != VERSION:
+        raise ProtocolError(f"protocol versie {version} != {VERSION}")
+    if size > max_size:
+        raise ProtocolError(f"frame van {size} bytes > {max_size}")
+    body = _recv_exact(sock, size) if size else bytearray()
+    if body is None:
+        return None
+    if raw:
+        return kind, rid, bytes(body)
+    try:
+        return kind, rid, marshal.loads(body)
+    except (ValueError, EOFError, TypeError) as e:
+        raise BadPayload(kind, rid, e)
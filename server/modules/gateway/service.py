@@ -0,0 +1,402 @@
+"""
+Broker-gateway: 1 proces bezit de broker-sessie(s) (1 IB clientId), HTTP-workers praten ermee via IPC.
+- adapters: de default (IBKR_ADAPTER) + ADAPTER_ROUTES van dit proces, gestart zoals in de API
+- CALL-frames draaien op een thread pool: een trage bracket houdt andere workers niet op
+- push: gewijzigde RESULTS (records-listener), quotes (QUOTES.changes_since), posities en readiness
+  gaan samen in 1 EVENT-frame naar alle workers; een nieuwe worker krijgt eerst een volledige snapshot
+- market data subscriptions worden per verbinding bijgehouden en vrijgegeven als een worker wegvalt
+- RESULTS_SHM=1: order-status ook in een shared-memory tabel (results.shared); workers lezen die
+  zonder IPC, de naam + generatie gaan mee in de HELLO
+- authenticatie vóór elke unmarshal; TCP heeft altijd een token (GATEWAY_TOKEN of een sessie-token)
+- een ongeldig of falend commando krijgt een ERROR-frame voor zijn request id, de verbinding blijft open
+- order_state: status van internal ids + of hun send hier nog loopt (workers met een onbekende uitkomst)
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+
+from server.modules.data import market, positions
+from server.modules.data.market import QUOTES
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting import service as transmit
+from server.modules.order_transmitting.adapters import registry
+from server.modules.order_transmitting.adapters.base import AdapterUnavailable
+from server.modules.results import records, shared
+from . import protocol
+from .protocol import CALL, ERROR, EVENT, HELLO, HELLO_MAX, REPLY, BadPayload, pack, read_frame
+
+_THREADS = int(os.getenv("GATEWAY_THREADS", "8"))
+_PUSH_MS = float(os.getenv("GATEWAY_PUSH_MS", "10"))              # quotes/posities pollen; results wekken meteen
+_IDLE_TIMEOUT_SEC = float(os.getenv("GATEWAY_IDLE_TIMEOUT_SEC", "10"))  # geen frame (ook geen ping) = worker weg
+_SHM = os.getenv("RESULTS_SHM", "1") != "0"
+_STATE_SEC = 0.5
+_SNAPSHOT_CHUNK = 5000
+
+_ORDER_CALLS = ("send", "send_many", "place_bracket")
+_ADAPTER_CALLS = _ORDER_CALLS + ("cancel", "cancel_bracket", "status", "reference_price")
+
+
+class _Conn:
+    __slots__ = ("sock", "peer", "lock", "subs", "alive")
+
+    def __init__(self, sock: socket.socket, peer: str):
+        self.sock = sock
+        self.peer = peer
+        self.lock = threading.Lock()
+        self.subs: Dict[str, int] = {}
+        self.alive = True
+
+    def send(self, data: bytes) -> bool:
+        try:
+            with self.lock:
+                self.sock.sendall(data)
+            return True
+        except OSError:
+            self.close()
+            return False
+
+    def close(self) -> None:
+        if not self.alive:
+            return
+        self.alive = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def _pack_reply(rid: int, obj: Any) -> bytes:
+    try:
+        return pack(REPLY, rid, obj)
+    except ValueError:
+        # niet-builtin types (bv. datetime in een broker-antwoord): via JSON naar builtins
+        return pack(REPLY, rid, json.loads(json.dumps(obj, default=str)))
+
+
+def _error_name(e: BaseException) -> str:
+    return "AdapterUnavailable" if isinstance(e, AdapterUnavailable) else e.__class__.__name__
+
+
+class GatewayServer:
+    def __init__(self, address: Optional[str] = None):
+        self.address = address or protocol.default_address()
+        self._conns: Dict[int, _Conn] = {}
+        self._pool = ThreadPoolExecutor(_THREADS, thread_name_prefix="gateway-call")
+        self._dirty: set = set()
+        self._dirty_lock = threading.Lock()
+        self._push_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._qv = 0
+        self._pos_seen: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._state: Optional[Dict[str, Any]] = None
+        self._state_ts = 0.0
+        self._sock: Optional[socket.socket] = None
+        self._unix_path: Optional[str] = None
+        self._closed = False
+        self._token, self._token_created = "", False
+        self._inflight: Dict[str, int] = {}     # internal id -> lopende order-calls
+        self._inflight_lock = threading.Lock()
+        self.stats = {"clients": 0, "calls": 0, "errors": 0, "events": 0}
+
+    # ---- info / readiness ----
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "address": self.address,
+            "default": registry.default_name(),
+            "adapters": transmit._adapters_in_use(),
+            "clients": len(self._conns),
+            "shm": shared.WRITER.spec() if shared.WRITER is not None else None,
+            **self.stats,
+        }
+
+    def _state_summary(self) -> Dict[str, Any]:
+        r = transmit.readiness()
+        return {"ready": r["ready"], "adapters": {n: bool(v.get("ready")) for n, v in r["adapters"].items()}}
+
+    # ---- calls ----
+
+    def _call(self, conn: _Conn, target: Optional[str], method: str, args: tuple, kwargs: dict) -> Any:
+        name = registry.normalize(target) if target else registry.default_name()
+        if method in _ADAPTER_CALLS:
+            ad = registry.get(name)
+            if method in _ORDER_CALLS:
+                ad.ensure_ready()
+            return getattr(ad, method)(*args, **kwargs)
+        if method == "readiness":
+            r = transmit.readiness()["adapters"].get(name)
+            return r if r is not None else registry.get(name).readiness()
+        if method == "subscribe_market_data":
+            sym = args[0]
+            err = market.subscribe([sym])["errors"].get(sym)
+            if err:
+                raise RuntimeError(err)
+            conn.subs[sym] = conn.subs.get(sym, 0) + 1
+            return True
+        if method == "unsubscribe_market_data":
+            sym = args[0]
+            if conn.subs.get(sym, 0) > 0:
+                conn.subs[sym] -= 1
+                market.unsubscribe([sym])
+            return True
+        if method == "fetch_historical_bars":
+            from server.modules.order_transmitting.adapters.ibkr.adapter import fetch_historical_bars
+            return fetch_historical_bars(*args, **kwargs)
+        if method == "ensure_bars":
+            from server.modules.data.bars import ensure_status
+            return ensure_status(*args)
+        if method == "pacer_stats":
+            if "ibkr" not in registry.loaded():
+                return {"active": False}
+            from server.modules.order_transmitting.adapters.ibkr.adapter import pacer_stats
+            return {"active": True, **pacer_stats()}
+        if method == "reconcile":
+            from server.modules.order_transmitting import reconcile
+            return reconcile.run(kwargs.get("adapter") or name, bool(kwargs.get("dry_run")), float(kwargs.get("max_age") or 0))
+        if method == "order_state":
+            with self._inflight_lock:
+                inflight = set(self._inflight)
+            return {iid: {"result": RESULTS.get(iid), "inflight": iid in inflight} for iid in args[0]}
+        if method == "info":
+            return self.info()
+        raise ValueError(f"unknown gateway method: {method}")
+
+    @staticmethod
+    def _order_ids(method: str, args: tuple, kwargs: dict) -> List[str]:
+        if method == "send":
+            return [args[1]] if len(args) > 1 and args[1] else []
+        if method == "send_many":
+            return [iid for _, iid in args[0] if iid]
+        if method == "place_bracket":
+            return list((kwargs.get("internal_ids") or {}).values())
+        return []
+
+    def _track(self, iids: List[str], delta: int) -> None:
+        with self._inflight_lock:
+            for iid in iids:
+                n = self._inflight.get(iid, 0) + delta
+                if n > 0:
+                    self._inflight[iid] = n
+                else:
+                    self._inflight.pop(iid, None)
+
+    def _run_call(self, conn: _Conn, rid: int, call: Tuple[Optional[str], str, tuple, dict], iids: List[str]) -> None:
+        self.stats["calls"] += 1
+        try:
+            target, method, args, kwargs = call
+            data = _pack_reply(rid, self._call(conn, target, method, args, kwargs))
+        except Exception as e:
+            self.stats["errors"] += 1
+            data = pack(ERROR, rid, (_error_name(e), str(e)))
+        finally:
+            self._track(iids, -1)
+        conn.send(data)
+
+    def _dispatch(self, conn: _Conn, rid: int, body: Any) -> None:
+        """1 CALL-frame; een fout raakt enkel dit commando (ERROR-frame), niet de verbinding."""
+        try:
+            target, method, args, kwargs = body
+            args, kwargs = tuple(args), dict(kwargs)
+            iids = self._order_ids(method, args, kwargs)
+        except Exception as e:
+            self.stats["errors"] += 1
+            conn.send(pack(ERROR, rid, ("ValueError", f"malformed call: {e.__class__.__name__}: {e}")))
+            return
+        if method == "ping":
+            # liveness meteen beantwoorden, ook als de pool vol zit
+            conn.send(pack(REPLY, rid, time.time()))
+            return
+        # vóór de pool: een order_state die na deze send binnenkomt ziet hem als lopend
+        self._track(iids, +1)
+        try:
+            self._pool.submit(self._run_call, conn, rid, (target, method, args, kwargs), iids)
+        except RuntimeError as e:      # pool gestopt (close)
+            self._track(iids, -1)
+            conn.send(pack(ERROR, rid, ("AdapterUnavailable", f"gateway stopping: {e}")))
+
+    # ---- push ----
+
+    def _on_records(self, ids) -> None:
+        with self._dirty_lock:
+            self._dirty.update(ids)
+        self._wake.set()
+
+    def _collect(self) -> Dict[str, Any]:
+        ev: Dict[str, Any] = {}
+        with self._dirty_lock:
+            ids, self._dirty = self._dirty, set()
+        if ids:
+            r = {}
+            for iid in ids:
+                snap = RESULTS.get(iid)
+                if snap is not None:
+                    r[iid] = snap
+            if r:
+                ev["r"] = r
+        self._qv, quotes = QUOTES.changes_since(self._qv)
+        if quotes:
+            ev["q"] = quotes
+        # posities zijn immutable dicts die per update vervangen worden: identiteit = ongewijzigd
+        seen = self._pos_seen
+        changed = []
+        for p in positions.list_positions(include_flat=True):
+            key = (p["account"], p["symbol"])
+            if seen.get(key) is not p:
+                seen[key] = p
+                changed.append(p)
+        if changed:
+            ev["p"] = changed
+        now = time.monotonic()
+        if now - self._state_ts >= _STATE_SEC:
+            self._state_ts = now
+            s = self._state_summary()
+            if s != self._state:
+                self._state = s
+                ev["s"] = s
+        return ev
+
+    def _push(self) -> None:
+        with self._push_lock:
+            if not self._conns:
+                with self._dirty_lock:
+                    self._dirty.clear()
+                self._qv = QUOTES.version
+                return
+            ev = self._collect()
+            if not ev:
+                return
+            data = pack(EVENT, 0, ev)
+            self.stats["events"] += 1
+            for conn in list(self._conns.values()):
+                conn.send(data)
+
+    def _pusher(self) -> None:
+        while not self._closed:
+            self._wake.wait(_PUSH_MS / 1000.0)
+            self._wake.clear()
+            try:
+                self._push()
+            except Exception:
+                # de push-lus mag nooit stoppen (bv. een entry die niet te marshallen valt)
+                pass
+
+    def _send_snapshot(self, conn: _Conn) -> None:
+        items = list(RESULTS.items())
+        for i in range(0, len(items), _SNAPSHOT_CHUNK):
+            conn.send(pack(EVENT, 0, {"r": dict(items[i:i + _SNAPSHOT_CHUNK])}))
+        if self._state is None:
+            self._state = self._state_summary()
+        conn.send(pack(EVENT, 0, {
+            "q": QUOTES.changes_since(0)[1],
+            "p": positions.list_positions(include_flat=True),
+            "s": self._state,
+        }))
+
+    # ---- verbindingen ----
+
+    def _serve_conn(self, sock: socket.socket, peer: str) -> None:
+        conn = _Conn(sock, peer)
+        try:
+            # HELLO ruw en begrensd: geen marshal.loads op bytes van een niet-geauthenticeerde client
+            f = read_frame(sock, raw=True, max_size=HELLO_MAX)
+            if f is None or f[0] != HELLO:
+                return
+            if self._token and not hmac.compare_digest(f[2], self._token.encode()):
+                conn.send(pack(ERROR, f[1], ("PermissionError", "invalid gateway token")))
+                return
+            conn.send(pack(HELLO, f[1], self.info()))
+            # snapshot en registratie onder de push-lock: geen update valt tussen beide
+            with self._push_lock:
+                self._send_snapshot(conn)
+                self._conns[id(conn)] = conn
+                self.stats["clients"] += 1
+            while conn.alive:
+                try:
+                    f = read_frame(sock)
+                except BadPayload as e:
+                    self.stats["errors"] += 1
+                    conn.send(pack(ERROR, e.rid, ("ValueError", f"bad payload: {e}")))
+                    continue
+                if f is None:
+                    break
+                if f[0] == CALL:
+                    self._dispatch(conn, f[1], f[2])
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+        finally:
+            self._conns.pop(id(conn), None)
+            conn.close()
+            for sym, n in conn.subs.items():
+                if n > 0:
+                    market.unsubscribe([sym] * n)
+
+    def _bind(self) -> socket.socket:
+        family, addr = protocol.parse_address(self.address)
+        if family == getattr(socket, "AF_UNIX", None):
+            if os.path.exists(addr):
+                probe = socket.socket(family, socket.SOCK_STREAM)
+                try:
+                    probe.connect(addr)
+                except OSError:
+                    os.unlink(addr)     # stale socket van een vorige run
+                else:
+                    probe.close()
+                    raise RuntimeError(f"gateway draait al op {self.address}")
+            os.makedirs(os.path.dirname(addr) or ".", exist_ok=True)
+            self._unix_path = addr
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET and os.name != "nt":
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        if self._unix_path:
+            os.chmod(addr, 0o600)
+        sock.listen(64)
+        return sock
+
+    def serve_forever(self) -> None:
+        self._sock = sock = self._bind()
+        # na de bind: een tweede gateway (bind faalt) overschrijft het token van de draaiende niet
+        self._token, self._token_created = protocol.server_token(self.address)
+        if _SHM:
+            shared.create_writer()
+        records.subscribe(self._on_records)
+        threading.Thread(target=self._pusher, name="gateway-push", daemon=True).start()
+        while not self._closed:
+            try:
+                c, peer = sock.accept()
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            c.settimeout(_IDLE_TIMEOUT_SEC)
+            if sock.family == socket.AF_INET:
+                c.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(
+                target=self._serve_conn, args=(c, str(peer) or "unix"), name="gateway-conn", daemon=True,
+            ).start()
+
+    def close(self) -> None:
+        self._closed = True
+        records.unsubscribe(self._on_records)
+        for conn in list(self._conns.values()):
+            conn.close()
+        if self._sock is not None:
+            self._sock.close()
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+        if self._token_created:
+            try:
+                protocol.TOKEN_FILE.unlink()
+            except OSError:
+                pass
+        shared.close_writer()
+        self._pool.shutdown(wait=False)
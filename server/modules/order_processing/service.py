@@ -1,7 +1,6 @@
 from __future__ import annotations
 from typing import Tuple
-from server.modules.strategy_types.service import validate as validate_strategy, _resolve
-from server.modules.strategy_types.registry import get as get_strategy
+from server.modules.strategy_types import registry
 
 def validate_order(o: dict) -> Tuple[bool, str]:
     # (basisvalidatie blijft voor oudere paden bruikbaar)
@@ -20,15 +19,16 @@ def enrich_order(o: dict) -> dict:
     return {"order": o}
 
 def build_from_strategy(symbol: str, strategy_id: str, params: dict) -> Tuple[bool, str, dict]:
-    """Validate via strategy and map to final order spec using strategy.to_order()."""
-    sid = _resolve(strategy_id) or strategy_id
-    ok, msg = validate_strategy(sid, params)
-    if not ok:
-        return False, msg, {}
-    cls = get_strategy(sid)
-    if not cls:
+    """Validate + build in 1 stap via de strategy registry (single orders; brackets via /strategy-types/run)."""
+    try:
+        spec = registry.build(strategy_id, symbol, params)
+    except KeyError:
         return False, f"strategy '{strategy_id}' not found", {}
-    order = cls.to_order(symbol=symbol, params=params)
+    except ValueError as e:
+        return False, str(e), {}
+    if spec["type"] != "single":
+        return False, f"strategy '{strategy_id}' is a {spec['type']} strategy; use /strategy-types/run", {}
+    order = spec["order"]
     # add generic defaults
     order.setdefault("tif", "DAY")
     order.setdefault("exchange", "SMART")
@@ -1,8 +1,23 @@
 from __future__ import annotations
-from typing import Protocol, Any, Tuple
+from typing import Protocol, Any, Dict, Iterable, List, Optional, Tuple, runtime_checkable
+import asyncio
 
+SendResult = Tuple[bool, Dict[str, Any]]
+
+
+class AdapterUnavailable(RuntimeError):
+    """Adapter/sessie niet klaar: order-endpoints antwoorden meteen met 503 i.p.v. te wachten."""
+
+
+@runtime_checkable
 class TransmitAdapter(Protocol):
-    def send(self, order: dict) -> Tuple[bool, dict[str, Any]]:
+    """
+    Volledig adapter-oppervlak. Elke methode bestaat sync én async (suffix _async);
+    AdapterBase levert de async varianten en send_many als de adapter niets beters heeft.
+    """
+    name: str
+
+    def send(self, order: dict, internal_id: Optional[str] = None) -> SendResult:
         """
         Verzendt order naar broker.
         Return: (ok, result)
@@ -10,3 +25,130 @@ class TransmitAdapter(Protocol):
           ok=False: result bevat {"status":"error","error":"..."}
         """
         ...
+
+    def send_many(self, orders: List[Tuple[dict, Optional[str]]]) -> List[SendResult]:
+        """Batch van (order, internal_id); resultaten in dezelfde volgorde."""
+        ...
+
+    def place_bracket(
+        self, *, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str],
+    ) -> SendResult:
+        """Parent + target + stop (OCA). ok=True: {"ibkr_order_ids": {"parent","target","stop"}, ...}"""
+        ...
+
+    def cancel(self, internal_id: str) -> Dict[str, Any]:
+        """Return {"ok": bool, ...}"""
+        ...
+
+    def cancel_bracket(self, order_ids: Iterable[int]) -> int:
+        """Cancel broker order ids; return aantal aangevraagde cancels."""
+        ...
+
+    def start(self) -> None:
+        """Verbinding/engine opstarten (mag blokkeren; wordt bij startup op de achtergrond aangeroepen)."""
+        ...
+
+    def readiness(self) -> Dict[str, Any]:
+        """{"ready": bool, ...}: klaar om orders te verwerken."""
+        ...
+
+    def ensure_ready(self) -> None:
+        """Raise AdapterUnavailable als er nu geen orders verwerkt kunnen worden (goedkoop: per order)."""
+        ...
+
+    def status(self, internal_id: str) -> Optional[str]:
+        """Laatst bekende status (lowercase) of None."""
+        ...
+
+    def broker_orders(self) -> List[Dict[str, Any]]:
+        """
+        Alle open + afgehandelde orders van deze sessie volgens de broker, in 1 bulk-opvraging:
+        [{"order_id", "status", "filled_qty", "avg_price", "symbol"}, ...] (reconciliatie)
+        """
+        ...
+
+    def run_on_writer(self, fn, *args):
+        """fn(*args) uitvoeren op de thread die de records van deze adapter schrijft; return het resultaat."""
+        ...
+
+    async def send_async(self, order: dict, internal_id: Optional[str] = None) -> SendResult: ...
+    async def send_many_async(self, orders: List[Tuple[dict, Optional[str]]]) -> List[SendResult]: ...
+    async def place_bracket_async(
+        self, *, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str],
+    ) -> SendResult: ...
+    async def cancel_async(self, internal_id: str) -> Dict[str, Any]: ...
+    async def cancel_bracket_async(self, order_ids: Iterable[int]) -> int: ...
+    async def status_async(self, internal_id: str) -> Optional[str]: ...
+
+
+class AdapterBase:
+    """
+    Defaults voor TransmitAdapter: send_many = lus over send, status uit RESULTS,
+    async = sync variant in een worker-thread (blokkeert de event loop niet).
+    """
+    name = "base"
+
+    def send(self, order: dict, internal_id: Optional[str] = None) -> SendResult:
+        raise NotImplementedError(f"{self.__class__.__name__}.send not implemented")
+
+    def place_bracket(
+        self, *, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str],
+    ) -> SendResult:
+        return False, {"status": "error", "error": f"{self.name}: brackets not supported"}
+
+    def cancel(self, internal_id: str) -> Dict[str, Any]:
+        return {"ok": False, "error": f"{self.name}: cancel not supported"}
+
+    def cancel_bracket(self, order_ids: Iterable[int]) -> int:
+        raise NotImplementedError(f"{self.name}: cancel_bracket not supported")
+
+    def send_many(self, orders: List[Tuple[dict, Optional[str]]]) -> List[SendResult]:
+        return [self.send(order, internal_id=iid) for order, iid in orders]
+
+    def start(self) -> None:
+        pass
+
+    def readiness(self) -> Dict[str, Any]:
+        return {"ready": True}
+
+    def ensure_ready(self) -> None:
+        pass
+
+    def broker_orders(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError(f"{self.name}: broker_orders not supported")
+
+    def run_on_writer(self, fn, *args):
+        return fn(*args)
+
+    def reference_price(self, symbol: str) -> Optional[float]:
+        """Prijs voor de risk check als de quote cache niets heeft (bv. MKT zonder subscription); None = onbekend."""
+        return None
+
+    def status(self, internal_id: str) -> Optional[str]:
+        from server.modules.data.store import RESULTS
+        s = (RESULTS.get(internal_id) or {}).get("status")
+        return str(s).lower() if s else None
+
+    async def send_async(self, order: dict, internal_id: Optional[str] = None) -> SendResult:
+        return await asyncio.to_thread(self.send, order, internal_id)
+
+    async def send_many_async(self, orders: List[Tuple[dict, Optional[str]]]) -> List[SendResult]:
+        return await asyncio.to_thread(self.send_many, orders)
+
+    async def place_bracket_async(
+        self, *, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str],
+    ) -> SendResult:
+        return await asyncio.to_thread(
+            lambda: self.place_bracket(
+                base_order=base_order, target_price=target_price, stop_price=stop_price, internal_ids=internal_ids,
+            )
+        )
+
+    async def cancel_async(self, internal_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.cancel, internal_id)
+
+    async def cancel_bracket_async(self, order_ids: Iterable[int]) -> int:
+        return await asyncio.to_thread(self.cancel_bracket, list(order_ids))
+
+    async def status_async(self, internal_id: str) -> Optional[str]:
+        return self.status(internal_id)
@@ -0,0 +1,416 @@
+"""
+Gateway adapter: HTTP-worker kant van de broker-gateway (python -m server.modules.gateway).
+- meerdere uvicorn workers delen zo 1 broker-sessie (geen clientId-botsingen)
+- 1 socket per worker-proces, gemultiplext op request id; een reader-thread matcht REPLY/ERROR
+  en past EVENT-frames toe op de lokale kopie van de gedeelde result view:
+  RESULTS (+ records-listeners, o.a. risk), quotes en posities
+- koppelt aan de shared-memory result-tabel van de gateway (results.shared) voor /results reads zonder IPC
+- ping elke GATEWAY_PING_SEC; verbinding weg = reconnect met backoff, intussen AdapterUnavailable (503)
+- order-call verstuurd maar geen antwoord (timeout / verbinding weg): de gateway kan de order al geplaatst
+  hebben. Zo'n send geeft status 'unknown' (geen error: de caller mag niet opnieuw plaatsen); een
+  resolver-thread vraagt later order_state op en zet de echte status, of 'error' als de send nooit liep
+"""
+
+from __future__ import annotations
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import itertools
+import os
+import socket
+import threading
+import time
+
+from server.modules.data import market, positions
+from server.modules.data.market import QUOTES
+from server.modules.data.store import RESULTS
+from server.modules.gateway import protocol
+from server.modules.gateway.protocol import CALL, ERROR, EVENT, HELLO, REPLY, pack, pack_raw, read_frame
+from server.modules.order_transmitting.adapters.base import AdapterBase, AdapterUnavailable
+from server.modules.results import shared
+from server.modules.results.records import notify
+
+_TARGET = os.getenv("GATEWAY_TARGET") or None                 # adapter in de gateway; None = zijn default
+_CALL_TIMEOUT_SEC = float(os.getenv("GATEWAY_CALL_TIMEOUT_SEC", "30"))
+_CONNECT_TIMEOUT_SEC = float(os.getenv("GATEWAY_CONNECT_TIMEOUT_SEC", "5"))
+_PING_SEC = float(os.getenv("GATEWAY_PING_SEC", "2"))
+_RECONNECT_MAX_SEC = 5.0
+_RESOLVE_GRACE_SEC = 2.0      # pas daarna order_state: de gateway kan het frame nog aan het lezen zijn
+_RESOLVE_EVERY_SEC = 1.0
+
+
+class OutcomeUnknown(AdapterUnavailable):
+    """Call verstuurd, maar geen antwoord (timeout of verbinding weg): uitgevoerd of niet is onbekend."""
+
+
+class GatewayAdapter(AdapterBase):
+    """Zelfde oppervlak als ibkr/sim; elke call is 1 round trip naar de gateway."""
+    name = "gateway"
+
+    def __init__(self, address: Optional[str] = None, target: Optional[str] = _TARGET):
+        self.address = address or protocol.default_address()
+        self.target = target
+        self.state = "idle"          # idle | connecting | connected | reconnecting
+        self.error: Optional[str] = None
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._rid = itertools.count(1)
+        self._connected = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._info: Dict[str, Any] = {}
+        self._remote: Dict[str, Any] = {}
+        self._unknown: Dict[str, Tuple[float, int]] = {}    # internal id -> (sinds, keer 'niet gezien')
+        self._unknown_lock = threading.Lock()
+        self._resolver: Optional[threading.Thread] = None
+        self.stats = {"connects": 0, "calls": 0, "events": 0, "results": 0, "quotes": 0, "unknown": 0}
+
+    # ---- verbinding ----
+
+    def _open(self) -> socket.socket:
+        family, addr = protocol.parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(_CONNECT_TIMEOUT_SEC)
+        try:
+            sock.connect(addr)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # token bij elke connect opnieuw lezen: een herstarte gateway heeft een nieuw sessie-token
+            sock.sendall(pack_raw(HELLO, 0, protocol.client_token().encode()))
+            f = read_frame(sock)
+            if f is None:
+                raise ConnectionError("gateway sloot de verbinding")
+            if f[0] == ERROR:
+                raise ConnectionError(f"gateway: {f[2][1]}")
+            self._info = f[2]
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    def _run(self) -> None:
+        delay = 0.2
+        while True:
+            try:
+                sock = self._open()
+            except (OSError, ValueError) as e:
+                self.error = f"{e.__class__.__name__}: {e}"
+                self.state = "reconnecting" if self.stats["connects"] else "connecting"
+                time.sleep(delay)
+                delay = min(delay * 2, _RECONNECT_MAX_SEC)
+                continue
+            delay = 0.2
+            shared.attach_reader(self._info.get("shm"))
+            self._sock = sock
+            self.stats["connects"] += 1
+            self.error = None
+            self.state = "connected"
+            self._connected.set()
+            if self.stats["connects"] > 1:
+                # de gateway gaf de subscriptions van de oude verbinding vrij
+                threading.Thread(target=self._resubscribe, name="gateway-resub", daemon=True).start()
+            try:
+                self._read_loop(sock)
+            except (OSError, ValueError, EOFError, TypeError) as e:
+                self.error = f"{e.__class__.__name__}: {e}"
+            self._drop(sock)
+
+    def _read_loop(self, sock: socket.socket) -> None:
+        while True:
+            f = read_frame(sock)
+            if f is None:
+                self.error = "gateway closed the connection"
+                return
+            kind, rid, body = f
+            if kind == EVENT:
+                self._apply(body)
+                continue
+            fut = self._pending.pop(rid, None)
+            if fut is None:
+                continue
+            if kind == REPLY:
+                fut.set_result(body)
+            elif kind == ERROR:
+                name, msg = body
+                if name == "AdapterUnavailable":
+                    fut.set_exception(AdapterUnavailable(msg))
+                elif name in ("ValueError", "KeyError"):
+                    fut.set_exception(ValueError(msg))
+                else:
+                    fut.set_exception(RuntimeError(f"{name}: {msg}"))
+
+    def _drop(self, sock: socket.socket) -> None:
+        """Verbinding weg: openstaande calls falen meteen (geen wachten op de reconnect)."""
+        if self._sock is sock:
+            self._sock = None
+            self._connected.clear()
+            self.state = "reconnecting"
+        try:
+            sock.close()
+        except OSError:
+            pass
+        pending, self._pending = self._pending, {}
+        for fut in list(pending.values()):
+            # het frame was al verstuurd: de gateway kan de call nog uitgevoerd hebben
+            fut.set_exception(OutcomeUnknown(f"gateway connection lost: {self.error or '-'}"))
+
+    def _pinger(self) -> None:
+        while True:
+            time.sleep(_PING_SEC)
+            sock = self._sock
+            if sock is None:
+                continue
+            try:
+                self._call("ping", timeout=max(_PING_SEC * 2, 1.0))
+            except OutcomeUnknown as e:
+                if self._sock is sock:
+                    # geen antwoord: gateway hangt; reader-thread reconnect
+                    self.error = f"ping: {e}"
+                    self._drop(sock)
+            except AdapterUnavailable:
+                pass
+            except Exception as e:
+                # geen antwoord: gateway hangt of is weg; reader-thread reconnect
+                self.error = f"ping: {e.__class__.__name__}: {e}"
+                self._drop(sock)
+
+    def _resubscribe(self) -> None:
+        for sym in market.subscriptions():
+            try:
+                self._call("subscribe_market_data", sym)
+            except Exception:
+                pass
+
+    # ---- gedeelde result view ----
+
+    def _apply(self, ev: Dict[str, Any]) -> None:
+        self.stats["events"] += 1
+        r = ev.get("r")
+        if r:
+            name = self.name
+            for iid, snap in r.items():
+                # adapter = gateway (cancels e.d. lopen terug via de gateway), broker = adapter in de gateway
+                RESULTS[iid] = {**snap, "adapter": name, "broker": snap.get("adapter")}
+            self.stats["results"] += len(r)
+            notify(r.keys())
+        q = ev.get("q")
+        if q:
+            for d in q:
+                d = dict(d)
+                sym = d.pop("symbol")
+                QUOTES.update(sym, ts=d.pop("ts", None), **d)
+            self.stats["quotes"] += len(q)
+        for p in ev.get("p") or ():
+            positions.apply_snapshot(p)
+        s = ev.get("s")
+        if s is not None:
+            self._remote = s
+
+    # ---- calls ----
+
+    def _call(self, method: str, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        if self._thread is None:
+            self.start()
+        sock = self._sock
+        if sock is None:
+            raise AdapterUnavailable(f"gateway {self.state}: {self.error or self.address}")
+        rid = next(self._rid)
+        fut: Future = Future()
+        self._pending[rid] = fut
+        data = pack(CALL, rid, (self.target, method, args, kwargs))
+        self.stats["calls"] += 1
+        try:
+            with self._send_lock:
+                sock.sendall(data)
+        except OSError as e:
+            self._pending.pop(rid, None)
+            self.error = f"{e.__class__.__name__}: {e}"
+            self._drop(sock)
+            raise AdapterUnavailable(f"gateway: {self.error}")
+        try:
+            return fut.result(timeout or _CALL_TIMEOUT_SEC)
+        except FutureTimeout:
+            self._pending.pop(rid, None)
+            raise OutcomeUnknown(f"gateway: geen antwoord op {method} binnen {timeout or _CALL_TIMEOUT_SEC:g}s")
+
+    def reference_price(self, symbol: str) -> Optional[float]:
+        try:
+            return self._call("reference_price", symbol, timeout=5.0)
+        except Exception:
+            return None
+
+    # ---- onbekende uitkomst van order-calls ----
+
+    def _mark_unknown(self, iids: Iterable[Optional[str]], error: str, detail: Optional[dict] = None) -> None:
+        # een EVENT van de gateway (heeft 'broker') kan de echte status al gebracht hebben
+        ids = [iid for iid in iids if iid and "broker" not in (RESULTS.get(iid) or {})]
+        now = time.monotonic()
+        with self._unknown_lock:
+            for iid in ids:
+                self._unknown[iid] = (now, 0)
+                RESULTS[iid] = {"status": "unknown", "error": error, "detail": detail, "adapter": self.name}
+            self.stats["unknown"] += len(ids)
+            if self._resolver is None:
+                self._resolver = threading.Thread(target=self._resolve_loop, name="gateway-resolve", daemon=True)
+                self._resolver.start()
+        notify(ids)
+
+    def _resolve_loop(self) -> None:
+        while True:
+            time.sleep(_RESOLVE_EVERY_SEC)
+            now = time.monotonic()
+            with self._unknown_lock:
+                due = [iid for iid, (since, _) in self._unknown.items() if now - since >= _RESOLVE_GRACE_SEC]
+            if not due or self._sock is None:
+                continue
+            try:
+                states = self._call("order_state", due, timeout=5.0)
+            except Exception:
+                continue        # gateway (nog) weg: volgende ronde
+            self._resolve(states)
+
+    def _resolve(self, states: Dict[str, Dict[str, Any]]) -> None:
+        done: Dict[str, Dict[str, Any]] = {}
+        with self._unknown_lock:
+            for iid, st in states.items():
+                entry = self._unknown.get(iid)
+                if entry is None:
+                    continue
+                if st.get("result") is not None:
+                    done[iid] = st["result"]
+                elif st.get("inflight"):
+                    continue
+                elif entry[1] >= 1:
+                    # 2 rondes niet lopend en onbekend bij de gateway: de send is er nooit uitgevoerd
+                    done[iid] = {
+                        "status": "error", "error": "not placed: the gateway never executed this send",
+                        "detail": (RESULTS.get(iid) or {}).get("detail"),
+                    }
+                else:
+                    self._unknown[iid] = (entry[0], entry[1] + 1)
+                    continue
+                del self._unknown[iid]
+        if done:
+            self._apply({"r": done})
+
+    def send(self, order: dict, internal_id: Optional[str] = None) -> Tuple[bool, Dict[str, Any]]:
+        try:
+            ok, res = self._call("send", order, internal_id)
+            return ok, res
+        except OutcomeUnknown as e:
+            self._mark_unknown([internal_id], str(e), order)
+            return True, {"status": "unknown", "error": str(e), "detail": order}
+        except Exception as e:
+            return False, {"status": "error", "error": str(e), "detail": order}
+
+    def send_many(self, orders: List[Tuple[dict, Optional[str]]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """1 round trip voor de hele batch."""
+        batch = [(o, iid) for o, iid in orders]
+        try:
+            return [(ok, res) for ok, res in self._call("send_many", batch)]
+        except OutcomeUnknown as e:
+            for o, iid in batch:
+                self._mark_unknown([iid], str(e), o)
+            return [(True, {"status": "unknown", "error": str(e), "detail": o}) for o, _ in batch]
+        except Exception as e:
+            return [(False, {"status": "error", "error": str(e), "detail": o}) for o, _ in batch]
+
+    def place_bracket(
+        self, *, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str],
+    ) -> Tuple[bool, Dict[str, Any]]:
+        try:
+            ok, res = self._call(
+                "place_bracket",
+                base_order=base_order, target_price=float(target_price), stop_price=float(stop_price),
+                internal_ids=dict(internal_ids),
+            )
+            return ok, res
+        except OutcomeUnknown as e:
+            self._mark_unknown(internal_ids.values(), str(e), base_order)
+            return True, {"status": "unknown", "error": str(e), "ibkr_order_ids": {}, "oca_group": None}
+        except Exception as e:
+            return False, {"status": "error", "error": str(e)}
+
+    def cancel(self, internal_id: str) -> Dict[str, Any]:
+        try:
+            return self._call("cancel", internal_id)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def cancel_bracket(self, order_ids: Iterable[int]) -> int:
+        return int(self._call("cancel_bracket", [int(x) for x in order_ids if x is not None]))
+
+    def start(self) -> None:
+        """Reader- en ping-thread starten; wacht hooguit GATEWAY_CONNECT_TIMEOUT_SEC op de eerste verbinding."""
+        with self._start_lock:
+            if self._thread is None:
+                self.state = "connecting"
+                self._thread = threading.Thread(target=self._run, name="gateway-client", daemon=True)
+                self._thread.start()
+                threading.Thread(target=self._pinger, name="gateway-ping", daemon=True).start()
+        self._connected.wait(_CONNECT_TIMEOUT_SEC)
+
+    def _remote_ready(self) -> bool:
+        adapters = self._remote.get("adapters") or {}
+        name = self.target or self._info.get("default")
+        return bool(adapters.get(name)) if name in adapters else bool(self._remote.get("ready"))
+
+    def readiness(self) -> Dict[str, Any]:
+        gw = {
+            "address": self.address, "state": self.state, "error": self.error,
+            "pid": self._info.get("pid"), "target": self.target or self._info.get("default"), **self.stats,
+        }
+        if self._sock is None:
+            return {"ready": False, "state": self.state, "error": self.error, "gateway": gw}
+        try:
+            remote = self._call("readiness", timeout=2.0)
+        except Exception as e:
+            remote = {"ready": False, "error": str(e)}
+        return {**remote, "ready": bool(remote.get("ready")), "gateway": gw}
+
+    def ensure_ready(self) -> None:
+        """Fail fast op de gecachte staat (gepusht door de gateway): geen round trip per order."""
+        if self._thread is None:
+            self.start()
+        if self._sock is None:
+            raise AdapterUnavailable(f"gateway {self.state}: {self.error or self.address}")
+        if not self._remote_ready():
+            raise AdapterUnavailable(f"gateway: broker session not ready ({self.target or self._info.get('default')})")
+
+
+ADAPTER = GatewayAdapter()
+
+
+# ---- zelfde module-functies als de IBKR adapter (data.market, data.bars, /transmit/pacer) ----
+
+def subscribe_market_data(symbol: str) -> None:
+    ADAPTER._call("subscribe_market_data", symbol)
+
+
+def unsubscribe_market_data(symbol: str) -> None:
+    ADAPTER._call("unsubscribe_market_data", symbol)
+
+
+def fetch_historical_bars(
+    symbol: str, bar_size: str, end_ts: float, duration: str,
+    what: str = "TRADES", use_rth: bool = False, timeout: float = 120.0,
+) -> List[Tuple[float, float, float, float, float, float]]:
+    rows = ADAPTER._call(
+        "fetch_historical_bars", symbol, bar_size, end_ts, duration, what, use_rth, timeout, timeout=timeout + 5.0,
+    )
+    return [tuple(r) for r in rows]
+
+
+def ensure_bars(symbol: str, bar_size: str, start: float, end: float, start_job: bool) -> Dict[str, Any]:
+    """Bar-fetch in de gateway (enige schrijver van data/bars): {"fetching", "error"}."""
+    return ADAPTER._call("ensure_bars", symbol, bar_size, start, end, start_job)
+
+
+def pacer_stats() -> Dict[str, Any]:
+    return ADAPTER._call("pacer_stats")
+
+
+def reconcile(adapter: Optional[str] = None, dry_run: bool = False, max_age: float = 0.0) -> Dict[str, Any]:
+    """Reconciliatie-pass in de gateway (daar zitten de broker-sessie en de records)."""
+    return ADAPTER._call("reconcile", adapter=adapter, dry_run=dry_run, max_age=max_age, timeout=_CALL_TIMEOUT_SEC * 2)
@@ -3,16 +3,32 @@ IBKR adapter
 - 1 dedicated IB-thread met eigen asyncio loop
 - single orders + bracket (parent MKT + OCO target LMT + stop STP)
 - status & cancel helpers die binnen dezelfde IB-verbinding draaien
+- pacer: elk uitgaand API-bericht passeert een token bucket (TWS verbreekt boven ~50 msg/s)
 """
 
 from __future__ import annotations
 from typing import Any, Dict, Optional, Tuple, List, Callable
-from queue import Queue
+from collections import deque
+from queue import PriorityQueue, Empty
+import concurrent.futures
+import itertools
 import threading
+from datetime import datetime, timezone
+import calendar
 import os
 import time
 
+def _ensure_event_loop() -> None:
+    # eventkit (via ib_insync) vraagt bij import de loop van de huidige thread op;
+    # deze module wordt lazy geladen, vaak op een worker- of startup-thread zonder loop
+    import asyncio
+    try:
+        asyncio.get_event_loop()
+    except RuntimeError:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
 try:
+    _ensure_event_loop()
     # ib_insync types
     from ib_insync import IB, Stock, Order, MarketOrder, LimitOrder, StopOrder  # type: ignore
 except Exception as e:  # pragma: no cover
@@ -22,6 +38,10 @@ else:
     _IMPORT_ERROR = None
 
 from server.modules.data.store import RESULTS
+from server.modules.order_transmitting.adapters.base import AdapterBase, AdapterUnavailable
+from server.modules.data import positions, market
+from server.modules.results.records import RECORDS, ensure_record, publish, notify
+from server.modules.results.ledger import record_ib_fill, record_ib_commission
 
 # -------------------------
 # ENV
@@ -29,13 +49,29 @@ from server.modules.data.store import RESULTS
 _HOST = os.getenv("IBKR_HOST", "127.0.0.1")
 _PORT = int(os.getenv("IBKR_PORT", "7497"))
 _CLIENT_ID = int(os.getenv("IBKR_CLIENT_ID", "9"))
+# trade-event coalescing: 0 = per loop-iteratie, >0 = venster in ms
+_COALESCE_MS = float(os.getenv("IBKR_COALESCE_MS", "0"))
+# idle: zo vaak draait de IB-thread zijn asyncio loop (events + coalesce flushes)
+_PUMP_MS = float(os.getenv("IBKR_PUMP_MS", "20"))
+# pacing van uitgaande API-berichten (TWS-limiet is 50/s; marge voor berichten die ib_insync zelf stuurt)
+_MSG_RATE = float(os.getenv("IBKR_MSG_RATE", "45"))
+_MSG_BURST = float(os.getenv("IBKR_MSG_BURST", "10"))
+# sessie: connect timeout, reconnect backoff en heartbeat (reqCurrentTime round trip)
+_CONNECT_TIMEOUT_SEC = float(os.getenv("IBKR_CONNECT_TIMEOUT_SEC", "10"))
+_RECONNECT_MIN_SEC = float(os.getenv("IBKR_RECONNECT_MIN_SEC", "1"))
+_RECONNECT_MAX_SEC = float(os.getenv("IBKR_RECONNECT_MAX_SEC", "30"))
+_HB_SEC = float(os.getenv("IBKR_HEARTBEAT_SEC", "5"))                  # 0 = geen heartbeat
+_HB_TIMEOUT_SEC = float(os.getenv("IBKR_HEARTBEAT_TIMEOUT_SEC", "3"))
+_HB_MAX_FAILURES = int(os.getenv("IBKR_HEARTBEAT_MAX_FAILURES", "2"))
+# snapshot-quote voor de risk check (MKT zonder subscription); zo lang wacht het order-pad max.
+_SNAPSHOT_TIMEOUT_SEC = float(os.getenv("IBKR_SNAPSHOT_TIMEOUT_SEC", "2"))
 
 # -------------------------
 # IB runner (dedicated thread)
 # -------------------------
 
 class _Task:
-    __slots__ = ("fn", "args", "kwargs", "ev", "result", "error")
+    __slots__ = ("fn", "args", "kwargs", "ev", "result", "error", "ts")
     def __init__(self, fn: Callable, *args, **kwargs):
         self.fn = fn
         self.args = args
@@ -43,16 +79,104 @@ class _Task:
         self.ev = threading.Event()
         self.result: Any = None
         self.error: Optional[BaseException] = None
+        self.ts = time.monotonic()
+
+class _Pacer:
+    """
+    Token bucket voor uitgaande API-berichten (enkel gebruikt op de IB-thread).
+    reserve() neemt altijd tokens (het saldo mag negatief worden) en geeft de wachttijd terug:
+    bursts worden uitgesmeerd in volgorde van aanvraag, nooit gedropt.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.ts = time.monotonic()
+        self.by_kind: Dict[str, int] = {}
+        self.sent: "deque[Tuple[float, int]]" = deque()   # (verzendtijd, n) van de laatste seconde
+        self.waits = 0
+        self.wait_total = 0.0
+        self.last_wait = 0.0
+
+    def reserve(self, kind: str, n: int = 1) -> float:
+        now = time.monotonic()
+        self.by_kind[kind] = self.by_kind.get(kind, 0) + n
+        if self.rate <= 0:
+            wait = 0.0
+        else:
+            self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate) - n
+            self.ts = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        self.sent.append((now + wait, n))
+        self.last_wait = wait
+        if wait > 0:
+            self.waits += 1
+            self.wait_total += wait
+        return wait
+
+    def current_rate(self) -> int:
+        """Berichten verzonden (of ingepland) in de laatste seconde."""
+        now = time.monotonic()
+        while self.sent and self.sent[0][0] < now - 1.0:
+            self.sent.popleft()
+        return sum(n for ts, n in self.sent if ts <= now)
+
+# prioriteiten: orders/status eerst, bulk (historische data) enkel als er niets anders wacht
+PRIO_HIGH = 0
+PRIO_LOW = 10
+
+# hooks die 1x na de eerste geslaagde connect op de IB-thread draaien: fn(ib)
+# (events op het IB-object zelf blijven hangen na een reconnect; Trade-objecten en hun
+# statusEvent/fillEvent niet: ib.reset() gooit ze weg, zie _retrack_reconnect)
+_CONNECT_HOOKS: List[Callable[["IB"], None]] = []
+# hooks na elke reconnect (bv. market data opnieuw aanvragen): fn(ib)
+_RECONNECT_HOOKS: List[Callable[["IB"], None]] = []
+
+def on_connect(fn: Callable[["IB"], None]) -> Callable[["IB"], None]:
+    _CONNECT_HOOKS.append(fn)
+    return fn
+
+def on_reconnect(fn: Callable[["IB"], None]) -> Callable[["IB"], None]:
+    _RECONNECT_HOOKS.append(fn)
+    return fn
+
+class SessionDown(RuntimeError):
+    """IB-sessie niet verbonden: taken falen meteen i.p.v. te wachten op een reconnect."""
 
 class IBRunner:
+    """
+    Dedicated IB-thread met state machine:
+      idle -> connecting -> connected -> disconnected -> reconnecting -> connected ...
+    (failed = eerste connect mislukt; er wordt met backoff opnieuw geprobeerd)
+    Heartbeat: reqCurrentTime elke _HB_SEC; RTT wordt bijgehouden, te veel missers = reconnect.
+    Buiten 'connected' falen taken meteen (SessionDown).
+    """
+
     def __init__(self):
         if IB is None:
             raise RuntimeError(f"ib_insync not available: {_IMPORT_ERROR!r}")
-        self._q: "Queue[_Task]" = Queue()
+        self._q: "PriorityQueue[Tuple[int, int, _Task]]" = PriorityQueue()
+        self._seq = itertools.count()
         self._thread = threading.Thread(target=self._thread_main, name="IBKR-Thread", daemon=True)
         self._started = False
         self._lock = threading.Lock()
         self.ib: Optional[IB] = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+        self.transitions: "deque[Tuple[float, str, Optional[str]]]" = deque(maxlen=50)
+        self.reconnects = 0
+        self._lost: Optional[str] = None      # reden van sessieverlies (gezet op de IB-thread)
+        self._state_ev = threading.Event()    # gezet zodra connecting/reconnecting afgelopen is
+        # heartbeat
+        self.rtt_ms: Optional[float] = None
+        self.rtt_avg_ms: Optional[float] = None
+        self.last_heartbeat: Optional[float] = None
+        self.hb_failures = 0
+        self._pacer = _Pacer(_MSG_RATE, _MSG_BURST)
+        self._queue_delay = 0.0     # EWMA (s) van de wachttijd in de task queue
+        self._last_queue_delay = 0.0
 
     def start(self):
         with self._lock:
@@ -60,6 +184,19 @@ class IBRunner:
                 self._thread.start()
                 self._started = True
 
+    def wait_settled(self, timeout: float) -> str:
+        """Wacht tot een lopende (re)connect afgelopen is; return de state."""
+        self._state_ev.wait(timeout)
+        return self.state
+
+    def _set_state(self, state: str, detail: Optional[str] = None) -> None:
+        self.state = state
+        self.transitions.append((time.time(), state, detail))
+        if state in ("connecting", "reconnecting"):
+            self._state_ev.clear()
+        else:
+            self._state_ev.set()
+
     def _ensure_loop_in_thread(self):
         import asyncio
         try:
@@ -69,22 +206,81 @@ class IBRunner:
             asyncio.set_event_loop(loop)
 
     def _thread_main(self):
-        # 1) event loop
         self._ensure_loop_in_thread()
-        # 2) IB connect (blocking)
         self.ib = IB()
-        ok = self.ib.connect(_HOST, _PORT, clientId=_CLIENT_ID, readonly=False)
-        if not ok:
-            err = RuntimeError(f"IB.connect failed to {_HOST}:{_PORT} (clientId={_CLIENT_ID})")
-            # drain queue with error
-            while True:
-                task: _Task = self._q.get()
-                task.error = err
-                task.ev.set()
-                self._q.task_done()
-        # 3) task loop
+        self.ib.disconnectedEvent += self._on_disconnected
+        backoff = _RECONNECT_MIN_SEC
+        first = True
         while True:
-            task: _Task = self._q.get()
+            self._set_state("connecting" if first else "reconnecting")
+            if self._connect(first):
+                backoff = _RECONNECT_MIN_SEC
+                if not first:
+                    self.reconnects += 1
+                first = False
+                reason = self._serve()
+                self._set_state("disconnected", reason)
+            else:
+                self._set_state("failed" if first else "disconnected", self.error)
+            self._fail_pending(SessionDown(f"IB session down: {self.error or self.state}"))
+            self._drain_for(backoff)
+            backoff = min(backoff * 2, _RECONNECT_MAX_SEC)
+
+    def _connect(self, first: bool) -> bool:
+        self._lost = None
+        try:
+            ok = self.ib.connect(_HOST, _PORT, clientId=_CLIENT_ID, readonly=False, timeout=_CONNECT_TIMEOUT_SEC)
+            if ok is False:
+                raise RuntimeError(f"IB.connect failed to {_HOST}:{_PORT} (clientId={_CLIENT_ID})")
+        except Exception as e:
+            self.error = f"{e.__class__.__name__}: {e}"
+            try:
+                self.ib.disconnect()
+            except Exception:
+                pass
+            return False
+        hooks = _CONNECT_HOOKS if first else _RECONNECT_HOOKS
+        for hook in hooks:
+            try:
+                hook(self.ib)
+            except Exception:
+                pass
+        self.error = None
+        self.hb_failures = 0
+        self.connected_at = time.time()
+        self._set_state("connected")
+        return True
+
+    def _on_disconnected(self) -> None:
+        if self._lost is None:
+            self._lost = "disconnected by gateway"
+
+    def _serve(self) -> str:
+        """Task loop tot de sessie wegvalt; return de reden."""
+        # idle -> loop laten draaien zodat events/flushes niet op de volgende taak wachten
+        pump = _PUMP_MS / 1000.0
+        next_hb = time.monotonic() + _HB_SEC
+        while True:
+            if self._lost is None and not self.ib.isConnected():
+                self._lost = "connection lost"
+            if self._lost is not None:
+                return self._lost
+            now = time.monotonic()
+            if _HB_SEC > 0 and now >= next_hb:
+                self._heartbeat()
+                next_hb = time.monotonic() + _HB_SEC
+                continue
+            try:
+                _, _, task = self._q.get(timeout=pump)
+            except Empty:
+                try:
+                    self.ib.sleep(0)
+                except Exception:
+                    pass
+                continue
+            d = time.monotonic() - task.ts
+            self._last_queue_delay = d
+            self._queue_delay += 0.1 * (d - self._queue_delay)
             try:
                 task.result = task.fn(self.ib, *task.args, **task.kwargs)
             except BaseException as e:
@@ -93,27 +289,181 @@ class IBRunner:
                 task.ev.set()
                 self._q.task_done()
 
-    def run(self, fn: Callable, *args, **kwargs):
+    def _heartbeat(self) -> None:
+        """reqCurrentTime round trip; na _HB_MAX_FAILURES missers op rij: sessie als verloren beschouwen."""
+        import asyncio
+        t0 = time.perf_counter()
+        try:
+            self._pace("reqCurrentTime")
+            self.ib.run(asyncio.wait_for(self.ib.reqCurrentTimeAsync(), _HB_TIMEOUT_SEC))
+        except Exception as e:
+            self.hb_failures += 1
+            self.error = f"heartbeat: {e.__class__.__name__}: {e}"
+            if self.hb_failures >= _HB_MAX_FAILURES:
+                self._lost = f"heartbeat failed {self.hb_failures}x"
+                try:
+                    self.ib.disconnect()
+                except Exception:
+                    pass
+            return
+        rtt = (time.perf_counter() - t0) * 1000.0
+        self.rtt_ms = round(rtt, 3)
+        self.rtt_avg_ms = round(rtt if self.rtt_avg_ms is None else self.rtt_avg_ms + 0.2 * (rtt - self.rtt_avg_ms), 3)
+        self.last_heartbeat = time.time()
+        self.hb_failures = 0
+        self.error = None
+
+    def _fail_pending(self, err: BaseException) -> None:
+        while True:
+            try:
+                _, _, task = self._q.get_nowait()
+            except Empty:
+                return
+            task.error = err
+            task.ev.set()
+            self._q.task_done()
+
+    def _drain_for(self, seconds: float) -> None:
+        """Backoff vóór de volgende connect-poging; taken die toch binnenkomen falen meteen."""
+        deadline = time.monotonic() + seconds
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return
+            try:
+                _, _, task = self._q.get(timeout=left)
+            except Empty:
+                return
+            task.error = SessionDown(f"IB session down: {self.error or self.state}")
+            task.ev.set()
+            self._q.task_done()
+
+    def _submit(self, priority: int, fn: Callable, args, kwargs):
         self.start()
+        if self.state != "connected":
+            raise SessionDown(f"IB session {self.state}: {self.error or 'not connected'}")
         task = _Task(fn, *args, **kwargs)
-        self._q.put(task)
+        self._q.put((priority, next(self._seq), task))
         task.ev.wait()
         if task.error:
             raise task.error
         return task.result
 
+    def health(self) -> Dict[str, Any]:
+        return {
+            "ready": self.state == "connected",
+            "state": self.state,
+            "error": self.error,
+            "connected_at": self.connected_at,
+            "reconnects": self.reconnects,
+            "rtt_ms": self.rtt_ms,
+            "rtt_avg_ms": self.rtt_avg_ms,
+            "last_heartbeat": self.last_heartbeat,
+            "heartbeat_failures": self.hb_failures,
+            "transitions": [{"ts": ts, "state": st, "detail": d} for ts, st, d in list(self.transitions)[-10:]],
+        }
+
+    def _pace(self, kind: str, n: int = 1) -> None:
+        """
+        Vóór elk uitgaand bericht aanroepen (op de IB-thread, buiten coroutines).
+        Wacht via ib.sleep: events blijven binnenkomen terwijl de burst uitgesmeerd wordt.
+        """
+        wait = self._pacer.reserve(kind, n)
+        if wait > 0:
+            self.ib.sleep(wait)
+
+    async def _pace_async(self, kind: str, n: int = 1) -> None:
+        """Idem voor coroutines op de IB-loop (submit_async)."""
+        wait = self._pacer.reserve(kind, n)
+        if wait > 0:
+            import asyncio
+            await asyncio.sleep(wait)
+
+    def pacer_stats(self) -> Dict[str, Any]:
+        p = self._pacer
+        return {
+            "max_rate": p.rate,
+            "burst": p.burst,
+            "rate": p.current_rate(),
+            "tokens": round(min(p.burst, p.tokens + (time.monotonic() - p.ts) * p.rate), 2) if p.rate > 0 else None,
+            "pace_waits": p.waits,
+            "pace_wait_total_ms": round(p.wait_total * 1000, 1),
+            "last_pace_wait_ms": round(p.last_wait * 1000, 1),
+            "queue_depth": self._q.qsize(),
+            "queue_delay_ms": round(self._queue_delay * 1000, 2),
+            "last_queue_delay_ms": round(self._last_queue_delay * 1000, 2),
+            "messages": dict(p.by_kind),
+        }
+
+    def run(self, fn: Callable, *args, **kwargs):
+        return self._submit(PRIO_HIGH, fn, args, kwargs)
+
+    def run_low(self, fn: Callable, *args, **kwargs):
+        """Zoals run(), maar pas als er geen high-priority taken meer wachten."""
+        return self._submit(PRIO_LOW, fn, args, kwargs)
+
+    def submit_async(self, coro_fn: Callable, *args) -> "concurrent.futures.Future":
+        """
+        Start coro_fn(ib, *args) op de IB-loop via de low lane en return meteen een Future.
+        De coroutine loopt verder tijdens andere taken/idle pumps: de task-loop blokkeert niet.
+        """
+        cf: "concurrent.futures.Future" = concurrent.futures.Future()
+
+        def _start(ib):
+            import asyncio
+            fut = asyncio.ensure_future(coro_fn(ib, *args))
+
+            def _done(f):
+                if f.cancelled():
+                    cf.cancel()
+                elif f.exception() is not None:
+                    cf.set_exception(f.exception())
+                else:
+                    cf.set_result(f.result())
+            fut.add_done_callback(_done)
+
+        self.run_low(_start)
+        return cf
+
 _runner = IBRunner()
 
 # -------------------------
 # Helpers
 # -------------------------
 
+# (symbol, exchange) -> gekwalificeerd contract; scheelt 1 reqContractDetails per order
+_CONTRACTS: Dict[Tuple[str, str], Any] = {}
+
 def _qualified_stock(ib: IB, symbol: str, exchange: str = "SMART"):
+    key = (symbol, exchange)
+    c = _CONTRACTS.get(key)
+    if c is not None:
+        return c
+    _runner._pace("reqContractDetails")
     base = Stock(symbol=symbol, exchange=exchange, currency="USD")
     q = ib.qualifyContracts(base)
     if not q:
         raise RuntimeError(f"kon contract niet kwalificeren: {symbol}/{exchange}/USD")
-    return q[0]
+    c = _CONTRACTS[key] = q[0]
+    return c
+
+async def _qualified_stock_async(ib: IB, symbol: str):
+    c = _CONTRACTS.get((symbol, "SMART"))
+    if c is None:
+        await _runner._pace_async("reqContractDetails")
+        q = await ib.qualifyContractsAsync(Stock(symbol=symbol, exchange="SMART", currency="USD"))
+        if not q:
+            raise RuntimeError(f"kon contract niet kwalificeren: {symbol}/SMART/USD")
+        c = _CONTRACTS[(symbol, "SMART")] = q[0]
+    return c
+
+def _place(ib: IB, contract, order):
+    _runner._pace("placeOrder")
+    return ib.placeOrder(contract, order)
+
+def _cancel(ib: IB, order) -> None:
+    _runner._pace("cancelOrder")
+    ib.cancelOrder(order)
 
 def _build_order(order: dict) -> Order:
     side = (order.get("side") or "BUY").upper()
@@ -140,7 +490,7 @@ def _place_simple(ib: IB, order: dict):
         raise ValueError("order.symbol ontbreekt")
     exchange = order.get("exchange", "SMART")
     c = _qualified_stock(ib, symbol, exchange)
-    trade = ib.placeOrder(c, _build_order(order))
+    trade = _place(ib, c, _build_order(order))
     return trade
 
 def _opposite(side: str) -> str:
@@ -163,7 +513,7 @@ def _manual_bracket(ib: IB, base_order: dict, target_price: float, stop_price: f
     parent = MarketOrder(action=side, totalQuantity=qty)
     parent.tif = tif
     parent.transmit = False
-    parent_trade = ib.placeOrder(c, parent)
+    parent_trade = _place(ib, c, parent)
 
     # wacht even tot orderId er is
     ib.sleep(0.25)
@@ -191,9 +541,9 @@ def _manual_bracket(ib: IB, base_order: dict, target_price: float, stop_price: f
     stop.ocaType  = 1
     stop.transmit = True
 
-    profit_trade = ib.placeOrder(c, profit)
+    profit_trade = _place(ib, c, profit)
     ib.sleep(0.15)
-    stop_trade = ib.placeOrder(c, stop)
+    stop_trade = _place(ib, c, stop)
 
     return parent_trade, profit_trade, stop_trade
 
@@ -219,7 +569,7 @@ def _place_bracket(ib: IB, base_order: dict, target_price: float, stop_price: fl
         )
         parent.tif = profit.tif = stop.tif = tif
         # parent eerst
-        pt = ib.placeOrder(c, parent)
+        pt = _place(ib, c, parent)
         ib.sleep(0.25)
         pid = getattr(pt.order, "orderId", None)
         if pid is None:
@@ -228,9 +578,9 @@ def _place_bracket(ib: IB, base_order: dict, target_price: float, stop_price: fl
         # forceer relationele velden
         profit.parentId = pid; profit.transmit = False
         stop.parentId   = pid; stop.transmit   = True
-        pr = ib.placeOrder(c, profit)
+        pr = _place(ib, c, profit)
         ib.sleep(0.15)
-        st = ib.placeOrder(c, stop)
+        st = _place(ib, c, stop)
         return pt, pr, st
     except TypeError:
         # oudere ib_insync signatuur? -> manual
@@ -240,19 +590,11 @@ def _place_bracket(ib: IB, base_order: dict, target_price: float, stop_price: fl
 # RESULTS updates
 # -------------------------
 
-def _coerce_filled(trade) -> int:
+def _filled_of(status) -> int:
     try:
-        val = getattr(trade, "filled", None)
-        if callable(val):
-            val = val()
-        if val is None:
-            val = getattr(trade.orderStatus, "filled", 0)
-        return int(val or 0)
+        return int(status.filled or 0)
     except Exception:
-        try:
-            return int(getattr(trade.orderStatus, "filled", 0) or 0)
-        except Exception:
-            return 0
+        return 0
 
 def _get_limit_price(order) -> Optional[float]:
     for a in ("lmtPrice", "limitPrice"):
@@ -274,60 +616,189 @@ def _get_stop_price(order) -> Optional[float]:
                 pass
     return None
 
-def _update_results_from_trade(trade, internal_id: str):
+def _order_detail(order) -> dict:
+    """Statische orderdetails: 1x per internal_id opgebouwd, niet per event."""
+    return {
+        "action": order.action,
+        "totalQuantity": order.totalQuantity,
+        "orderType": order.orderType,
+        "lmtPrice": _get_limit_price(order),
+        "stopPrice": _get_stop_price(order),
+        "tif": order.tif,
+    }
+
+def _update_results_from_trade(trade, internal_id: str) -> bool:
+    """
+    Hot path (elk status/fill event): record in-place bijwerken en enkel bij
+    een echte wijziging een nieuwe snapshot publiceren in RESULTS.
+    Return True wanneer RESULTS[internal_id] veranderde.
+    """
     try:
-        status = (getattr(trade.orderStatus, "status", None) or "unknown").lower()
-        filled = _coerce_filled(trade)
-        avg    = getattr(trade.orderStatus, "avgFillPrice", None)
-        oid    = getattr(trade.order, "orderId", None)
-        RESULTS[internal_id] = {
-            "status": status,
-            "filled_qty": filled,
-            "avg_price": avg,
-            "detail": {
-                "action": trade.order.action,
-                "totalQuantity": trade.order.totalQuantity,
-                "orderType": trade.order.orderType,
-                "lmtPrice": _get_limit_price(trade.order),
-                "stopPrice": _get_stop_price(trade.order),
-                "tif": trade.order.tif,
-            },
-            "ibkr_order_id": oid,
-            "adapter": "ibkr",
-        }
+        rec = RECORDS.get(internal_id)
+        if rec is None:
+            rec = ensure_record(internal_id, "ibkr", _order_detail(trade.order))
+        st = trade.orderStatus
+        o = trade.order
+        if rec.update((st.status or "unknown").lower(), _filled_of(st), st.avgFillPrice, o.orderId, o.permId or None):
+            publish(rec)
+            return True
+        return False
     except Exception as e:
         RESULTS[internal_id] = {"status": "error", "error": str(e), "adapter": "ibkr"}
+        return True
+
+class _Coalescer:
+    """
+    Bundelt trade-events per internal_id (draait volledig op de IB-thread).
+    - window 0: flush aan het eind van de huidige loop-iteratie (call_soon)
+    - window > 0: flush na window seconden (call_later)
+    Laatste trade-state wint; listeners krijgen 1 notify per batch.
+    """
+
+    def __init__(self, window_sec: float):
+        self.window = window_sec
+        self._pending: Dict[str, Any] = {}
+        self._scheduled = False
+
+    def mark(self, trade, internal_id: str) -> None:
+        self._pending[internal_id] = trade
+        if not self._scheduled:
+            self._scheduled = True
+            import asyncio
+            loop = asyncio.get_event_loop()
+            if self.window > 0:
+                loop.call_later(self.window, self.flush)
+            else:
+                loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        self._scheduled = False
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        changed = [iid for iid, tr in batch.items() if _update_results_from_trade(tr, iid)]
+        if changed:
+            notify(changed)
+
+_coalescer = _Coalescer(_COALESCE_MS / 1000.0)
 
 def _bind_trade_events(trade, internal_id: str):
-    def _on_update(_tr, *args):
-        _update_results_from_trade(_tr, internal_id)
+    def _on_event(tr, *args):
+        _coalescer.mark(tr, internal_id)
     if hasattr(trade, "updateEvent"):
-        trade.updateEvent += _on_update
+        trade.updateEvent += _on_event
     else:
+        # status + fills vuren vaak samen voor 1 partial fill -> coalescer maakt er 1 update van
         if hasattr(trade, "statusEvent"):
-            trade.statusEvent += lambda tr: _update_results_from_trade(tr, internal_id)
-        if hasattr(trade, "fillsEvent"):
-            trade.fillsEvent  += lambda tr, *a: _update_results_from_trade(tr, internal_id)
+            trade.statusEvent += _on_event
+        if hasattr(trade, "fillEvent"):
+            trade.fillEvent += _on_event
+
+# ib orderId -> internal_id (voor events op IB-niveau, bv. execDetails)
+_IID_BY_OID: Dict[int, str] = {}
+
+def _track(trade, internal_id: str) -> None:
+    """Bind events + eerste snapshot. Enkel aanroepen op de IB-thread (single writer)."""
+    oid = getattr(trade.order, "orderId", None)
+    if oid:
+        _IID_BY_OID[int(oid)] = internal_id
+    _bind_trade_events(trade, internal_id)
+    if _update_results_from_trade(trade, internal_id):
+        notify([internal_id])
+
+def _place_simple_tracked(ib: IB, order: dict, internal_id: Optional[str]):
+    tr = _place_simple(ib, order)
+    if internal_id:
+        _track(tr, internal_id)
+    return tr
+
+def _place_bracket_tracked(ib: IB, base_order: dict, target_price: float, stop_price: float, internal_ids: Dict[str, str]):
+    pt, pr, st = _place_bracket(ib, base_order, target_price, stop_price)
+    _track(pt, internal_ids["parent"])
+    _track(pr, internal_ids["target"])
+    _track(st, internal_ids["stop"])
+    return pt, pr, st
+
+@on_connect
+def _retrack_replayed(ib: IB):
+    """
+    Na een herstart: RESULTS komt uit de journal-replay, maar _IID_BY_OID en de trade-events niet.
+    Index opnieuw opbouwen (ook afgewerkte orders: late execDetails/commissions) en de open trades
+    van deze clientId opnieuw volgen. Vóór _bind_ledger geregistreerd, zodat fills meteen matchen.
+    """
+    for iid, res in list(RESULTS.items()):
+        oid = res.get("ibkr_order_id")
+        if oid and res.get("adapter") == "ibkr":
+            _IID_BY_OID.setdefault(int(oid), iid)
+    _retrack_open(ib)
+
+@on_reconnect
+def _retrack_reconnect(ib: IB):
+    """Na een reconnect zijn de oude Trade-objecten (en hun events) weg: open trades opnieuw volgen."""
+    _retrack_open(ib)
+
+def _retrack_open(ib: IB) -> None:
+    for tr in ib.openTrades():
+        oid = getattr(tr.order, "orderId", 0)
+        iid = _IID_BY_OID.get(int(oid)) if oid else None
+        if iid is not None and getattr(tr.order, "clientId", _CLIENT_ID) == _CLIENT_ID:
+            _track(tr, iid)
+
+@on_connect
+def _bind_ledger(ib: IB):
+    """Elke execution + commission naar de fill ledger (ook fills van vóór _track)."""
+    def _on_exec(trade, fill):
+        record_ib_fill(fill, _IID_BY_OID.get(fill.execution.orderId))
+    def _on_commission(trade, fill, report):
+        record_ib_commission(fill, report)
+    ib.execDetailsEvent += _on_exec
+    ib.commissionReportEvent += _on_commission
+
+@on_connect
+def _bind_positions(ib: IB):
+    """Positie-cache seeden en live houden (IB stuurt posities na connect en na elke fill)."""
+    for p in ib.positions():
+        positions.on_ib_position(p)
+    for item in ib.portfolio():
+        positions.on_ib_portfolio(item)
+    ib.positionEvent += positions.on_ib_position
+    ib.updatePortfolioEvent += positions.on_ib_portfolio
 
 # -------------------------
 # Adapter
 # -------------------------
 
-class IbkrAdapter:
-    """Publieke adapter: single send + bracket + (legacy) cancel per internal_id."""
+class IbkrAdapter(AdapterBase):
+    """Publieke adapter: single send + batch + bracket + cancel per internal_id / per orderId."""
+    name = "ibkr"
 
     def send(self, order: dict, internal_id: Optional[str] = None) -> Tuple[bool, Dict[str, Any]]:
         try:
-            tr = _runner.run(_place_simple, order)
+            tr = _runner.run(_place_simple_tracked, order, internal_id)
             oid = getattr(tr.order, "orderId", None)
-            if internal_id:
-                _bind_trade_events(tr, internal_id)
-                _update_results_from_trade(tr, internal_id)
             status = (getattr(tr.orderStatus, "status", None) or "queued").lower()
             return True, {"status": status, "detail": order, "ibkr": True, "ibkr_order_id": oid}
         except Exception as e:
             return False, {"status": "error", "error": str(e), "detail": order}
 
+    def send_many(self, orders: List[Tuple[dict, Optional[str]]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """Alle orders in 1 IB-thread taak (1 queue-roundtrip i.p.v. 1 per order)."""
+        def _inner(ib: IB, batch):
+            out = []
+            for order, iid in batch:
+                try:
+                    tr = _place_simple_tracked(ib, order, iid)
+                    oid = getattr(tr.order, "orderId", None)
+                    status = (getattr(tr.orderStatus, "status", None) or "queued").lower()
+                    out.append((True, {"status": status, "detail": order, "ibkr": True, "ibkr_order_id": oid}))
+                except Exception as e:
+                    out.append((False, {"status": "error", "error": str(e), "detail": order}))
+            return out
+        try:
+            return _runner.run(_inner, list(orders))
+        except Exception as e:
+            return [(False, {"status": "error", "error": str(e), "detail": o}) for o, _ in orders]
+
     def place_bracket(
         self,
         *,
@@ -337,10 +808,7 @@ class IbkrAdapter:
         internal_ids: Dict[str, str],
     ) -> Tuple[bool, Dict[str, Any]]:
         try:
-            pt, pr, st = _runner.run(_place_bracket, base_order, float(target_price), float(stop_price))
-            _bind_trade_events(pt, internal_ids["parent"]); _update_results_from_trade(pt, internal_ids["parent"])
-            _bind_trade_events(pr, internal_ids["target"]); _update_results_from_trade(pr, internal_ids["target"])
-            _bind_trade_events(st, internal_ids["stop"]);   _update_results_from_trade(st, internal_ids["stop"])
+            pt, pr, st = _runner.run(_place_bracket_tracked, base_order, float(target_price), float(stop_price), internal_ids)
             ibkr_ids = {
                 "parent": getattr(pt.order, "orderId", None),
                 "target": getattr(pr.order, "orderId", None),
@@ -361,17 +829,58 @@ class IbkrAdapter:
                 # probeer trade → anders directe cancel op losse Order(orderId=...)
                 tr = next((t for t in ib.trades() if getattr(t.order, "orderId", None) == int(oid)), None)
                 if tr:
-                    ib.cancelOrder(tr.order)
+                    _cancel(ib, tr.order)
                     return True
                 o = Order()
                 o.orderId = int(oid)
-                ib.cancelOrder(o)
+                _cancel(ib, o)
                 return True
             ok = _runner.run(_cancel_one, int(ibkr_id))
             return {"ok": bool(ok)}
         except Exception as e:
             return {"ok": False, "error": str(e)}
 
+    def cancel_bracket(self, order_ids) -> int:
+        ids = [int(x) for x in order_ids if x is not None]
+        cancel_bracket(ids)
+        return len(ids)
+
+    def start(self) -> None:
+        """Connect op de IB-thread starten (niet wachten: readiness() toont de voortgang)."""
+        _runner.start()
+
+    def readiness(self) -> Dict[str, Any]:
+        return {**_runner.health(), "host": _HOST, "port": _PORT, "clientId": _CLIENT_ID}
+
+    def reference_price(self, symbol: str) -> Optional[float]:
+        """Snapshot (reqTickers) op de low lane; de ticker komt via pendingTickersEvent ook in QUOTES."""
+        async def _req(ib: IB, sym: str):
+            c = await _qualified_stock_async(ib, sym)
+            await _runner._pace_async("reqMktData")
+            tickers = await ib.reqTickersAsync(c)
+            return tickers[0].marketPrice() if tickers else None
+        try:
+            px = _runner.submit_async(_req, symbol).result(_SNAPSHOT_TIMEOUT_SEC)
+        except Exception:
+            return None
+        return float(px) if px and px == px and 0 < px < _UNSET else None
+
+    def broker_orders(self) -> List[Dict[str, Any]]:
+        return broker_orders()
+
+    def run_on_writer(self, fn, *args):
+        return _runner.run(lambda ib, *a: fn(*a), *args)
+
+    def ensure_ready(self) -> None:
+        """Fail fast als de sessie niet verbonden is (eerste gebruik zonder startup: 1x op de connect wachten)."""
+        if _runner.state == "connected":
+            return
+        if _runner.state == "idle":
+            _runner.start()
+            _runner.wait_settled(_CONNECT_TIMEOUT_SEC + 1.0)
+        if _runner.state != "connected":
+            raise AdapterUnavailable(f"ibkr session {_runner.state}: {_runner.error or 'not connected'}")
+
 ADAPTER = IbkrAdapter()
 
 # -------------------------
@@ -381,14 +890,17 @@ ADAPTER = IbkrAdapter()
 def _prime_orders(ib: IB):
     """Zorg dat IB zijn caches vult (open & completed orders)."""
     try:
+        _runner._pace("reqOpenOrders")
         ib.reqOpenOrders()
     except Exception:
         pass
     try:
+        _runner._pace("reqAllOpenOrders")
         ib.reqAllOpenOrders()
     except Exception:
         pass
     try:
+        _runner._pace("reqCompletedOrders")
         ib.reqCompletedOrders(apiOnly=True)
     except Exception:
         pass
@@ -407,6 +919,10 @@ def _find_trade_by_order_id(ib: IB, order_id: int):
             return tr
     return None
 
+def pacer_stats() -> Dict[str, Any]:
+    """Huidige berichtrate, pacing-wachttijden en queue delay van de IB-thread."""
+    return _runner.pacer_stats()
+
 def get_order_status(order_id: int) -> Optional[str]:
     """
     Geef status string ('submitted'/'filled'/'cancelled'/...) of None wanneer onbekend.
@@ -435,6 +951,58 @@ def get_order_status(order_id: int) -> Optional[str]:
         return None
     return _runner.run(_inner, int(order_id))
 
+# ib_insync UNSET_DOUBLE (sys.float_info.max) voor niet-gezette velden
+_UNSET = 1e300
+
+def _broker_row(tr, oid: int) -> Dict[str, Any]:
+    st = tr.orderStatus
+    filled = _filled_of(st)
+    # completed orders: orderStatus is leeg, de fill staat enkel op de order
+    fq = getattr(tr.order, "filledQuantity", 0) or 0
+    if 0 < fq < _UNSET:
+        filled = max(filled, int(fq))
+    avg = st.avgFillPrice or None
+    return {
+        "order_id": oid,
+        "perm_id": tr.order.permId or None,
+        "status": (st.status or "unknown").lower(),
+        "filled_qty": filled,
+        "avg_price": avg,
+        "symbol": getattr(tr.contract, "symbol", None),
+    }
+
+def broker_orders(timeout: float = 60.0) -> List[Dict[str, Any]]:
+    """
+    Open + completed orders van deze clientId in 1 bulk-opvraging (2 requests, low lane).
+    Completed orders komen vaak met orderId 0: via permId terug naar de orderId, uit de trades van deze
+    clientId in deze sessie of uit de perm_id in RESULTS (orders van vóór een herstart, via de journal).
+    """
+    async def _req(ib: IB):
+        await _runner._pace_async("reqAllOpenOrders")
+        open_trades = await ib.reqAllOpenOrdersAsync()
+        await _runner._pace_async("reqCompletedOrders")
+        done = await ib.reqCompletedOrdersAsync(False)
+        by_perm = {
+            r["perm_id"]: r["ibkr_order_id"] for r in list(RESULTS.values())
+            if r.get("perm_id") and r.get("ibkr_order_id") and r.get("adapter") == "ibkr"
+        }
+        by_perm.update(
+            (t.order.permId, t.order.orderId) for t in ib.trades()
+            if t.order.clientId == _CLIENT_ID and t.order.orderId > 0 and t.order.permId
+        )
+        rows: Dict[int, Dict[str, Any]] = {}
+        # open na completed: een order die in beide zit is nog niet af
+        for tr in list(done) + list(open_trades):
+            o = tr.order
+            oid = by_perm.get(o.permId) if o.permId else None
+            if oid is None:
+                if o.clientId != _CLIENT_ID or o.orderId <= 0:
+                    continue        # manuele TWS-orders / andere clients: niet van ons
+                oid = o.orderId
+            rows[oid] = _broker_row(tr, oid)
+        return list(rows.values())
+    return _runner.submit_async(_req).result(timeout)
+
 def cancel_bracket(ib_ids: List[int]) -> None:
     """
     Cancel alle IB orderIds in dezelfde IB-thread/verbinding.
@@ -452,11 +1020,11 @@ def cancel_bracket(ib_ids: List[int]) -> None:
             tr = _find_trade_by_order_id(ib, int(oid))
             try:
                 if tr is not None:
-                    ib.cancelOrder(tr.order)
+                    _cancel(ib, tr.order)
                 else:
                     o = Order()
                     o.orderId = int(oid)
-                    ib.cancelOrder(o)
+                    _cancel(ib, o)
             except Exception as exc:
                 errors.append(f"orderId {oid}: {exc}")
         if errors:
@@ -464,3 +1032,66 @@ def cancel_bracket(ib_ids: List[int]) -> None:
         return None
 
     _runner.run(_inner, [int(x) for x in ib_ids])
+
+# -------------------------
+# Market data (gedeelde quote cache in server.modules.data.market)
+# -------------------------
+
+_TICKERS: Dict[str, Any] = {}
+
+@on_connect
+def _bind_market_data(ib: IB):
+    # 1 callback per loop-iteratie met alle gewijzigde tickers
+    ib.pendingTickersEvent += market.on_ib_tickers
+
+@on_reconnect
+def _resubscribe_market_data(ib: IB):
+    """Na een reconnect zijn de oude tickers dood: opnieuw aanvragen."""
+    for sym, t in list(_TICKERS.items()):
+        _runner._pace("reqMktData")
+        _TICKERS[sym] = ib.reqMktData(t.contract, "", False, False)
+
+def subscribe_market_data(symbol: str) -> None:
+    def _inner(ib: IB, sym: str):
+        if sym in _TICKERS:
+            return
+        c = _qualified_stock(ib, sym)
+        _runner._pace("reqMktData")
+        _TICKERS[sym] = ib.reqMktData(c, "", False, False)
+    _runner.run(_inner, symbol)
+
+def unsubscribe_market_data(symbol: str) -> None:
+    def _inner(ib: IB, sym: str):
+        t = _TICKERS.pop(sym, None)
+        if t is not None:
+            _runner._pace("cancelMktData")
+            ib.cancelMktData(t.contract)
+    _runner.run(_inner, symbol)
+
+# -------------------------
+# Historische bars (low lane + async request: blokkeert de order-flow niet)
+# -------------------------
+
+def _bar_ts(d) -> float:
+    if isinstance(d, datetime):
+        if d.tzinfo is None:
+            d = d.replace(tzinfo=timezone.utc)
+        return d.timestamp()
+    # daily bars: datetime.date
+    return float(calendar.timegm(d.timetuple()))
+
+def fetch_historical_bars(
+    symbol: str, bar_size: str, end_ts: float, duration: str,
+    what: str = "TRADES", use_rth: bool = False, timeout: float = 120.0,
+) -> List[Tuple[float, float, float, float, float, float]]:
+    """1 chunk historische bars eindigend op end_ts: [(ts, open, high, low, close, volume), ...]"""
+    async def _req(ib: IB, sym: str):
+        c = await _qualified_stock_async(ib, sym)
+        end = datetime.fromtimestamp(end_ts, tz=timezone.utc)
+        await _runner._pace_async("reqHistoricalData")
+        return await ib.reqHistoricalDataAsync(c, end, duration, bar_size, what, use_rth, formatDate=2)
+    bars = _runner.submit_async(_req, symbol).result(timeout)
+    return [
+        (_bar_ts(b.date), float(b.open), float(b.high), float(b.low), float(b.close), float(b.volume))
+        for b in (bars or [])
+    ]
@@ -0,0 +1,115 @@
+"""
+Adapter registry.
+- ontdekking: elk subpackage van adapters/ met een adapter.py die ADAPTER exposeert
+  (zonder import: ib_insync wordt pas geladen als de ibkr adapter echt gebruikt wordt)
+- register(): adapters van buiten het package (tests, plugins)
+- 1 instantie per naam, lazy aangemaakt en gecachet
+- routing: expliciete naam > account-route (ADAPTER_ROUTES="DU123=ibkr,paper=sim") > IBKR_ADAPTER
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import importlib
+import importlib.util
+import os
+import pkgutil
+import threading
+
+# "mock" was de oude sleep-worker; die naam loopt nu via de sim adapter
+_ALIASES = {"mock": "sim"}
+
+_FACTORIES: Dict[str, Callable[[], Any]] = {}
+_INSTANCES: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, factory: Callable[[], Any]) -> None:
+    """factory() wordt 1x aangeroepen bij het eerste gebruik."""
+    with _lock:
+        _FACTORIES[name.lower()] = factory
+        _INSTANCES.pop(name.lower(), None)
+
+
+def _module_factory(modname: str) -> Callable[[], Any]:
+    def _factory():
+        return importlib.import_module(modname).ADAPTER
+    return _factory
+
+
+def _discover() -> None:
+    from server.modules.order_transmitting import adapters
+    for m in pkgutil.iter_modules(adapters.__path__):
+        if not m.ispkg or m.name in _FACTORIES:
+            continue
+        modname = f"{adapters.__name__}.{m.name}.adapter"
+        if importlib.util.find_spec(modname) is not None:
+            _FACTORIES[m.name] = _module_factory(modname)
+
+
+def names() -> List[str]:
+    return sorted(_FACTORIES)
+
+
+def loaded() -> List[str]:
+    return sorted(_INSTANCES)
+
+
+def normalize(name: str) -> str:
+    n = (name or "").strip().lower()
+    return _ALIASES.get(n, n)
+
+
+def get(name: str) -> Any:
+    n = normalize(name)
+    inst = _INSTANCES.get(n)
+    if inst is not None:
+        return inst
+    with _lock:
+        inst = _INSTANCES.get(n)
+        if inst is None:
+            factory = _FACTORIES.get(n)
+            if factory is None:
+                raise KeyError(f"unknown adapter: {name} (available: {', '.join(names())})")
+            inst = _INSTANCES[n] = factory()
+    return inst
+
+
+def _parse_routes(raw: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for part in raw.split(","):
+        if "=" in part:
+            acct, name = part.split("=", 1)
+            if acct.strip():
+                out[acct.strip()] = normalize(name)
+    return out
+
+
+_ROUTES = _parse_routes(os.getenv("ADAPTER_ROUTES", ""))
+
+
+def set_route(account: str, name: str) -> None:
+    _ROUTES[account] = normalize(name)
+
+
+def routes() -> Dict[str, str]:
+    return dict(_ROUTES)
+
+
+def default_name() -> str:
+    return normalize(os.getenv("IBKR_ADAPTER", "sim"))
+
+
+def resolve_name(name: Optional[str] = None, account: Optional[str] = None) -> str:
+    if name:
+        return normalize(name)
+    if account and account in _ROUTES:
+        return _ROUTES[account]
+    return default_name()
+
+
+def resolve(name: Optional[str] = None, account: Optional[str] = None) -> Tuple[str, Any]:
+    n = resolve_name(name, account)
+    return n, get(n)
+
+
+_discover()
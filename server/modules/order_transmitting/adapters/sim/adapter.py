@@ -0,0 +1,657 @@
+"""
+Sim adapter: matching engine op virtuele tijd (load tests / ontwikkelen zonder TWS).
+- 1 engine-thread is de enige schrijver (zelfde model als de IB-thread): API-threads zetten
+  commando's in een inbox, de engine verwerkt ze in batches
+- events (order-aankomst na latency, cancels, price ticks) in een heap op virtuele tijd;
+  SIM_SPEED=1 volgt de wall clock, 0 = zo snel mogelijk (springt naar het volgende event)
+- per symbool een boek met heaps: BUY LMT (hoogste eerst), SELL LMT (laagste eerst) en stops per trigger
+- partial fills via beperkte liquiditeit per tick, brackets met OCA (1 fill annuleert de rest)
+- voedt dezelfde paden als IBKR: OrderRecord/RESULTS + notify, fill ledger en de quote cache
+"""
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import concurrent.futures
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+
+from server.modules.data.market import QUOTES, reference_price, subscriptions
+from server.modules.order_transmitting.adapters.base import AdapterBase
+from server.modules.results.ledger import record_fill
+from server.modules.results.records import ensure_record, publish, notify
+
+# ---- ENV ----
+_SPEED = float(os.getenv("SIM_SPEED", "1"))                   # virtuele sec per wall sec; 0 = max
+_LATENCY_MS = float(os.getenv("SIM_LATENCY_MS", "5"))         # gemiddelde order-latency
+_JITTER_MS = float(os.getenv("SIM_LATENCY_JITTER_MS", "2"))   # +/- uniform
+_TICK_MS = float(os.getenv("SIM_TICK_MS", "100"))             # interval van de price path
+_VOL = float(os.getenv("SIM_VOL", "0.0005"))                  # relatieve stdev per tick
+_SPREAD_BPS = float(os.getenv("SIM_SPREAD_BPS", "2"))
+_LIQUIDITY = float(os.getenv("SIM_LIQUIDITY", "500"))         # stuks per kant per tick; 0 = onbeperkt
+_START_PRICE = float(os.getenv("SIM_START_PRICE", "100"))
+_PRICE_PATH = os.getenv("SIM_PRICE_PATH", "random").lower()   # random | bars
+_BAR_SIZE = os.getenv("SIM_BAR_SIZE", "1 min")                # bar size voor SIM_PRICE_PATH=bars
+_SEED = os.getenv("SIM_SEED")
+
+# order states (zelfde namen als IB, lowercase)
+_PENDING = "pendingsubmit"
+_HELD = "presubmitted"       # bracket child wacht op de parent
+_WORKING = "submitted"
+_FILLED = "filled"
+_CANCELLED = "cancelled"
+_REJECTED = "inactive"       # commando kon niet verwerkt worden (zoals IB Inactive)
+_DONE = (_FILLED, _CANCELLED)
+
+
+class _SimOrder:
+    __slots__ = (
+        "oid", "iid", "symbol", "side", "typ", "qty", "limit", "stop",
+        "filled", "notional", "status", "parent", "children", "oca", "fills", "detail",
+    )
+
+    def __init__(self, oid: int, iid: str, order: dict):
+        self.oid = oid
+        self.iid = iid
+        self.symbol = str(order.get("symbol") or "").upper()
+        self.side = (order.get("side") or "BUY").upper()
+        self.typ = (order.get("order_type") or "MKT").upper()
+        self.qty = float(order.get("quantity") or 0)
+        self.limit = float(order.get("limit_price") or 0) or None
+        self.stop = float(order.get("stop_price") or 0) or None
+        self.filled = 0.0
+        self.notional = 0.0
+        self.status = _PENDING
+        self.parent: Optional[int] = None
+        self.children: List[int] = []
+        self.oca: Optional[str] = None
+        self.fills = 0
+        self.detail = order
+
+    @property
+    def remaining(self) -> float:
+        return self.qty - self.filled
+
+    @property
+    def buy(self) -> bool:
+        return self.side == "BUY"
+
+
+def _validate(order: dict) -> None:
+    if not order.get("symbol"):
+        raise ValueError("order.symbol ontbreekt")
+    qty = int(order.get("quantity", 0) or 0)
+    if qty <= 0:
+        raise ValueError("quantity > 0 vereist")
+    typ = (order.get("order_type") or "MKT").upper()
+    if typ == "LMT" and float(order.get("limit_price", 0) or 0) <= 0:
+        raise ValueError("limit_price vereist voor LMT")
+    if typ == "STP" and float(order.get("stop_price", 0) or 0) <= 0:
+        raise ValueError("stop_price vereist voor STP")
+    if typ not in ("MKT", "LMT", "STP"):
+        raise ValueError(f"unsupported order_type: {typ}")
+
+
+class _Book:
+    """Per symbool: heaps met (sleutel, seq, oid); gecancelde/gevulde orders worden lazy overgeslagen."""
+    __slots__ = ("buy_lmt", "sell_lmt", "buy_stp", "sell_stp", "mkt", "price", "path", "liq_buy", "liq_sell")
+
+    def __init__(self, price: float, path: Optional[Iterator[float]]):
+        self.buy_lmt: List[Tuple[float, int, int]] = []    # (-limit, ...)
+        self.sell_lmt: List[Tuple[float, int, int]] = []   # (limit, ...)
+        self.buy_stp: List[Tuple[float, int, int]] = []    # (stop, ...)   trigger: last >= stop
+        self.sell_stp: List[Tuple[float, int, int]] = []   # (-stop, ...)  trigger: last <= stop
+        self.mkt: Deque[int] = deque()                     # market (+ getriggerde stop) orders met rest
+        self.price = price
+        self.path = path
+        self.liq_buy = self.liq_sell = _LIQUIDITY or math.inf
+
+    def working(self) -> bool:
+        return bool(self.buy_lmt or self.sell_lmt or self.buy_stp or self.sell_stp or self.mkt)
+
+    def quote(self) -> Tuple[float, float]:
+        half = self.price * _SPREAD_BPS / 2e4
+        return self.price - half, self.price + half
+
+
+class SimEngine:
+    def __init__(self):
+        self._rng = random.Random(int(_SEED) if _SEED else None)
+        self._cond = threading.Condition()
+        self._inbox: Deque[Tuple[str, Any]] = deque()
+        self._events: List[Tuple[float, int, str, Any]] = []
+        self._seq = itertools.count()
+        self._oids = itertools.count(1)
+        self._orders: Dict[int, _SimOrder] = {}
+        self._by_iid: Dict[str, int] = {}
+        self._books: Dict[str, _Book] = {}
+        self._paths: Dict[str, Iterable[float]] = {}
+        self._oca_groups: Dict[str, List[int]] = {}
+        self._dirty: Dict[str, _SimOrder] = {}
+        self._open = 0
+        self._tick_scheduled = False
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._w0 = time.time()
+        self._v0 = self._w0
+        self._vt = self._w0
+        self.stats = {"orders": 0, "fills": 0, "cancels": 0, "ticks": 0, "errors": 0}
+        self.last_error: Optional[str] = None
+
+    # ---- klok ----
+
+    def now(self) -> float:
+        """Virtuele tijd (epoch seconden)."""
+        if _SPEED > 0:
+            return self._v0 + (time.time() - self._w0) * _SPEED
+        return self._vt
+
+    def _latency(self) -> float:
+        return max(0.0, _LATENCY_MS + self._rng.uniform(-_JITTER_MS, _JITTER_MS)) / 1000.0
+
+    # ---- lifecycle ----
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._main, name="sim-engine", daemon=True)
+                self._thread.start()
+
+    def _post(self, kind: str, payload: Any) -> None:
+        self.start()
+        with self._cond:
+            self._inbox.append((kind, payload))
+            self._cond.notify()
+
+    # ---- API (elke thread) ----
+
+    def submit(self, orders: List[Tuple[int, str, dict, Optional[int], Optional[str], bool]]) -> None:
+        """orders: (oid, internal_id, order, parent_oid, oca_group, held)"""
+        for oid, iid, *_ in orders:
+            self._by_iid[iid] = oid   # meteen, zodat een cancel vlak na send de order vindt
+        self._post("submit", orders)
+
+    def cancel(self, oid: int) -> None:
+        self._post("cancel", oid)
+
+    def watch(self, symbol: str) -> None:
+        """Quotes voor een symbool laten tikken, ook zonder orders (market data subscription)."""
+        self._post("watch", symbol.upper())
+
+    def set_path(self, symbol: str, prices: Iterable[float]) -> None:
+        """Vaste price path voor een symbool (1 prijs per tick), bv. voor reproduceerbare tests."""
+        self._post("path", (symbol.upper(), prices))
+
+    def call(self, fn, *args, timeout: float = 10.0):
+        """fn(*args) op de engine-thread (tussen 2 commando-batches); return het resultaat."""
+        fut: "concurrent.futures.Future" = concurrent.futures.Future()
+        self._post("call", (fn, args, fut))
+        return fut.result(timeout)
+
+    def next_oid(self) -> int:
+        return next(self._oids)
+
+    def oid_of(self, internal_id: str) -> Optional[int]:
+        return self._by_iid.get(internal_id)
+
+    def pending(self) -> int:
+        """Orders in de inbox + nog niet afgehandelde orders in de engine."""
+        return sum(len(p) for k, p in list(self._inbox) if k == "submit") + self._open
+
+    # ---- engine-thread ----
+
+    def _main(self) -> None:
+        while True:
+            with self._cond:
+                while not self._inbox:
+                    wait = self._wait_time()
+                    if wait is not None and wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                cmds = list(self._inbox)
+                self._inbox.clear()
+            # per commando/event: de engine mag nooit stoppen en een kapotte order blokkeert de rest niet
+            for kind, payload in cmds:
+                try:
+                    self._handle_cmd(kind, payload)
+                except Exception as e:
+                    self._failed(kind, payload, e)
+            self._run_due()
+            try:
+                self._flush()
+            except Exception as e:
+                self._error("flush", e)
+
+    def _error(self, what: str, e: BaseException) -> None:
+        self.stats["errors"] += 1
+        self.last_error = f"{what}: {e.__class__.__name__}: {e}"
+
+    def _failed(self, kind: str, payload: Any, e: BaseException) -> None:
+        """Fout-antwoord enkel voor dit commando: de future van een call, anders alleen stats/last_error."""
+        self._error(kind, e)
+        if kind == "call":
+            fut = payload[2]
+            if not fut.done():
+                fut.set_exception(e)
+
+    def _wait_time(self) -> Optional[float]:
+        if not self._events:
+            return None
+        dt = self._events[0][0] - self.now()
+        if _SPEED <= 0:
+            return 0.0
+        return dt / _SPEED
+
+    def _schedule(self, at: float, kind: str, payload: Any) -> None:
+        heapq.heappush(self._events, (at, next(self._seq), kind, payload))
+
+    def _run_due(self) -> None:
+        ev = self._events
+        if _SPEED <= 0:
+            # max speed: 1 event-tijdstip per ronde, zodat nieuwe inbox-commando's tussendoor meelopen
+            if ev:
+                self._vt = max(self._vt, ev[0][0])
+            limit = self._vt
+        else:
+            limit = self.now()
+        while ev and ev[0][0] <= limit:
+            at, _, kind, payload = heapq.heappop(ev)
+            try:
+                if kind == "arrive":
+                    self._on_arrive(payload, at)
+                elif kind == "cancel":
+                    self._on_cancel(payload)
+                elif kind == "tick":
+                    self._tick_scheduled = False
+                    self._on_tick(at)
+            except Exception as e:
+                self._error(f"{kind} {payload if payload is not None else ''}".strip(), e)
+                if kind == "tick":
+                    self._ensure_tick(at)
+
+    def _handle_cmd(self, kind: str, payload: Any) -> None:
+        now = self.now()
+        if kind == "submit":
+            for item in payload:
+                try:
+                    self._submit_one(now, *item)
+                except Exception as e:
+                    self._reject(item, e)
+        elif kind == "cancel":
+            self._schedule(now + self._latency(), "cancel", payload)
+        elif kind == "watch":
+            self._book(payload)
+            self._ensure_tick(now)
+        elif kind == "path":
+            sym, prices = payload
+            self._paths[sym] = prices
+            b = self._books.get(sym)
+            if b is not None:
+                b.path = iter(prices)
+        elif kind == "call":
+            fn, args, fut = payload
+            try:
+                fut.set_result(fn(*args))
+            except Exception as e:
+                fut.set_exception(e)
+
+    def _submit_one(self, now: float, oid: int, iid: str, order: dict, parent: Optional[int],
+                    oca: Optional[str], held: bool) -> None:
+        o = _SimOrder(oid, iid, order)
+        o.parent, o.oca = parent, oca
+        self._orders[oid] = o
+        if parent is not None and parent in self._orders:
+            self._orders[parent].children.append(oid)
+        if oca:
+            self._oca_groups.setdefault(oca, []).append(oid)
+        self.stats["orders"] += 1
+        self._open += 1
+        self._touch(o)
+        if held:
+            o.status = _HELD
+            self._touch(o)
+        else:
+            self._schedule(now + self._latency(), "arrive", oid)
+
+    def _reject(self, item: tuple, e: BaseException) -> None:
+        """1 order uit een submit-batch faalde: enkel die order krijgt een foutstatus, de rest loopt door."""
+        oid, iid, order = item[0], item[1], item[2]
+        self._error(f"submit {iid}", e)
+        o = self._orders.pop(oid, None)
+        if o is not None:
+            self._dirty.pop(iid, None)
+            if o.status not in _DONE:
+                self._open -= 1
+        self._by_iid.pop(iid, None)
+        detail = {**order, "error": f"{e.__class__.__name__}: {e}"} if isinstance(order, dict) else {"error": str(e)}
+        rec = ensure_record(iid, "sim", detail)
+        if rec.update(_REJECTED, 0, None, oid):
+            publish(rec)
+        notify([iid])
+
+    # ---- prijzen ----
+
+    def _book(self, symbol: str, hint: Optional[float] = None) -> _Book:
+        b = self._books.get(symbol)
+        if b is None:
+            path = self._paths.get(symbol)
+            it = iter(path) if path is not None else (self._bars_path(symbol) if _PRICE_PATH == "bars" else None)
+            first = next(it, None) if it is not None else None
+            price = first or reference_price(symbol) or hint or _START_PRICE
+            b = self._books[symbol] = _Book(float(price), it)
+            self._quote(symbol, b)
+        return b
+
+    def _bars_path(self, symbol: str) -> Optional[Iterator[float]]:
+        try:
+            from server.modules.data.bars import series
+            closes = series(symbol, _BAR_SIZE).view()["close"]
+        except Exception:
+            return None
+        return iter(closes.tolist()) if len(closes) else None
+
+    def _step(self, b: _Book) -> None:
+        if b.path is not None:
+            nxt = next(b.path, None)
+            if nxt is not None:
+                b.price = float(nxt)
+                return
+            b.path = None
+        b.price = max(0.01, b.price * math.exp(self._rng.gauss(0.0, _VOL)))
+
+    def _quote(self, symbol: str, b: _Book, last_size: Optional[float] = None) -> None:
+        bid, ask = b.quote()
+        QUOTES.update(symbol, ts=self.now(), bid=bid, ask=ask, last=b.price, last_size=last_size)
+
+    def _ensure_tick(self, at: float) -> None:
+        if not self._tick_scheduled:
+            self._tick_scheduled = True
+            self._schedule(at + _TICK_MS / 1000.0, "tick", None)
+
+    def _on_tick(self, at: float) -> None:
+        self.stats["ticks"] += 1
+        subs = subscriptions()
+        active = False
+        for sym in set(self._books) | set(subs):
+            b = self._book(sym)
+            if not b.working() and sym not in subs:
+                continue
+            active = active or b.working() or _SPEED > 0
+            self._step(b)
+            b.liq_buy = b.liq_sell = _LIQUIDITY or math.inf
+            self._quote(sym, b)
+            self._match(b, at)
+        if active:
+            self._ensure_tick(at)
+
+    # ---- matching ----
+
+    def _on_arrive(self, oid: int, at: float) -> None:
+        o = self._orders.get(oid)
+        if o is None or o.status in _DONE:
+            return
+        b = self._book(o.symbol, o.limit or o.stop)
+        o.status = _WORKING
+        self._touch(o)
+        key = next(self._seq)
+        if o.typ == "MKT":
+            b.mkt.append(oid)
+        elif o.typ == "LMT":
+            heapq.heappush(b.buy_lmt if o.buy else b.sell_lmt, ((-o.limit if o.buy else o.limit), key, oid))
+        else:
+            heapq.heappush(b.buy_stp if o.buy else b.sell_stp, ((o.stop if o.buy else -o.stop), key, oid))
+        self._match(b, at)
+        if b.working():
+            self._ensure_tick(at)
+
+    def _live(self, oid: int) -> Optional[_SimOrder]:
+        o = self._orders.get(oid)
+        return o if (o is not None and o.status == _WORKING) else None
+
+    def _match(self, b: _Book, at: float) -> None:
+        bid, ask = b.quote()
+        last = b.price
+        # stops: trigger -> market
+        while b.buy_stp and b.buy_stp[0][0] <= last:
+            oid = heapq.heappop(b.buy_stp)[2]
+            if self._live(oid):
+                b.mkt.append(oid)
+        while b.sell_stp and -b.sell_stp[0][0] >= last:
+            oid = heapq.heappop(b.sell_stp)[2]
+            if self._live(oid):
+                b.mkt.append(oid)
+        # market orders in aankomstvolgorde
+        n = len(b.mkt)
+        for _ in range(n):
+            oid = b.mkt.popleft()
+            o = self._live(oid)
+            if o is None:
+                continue
+            self._take(b, o, ask if o.buy else bid, at)
+            if o.status == _WORKING:
+                b.mkt.append(oid)
+        # limits: beste prijs eerst, zolang marketable en er liquiditeit is
+        while b.buy_lmt and b.liq_buy > 0 and -b.buy_lmt[0][0] >= ask:
+            oid = b.buy_lmt[0][2]
+            o = self._live(oid)
+            if o is None:
+                heapq.heappop(b.buy_lmt)
+                continue
+            self._take(b, o, min(ask, o.limit), at)
+            if o.status != _WORKING:
+                heapq.heappop(b.buy_lmt)
+        while b.sell_lmt and b.liq_sell > 0 and b.sell_lmt[0][0] <= bid:
+            oid = b.sell_lmt[0][2]
+            o = self._live(oid)
+            if o is None:
+                heapq.heappop(b.sell_lmt)
+                continue
+            self._take(b, o, max(bid, o.limit), at)
+            if o.status != _WORKING:
+                heapq.heappop(b.sell_lmt)
+
+    def _take(self, b: _Book, o: _SimOrder, px: float, at: float) -> None:
+        liq = b.liq_buy if o.buy else b.liq_sell
+        qty = min(o.remaining, liq)
+        if qty <= 0:
+            return
+        if o.buy:
+            b.liq_buy -= qty
+        else:
+            b.liq_sell -= qty
+        self._fill(o, qty, px, at)
+
+    def _fill(self, o: _SimOrder, qty: float, px: float, at: float) -> None:
+        o.filled += qty
+        o.notional += qty * px
+        o.fills += 1
+        self.stats["fills"] += 1
+        if o.remaining <= 1e-9:
+            self._finish(o, _FILLED)
+        self._touch(o)
+        record_fill(
+            exec_id=f"sim-{o.oid}-{o.fills}", symbol=o.symbol, side=o.side, price=px, size=qty,
+            ts=at, internal_id=o.iid, ib_order_id=o.oid, account="sim",
+        )
+        if o.oca:
+            # OCA (type 1): de eerste fill annuleert alle andere orders in de groep
+            for oid in self._oca_siblings(o):
+                self._do_cancel(oid)
+        if o.status == _FILLED:
+            for cid in o.children:
+                c = self._orders.get(cid)
+                if c is not None and c.status == _HELD:
+                    self._schedule(at, "arrive", cid)
+
+    def _oca_siblings(self, o: _SimOrder) -> List[int]:
+        return [oid for oid in self._oca_groups.get(o.oca, ()) if oid != o.oid]
+
+    def _finish(self, o: _SimOrder, status: str) -> None:
+        o.status = status
+        self._open -= 1
+        if o.oca and all(self._orders[x].status in _DONE for x in self._oca_groups.get(o.oca, ()) if x in self._orders):
+            self._oca_groups.pop(o.oca, None)
+
+    def _on_cancel(self, oid: int) -> None:
+        self.stats["cancels"] += 1
+        self._do_cancel(oid)
+
+    def _do_cancel(self, oid: int) -> None:
+        o = self._orders.get(oid)
+        if o is None or o.status in _DONE:
+            return
+        self._finish(o, _CANCELLED)
+        self._touch(o)
+        # een ongevulde parent neemt zijn children mee
+        for cid in o.children:
+            c = self._orders.get(cid)
+            if c is not None and c.status == _HELD:
+                self._finish(c, _CANCELLED)
+                self._touch(c)
+
+    # ---- results ----
+
+    def _touch(self, o: _SimOrder) -> None:
+        self._dirty[o.iid] = o
+
+    def _flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        for iid, o in dirty.items():
+            rec = ensure_record(iid, "sim", o.detail)
+            avg = round(o.notional / o.filled, 6) if o.filled else None
+            if rec.update(o.status, int(o.filled), avg, o.oid):
+                publish(rec)
+        notify(dirty.keys())
+        # afgehandelde orders na een tijd vergeten (RECORDS/RESULTS houden de eindstatus)
+        if len(self._orders) > 200_000:
+            for oid in [k for k, v in self._orders.items() if v.status in _DONE][:100_000]:
+                o = self._orders.pop(oid)
+                self._by_iid.pop(o.iid, None)
+
+
+ENGINE = SimEngine()
+
+
+class SimAdapter(AdapterBase):
+    """Zelfde oppervlak als de IBKR adapter: send(_many), place_bracket, cancel, cancel_bracket, status."""
+    name = "sim"
+
+    def send(self, order: dict, internal_id: Optional[str] = None) -> Tuple[bool, Dict[str, Any]]:
+        return self.send_many([(order, internal_id)])[0]
+
+    def send_many(self, orders: List[Tuple[dict, Optional[str]]]) -> List[Tuple[bool, Dict[str, Any]]]:
+        """1 inbox-commando voor de hele batch."""
+        out, batch = [], []
+        for order, internal_id in orders:
+            try:
+                _validate(order)
+            except ValueError as e:
+                out.append((False, {"status": "error", "error": str(e), "detail": order}))
+                continue
+            oid = ENGINE.next_oid()
+            batch.append((oid, internal_id or f"sim-{oid}", order, None, None, False))
+            out.append((True, {"status": _PENDING, "detail": order, "sim": True, "ibkr_order_id": oid}))
+        if batch:
+            ENGINE.submit(batch)
+        return out
+
+    def place_bracket(
+        self,
+        *,
+        base_order: dict,
+        target_price: float,
+        stop_price: float,
+        internal_ids: Dict[str, str],
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """Parent MKT + target LMT + stop STP (OCA). order_type 'NONE' = enkel de OCA-exits (geen parent)."""
+        side = (base_order.get("side") or "BUY").upper()
+        child_side = "SELL" if side == "BUY" else "BUY"
+        oco_only = (base_order.get("order_type") or "").upper() == "NONE"
+        parent = {**base_order, "side": side, "order_type": "MKT"}
+        try:
+            _validate(parent)
+            if float(target_price) <= 0 or float(stop_price) <= 0:
+                raise ValueError("target_price & stop_price > 0 vereist")
+        except ValueError as e:
+            return False, {"status": "error", "error": str(e)}
+        common = {k: base_order.get(k) for k in ("symbol", "quantity", "tif", "exchange") if k in base_order}
+        target = {**common, "side": child_side, "order_type": "LMT", "limit_price": float(target_price)}
+        stop = {**common, "side": child_side, "order_type": "STP", "stop_price": float(stop_price)}
+        pid = None if oco_only else ENGINE.next_oid()
+        tid, sid = ENGINE.next_oid(), ENGINE.next_oid()
+        oca = f"OCA-{pid if pid is not None else tid}"
+        batch = []
+        if pid is not None:
+            batch.append((pid, internal_ids["parent"], parent, None, None, False))
+        batch.append((tid, internal_ids["target"], target, pid, oca, pid is not None))
+        batch.append((sid, internal_ids["stop"], stop, pid, oca, pid is not None))
+        ENGINE.submit(batch)
+        return True, {"ibkr_order_ids": {"parent": pid, "target": tid, "stop": sid}, "oca_group": oca}
+
+    def cancel(self, internal_id: str):
+        oid = ENGINE.oid_of(internal_id)
+        if oid is None:
+            return {"ok": False, "error": "order unknown"}
+        ENGINE.cancel(oid)
+        return {"ok": True}
+
+    def cancel_bracket(self, order_ids: Iterable[int]) -> int:
+        n = 0
+        for oid in order_ids:
+            if oid is not None:
+                ENGINE.cancel(int(oid))
+                n += 1
+        return n
+
+    def start(self) -> None:
+        ENGINE.start()
+
+    def readiness(self) -> Dict[str, Any]:
+        t = ENGINE._thread
+        return {
+            "ready": t is not None and t.is_alive(), "state": "running" if t is not None else "idle",
+            "errors": ENGINE.stats["errors"], "last_error": ENGINE.last_error,
+        }
+
+    def broker_orders(self) -> List[Dict[str, Any]]:
+        """Alle orders die de engine nog kent (afgehandelde worden na 200k vergeten, zie _flush)."""
+        def _dump():
+            return [
+                {
+                    "order_id": o.oid, "status": o.status, "filled_qty": int(o.filled),
+                    "avg_price": round(o.notional / o.filled, 6) if o.filled else None, "symbol": o.symbol,
+                }
+                for o in ENGINE._orders.values()
+            ]
+        return ENGINE.call(_dump)
+
+    def run_on_writer(self, fn, *args):
+        return ENGINE.call(fn, *args)
+
+    def reference_price(self, symbol: str) -> Optional[float]:
+        """Huidige boekprijs (ook zonder watch); nog geen boek: de startprijs die de engine zou nemen."""
+        b = ENGINE._books.get(symbol)
+        if b is not None:
+            return b.price
+        return None if symbol in ENGINE._paths or _PRICE_PATH == "bars" else _START_PRICE
+
+
+ADAPTER = SimAdapter()
+
+
+# ---- market data (zelfde functies als de IBKR adapter, voor data.market) ----
+
+def subscribe_market_data(symbol: str) -> None:
+    ENGINE.watch(symbol)
+
+
+def unsubscribe_market_data(symbol: str) -> None:
+    # de tick-loop laat symbolen zonder subscription en zonder orders vanzelf vallen
+    pass
@@ -1,12 +1,9 @@
-import os
+from .adapters import registry
 
 def current_adapter_name() -> str:
-    return os.getenv("IBKR_ADAPTER", "mock").lower()
+    """Default adapter (IBKR_ADAPTER; "mock" wordt "sim")."""
+    return registry.default_name()
 
-def load_adapter(name: str | None = None):
-    adapter_name = (name or current_adapter_name())
-    if adapter_name == "ibkr":
-        from .adapters.ibkr.adapter import ADAPTER
-        return "ibkr", ADAPTER
-    from .adapters.mock.adapter import ADAPTER
-    return "mock", ADAPTER
+def load_adapter(name: str | None = None, account: str | None = None):
+    """(naam, adapter) voor een expliciete naam, een account-route of de default; instanties zijn gecachet."""
+    return registry.resolve(name, account)
@@ -0,0 +1,172 @@
+"""
+Idempotency-Key voor order-plaatsende endpoints.
+- eerste request met een key voert de plaatsing uit en bewaart de response (geheugen + SQLite, TTL)
+- retries met dezelfde key krijgen die originele response terug, ook na een herstart
+- gelijktijdige retry terwijl de eerste nog loopt: wacht op de eerste i.p.v. opnieuw te plaatsen
+- zelfde key met een andere body = conflict (409)
+- mislukte plaatsingen (exception) zonder verstuurde order worden niet bewaard: de client mag opnieuw proberen
+- faalt fn nadat er al orders naar een adapter gingen (note_placed), dan wordt de fout samen met die
+  internal ids bewaard; retries krijgen die fout (IdempotentFailure) i.p.v. fn opnieuw uit te voeren
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+from server.modules.persistence import db
+
+_TTL_SEC = float(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+_WAIT_SEC = 30.0          # max wachten op een lopende request met dezelfde key
+_PURGE_EVERY = 500        # SQLite-opruiming na zoveel nieuwe keys
+
+# key -> (expires, fingerprint, response); constante TTL => insertievolgorde = vervalvolgorde
+_CACHE: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+_INFLIGHT: Dict[str, threading.Event] = {}
+# internal ids die binnen de lopende run_once naar een adapter gingen (zelfde thread/context)
+_PLACED: ContextVar[Optional[List[str]]] = ContextVar("idempotency_placed", default=None)
+_lock = threading.Lock()
+_puts = 0
+
+
+class IdempotencyConflict(ValueError):
+    """Key werd al gebruikt voor een andere request."""
+
+
+class IdempotentFailure(RuntimeError):
+    """Eerdere request met deze key faalde nadat er al orders verstuurd waren (outcome = bewaarde fout)."""
+
+    def __init__(self, outcome: Dict[str, Any]):
+        self.outcome = outcome
+        self.status_code = int(outcome.get("status_code") or 500)
+        super().__init__(f"{outcome.get('error')} (placed orders: {', '.join(outcome.get('placed_order_ids') or [])})")
+
+    def detail(self) -> Dict[str, Any]:
+        return {"error": self.outcome.get("error"), "placed_order_ids": self.outcome.get("placed_order_ids") or []}
+
+
+def note_placed(*internal_ids: str) -> None:
+    """Order-pad (order_transmitting.service): deze orders gaan naar de adapter."""
+    placed = _PLACED.get()
+    if placed is not None:
+        placed.extend(internal_ids)
+
+
+def unnote_placed(*internal_ids: str) -> None:
+    """De adapter weigerde definitief (niets verstuurd)."""
+    placed = _PLACED.get()
+    if placed:
+        for iid in internal_ids:
+            if iid in placed:
+                placed.remove(iid)
+
+
+def _failure(e: BaseException, placed: List[str]) -> Dict[str, Any]:
+    # HTTPException (router) heeft status_code/detail; andere exceptions worden een 500
+    detail = getattr(e, "detail", None)
+    return {
+        "idempotent_failure": True,
+        "status_code": int(getattr(e, "status_code", 500) or 500),
+        "error": detail if detail is not None else f"{e.__class__.__name__}: {e}",
+        "placed_order_ids": list(dict.fromkeys(placed)),
+    }
+
+
+def fingerprint(scope: str, payload: Any) -> str:
+    raw = json.dumps([scope, payload], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _expire(now: float) -> None:
+    while _CACHE:
+        k, (exp, _, _) = next(iter(_CACHE.items()))
+        if exp > now:
+            break
+        _CACHE.popitem(last=False)
+
+
+def _lookup(key: str, fp: str, now: float) -> Optional[Any]:
+    hit = _CACHE.get(key)
+    if hit is None:
+        row = db.idem_get(key, now)
+        if row is None:
+            return None
+        hit = (row[2], row[0], json.loads(row[1]))
+        with _lock:
+            _CACHE[key] = hit
+    if hit[0] <= now:
+        return None
+    if hit[1] != fp:
+        raise IdempotencyConflict(f"Idempotency-Key {key!r} already used for a different request")
+    if isinstance(hit[2], dict) and hit[2].get("idempotent_failure"):
+        raise IdempotentFailure(hit[2])
+    return hit[2]
+
+
+def _store(key: str, fp: str, response: Any, now: float) -> None:
+    global _puts
+    exp = now + _TTL_SEC
+    # via JSON: replay geeft exact wat de eerste client kreeg (ook na herstart)
+    response_json = json.dumps(response, default=str)
+    db.idem_put(key, fp, response_json, exp)
+    with _lock:
+        _CACHE[key] = (exp, fp, json.loads(response_json))
+        _CACHE.move_to_end(key)
+        _expire(now)
+        _puts += 1
+        purge = _puts % _PURGE_EVERY == 0
+    if purge:
+        db.idem_purge(now)
+
+
+def run_once(key: Optional[str], scope: str, payload: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """
+    Return (response, replayed). Zonder key: gewoon fn().
+    scope = endpoint (zelfde key op een ander endpoint is ook een conflict).
+    IdempotentFailure: een eerdere request met deze key faalde na het versturen van orders.
+    """
+    if not key:
+        return fn(), False
+    fp = fingerprint(scope, payload)
+    deadline = time.monotonic() + _WAIT_SEC
+    while True:
+        hit = _lookup(key, fp, time.time())
+        if hit is not None:
+            return hit, True
+        with _lock:
+            ev = _INFLIGHT.get(key)
+            if ev is None:
+                ev = _INFLIGHT[key] = threading.Event()
+                break
+        # lopende request met dezelfde key: daarna opnieuw kijken (faalde die, dan voeren wij uit)
+        if not ev.wait(max(0.0, deadline - time.monotonic())):
+            raise IdempotencyConflict(f"request with Idempotency-Key {key!r} still in progress")
+    try:
+        hit = _lookup(key, fp, time.time())
+        if hit is not None:
+            return hit, True
+        placed: List[str] = []
+        token = _PLACED.set(placed)
+        try:
+            response = fn()
+        except BaseException as e:
+            if placed:
+                _store(key, fp, _failure(e, placed), time.time())
+            raise
+        finally:
+            _PLACED.reset(token)
+        _store(key, fp, response, time.time())
+        return response, False
+    finally:
+        with _lock:
+            _INFLIGHT.pop(key, None)
+        ev.set()
+
+
+def stats() -> Dict[str, Any]:
+    return {"cached": len(_CACHE), "inflight": len(_INFLIGHT), "ttl_sec": _TTL_SEC}
@@ -0,0 +1,255 @@
+"""
+Reconciliatie: lokale order-state (RESULTS) periodiek tegen de broker leggen.
+- 1 bulk-opvraging per pass via adapter.broker_orders() (IBKR: reqAllOpenOrders + reqCompletedOrders),
+  nooit een request per order
+- diff met set-operaties op orderId (ibkr_order_id): enkel bij de broker (untracked), lokaal open maar
+  weg bij de broker (missing), in beide maar afwijkend (status / filled_qty / avg_price)
+- correcties in 1 batch op de schrijver-thread van de adapter (records.publish + 1 notify, dus journal,
+  risk, gateway-push en shm volgen); een entry die sinds de opname wijzigde wordt overgeslagen (raced)
+- 2 passes na elkaar missing -> status 'inactive' (1 pass kan een order zijn die de broker nog niet toont)
+- daarna: OCA-groepen waarvan alle legs af zijn -> inactive in de exit_types registry
+- kost O(orders in RESULTS + bij de broker); de lijsten in het rapport zijn begrensd (RECONCILE_REPORT_MAX)
+- in een HTTP-worker achter de broker-gateway draait de pass in de gateway (IPC-call)
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Set, Tuple
+import os
+import threading
+import time
+
+from server.modules.data.store import RESULTS
+from server.modules.order_transmitting.adapters import registry
+from server.modules.order_transmitting.adapters.base import AdapterBase, AdapterUnavailable
+from server.modules.results import records
+
+_INTERVAL_SEC = float(os.getenv("RECONCILE_INTERVAL_SEC", "60"))     # 0 = geen periodieke pass
+_MAX_AGE_SEC = float(os.getenv("RECONCILE_MAX_AGE_SEC", "5"))       # ensure_fresh (OCA detail refresh)
+_REPORT_MAX = int(os.getenv("RECONCILE_REPORT_MAX", "200"))
+
+_DONE = frozenset(("filled", "cancelled", "apicancelled", "inactive", "error", "rejected"))
+_LOST = "inactive"
+
+_LOCKS: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_MISSING: Dict[str, Set[int]] = {}          # adapter -> orderIds die de vorige pass missing waren
+_LAST: Dict[str, Dict[str, Any]] = {}       # adapter -> laatste rapport
+_ERRORS: Dict[str, str] = {}
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _lock_for(name: str) -> threading.Lock:
+    with _locks_guard:
+        lk = _LOCKS.get(name)
+        if lk is None:
+            lk = _LOCKS[name] = threading.Lock()
+        return lk
+
+
+def supports(ad: Any) -> bool:
+    return type(ad).broker_orders is not AdapterBase.broker_orders
+
+
+def _local_index(name: str) -> Tuple[Dict[int, Tuple[str, dict]], Set[int]]:
+    """orderId -> (internal_id, RESULTS-snapshot) voor deze adapter + orderIds met meer dan 1 internal_id."""
+    idx: Dict[int, Tuple[str, dict]] = {}
+    dup: Set[int] = set()
+    for iid, r in list(RESULTS.items()):
+        if r.get("adapter") != name:
+            continue
+        oid = r.get("ibkr_order_id")
+        if oid is None:
+            continue
+        if oid in idx:
+            dup.add(oid)
+        idx[oid] = (iid, r)
+    return idx, dup
+
+
+def _view(r: dict) -> Dict[str, Any]:
+    return {"status": r.get("status"), "filled_qty": r.get("filled_qty") or 0, "avg_price": r.get("avg_price")}
+
+
+def _differs(local: dict, broker: dict) -> bool:
+    st = broker.get("status")
+    if st and st != "unknown" and st != (local.get("status") or "").lower():
+        return True
+    if float(broker.get("filled_qty") or 0) != float(local.get("filled_qty") or 0):
+        return True
+    avg = broker.get("avg_price")
+    return avg is not None and local.get("avg_price") is not None and abs(avg - local["avg_price"]) > 1e-9
+
+
+def _apply(name: str, fixes: List[Tuple[str, dict, int, dict]]) -> Tuple[List[str], int]:
+    """Op de schrijver-thread: records bijwerken, 1 notify voor de hele batch. Return (gewijzigd, raced)."""
+    changed: List[str] = []
+    raced = 0
+    for iid, snap, oid, want in fixes:
+        if RESULTS.get(iid) is not snap:
+            # intussen een event verwerkt: dat is nieuwer dan onze opname, volgende pass kijkt opnieuw
+            raced += 1
+            continue
+        rec = records.get_record(iid) or records.ensure_record(iid, name, snap.get("detail"))
+        avg = want.get("avg_price")
+        rec.update(
+            want["status"], want["filled_qty"], snap.get("avg_price") if avg is None else avg, oid,
+            want.get("perm_id") or snap.get("perm_id"),
+        )
+        records.publish(rec)
+        changed.append(iid)
+    if changed:
+        records.notify(changed)
+    return changed, raced
+
+
+def _pass(name: str, dry_run: bool) -> Dict[str, Any]:
+    ad = registry.get(name)
+    if not supports(ad):
+        raise ValueError(f"{name}: reconciliatie niet ondersteund (geen broker_orders)")
+    if not ad.readiness().get("ready"):
+        raise AdapterUnavailable(f"{name}: niet klaar voor reconciliatie")
+    t0 = time.perf_counter()
+    # lokale opname vóór de fetch: orders die erna binnenkomen tellen pas de volgende pass mee
+    local, dup = _local_index(name)
+    t1 = time.perf_counter()
+    broker = {int(r["order_id"]): r for r in ad.broker_orders()}
+    t2 = time.perf_counter()
+
+    b_ids, l_ids = broker.keys(), local.keys()
+    common = (b_ids & l_ids) - dup
+    untracked = b_ids - l_ids
+    missing = {oid for oid in l_ids - b_ids if (local[oid][1].get("status") or "").lower() not in _DONE} - dup
+    lost = missing & _MISSING.get(name, set())
+
+    fixes: List[Tuple[str, dict, int, dict]] = []
+    mismatches: List[Dict[str, Any]] = []
+    for oid in common:
+        iid, snap = local[oid]
+        b = broker[oid]
+        # snelle weg voor de overgrote meerderheid: exact gelijk
+        if (b["status"] == snap.get("status") and b["filled_qty"] == snap.get("filled_qty")
+                and (b["avg_price"] is None or b["avg_price"] == snap.get("avg_price"))):
+            continue
+        if _differs(snap, b):
+            fixes.append((iid, snap, oid, b))
+            mismatches.append({"internal_id": iid, "ibkr_order_id": oid, "local": _view(snap), "broker": _view(b)})
+    for oid in lost:
+        iid, snap = local[oid]
+        fixes.append((iid, snap, oid, {**_view(snap), "status": _LOST}))
+
+    changed: List[str] = []
+    raced = 0
+    oca_closed: List[str] = []
+    if not dry_run:
+        _MISSING[name] = missing - lost
+        if fixes:
+            changed, raced = ad.run_on_writer(_apply, name, fixes)
+        from server.modules.exit_types.service import sync_active
+        oca_closed = sync_active()
+    t3 = time.perf_counter()
+
+    cap = _REPORT_MAX
+    return {
+        "adapter": name,
+        "at": time.time(),
+        "dry_run": dry_run,
+        "ms": round((t3 - t0) * 1000, 1),
+        "fetch_ms": round((t2 - t1) * 1000, 1),
+        "counts": {
+            "broker": len(broker), "local": len(local), "matched": len(common),
+            "mismatched": len(mismatches), "untracked": len(untracked), "missing": len(missing),
+            "lost": len(lost), "ambiguous": len(dup), "corrected": len(changed), "raced": raced,
+            "oca_closed": len(oca_closed),
+        },
+        "mismatches": mismatches[:cap],
+        "untracked": [broker[oid] for oid in sorted(untracked)[:cap]],
+        "missing": [
+            {"internal_id": local[oid][0], "ibkr_order_id": oid, "status": local[oid][1].get("status"),
+             "lost": oid in lost}
+            for oid in sorted(missing)[:cap]
+        ],
+        "ambiguous": sorted(dup)[:cap],
+        "oca_closed": oca_closed[:cap],
+    }
+
+
+def run(adapter: Optional[str] = None, dry_run: bool = False, max_age: float = 0.0) -> Dict[str, Any]:
+    """
+    1 reconciliatie-pass voor een adapter (default: IBKR_ADAPTER). max_age > 0: een rapport dat
+    jonger is wordt hergebruikt (zo kost een stortvloed aan refreshes hooguit 1 bulk-fetch).
+    """
+    name = registry.resolve_name(adapter)
+    if registry.default_name() == "gateway":
+        return _run_remote(None if name == "gateway" else name, dry_run, max_age)
+    with _lock_for(name):
+        last = _LAST.get(name)
+        if max_age > 0 and last is not None and not last["dry_run"] and time.time() - last["at"] < max_age:
+            return last
+        try:
+            out = _pass(name, dry_run)
+        except Exception as e:
+            _ERRORS[name] = f"{e.__class__.__name__}: {e}"
+            raise
+        _ERRORS.pop(name, None)
+        _LAST[name] = out
+        return out
+
+
+def _run_remote(name: Optional[str], dry_run: bool, max_age: float) -> Dict[str, Any]:
+    """HTTP-worker: de pass draait in de gateway; lokaal enkel de OCA registry van deze worker bijwerken."""
+    from server.modules.order_transmitting.adapters.gateway.adapter import reconcile as gateway_reconcile
+    out = gateway_reconcile(name, dry_run, max_age)
+    if not dry_run:
+        from server.modules.exit_types.service import sync_active
+        sync_active()
+    _LAST["gateway"] = out
+    return out
+
+
+def ensure_fresh(adapter: Optional[str] = None) -> Dict[str, Any]:
+    return run(adapter, max_age=_MAX_AGE_SEC)
+
+
+def _adapters() -> List[str]:
+    from server.modules.order_transmitting.service import _adapters_in_use
+    loaded = set(registry.loaded())
+    return [n for n in _adapters_in_use() if n in loaded and supports(registry.get(n))]
+
+
+def _loop() -> None:
+    while not _stop.wait(_INTERVAL_SEC):
+        for name in _adapters():
+            try:
+                run(name)
+            except Exception:
+                # niet verbonden e.d.: staat in stats()["errors"], volgende interval opnieuw
+                pass
+
+
+def start() -> bool:
+    """Periodieke pass starten (niet in een worker achter de gateway: die reconcilieert zelf)."""
+    global _thread
+    if _INTERVAL_SEC <= 0 or registry.default_name() == "gateway" or _thread is not None:
+        return False
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="reconcile", daemon=True)
+    _thread.start()
+    return True
+
+
+def stop() -> None:
+    global _thread
+    _stop.set()
+    t, _thread = _thread, None
+    if t is not None:
+        t.join(timeout=2.0)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "interval_sec": _INTERVAL_SEC,
+        "running": _thread is not None,
+        "last": {k: {kk: v[kk] for kk in ("at", "ms", "fetch_ms", "counts")} for k, v in _LAST.items()},
+        "errors": dict(_ERRORS),
+    }
@@ -1,83 +1,67 @@
-import uuid, threading, time, random
-from queue import Queue
+import threading
+import uuid
+from secrets import token_hex
+from typing import Any, Dict, List
 from server.modules.data.store import ORDERS, RESULTS
+from server.modules.results import journal
+from server.modules.results.ledger import record_order
+from server.modules.results.records import notify
+from server.modules.risk import service as risk
+from . import idempotency
 from .config import load_adapter
+from .adapters import registry
 
-# Queue en worker worden ALLEEN gebruikt voor de mock-adapter.
-_q: "Queue[tuple[str, dict]]" = Queue()
-_worker_started = False
+# adapter -> fout bij het laden/starten op de achtergrond (bv. ib_insync ontbreekt)
+_START_ERRORS: Dict[str, str] = {}
+_started = False
 
-def _worker():
-    """Mock-fill worker: alleen gebruiken met mock adapter."""
-    while True:
-        order_id, order = _q.get()
-        try:
-            time.sleep(2.0)
-            px = round(random.uniform(10, 500), 2)
-            RESULTS[order_id] = {
-                "status": "filled",
-                "filled_qty": order.get("quantity", 0),
-                "avg_price": px,
-                "detail": order,
-                "adapter": "mock",
-            }
-        except Exception as e:
-            RESULTS[order_id] = {"status": "error", "error": repr(e), "detail": order, "adapter": "mock"}
-        finally:
-            _q.task_done()
+def _adapters_in_use() -> List[str]:
+    return sorted({registry.default_name(), *registry.routes().values()})
 
-def start_worker_once():
-    """Start alleen bij mock-adapter; voor IBKR doen events het werk."""
-    global _worker_started
-    adapter_name, _ = load_adapter()
-    if adapter_name != "mock":
-        return
-    if not _worker_started:
-        t = threading.Thread(target=_worker, daemon=True, name="transmit-worker")
-        t.start()
-        _worker_started = True
+def _start_adapter(name: str) -> None:
+    try:
+        registry.get(name).start()
+        _START_ERRORS.pop(name, None)
+    except Exception as e:
+        _START_ERRORS[name] = f"{e.__class__.__name__}: {e}"
 
-def enqueue_order(order: dict) -> str:
+def start_worker_once():
     """
-    Stuurt order via geselecteerde adapter.
-    - mock: zet RESULT 'queued' en worker simuleert fill.
-    - ibkr: plaatst bij TWS/Gateway; RESULT wordt live geüpdatet via ib_insync events.
-    In alle gevallen updaten we RESULTS met 'ok' of 'error' en geven een internal order_id terug.
+    Start de adapters die in gebruik zijn (default + ADAPTER_ROUTES) zonder de startup te blokkeren:
+    sim meteen, de rest (IBKR: ib_insync import + connect) op een achtergrondthread.
+    Voortgang via readiness() / GET /api/ready.
     """
-    adapter_name, adapter = load_adapter()
-    order_id = uuid.uuid4().hex[:12]
-    ORDERS[order_id] = order
-
-    if adapter_name == "ibkr":
-        try:
-            ok, res = adapter.send(order, internal_id=order_id)
-        except TypeError:
-            ok, res = adapter.send(order)
+    global _started
+    if _started:
+        return
+    _started = True
+    for name in _adapters_in_use():
+        if name == "sim":
+            _start_adapter(name)
+        else:
+            threading.Thread(target=_start_adapter, args=(name,), name=f"{name}-start", daemon=True).start()
 
-        if ok:
-            RESULTS[order_id] = {
-                "status": res.get("status", "queued"),
-                "detail": order,
-                "adapter": adapter_name,
-                "ibkr_order_id": res.get("ibkr_order_id"),
-            }
+def readiness() -> Dict[str, Any]:
+    """Per adapter in gebruik: klaar voor orders? (ready = allemaal klaar)"""
+    out: Dict[str, Any] = {}
+    for name in _adapters_in_use():
+        if name in _START_ERRORS:
+            out[name] = {"ready": False, "state": "failed", "error": _START_ERRORS[name]}
+        elif name not in registry.loaded():
+            out[name] = {"ready": False, "state": "loading" if _started else "idle"}
         else:
-            RESULTS[order_id] = {
-                "status": "error",
-                "error": res.get("error"),
-                "detail": order,
-                "adapter": adapter_name,
-            }
-        return order_id
+            out[name] = registry.get(name).readiness()
+    return {"ready": all(v.get("ready") for v in out.values()), "adapters": out}
 
-    ok, res = adapter.send(order)
+def _store_result(order_id: str, order: dict, adapter_name: str, ok: bool, res: dict) -> None:
     if ok:
-        RESULTS[order_id] = {
+        # adapter publiceert zelf record-snapshots (events kunnen sneller zijn dan deze return)
+        RESULTS.setdefault(order_id, {
             "status": res.get("status", "queued"),
             "detail": order,
             "adapter": adapter_name,
-        }
-        _q.put((order_id, order))
+            "ibkr_order_id": res.get("ibkr_order_id"),
+        })
     else:
         RESULTS[order_id] = {
             "status": "error",
@@ -85,7 +69,144 @@ def enqueue_order(order: dict) -> str:
             "detail": order,
             "adapter": adapter_name,
         }
+
+def enqueue_order(
+    order: dict, strategy_id: str | None = None, adapter: str | None = None, account: str | None = None,
+) -> str:
+    """
+    Stuurt order via de adapter voor dit request:
+    expliciete `adapter` > route van `account` (of order["account"]) > default (IBKR_ADAPTER).
+    - sim: matching engine op virtuele tijd; RESULT volgt via de engine-thread.
+    - ibkr: plaatst bij TWS/Gateway; RESULT wordt live geüpdatet via ib_insync events.
+    Adapter niet klaar (bv. IB-sessie down): meteen AdapterUnavailable, er wordt niets geregistreerd.
+    Daarna de pre-trade risk check: afgewezen orders krijgen status 'rejected' en gaan niet naar de adapter.
+    In alle gevallen updaten we RESULTS met 'ok', 'rejected' of 'error' en geven een internal order_id terug.
+    strategy_id (optioneel) wordt mee opgeslagen voor execution-analytics.
+    """
+    adapter_name, ad = load_adapter(adapter, account or order.get("account"))
+    ad.ensure_ready()
+    order_id = uuid.uuid4().hex[:12]
+    ORDERS[order_id] = order
+    journal.submit(order_id, order, adapter_name, strategy_id)
+    reason = risk.check(order_id, order, price_source=ad.reference_price)
+    if reason is not None:
+        risk.reject(order_id, order, reason, adapter_name)
+        notify([order_id])
+        return order_id
+    record_order(order_id, order, strategy_id=strategy_id)
+    idempotency.note_placed(order_id)
+    ok, res = ad.send(order, internal_id=order_id)
+    if not ok:
+        risk.release(order_id)
+        idempotency.unnote_placed(order_id)
+    _store_result(order_id, order, adapter_name, ok, res)
+    # lokale RESULTS-writes (reject/error/eerste status) ook naar de listeners (journal)
+    notify([order_id])
     return order_id
 
+def enqueue_orders(
+    orders: List[dict], strategy_id: str | None = None, adapter: str | None = None, account: str | None = None,
+) -> List[str]:
+    """Batch: 1 send_many per adapter; internal ids in dezelfde volgorde als `orders`."""
+    groups: Dict[str, tuple] = {}
+    ids: List[str] = []
+    resolved = [load_adapter(adapter, account or order.get("account")) for order in orders]
+    # fail fast vóór er iets geregistreerd wordt
+    for ad in {id(ad): ad for _, ad in resolved}.values():
+        ad.ensure_ready()
+    for order, (adapter_name, ad) in zip(orders, resolved):
+        order_id = uuid.uuid4().hex[:12]
+        ORDERS[order_id] = order
+        journal.submit(order_id, order, adapter_name, strategy_id)
+        ids.append(order_id)
+        reason = risk.check(order_id, order, price_source=ad.reference_price)
+        if reason is not None:
+            risk.reject(order_id, order, reason, adapter_name)
+            continue
+        record_order(order_id, order, strategy_id=strategy_id)
+        groups.setdefault(adapter_name, (ad, []))[1].append((order, order_id))
+    for adapter_name, (ad, batch) in groups.items():
+        idempotency.note_placed(*(order_id for _, order_id in batch))
+        for (order, order_id), (ok, res) in zip(batch, ad.send_many(batch)):
+            if not ok:
+                risk.release(order_id)
+                idempotency.unnote_placed(order_id)
+            _store_result(order_id, order, adapter_name, ok, res)
+    notify(ids)
+    return ids
+
+def submit_bracket(
+    base_order: dict,
+    target_price: float,
+    stop_price: float,
+    strategy_id: str | None = None,
+    adapter: str | None = None,
+    account: str | None = None,
+    oco_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    Parent + target + stop via de gekozen adapter (enige plek waar brackets ingestuurd worden).
+    oco_only: geen parent, enkel de OCA-exits (base_order["order_type"] = "NONE").
+    Raise AdapterUnavailable als de adapter niet klaar is,
+    RuntimeError als de risk check of de adapter de bracket weigert.
+    """
+    adapter_name, ad = load_adapter(adapter, account or base_order.get("account"))
+    ad.ensure_ready()
+    parent_id, target_id, stop_id = token_hex(6), token_hex(6), token_hex(6)
+    base = {**base_order, "order_type": "NONE" if oco_only else "MKT"}
+    # de parent opent/vergroot de positie; OCO-exits (oco_only) enkel rate-limit/kill switch
+    reason = risk.check(parent_id, base, exit_only=oco_only, price_source=ad.reference_price)
+    if reason is not None:
+        for iid in (parent_id, target_id, stop_id):
+            risk.reject(iid, base, reason, adapter_name)
+        notify([parent_id, target_id, stop_id])
+        raise RuntimeError(f"risk: {reason}")
+    for iid in (parent_id, target_id, stop_id):
+        RESULTS[iid] = {"status": "accepted", "adapter": adapter_name}
+    notify([parent_id, target_id, stop_id])
+    if not oco_only:
+        record_order(parent_id, base, strategy_id=strategy_id)
+    # exit-legs ook in order_meta: hun fills horen bij een order (execution-analytics)
+    exit_side = "SELL" if (base.get("side") or "BUY").upper() == "BUY" else "BUY"
+    leg = {"symbol": base.get("symbol"), "side": exit_side, "quantity": base.get("quantity")}
+    record_order(target_id, {**leg, "order_type": "LMT", "limit_price": float(target_price)}, strategy_id=strategy_id)
+    record_order(stop_id, {**leg, "order_type": "STP"}, strategy_id=strategy_id)
+    idempotency.note_placed(*((target_id, stop_id) if oco_only else (parent_id, target_id, stop_id)))
+    ok, payload = ad.place_bracket(
+        base_order=base,
+        target_price=float(target_price),
+        stop_price=float(stop_price),
+        internal_ids={"parent": parent_id, "target": target_id, "stop": stop_id},
+    )
+    if not ok:
+        risk.release(parent_id)
+        idempotency.unnote_placed(parent_id, target_id, stop_id)
+        for iid in (parent_id, target_id, stop_id):
+            RESULTS[iid] = {"status": "error", "error": payload.get("error"), "adapter": adapter_name}
+        notify([parent_id, target_id, stop_id])
+        raise RuntimeError(payload.get("error", "bracket failed"))
+    return {
+        "mode": "bracket",
+        "adapter": adapter_name,
+        "parent_order_id": parent_id,
+        "target_order_id": target_id,
+        "stop_order_id": stop_id,
+        "ibkr_order_ids": payload.get("ibkr_order_ids", {}) or payload.get("ibkr_ids", {}) or {},
+        "oca_group": payload.get("oca_group"),
+    }
+
+def cancel_order(internal_id: str) -> Dict[str, Any]:
+    """Cancel via de adapter die de order plaatste (RESULTS[...]['adapter'])."""
+    name = (RESULTS.get(internal_id) or {}).get("adapter")
+    if not name:
+        return {"ok": False, "error": "order unknown"}
+    _, ad = load_adapter(name)
+    return ad.cancel(internal_id)
+
 def queue_size() -> int:
-    return _q.qsize()
+    """Sim: orders die nog niet gevuld/gecanceld zijn; IBKR: 0 (geen lokale queue)."""
+    adapter_name, _ = load_adapter()
+    if adapter_name != "sim":
+        return 0
+    from .adapters.sim.adapter import ENGINE
+    return ENGINE.pending()
@@ -1,34 +1,93 @@
 from __future__ import annotations
-import os, sqlite3, json, threading
+import os, sqlite3, json, threading, time
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Sequence, Tuple
 
 _DB_DIR = Path(__file__).resolve().parents[3] / "data"
 _DB_DIR.mkdir(parents=True, exist_ok=True)
 _DB_PATH = _DB_DIR / "app.db"
 
 _lock = threading.Lock()
+_graphs_migrated = False
+_runs_migrated = False
+
+# graph-versies die bewaard blijven per graph (oudere bodies worden bij save opgeruimd)
+GRAPH_KEEP_VERSIONS = int(os.getenv("GRAPH_KEEP_VERSIONS", "50"))
 
 def get_conn() -> sqlite3.Connection:
     conn = sqlite3.connect(str(_DB_PATH))
     conn.row_factory = sqlite3.Row
     return conn
 
+def _migrate_graphs(cur: sqlite3.Cursor) -> None:
+    """Oude graphs-tabel (zonder version/updated_at/deleted) 1x per proces bijwerken."""
+    global _graphs_migrated
+    if _graphs_migrated:
+        return
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(graphs)")}
+    if "version" not in cols:
+        cur.execute("ALTER TABLE graphs ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    if "deleted" not in cols:
+        cur.execute("ALTER TABLE graphs ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+    if "updated_at" not in cols:
+        cur.execute("ALTER TABLE graphs ADD COLUMN updated_at REAL")
+    # uniek maken (rowid als tiebreak): de listing-cursor is enkel updated_at
+    cur.execute("""
+        UPDATE graphs SET updated_at = COALESCE(CAST(strftime('%s', created_at) AS REAL), 0) + rowid * 1e-6
+        WHERE updated_at IS NULL
+    """)
+    cur.execute("""
+        INSERT OR IGNORE INTO graph_versions (graph_id, version, name, description, json, updated_at)
+        SELECT id, version, name, description, json, updated_at FROM graphs WHERE deleted = 0
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_graphs_updated ON graphs(updated_at);")
+    _graphs_migrated = True
+
+def _migrate_graph_runs(cur: sqlite3.Cursor) -> None:
+    """graph_runs zonder cancel_requested (cancel vanuit een andere worker) 1x per proces bijwerken."""
+    global _runs_migrated
+    if _runs_migrated:
+        return
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(graph_runs)")}
+    if "cancel_requested" not in cols:
+        cur.execute("ALTER TABLE graph_runs ADD COLUMN cancel_requested REAL")
+    # partial index: enkel open runs met een cancel-verzoek (wordt NULL zodra de run af is)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS ix_graph_runs_cancel ON graph_runs(cancel_requested)
+        WHERE cancel_requested IS NOT NULL
+    """)
+    _runs_migrated = True
+
 def init_db():
     with _lock:
         conn = get_conn()
         try:
             cur = conn.cursor()
-            # graphs
+            # graphs: 1 rij per graph (laatste versie of tombstone), bodies per versie in graph_versions
             cur.execute("""
             CREATE TABLE IF NOT EXISTS graphs (
                 id TEXT PRIMARY KEY,
                 name TEXT NOT NULL,
                 description TEXT,
                 json TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS graph_versions (
+                graph_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT,
+                json TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (graph_id, version)
             );
             """)
+            _migrate_graphs(cur)
             # oca registry (legs apart)
             cur.execute("""
             CREATE TABLE IF NOT EXISTS oca_registry (
@@ -49,59 +108,258 @@ def init_db():
                 FOREIGN KEY(oca_group) REFERENCES oca_registry(oca_group) ON DELETE CASCADE
             );
             """)
+            # fill ledger (append-only; exec_id uniek -> herhaalde executions zijn no-op)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS fills (
+                exec_id TEXT PRIMARY KEY,
+                internal_id TEXT,
+                ib_order_id INTEGER,
+                symbol TEXT NOT NULL,
+                side TEXT NOT NULL,
+                day TEXT NOT NULL,
+                ts REAL NOT NULL,
+                price REAL NOT NULL,
+                size REAL NOT NULL
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_fills_symbol_day ON fills(symbol, day);")
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_fills_day ON fills(day);")
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_fills_internal ON fills(internal_id);")
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS commissions (
+                exec_id TEXT PRIMARY KEY,
+                commission REAL NOT NULL,
+                currency TEXT,
+                realized_pnl REAL
+            );
+            """)
+            # order metadata voor execution-analytics (1 rij per entry-order)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS order_meta (
+                internal_id TEXT PRIMARY KEY,
+                strategy_id TEXT,
+                symbol TEXT NOT NULL,
+                side TEXT NOT NULL,
+                order_type TEXT,
+                quantity REAL NOT NULL,
+                limit_price REAL,
+                arrival_price REAL,
+                day TEXT NOT NULL,
+                ts REAL NOT NULL
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_order_meta_day ON order_meta(day);")
+            # idempotency keys van order-endpoints: originele response voor retries (TTL via expires)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                response TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_expires ON idempotency_keys(expires);")
+            # schedules van graph runs (spec als JSON); next_run/last_run zijn runtime-state, updated_at enkel bij edits
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS graph_schedules (
+                id TEXT PRIMARY KEY,
+                graph_id TEXT NOT NULL,
+                spec TEXT NOT NULL,
+                enabled INTEGER NOT NULL DEFAULT 1,
+                next_run REAL,
+                last_run REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_graph_schedules_graph ON graph_schedules(graph_id);")
+            # run-historiek (API en schedules); result = JSON van de executor
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS graph_runs (
+                id TEXT PRIMARY KEY,
+                graph_id TEXT NOT NULL,
+                graph_version INTEGER,
+                schedule_id TEXT,
+                symbol TEXT,
+                adapter TEXT,
+                source TEXT NOT NULL,
+                status TEXT NOT NULL,
+                scheduled_for REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                cancel_requested REAL
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_graph_runs_schedule ON graph_runs(schedule_id, created_at);")
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_graph_runs_graph ON graph_runs(graph_id, created_at);")
+            _migrate_graph_runs(cur)
             conn.commit()
         finally:
             conn.close()
 
-def save_graph(graph_id: str, name: str, description: str, json_payload: Dict[str, Any]) -> None:
+_GRAPH_META = "id, name, description, version, created_at, updated_at, deleted"
+
+def _next_updated_at(cur: sqlite3.Cursor) -> float:
+    """Strikt stijgend over alle graphs (ook bij gelijke/terugspringende klok): cursor = updated_at."""
+    cur.execute("SELECT MAX(updated_at) FROM graphs")
+    last = cur.fetchone()[0] or 0.0
+    return max(time.time(), last + 1e-6)
+
+def save_graph(
+    graph_id: str, name: str, description: str, json_payload: Dict[str, Any], expected_version: int | None = None,
+) -> Tuple[bool, int, float]:
+    """
+    Nieuwe versie van een graph (ook na een delete: de nummering loopt door).
+    expected_version: enkel opslaan als dat de huidige versie is (0 = mag nog niet bestaan).
+    Return (ok, versie, updated_at); ok=False: conflict, versie = de huidige.
+    """
     init_db()
+    body = json.dumps(json_payload)
     with _lock:
         conn = get_conn()
         try:
             cur = conn.cursor()
+            # BEGIN IMMEDIATE: read-modify-write ook over processen heen (uvicorn workers) serieel
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT version, deleted, updated_at FROM graphs WHERE id=?", (graph_id,))
+            row = cur.fetchone()
+            current = 0 if row is None or row["deleted"] else row["version"]
+            if expected_version is not None and int(expected_version) != current:
+                conn.rollback()
+                return False, current, row["updated_at"] if row else 0.0
+            version = (row["version"] + 1) if row else 1
+            ts = _next_updated_at(cur)
             cur.execute("""
-                INSERT INTO graphs (id, name, description, json)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET name=excluded.name, description=excluded.description, json=excluded.json
-            """, (graph_id, name, description, json.dumps(json_payload)))
+                INSERT INTO graphs (id, name, description, json, version, updated_at, deleted)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(id) DO UPDATE SET name=excluded.name, description=excluded.description, json=excluded.json,
+                    version=excluded.version, updated_at=excluded.updated_at, deleted=0
+            """, (graph_id, name, description, body, version, ts))
+            cur.execute("""
+                INSERT OR REPLACE INTO graph_versions (graph_id, version, name, description, json, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (graph_id, version, name, description, body, ts))
+            if GRAPH_KEEP_VERSIONS > 0:
+                cur.execute("DELETE FROM graph_versions WHERE graph_id=? AND version<=?",
+                            (graph_id, version - GRAPH_KEEP_VERSIONS))
+            conn.commit()
+            return True, version, ts
+        finally:
+            conn.close()
+
+def delete_graph(graph_id: str, expected_version: int | None = None) -> Tuple[bool, int]:
+    """
+    Tombstone: de rij blijft (deleted=1, nieuwe versie + updated_at, lege body) zodat incrementele
+    listings de delete zien; alle bodies (ook de historiek) gaan echt weg.
+    Return (ok, versie); ok=False met versie 0 = onbekend, anders conflict met de huidige versie.
+    """
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT version, deleted FROM graphs WHERE id=?", (graph_id,))
+            row = cur.fetchone()
+            if row is None or row["deleted"]:
+                conn.rollback()
+                return False, 0
+            if expected_version is not None and int(expected_version) != row["version"]:
+                conn.rollback()
+                return False, row["version"]
+            version = row["version"] + 1
+            cur.execute("UPDATE graphs SET json='null', version=?, updated_at=?, deleted=1 WHERE id=?",
+                        (version, _next_updated_at(cur), graph_id))
+            cur.execute("DELETE FROM graph_versions WHERE graph_id=?", (graph_id,))
+            conn.commit()
+            return True, version
+        finally:
+            conn.close()
+
+def purge_graph_tombstones(before: float) -> int:
+    """Tombstones ouder dan before definitief weg (clients die zo lang niet synchroniseerden: volledige listing)."""
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute("DELETE FROM graphs WHERE deleted=1 AND updated_at<?", (before,))
             conn.commit()
+            return cur.rowcount
         finally:
             conn.close()
 
-def load_graph(graph_id: str) -> Dict[str, Any] | None:
+def graph_head(graph_id: str) -> Dict[str, Any] | None:
+    """Metadata van de huidige versie (ook tombstones), zonder body."""
     init_db()
     with _lock:
         conn = get_conn()
         try:
             cur = conn.cursor()
-            cur.execute("SELECT id, name, description, json FROM graphs WHERE id=?", (graph_id,))
+            cur.execute(f"SELECT {_GRAPH_META} FROM graphs WHERE id=?", (graph_id,))
             row = cur.fetchone()
-            if not row:
-                return None
-            payload = json.loads(row["json"])
-            payload["id"] = row["id"]
-            payload["name"] = row["name"]
-            payload["description"] = row["description"]
-            return payload
+            return dict(row) if row else None
         finally:
             conn.close()
 
-def load_all_graphs() -> List[Dict[str, Any]]:
+def load_graph_body(graph_id: str, version: int | None = None) -> str | None:
+    """JSON-body (ongeparsed) van de huidige of een bewaarde versie; None voor tombstones/onbekend."""
     init_db()
     with _lock:
         conn = get_conn()
         try:
             cur = conn.cursor()
-            cur.execute("SELECT id, name, description, json FROM graphs ORDER BY created_at ASC")
-            rows = cur.fetchall()
-            out = []
-            for r in rows:
-                p = json.loads(r["json"])
-                p["id"] = r["id"]
-                p["name"] = r["name"]
-                p["description"] = r["description"]
-                out.append(p)
-            return out
+            if version is None:
+                cur.execute("SELECT json FROM graphs WHERE id=? AND deleted=0", (graph_id,))
+            else:
+                cur.execute("SELECT json FROM graph_versions WHERE graph_id=? AND version=?", (graph_id, int(version)))
+            row = cur.fetchone()
+            return row["json"] if row else None
+        finally:
+            conn.close()
+
+def graph_versions(graph_id: str) -> List[Dict[str, Any]]:
+    """Bewaarde versies (metadata), nieuwste eerst."""
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT version, name, description, updated_at FROM graph_versions
+                WHERE graph_id=? ORDER BY version DESC
+            """, (graph_id,))
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
+
+def graphs_page(
+    limit: int = 100, cursor: float | None = None, descending: bool = False, include_deleted: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Metadata (geen JSON-body) gesorteerd op updated_at via ix_graphs_updated.
+    cursor: updated_at van de laatste rij van de vorige pagina (exclusief).
+    """
+    init_db()
+    where, args = [], []
+    if cursor is not None:
+        where.append("updated_at < ?" if descending else "updated_at > ?")
+        args.append(float(cursor))
+    if not include_deleted:
+        where.append("deleted = 0")
+    sql = f"SELECT {_GRAPH_META} FROM graphs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY updated_at {'DESC' if descending else 'ASC'} LIMIT ?"
+    args.append(int(limit))
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, args)
+            return [dict(r) for r in cur.fetchall()]
         finally:
             conn.close()
 
@@ -169,3 +427,380 @@ def oca_load_all() -> Dict[str, Dict[str, Any]]:
             return regs
         finally:
             conn.close()
+
+# ---- fill ledger ----
+
+def fills_insert_many(rows: List[Tuple[Any, ...]]) -> int:
+    """rows: (exec_id, internal_id, ib_order_id, symbol, side, day, ts, price, size)"""
+    if not rows:
+        return 0
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.executemany("""
+                INSERT OR IGNORE INTO fills (exec_id, internal_id, ib_order_id, symbol, side, day, ts, price, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+def commissions_insert_many(rows: List[Tuple[Any, ...]]) -> int:
+    """rows: (exec_id, commission, currency, realized_pnl)"""
+    if not rows:
+        return 0
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.executemany("""
+                INSERT OR IGNORE INTO commissions (exec_id, commission, currency, realized_pnl)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+def order_meta_insert_many(rows: List[Tuple[Any, ...]]) -> int:
+    """rows: (internal_id, strategy_id, symbol, side, order_type, quantity, limit_price, arrival_price, day, ts)"""
+    if not rows:
+        return 0
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.executemany("""
+                INSERT OR IGNORE INTO order_meta
+                    (internal_id, strategy_id, symbol, side, order_type, quantity, limit_price, arrival_price, day, ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+def analytics_load(after_order_rowid: int = 0, after_fill_rowid: int = 0,
+                   retry_fill_rowids: Sequence[int] = ()) -> Tuple[List[Tuple[Any, ...]], List[Tuple[Any, ...]]]:
+    """
+    Incrementeel (beide tabellen zijn append-only): enkel rijen na de gegeven rowids, als tuples.
+      orders: (rowid, strategy_id, symbol, side, quantity, arrival_price, ts)   gesorteerd op rowid
+      fills:  (fill_rowid, order_rowid, ts, price, size)                         gesorteerd op fill rowid
+    order_rowid is None als de order_meta rij (nog) ontbreekt; die fills geeft de caller opnieuw mee
+    in retry_fill_rowids.
+    """
+    init_db()
+    with _lock:
+        conn = get_conn()
+        conn.row_factory = None
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT rowid, strategy_id, symbol, side, quantity, arrival_price, ts
+                FROM order_meta WHERE rowid > ? ORDER BY rowid
+            """, (int(after_order_rowid),))
+            orders = cur.fetchall()
+            sql = """
+                SELECT f.rowid, o.rowid, f.ts, f.price, f.size
+                FROM fills f LEFT JOIN order_meta o ON o.internal_id = f.internal_id
+                WHERE f.internal_id IS NOT NULL AND (f.rowid > ?{retry}) ORDER BY f.rowid
+            """
+            retry = [int(r) for r in retry_fill_rowids]
+            cond = f" OR f.rowid IN ({','.join('?' * len(retry))})" if retry else ""
+            cur.execute(sql.format(retry=cond), (int(after_fill_rowid), *retry))
+            fills = cur.fetchall()
+            return orders, fills
+        finally:
+            conn.close()
+
+def fills_query(symbol: str | None = None, day: str | None = None, internal_id: str | None = None, limit: int = 1000) -> List[Dict[str, Any]]:
+    init_db()
+    where, args = [], []
+    if symbol:
+        where.append("f.symbol=?"); args.append(symbol)
+    if day:
+        where.append("f.day=?"); args.append(day)
+    if internal_id:
+        where.append("f.internal_id=?"); args.append(internal_id)
+    sql = """
+        SELECT f.exec_id, f.internal_id, f.ib_order_id, f.symbol, f.side, f.day, f.ts, f.price, f.size,
+               c.commission, c.currency, c.realized_pnl
+        FROM fills f LEFT JOIN commissions c ON c.exec_id = f.exec_id
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY f.ts ASC LIMIT ?"
+    args.append(int(limit))
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, args)
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
+
+def pnl_by_symbol(day: str) -> List[Dict[str, Any]]:
+    """
+    Dag-P&L per symbool uit de ledger (index ix_fills_symbol_day).
+    cash = verkoopopbrengst - aankoopkost; net_qty = open rest van die dag.
+    """
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT f.symbol AS symbol,
+                       COUNT(*) AS fills,
+                       SUM(CASE WHEN f.side='BUY' THEN f.size ELSE -f.size END) AS net_qty,
+                       SUM(CASE WHEN f.side='BUY' THEN f.size ELSE 0 END) AS bought,
+                       SUM(CASE WHEN f.side='SELL' THEN f.size ELSE 0 END) AS sold,
+                       SUM(CASE WHEN f.side='BUY' THEN -f.price * f.size ELSE f.price * f.size END) AS cash,
+                       COALESCE(SUM(c.commission), 0) AS commission,
+                       SUM(c.realized_pnl) AS realized_pnl
+                FROM fills f LEFT JOIN commissions c ON c.exec_id = f.exec_id
+                WHERE f.day = ?
+                GROUP BY f.symbol
+                ORDER BY f.symbol
+            """, (day,))
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
+
+# ---- idempotency keys ----
+
+def idem_get(key: str, now: float) -> Tuple[str, str, float] | None:
+    """(fingerprint, response_json, expires) of None als onbekend/verlopen."""
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT fingerprint, response, expires FROM idempotency_keys WHERE key=? AND expires>?", (key, now))
+            row = cur.fetchone()
+            return (row["fingerprint"], row["response"], row["expires"]) if row else None
+        finally:
+            conn.close()
+
+def idem_put(key: str, fingerprint: str, response_json: str, expires: float) -> None:
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            conn.execute("""
+                INSERT INTO idempotency_keys (key, fingerprint, response, expires)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET fingerprint=excluded.fingerprint, response=excluded.response, expires=excluded.expires
+            """, (key, fingerprint, response_json, expires))
+            conn.commit()
+        finally:
+            conn.close()
+
+def idem_purge(now: float) -> int:
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute("DELETE FROM idempotency_keys WHERE expires<=?", (now,))
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+# ---- graph schedules ----
+
+def schedule_save(schedule_id: str, graph_id: str, spec: Dict[str, Any], enabled: bool, next_run: float | None) -> float:
+    """Nieuwe of gewijzigde schedule; return updated_at."""
+    init_db()
+    now = time.time()
+    with _lock:
+        conn = get_conn()
+        try:
+            conn.execute("""
+                INSERT INTO graph_schedules (id, graph_id, spec, enabled, next_run, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET graph_id=excluded.graph_id, spec=excluded.spec,
+                    enabled=excluded.enabled, next_run=excluded.next_run, updated_at=excluded.updated_at
+            """, (schedule_id, graph_id, json.dumps(spec), int(enabled), next_run, now, now))
+            conn.commit()
+            return now
+        finally:
+            conn.close()
+
+def schedule_delete(schedule_id: str) -> bool:
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute("DELETE FROM graph_schedules WHERE id=?", (schedule_id,))
+            conn.commit()
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+def schedules_load(schedule_id: str | None = None) -> List[Dict[str, Any]]:
+    init_db()
+    sql = "SELECT id, graph_id, spec, enabled, next_run, last_run, created_at, updated_at FROM graph_schedules"
+    args: Tuple[Any, ...] = ()
+    if schedule_id is not None:
+        sql += " WHERE id=?"
+        args = (schedule_id,)
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, args)
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
+
+def schedules_signature() -> Tuple[int, float]:
+    """(aantal, max updated_at): goedkope check of een ander proces schedules wijzigde."""
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            row = conn.execute("SELECT COUNT(*), MAX(updated_at) FROM graph_schedules").fetchone()
+            return int(row[0]), float(row[1] or 0.0)
+        finally:
+            conn.close()
+
+def schedules_claim(claims: List[Tuple[str, float, float | None, float]]) -> List[str]:
+    """
+    claims = [(id, verwachte next_run, nieuwe next_run, last_run)] in 1 transactie.
+    Compare-and-set op next_run: bij meerdere workers vuurt elke occurrence precies 1 keer.
+    Return de ids die geclaimd werden.
+    """
+    if not claims:
+        return []
+    init_db()
+    won: List[str] = []
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            for sid, due, nxt, last in claims:
+                cur.execute(
+                    "UPDATE graph_schedules SET next_run=?, last_run=? WHERE id=? AND next_run=? AND enabled=1",
+                    (nxt, last, sid, due),
+                )
+                if cur.rowcount:
+                    won.append(sid)
+            conn.commit()
+            return won
+        finally:
+            conn.close()
+
+# ---- graph runs ----
+
+_RUN_COLS = ("id", "graph_id", "graph_version", "schedule_id", "symbol", "adapter", "source", "status",
+             "scheduled_for", "created_at", "started_at", "finished_at", "result", "error")
+
+def graph_runs_insert(rows: List[Tuple[Any, ...]]) -> None:
+    """
+    rows in de volgorde van _RUN_COLS (insert of volledige update); 1 transactie per batch.
+    cancel_requested (gezet door een andere worker) blijft staan zolang de run open is.
+    """
+    if not rows:
+        return
+    init_db()
+    updates = ", ".join(f"{c}=excluded.{c}" for c in _RUN_COLS[1:])
+    with _lock:
+        conn = get_conn()
+        try:
+            conn.executemany(
+                f"""
+                INSERT INTO graph_runs ({', '.join(_RUN_COLS)}) VALUES ({', '.join('?' * len(_RUN_COLS))})
+                ON CONFLICT(id) DO UPDATE SET {updates},
+                    cancel_requested = CASE WHEN excluded.status IN ('queued', 'running')
+                                            THEN graph_runs.cancel_requested END
+                """,
+                rows,
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+def graph_runs_query(
+    run_id: str | None = None, graph_id: str | None = None, schedule_id: str | None = None,
+    before: float | None = None, before_id: str | None = None, limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Nieuwste eerst; (before, before_id) = created_at en id van de laatste rij van de vorige pagina (exclusief)."""
+    init_db()
+    where, args = [], []
+    for col, v in (("id", run_id), ("graph_id", graph_id), ("schedule_id", schedule_id)):
+        if v is not None:
+            where.append(f"{col}=?")
+            args.append(v)
+    if before is not None and before_id is not None:
+        # zelfde created_at komt voor (batch submits): id als tie-breaker, anders vallen rijen tussen pagina's
+        where.append("(created_at<? OR (created_at=? AND id<?))")
+        args.extend((float(before), float(before), before_id))
+    elif before is not None:
+        where.append("created_at<?")
+        args.append(float(before))
+    sql = f"SELECT {', '.join(_RUN_COLS)} FROM graph_runs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    args.append(int(limit))
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, args)
+            return [dict(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
+
+def graph_runs_trim(keep: int, schedule_id: str | None = None, graph_id: str | None = None) -> int:
+    """Enkel de nieuwste keep runs van een schedule (of de API-runs van een graph) bewaren."""
+    init_db()
+    if schedule_id is not None:
+        scope, args = "schedule_id=?", [schedule_id]
+    else:
+        scope, args = "schedule_id IS NULL AND graph_id=?", [graph_id]
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute(f"""
+                DELETE FROM graph_runs WHERE {scope} AND status NOT IN ('queued', 'running') AND created_at < (
+                    SELECT created_at FROM graph_runs WHERE {scope} ORDER BY created_at DESC LIMIT 1 OFFSET ?
+                )
+            """, args + args + [int(keep) - 1])
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+def graph_run_request_cancel(run_id: str) -> bool:
+    """Cancel-verzoek voor een open run in een ander proces (diens flusher pikt het op)."""
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute(
+                "UPDATE graph_runs SET cancel_requested=? WHERE id=? AND status IN ('queued', 'running')",
+                (time.time(), run_id),
+            )
+            conn.commit()
+            return cur.rowcount > 0
+        finally:
+            conn.close()
+
+def graph_runs_cancel_requested() -> List[str]:
+    init_db()
+    with _lock:
+        conn = get_conn()
+        try:
+            cur = conn.execute("SELECT id FROM graph_runs WHERE cancel_requested IS NOT NULL")
+            return [r[0] for r in cur.fetchall()]
+        finally:
+            conn.close()
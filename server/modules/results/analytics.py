@@ -0,0 +1,207 @@
+"""
+Execution-quality analytics over order_meta + fills (NumPy, gevectoriseerd).
+- slippage t.o.v. arrival price in bps (positief = slechter dan arrival)
+- fill ratio (gevuld / gevraagd)
+- tijd tot eerste fill / volledige fill (percentielen)
+Gegroepeerd per strategy en per symbool. Data komt incrementeel uit SQLite in een kolom-cache.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import calendar
+import threading
+import time
+
+try:
+    import numpy as np  # type: ignore
+except Exception as e:  # pragma: no cover
+    np = None  # type: ignore
+    _IMPORT_ERROR = e
+else:
+    _IMPORT_ERROR = None
+
+from server.modules.persistence.db import analytics_load
+from server.modules.results import ledger
+
+_PCTS = (50, 90, 99)
+# fills zonder order_meta rij (meta nog niet geschreven): per refresh opnieuw geprobeerd, de nieuwste
+# max zoveel tegelijk; na _PENDING_TTL_SEC komt die meta niet meer (bv. order van buiten de app): vergeten
+_RETRY_MAX = 500
+_PENDING_TTL_SEC = 900.0
+
+
+def _dist(values) -> Optional[Dict[str, float]]:
+    v = values[~np.isnan(values)]
+    if v.size == 0:
+        return None
+    p = np.percentile(v, _PCTS)
+    out = {f"p{q}": round(float(x), 4) for q, x in zip(_PCTS, p)}
+    out["mean"] = round(float(v.mean()), 4)
+    return out
+
+
+def _group(keys, cols: Dict[str, Any]) -> List[Dict[str, Any]]:
+    uniq, inv = np.unique(keys.astype(str), return_inverse=True)
+    g = len(uniq)
+    qty, filled, slip, has_slip, t_first, t_full = (
+        cols["qty"], cols["filled"], cols["slip"], cols["has_slip"], cols["t_first"], cols["t_full"],
+    )
+    n_orders = np.bincount(inv, minlength=g)
+    n_filled = np.bincount(inv, weights=(filled > 0), minlength=g)
+    q_sum = np.bincount(inv, weights=qty, minlength=g)
+    f_sum = np.bincount(inv, weights=filled, minlength=g)
+    w = np.where(has_slip, filled, 0.0)
+    s_w = np.bincount(inv, weights=np.where(has_slip, slip * filled, 0.0), minlength=g)
+    w_sum = np.bincount(inv, weights=w, minlength=g)
+    s_cnt = np.bincount(inv, weights=has_slip, minlength=g)
+    s_sum = np.bincount(inv, weights=np.where(has_slip, slip, 0.0), minlength=g)
+
+    # percentielen: 1 sort op groep, daarna aaneengesloten slices
+    order = np.argsort(inv, kind="stable")
+    bounds = np.cumsum(n_orders)[:-1]
+    first_parts = np.split(t_first[order], bounds)
+    full_parts = np.split(t_full[order], bounds)
+
+    out = []
+    for i, key in enumerate(uniq):
+        out.append({
+            "key": str(key),
+            "orders": int(n_orders[i]),
+            "filled_orders": int(n_filled[i]),
+            "fill_ratio": round(float(f_sum[i] / q_sum[i]), 4) if q_sum[i] > 0 else None,
+            "slippage_bps_mean": round(float(s_sum[i] / s_cnt[i]), 3) if s_cnt[i] > 0 else None,
+            "slippage_bps_wavg": round(float(s_w[i] / w_sum[i]), 3) if w_sum[i] > 0 else None,
+            "time_to_first_fill_s": _dist(first_parts[i]),
+            "time_to_full_fill_s": _dist(full_parts[i]),
+        })
+    return out
+
+
+class _Cache:
+    """
+    Kolom-cache van order_meta + fills. Beide tabellen zijn append-only, dus per call
+    worden enkel de nieuwe rowids opgehaald; de rest is pure NumPy.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.o_last = 0
+        self.f_last = 0
+        self.o_rowid = np.empty(0, np.int64)
+        self.o_strategy = np.empty(0, object)
+        self.o_symbol = np.empty(0, object)
+        self.o_sign = np.empty(0)
+        self.o_qty = np.empty(0)
+        self.o_arrival = np.empty(0)
+        self.o_ts = np.empty(0)
+        self.f_order = np.empty(0, np.int64)   # index in de o_* kolommen
+        self.f_ts = np.empty(0)
+        self.f_px = np.empty(0)
+        self.f_sz = np.empty(0)
+        self.f_pending: Dict[int, float] = {}  # fill rowid waarvan de order_meta rij nog ontbrak -> sinds
+        self.f_dropped = 0
+
+    def refresh(self) -> None:
+        retry = sorted(self.f_pending)[-_RETRY_MAX:]
+        orders, fills = analytics_load(self.o_last, self.f_last, retry)
+        if orders:
+            rowid, strategy, symbol, side, qty, arrival, ts = zip(*orders)
+            self.o_rowid = np.concatenate([self.o_rowid, np.asarray(rowid, np.int64)])
+            self.o_strategy = np.concatenate([self.o_strategy, np.asarray([x or "unknown" for x in strategy], object)])
+            self.o_symbol = np.concatenate([self.o_symbol, np.asarray(symbol, object)])
+            self.o_sign = np.concatenate([self.o_sign, np.where(np.asarray(side, object) == "BUY", 1.0, -1.0)])
+            self.o_qty = np.concatenate([self.o_qty, np.asarray(qty, np.float64)])
+            self.o_arrival = np.concatenate([self.o_arrival, np.asarray([np.nan if a is None else a for a in arrival], np.float64)])
+            self.o_ts = np.concatenate([self.o_ts, np.asarray(ts, np.float64)])
+            self.o_last = int(rowid[-1])
+        if fills:
+            self.f_last = max(self.f_last, int(fills[-1][0]))
+            # meta ontbreekt, of is pas na de orders-query geschreven: volgende refresh opnieuw
+            missing = {r[0] for r in fills if r[1] is None or r[1] > self.o_last}
+            now = time.monotonic()
+            for rid in retry:
+                if rid not in missing:
+                    del self.f_pending[rid]
+            for rid in missing:
+                self.f_pending.setdefault(rid, now)
+            fills = [r for r in fills if r[1] is not None and r[1] <= self.o_last]
+        if self.f_pending:
+            cutoff = time.monotonic() - _PENDING_TTL_SEC
+            old = [rid for rid, since in self.f_pending.items() if since < cutoff]
+            for rid in old:
+                del self.f_pending[rid]
+            self.f_dropped += len(old)
+        if fills:
+            f = np.asarray(fills, np.float64)
+            self.f_order = np.concatenate([self.f_order, np.searchsorted(self.o_rowid, f[:, 1].astype(np.int64))])
+            self.f_ts = np.concatenate([self.f_ts, f[:, 2]])
+            self.f_px = np.concatenate([self.f_px, f[:, 3]])
+            self.f_sz = np.concatenate([self.f_sz, f[:, 4]])
+
+
+_cache = _Cache() if np is not None else None
+
+
+def _day_ts(day: str) -> float:
+    """YYYY-MM-DD -> epoch (UTC); ValueError bij een ongeldige datum (router -> 400)."""
+    try:
+        return float(calendar.timegm(time.strptime(day, "%Y-%m-%d")))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date {day!r}, expected YYYY-MM-DD")
+
+
+def compute(day_from: Optional[str] = None, day_to: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
+    if np is None:
+        raise RuntimeError(f"numpy not available: {_IMPORT_ERROR!r}")
+    t0 = time.perf_counter()
+    now = time.time()
+    day_to = day_to or time.strftime("%Y-%m-%d", time.gmtime(now))
+    day_from = day_from or time.strftime("%Y-%m-%d", time.gmtime(now - days * 86400))
+    ts_from, ts_to = _day_ts(day_from), _day_ts(day_to) + 86400.0
+
+    ledger.flush()
+    c = _cache
+    with c.lock:
+        c.refresh()
+        sel = np.flatnonzero((c.o_ts >= ts_from) & (c.o_ts < ts_to))
+        # fills van geselecteerde orders, geherindexeerd naar 0..n-1
+        pos = np.full(len(c.o_ts), -1, np.int64)
+        pos[sel] = np.arange(len(sel))
+        f_idx = pos[c.f_order]
+        keep = f_idx >= 0
+        f_idx, f_ts, f_px, f_sz = f_idx[keep], c.f_ts[keep], c.f_px[keep], c.f_sz[keep]
+        strategy, symbol = c.o_strategy[sel], c.o_symbol[sel]
+        sign, qty, arrival, sub_ts = c.o_sign[sel], c.o_qty[sel], c.o_arrival[sel], c.o_ts[sel]
+
+        pending, dropped = len(c.f_pending), c.f_dropped
+
+    n = len(sel)
+    result: Dict[str, Any] = {
+        "day_from": day_from, "day_to": day_to, "orders": int(n), "fills": int(len(f_idx)),
+        "fills_pending_meta": pending, "fills_dropped_meta": dropped,
+    }
+    if n == 0:
+        result.update({"by_strategy": [], "by_symbol": [], "elapsed_ms": round((time.perf_counter() - t0) * 1e3, 2)})
+        return result
+
+    filled = np.bincount(f_idx, weights=f_sz, minlength=n)
+    notional = np.bincount(f_idx, weights=f_px * f_sz, minlength=n)
+    first = np.full(n, np.inf)
+    np.minimum.at(first, f_idx, f_ts)
+    last = np.full(n, -np.inf)
+    np.maximum.at(last, f_idx, f_ts)
+    first[np.isinf(first)] = np.nan
+    last[np.isinf(last)] = np.nan
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.where(filled > 0, notional / filled, np.nan)
+        slip = sign * (avg - arrival) / arrival * 1e4
+    has_slip = ~np.isnan(slip)
+    t_first = first - sub_ts
+    t_full = np.where(filled >= qty, last - sub_ts, np.nan)
+
+    cols = {"qty": qty, "filled": filled, "slip": slip, "has_slip": has_slip, "t_first": t_first, "t_full": t_full}
+    result["by_strategy"] = _group(strategy, cols)
+    result["by_symbol"] = _group(symbol, cols)
+    result["elapsed_ms"] = round((time.perf_counter() - t0) * 1e3, 2)
+    return result
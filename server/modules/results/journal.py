@@ -0,0 +1,349 @@
+"""
+Order journal: append-only log van de order lifecycle, voor herstel na een crash/herstart.
+- events: SUBMIT (internal_id, order, adapter, strategy), RESULT (volledige RESULTS-entry na elke
+  wijziging: ack/ibkr_order_id, status, fill, cancel, reject) en OCA (exit_types registry)
+- RESULT komt via de records-listener (adapters) en records.notify in order_transmitting.service;
+  het order-detail gaat 1x per internal_id mee, niet bij elke statuswijziging
+- record = u32 lengte + u32 crc32 + marshal-payload; appenden is O(1) op de aanroepende thread,
+  1 writer-thread schrijft batches en doet fsync (JOURNAL_FSYNC_MS)
+- write/fsync faalt (disk vol e.d.): de batch gaat terug vooraan in de buffer en het segment wordt
+  afgesloten; de volgende batch opent een nieuw segment (nooit appenden achter een half geschreven record)
+- snapshot (ORDERS + RESULTS + OCA registry) elke JOURNAL_SNAPSHOT_EVENTS events en bij afsluiten;
+  daarna begint een nieuw segment en verdwijnen de oude
+- replay bij startup: laatste snapshot + segmenten erna; een half geschreven staart (crash) stopt
+  enkel dat segment. Events zijn toestanden (last writer wins), dus dubbel toepassen is onschadelijk.
+  De ibkr-adapter bouwt daarna zijn orderId-index en trade-events op uit de gereplayde RESULTS
+- uit in een HTTP-worker achter de broker-gateway (IBKR_ADAPTER=gateway): daar journaalt de gateway
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import marshal
+import os
+import struct
+import threading
+import time
+import zlib
+
+from server.modules.data.store import ORDERS, RESULTS
+from server.modules.results import records
+
+_DIR = Path(os.getenv("JOURNAL_DIR", str(Path(__file__).resolve().parents[3] / "data" / "journal")))
+_ENABLED = os.getenv("JOURNAL_ENABLED", "1") != "0"
+_FSYNC_SEC = float(os.getenv("JOURNAL_FSYNC_MS", "20")) / 1000.0
+_SNAPSHOT_EVENTS = int(os.getenv("JOURNAL_SNAPSHOT_EVENTS", "200000"))   # 0 = enkel bij afsluiten
+
+SUBMIT, RESULT, OCA = 1, 2, 3
+_VERSION = 1
+_REC = struct.Struct("<II")
+
+_lock = threading.Lock()        # buffer (kort: enkel append/swap)
+_io_lock = threading.Lock()     # bestand: schrijven, fsync, segment wisselen
+_wake = threading.Event()
+_buf: List[bytes] = []
+_fh = None
+_seg = 0
+_since_snapshot = 0
+_started = False
+_closing = False
+_thread: Optional[threading.Thread] = None
+# internal_ids waarvan het order-detail al in het journal staat
+_has_detail: set = set()
+_stats: Dict[str, Any] = {"events": 0, "bytes": 0, "batches": 0, "snapshots": 0, "replay": None}
+
+
+def _seg_path(n: int) -> Path:
+    return _DIR / f"seg-{n:06d}.log"
+
+
+def _snap_path(n: int) -> Path:
+    return _DIR / f"snap-{n:06d}.bin"
+
+
+def _numbered(prefix: str) -> List[Tuple[int, Path]]:
+    out = []
+    for p in _DIR.glob(f"{prefix}-*"):
+        try:
+            out.append((int(p.stem.split("-", 1)[1]), p))
+        except ValueError:
+            continue
+    return sorted(out)
+
+
+def _dumps(obj: Any) -> bytes:
+    try:
+        return marshal.dumps(obj)
+    except ValueError:
+        # niet-builtin types in een order/result (bv. datetime): via JSON naar builtins
+        return marshal.dumps(json.loads(json.dumps(obj, default=str)))
+
+
+def _append(payload: tuple) -> None:
+    global _since_snapshot
+    body = _dumps(payload)
+    rec = _REC.pack(len(body), zlib.crc32(body)) + body
+    with _lock:
+        _buf.append(rec)
+        _since_snapshot += 1
+    _stats["events"] += 1
+
+
+# ---- events ----
+
+def submit(internal_id: str, order: dict, adapter: Optional[str] = None, strategy_id: Optional[str] = None) -> None:
+    if not _started:
+        return
+    _has_detail.add(internal_id)
+    _append((SUBMIT, time.time(), internal_id, order, adapter, strategy_id))
+
+
+def _on_records(ids: List[str]) -> None:
+    """records-listener: 1 RESULT per gewijzigde id (detail enkel de eerste keer)."""
+    now = time.time()
+    for iid in ids:
+        res = RESULTS.get(iid)
+        if res is None:
+            continue
+        detail = None
+        if iid not in _has_detail and res.get("detail"):
+            detail = res["detail"]
+            _has_detail.add(iid)
+        _append((RESULT, now, iid, {k: v for k, v in res.items() if k != "detail"}, detail))
+
+
+def oca(group: str, record: Optional[Dict[str, Any]]) -> None:
+    if _started:
+        _append((OCA, time.time(), group, record))
+
+
+# ---- writer ----
+
+def _open_segment(n: int) -> None:
+    global _fh, _seg
+    if _fh is not None:
+        _fh.flush()
+        os.fsync(_fh.fileno())
+        _fh.close()
+    _seg = n
+    _fh = open(_seg_path(n), "ab")
+
+
+def _swap() -> bytes:
+    """Onder _lock: buffer leegmaken."""
+    global _buf
+    data = b"".join(_buf)
+    _buf = []
+    return data
+
+
+def _write(data: bytes) -> int:
+    """
+    Onder _io_lock (niet _lock: appenders wachten nooit op een fsync).
+    Bij een fout: data terug vooraan in de buffer, segment dicht; de volgende write opent een nieuw.
+    """
+    global _fh
+    if not data or not _started:
+        return 0
+    try:
+        if _fh is None:
+            _open_segment(_seg + 1)
+        _fh.write(data)
+        _fh.flush()
+        os.fsync(_fh.fileno())
+    except BaseException:
+        with _lock:
+            _buf.insert(0, data)
+        fh, _fh = _fh, None
+        if fh is not None:
+            try:
+                fh.close()
+            except OSError:
+                pass
+        _stats["write_errors"] = _stats.get("write_errors", 0) + 1
+        raise
+    _stats["bytes"] += len(data)
+    _stats["batches"] += 1
+    return len(data)
+
+
+def flush() -> int:
+    with _io_lock:
+        with _lock:
+            data = _swap()
+        return _write(data)
+
+
+def _writer() -> None:
+    while not _closing:
+        _wake.wait(_FSYNC_SEC)
+        _wake.clear()
+        try:
+            flush()
+            if _SNAPSHOT_EVENTS and _since_snapshot >= _SNAPSHOT_EVENTS:
+                snapshot()
+        except Exception as e:
+            # disk vol e.d.: events blijven in de buffer en gaan mee met de volgende batch
+            _stats["error"] = f"{e.__class__.__name__}: {e}"
+
+
+def snapshot() -> Optional[Path]:
+    """Volledige toestand wegschrijven; oude segmenten/snapshots daarna weg. Return het pad."""
+    global _since_snapshot
+    if not _started:
+        return None
+    from server.modules.exit_types import registry as oca_registry
+    with _io_lock:
+        with _lock:
+            data = _swap()
+            _since_snapshot = 0
+            state = (_VERSION, _seg + 1, time.time(), dict(ORDERS), dict(RESULTS), oca_registry.dump())
+        # alles vóór de swap zit in de state; wat erna komt gaat naar het nieuwe segment
+        _write(data)
+        n = _seg + 1
+        _open_segment(n)
+    path = _snap_path(n)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        body = _dumps(state)
+        f.write(_REC.pack(len(body), zlib.crc32(body)) + body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    for k, p in _numbered("seg") + _numbered("snap"):
+        if k < n:
+            p.unlink(missing_ok=True)
+    _stats["snapshots"] += 1
+    return path
+
+
+# ---- replay ----
+
+def _read_records(data: bytes):
+    """(payload, ...) tot het einde of de eerste onvolledige/corrupte record."""
+    off, end = 0, len(data)
+    size = _REC.size
+    view = memoryview(data)
+    while off + size <= end:
+        n, crc = _REC.unpack_from(data, off)
+        body = view[off + size:off + size + n]
+        if len(body) < n or zlib.crc32(body) != crc:
+            return
+        yield marshal.loads(body)
+        off += size + n
+
+
+def _load_snapshot() -> int:
+    """Laatste geldige snapshot toepassen; return het segmentnummer waar replay verder gaat."""
+    from server.modules.exit_types import registry as oca_registry
+    for n, p in reversed(_numbered("snap")):
+        state = next(_read_records(p.read_bytes()), None)
+        if state is None or state[0] != _VERSION:
+            continue
+        _, seg, _, orders, results, ocas = state
+        ORDERS.update(orders)
+        RESULTS.update(results)
+        oca_registry.restore(ocas)
+        return seg
+    return 0
+
+
+def replay() -> Dict[str, Any]:
+    """Bouw ORDERS, RESULTS en de OCA registry opnieuw op uit snapshot + journal."""
+    from server.modules.exit_types import registry as oca_registry
+    t0 = time.perf_counter()
+    _DIR.mkdir(parents=True, exist_ok=True)
+    start = _load_snapshot()
+    events = 0
+    segments = [(n, p) for n, p in _numbered("seg") if n >= start]
+    orders, results = ORDERS, RESULTS
+    for _, p in segments:
+        for ev in _read_records(p.read_bytes()):
+            kind = ev[0]
+            if kind == RESULT:
+                iid, res, detail = ev[2], ev[3], ev[4]
+                if detail is None:
+                    prev = results.get(iid)
+                    detail = prev.get("detail") if prev else orders.get(iid)
+                if detail is not None:
+                    res["detail"] = detail
+                results[iid] = res
+            elif kind == SUBMIT:
+                orders[ev[2]] = ev[3]
+            elif kind == OCA:
+                oca_registry.restore({ev[2]: ev[3]})
+            events += 1
+    _has_detail.update(iid for iid, r in results.items() if r.get("detail"))
+    _has_detail.update(orders)
+    out = {
+        "snapshot": start or None,
+        "segments": len(segments),
+        "events": events,
+        "orders": len(orders),
+        "results": len(results),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    _stats["replay"] = out
+    return out
+
+
+# ---- lifecycle ----
+
+def enabled() -> bool:
+    from server.modules.order_transmitting.adapters import registry
+    return _ENABLED and registry.default_name() != "gateway"
+
+
+def start() -> Optional[Dict[str, Any]]:
+    """Replay + writer starten (1x; vóór de adapters, zodat hun events na de replay komen)."""
+    global _started, _closing, _thread
+    if _started or not enabled():
+        return None
+    _closing = False
+    out = replay()
+    with _io_lock:
+        # nooit verder schrijven achter een mogelijk half geschreven staart
+        last = max([n for n, _ in _numbered("seg")] + [n for n, _ in _numbered("snap")] + [0])
+        _open_segment(last + 1)
+    _started = True
+    records.subscribe(_on_records)
+    _thread = threading.Thread(target=_writer, name="order-journal", daemon=True)
+    _thread.start()
+    return out
+
+
+def close(snapshot_on_close: bool = True) -> None:
+    """Afsluiten: rest flushen en (default) een snapshot zodat de volgende startup bijna niets replayt."""
+    global _started, _closing, _fh
+    if not _started:
+        return
+    records.unsubscribe(_on_records)
+    _closing = True
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout=2.0)
+    if snapshot_on_close:
+        snapshot()
+    with _io_lock:
+        with _lock:
+            data = _swap()
+        try:
+            _write(data)
+        except OSError as e:
+            _stats["error"] = f"{e.__class__.__name__}: {e}"
+        if _fh is not None:
+            _fh.close()
+            _fh = None
+    _started = False
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "enabled": _started,
+        "dir": str(_DIR),
+        "segment": _seg,
+        "pending": len(_buf),
+        "since_snapshot": _since_snapshot,
+        **_stats,
+    }
@@ -0,0 +1,297 @@
+"""
+Fill ledger: append-only log van elke execution + commission (+ entry-order metadata).
+- schrijvers (IB-thread / sim) appenden in een kolom-buffer (array/list, geen dict per fill)
+- 1 flusher-thread schrijft batches naar SQLite (fills/commissions, index op symbol+day)
+- exec_id is de sleutel: dubbele executions (reconnect, reqExecutions) worden genegeerd
+"""
+
+from __future__ import annotations
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import os
+import threading
+import time
+
+from server.modules.data import positions
+from server.modules.data.market import reference_price
+from server.modules.persistence.db import (
+    fills_insert_many, commissions_insert_many, order_meta_insert_many, fills_query, pnl_by_symbol,
+)
+
+_FLUSH_SEC = float(os.getenv("LEDGER_FLUSH_MS", "500")) / 1000.0
+_BATCH = int(os.getenv("LEDGER_BATCH", "5000"))
+_SEEN_MAX = int(os.getenv("LEDGER_SEEN_MAX", "200000"))
+
+# IB gebruikt DBL_MAX voor "niet gezet"
+_UNSET = 1e300
+
+
+def _norm_side(side: str) -> str:
+    s = (side or "").upper()
+    return "BUY" if s in ("BOT", "BUY", "B") else "SELL"
+
+
+def _day_of(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+class _FillColumns:
+    __slots__ = ("exec_id", "internal_id", "ib_order_id", "symbol", "side", "ts", "price", "size")
+
+    def __init__(self):
+        self.exec_id: List[str] = []
+        self.internal_id: List[Optional[str]] = []
+        self.ib_order_id = array("q")      # -1 = onbekend
+        self.symbol: List[str] = []
+        self.side: List[str] = []
+        self.ts = array("d")
+        self.price = array("d")
+        self.size = array("d")
+
+    def __len__(self) -> int:
+        return len(self.exec_id)
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        return [
+            (eid, iid, (oid if oid >= 0 else None), sym, side, _day_of(ts), ts, px, sz)
+            for eid, iid, oid, sym, side, ts, px, sz in zip(
+                self.exec_id, self.internal_id, self.ib_order_id, self.symbol,
+                self.side, self.ts, self.price, self.size,
+            )
+        ]
+
+
+class _CommissionColumns:
+    __slots__ = ("exec_id", "commission", "currency", "realized_pnl")
+
+    def __init__(self):
+        self.exec_id: List[str] = []
+        self.commission = array("d")
+        self.currency: List[Optional[str]] = []
+        self.realized_pnl = array("d")     # NaN = onbekend
+
+    def __len__(self) -> int:
+        return len(self.exec_id)
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        return [
+            (eid, c, cur, (None if math.isnan(r) else r))
+            for eid, c, cur, r in zip(self.exec_id, self.commission, self.currency, self.realized_pnl)
+        ]
+
+
+class _OrderColumns:
+    """Entry-orders (strategy + arrival price) als basis voor slippage/fill-ratio analytics."""
+    __slots__ = ("internal_id", "strategy_id", "symbol", "side", "order_type", "quantity", "limit_price", "arrival_price", "ts")
+
+    def __init__(self):
+        self.internal_id: List[str] = []
+        self.strategy_id: List[Optional[str]] = []
+        self.symbol: List[str] = []
+        self.side: List[str] = []
+        self.order_type: List[str] = []
+        self.quantity = array("d")
+        self.limit_price = array("d")     # NaN = geen
+        self.arrival_price = array("d")   # NaN = onbekend
+        self.ts = array("d")
+
+    def __len__(self) -> int:
+        return len(self.internal_id)
+
+    def rows(self) -> List[Tuple[Any, ...]]:
+        nn = lambda v: None if math.isnan(v) else v
+        return [
+            (iid, sid, sym, side, typ, q, nn(lp), nn(ap), _day_of(ts), ts)
+            for iid, sid, sym, side, typ, q, lp, ap, ts in zip(
+                self.internal_id, self.strategy_id, self.symbol, self.side, self.order_type,
+                self.quantity, self.limit_price, self.arrival_price, self.ts,
+            )
+        ]
+
+
+_lock = threading.Lock()
+_fills = _FillColumns()
+_comms = _CommissionColumns()
+_orders = _OrderColumns()
+_wake = threading.Event()
+# exec_ids van dit proces (insertion-ordered, oudste eruit): herhaalde execDetails na een reconnect
+# mogen de positie-cache niet nog eens verschuiven; de DB negeert ze zelf al (INSERT OR IGNORE)
+_seen: Dict[str, None] = {}
+_retry_fills: List[Tuple[Any, ...]] = []
+_retry_comms: List[Tuple[Any, ...]] = []
+_retry_orders: List[Tuple[Any, ...]] = []
+_flush_lock = threading.Lock()
+_start_lock = threading.Lock()
+_flusher_started = False
+
+
+def record_fill(
+    *,
+    exec_id: str,
+    symbol: str,
+    side: str,
+    price: float,
+    size: float,
+    ts: Optional[float] = None,
+    internal_id: Optional[str] = None,
+    ib_order_id: Optional[int] = None,
+    account: Optional[str] = None,
+) -> None:
+    """Append 1 execution (O(1), geen I/O op de aanroepende thread) en werk de positie-cache bij."""
+    _start_flusher_once()
+    exec_id = str(exec_id)
+    with _lock:
+        if exec_id in _seen:
+            return
+        _seen[exec_id] = None
+        if len(_seen) > _SEEN_MAX:
+            del _seen[next(iter(_seen))]
+        c = _fills
+        c.exec_id.append(exec_id)
+        c.internal_id.append(internal_id)
+        c.ib_order_id.append(int(ib_order_id) if ib_order_id is not None else -1)
+        c.symbol.append(symbol)
+        c.side.append(_norm_side(side))
+        c.ts.append(float(ts if ts is not None else time.time()))
+        c.price.append(float(price))
+        c.size.append(float(size))
+        full = len(c) >= _BATCH
+    if full:
+        _wake.set()
+    positions.apply_fill(symbol, side, size, price, account)
+
+
+def record_commission(exec_id: str, commission: float, currency: Optional[str] = None, realized_pnl: Optional[float] = None) -> None:
+    _start_flusher_once()
+    if realized_pnl is None or abs(realized_pnl) >= _UNSET:
+        realized_pnl = math.nan
+    with _lock:
+        c = _comms
+        c.exec_id.append(str(exec_id))
+        c.commission.append(float(commission or 0.0))
+        c.currency.append(currency)
+        c.realized_pnl.append(float(realized_pnl))
+
+
+def record_order(
+    internal_id: str,
+    order: dict,
+    *,
+    strategy_id: Optional[str] = None,
+    arrival_price: Optional[float] = None,
+    ts: Optional[float] = None,
+) -> None:
+    """Registreer een entry-order; arrival_price = referentieprijs op het moment van insturen."""
+    _start_flusher_once()
+    ap = arrival_price if arrival_price is not None else order.get("arrival_price")
+    if not ap:
+        ap = reference_price(order.get("symbol"))
+    lp = order.get("limit_price")
+    with _lock:
+        c = _orders
+        c.internal_id.append(internal_id)
+        c.strategy_id.append(strategy_id)
+        c.symbol.append(order.get("symbol") or "")
+        c.side.append(_norm_side(order.get("side") or "BUY"))
+        c.order_type.append((order.get("order_type") or "MKT").upper())
+        c.quantity.append(float(order.get("quantity") or 0))
+        c.limit_price.append(float(lp) if lp else math.nan)
+        c.arrival_price.append(float(ap) if ap else math.nan)
+        c.ts.append(float(ts if ts is not None else time.time()))
+
+
+def record_ib_fill(fill, internal_id: Optional[str] = None) -> None:
+    """ib_insync Fill -> ledger (execution; commission volgt apart via commissionReportEvent)."""
+    ex = fill.execution
+    t = getattr(ex, "time", None)
+    record_fill(
+        exec_id=ex.execId,
+        symbol=fill.contract.symbol,
+        side=ex.side,
+        price=ex.price,
+        size=ex.shares,
+        ts=(t.timestamp() if t else None),
+        internal_id=internal_id,
+        ib_order_id=ex.orderId,
+        account=getattr(ex, "acctNumber", None),
+    )
+
+
+def record_ib_commission(fill, report) -> None:
+    record_commission(
+        fill.execution.execId,
+        report.commission,
+        getattr(report, "currency", None),
+        getattr(report, "realizedPNL", None),
+    )
+
+
+def flush() -> int:
+    """Swap de buffers en schrijf ze in 1 batch per tabel. Return: #fills geschreven."""
+    global _fills, _comms, _orders, _retry_fills, _retry_comms, _retry_orders
+    with _flush_lock:
+        with _lock:
+            fills, _fills = _fills, _FillColumns()
+            comms, _comms = _comms, _CommissionColumns()
+            orders, _orders = _orders, _OrderColumns()
+        orows, _retry_orders = _retry_orders + orders.rows(), []
+        try:
+            order_meta_insert_many(orows)
+        except Exception:
+            _retry_orders = orows
+            _retry_fills += fills.rows()
+            _retry_comms += comms.rows()
+            raise
+        frows, _retry_fills = _retry_fills + fills.rows(), []
+        crows, _retry_comms = _retry_comms + comms.rows(), []
+        try:
+            fills_insert_many(frows)
+        except Exception:
+            # rows bewaren voor de volgende flush; niets gaat verloren
+            _retry_fills, _retry_comms = frows, crows
+            raise
+        try:
+            commissions_insert_many(crows)
+        except Exception:
+            _retry_comms = crows
+            raise
+        return len(frows)
+
+
+def pending() -> int:
+    return (len(_fills) + len(_comms) + len(_orders)
+            + len(_retry_fills) + len(_retry_comms) + len(_retry_orders))
+
+
+def _flusher():
+    while True:
+        _wake.wait(_FLUSH_SEC)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def _start_flusher_once():
+    global _flusher_started
+    if _flusher_started:
+        return
+    with _start_lock:
+        if not _flusher_started:
+            threading.Thread(target=_flusher, daemon=True, name="fill-ledger").start()
+            _flusher_started = True
+
+
+# ---- queries (flushen eerst zodat de buffer meetelt) ----
+
+def list_fills(symbol: Optional[str] = None, day: Optional[str] = None, internal_id: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+    flush()
+    return fills_query(symbol=symbol, day=day, internal_id=internal_id, limit=limit)
+
+
+def daily_pnl(day: Optional[str] = None) -> Dict[str, Any]:
+    flush()
+    d = day or _day_of(time.time())
+    return {"day": d, "symbols": pnl_by_symbol(d)}
@@ -0,0 +1,118 @@
+"""
+Compacte order-records achter RESULTS.
+- 1 OrderRecord per internal_id, in-place geüpdatet door de schrijver (IB-thread)
+- alleen gewijzigde velden worden gezet; ongewijzigde events kosten geen allocatie
+- readers zien via RESULTS altijd een consistente snapshot (copy-on-write dict, atomische assign)
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from server.modules.data.store import RESULTS
+from server.modules.results import shared
+
+
+class OrderRecord:
+    __slots__ = (
+        "internal_id", "adapter", "status", "filled_qty", "avg_price",
+        "ibkr_order_id", "perm_id", "detail", "_snap",
+    )
+
+    def __init__(self, internal_id: str, adapter: str, detail: Optional[dict] = None):
+        self.internal_id = internal_id
+        self.adapter = adapter
+        self.status: Optional[str] = None
+        self.filled_qty: int = 0
+        self.avg_price: Optional[float] = None
+        self.ibkr_order_id: Optional[int] = None
+        self.perm_id: Optional[int] = None    # IB permId: blijft over herstarts (orderId van completed orders = 0)
+        self.detail = detail or {}   # statisch na aanmaak, gedeeld door alle snapshots
+        self._snap: Optional[Dict[str, Any]] = None
+
+    def update(
+        self, status: str, filled_qty: int, avg_price: Optional[float], ibkr_order_id: Optional[int],
+        perm_id: Optional[int] = None,
+    ) -> bool:
+        """Zet enkel gewijzigde velden (perm_id enkel als hij gekend is). Return True wanneer er iets veranderde."""
+        changed = False
+        if status != self.status:
+            self.status = status
+            changed = True
+        if filled_qty != self.filled_qty:
+            self.filled_qty = filled_qty
+            changed = True
+        if avg_price != self.avg_price:
+            self.avg_price = avg_price
+            changed = True
+        if ibkr_order_id != self.ibkr_order_id:
+            self.ibkr_order_id = ibkr_order_id
+            changed = True
+        if perm_id and perm_id != self.perm_id:
+            self.perm_id = perm_id
+            changed = True
+        if changed:
+            self._snap = None
+        return changed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Immutable view (niet muteren); wordt enkel herbouwd na een wijziging."""
+        snap = self._snap
+        if snap is None:
+            snap = {
+                "status": self.status or "unknown",
+                "filled_qty": self.filled_qty,
+                "avg_price": self.avg_price,
+                "detail": self.detail,
+                "ibkr_order_id": self.ibkr_order_id,
+                "perm_id": self.perm_id,
+                "adapter": self.adapter,
+            }
+            self._snap = snap
+        return snap
+
+
+# internal_id -> record (enkel de schrijver muteert records)
+RECORDS: Dict[str, OrderRecord] = {}
+
+
+def get_record(internal_id: str) -> Optional[OrderRecord]:
+    return RECORDS.get(internal_id)
+
+
+def ensure_record(internal_id: str, adapter: str, detail: Optional[dict] = None) -> OrderRecord:
+    rec = RECORDS.get(internal_id)
+    if rec is None:
+        rec = RECORDS[internal_id] = OrderRecord(internal_id, adapter, detail)
+    return rec
+
+
+def publish(rec: OrderRecord) -> None:
+    """Publiceer de actuele snapshot in RESULTS (1 atomische dict-assign) en, in de gateway, in shared memory."""
+    RESULTS[rec.internal_id] = rec.snapshot()
+    w = shared.WRITER
+    if w is not None:
+        w.put(rec.internal_id, rec.status, rec.filled_qty, rec.avg_price, rec.ibkr_order_id)
+
+
+# downstream listeners: fn(changed_ids) 1x per batch, op de schrijver-thread (kort houden!)
+_LISTENERS: List[Callable[[List[str]], None]] = []
+
+
+def subscribe(fn: Callable[[List[str]], None]) -> None:
+    if fn not in _LISTENERS:
+        _LISTENERS.append(fn)
+
+
+def unsubscribe(fn: Callable[[List[str]], None]) -> None:
+    if fn in _LISTENERS:
+        _LISTENERS.remove(fn)
+
+
+def notify(changed_ids: Iterable[str]) -> None:
+    ids = list(changed_ids)
+    for fn in list(_LISTENERS):
+        try:
+            fn(ids)
+        except Exception:
+            # een listener mag de event-flow nooit breken
+            pass
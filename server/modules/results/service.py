@@ -1,7 +1,21 @@
 from server.modules.data.store import RESULTS
+from server.modules.results import shared
 
 def get_result(order_id: str) -> dict:
-    return RESULTS.get(order_id, {"status":"unknown","order_id":order_id})
+    """
+    Lokale RESULTS; in een HTTP-worker achter de broker-gateway gaan de velden uit de shared-memory
+    tabel voor (actueler dan de push, geen IPC).
+    """
+    res = RESULTS.get(order_id)
+    table = shared.READER
+    if table is not None:
+        try:
+            cur = table.get(order_id)
+        except (ValueError, TypeError):
+            cur = None      # tabel net losgekoppeld (gateway herstart)
+        if cur is not None:
+            return {**res, **cur} if res else {**cur, "order_id": order_id, "adapter": "gateway"}
+    return res if res is not None else {"status":"unknown","order_id":order_id}
 
 def list_results() -> dict:
     return RESULTS
@@ -0,0 +1,223 @@
+"""
+Gedeelde result-tabel in shared memory (multiprocessing.shared_memory) voor multi-worker deployments.
+- de broker-gateway maakt de tabel en is de enige schrijver (records.publish, dus ook
+  _update_results_from_trade en de sim); HTTP-workers koppelen read-only aan
+- vaste records van 80 bytes: seq u64 | internal_id 32s | status 16s | filled_qty f64 | avg_price f64 | ibkr_order_id i64
+- index = open addressing (crc32 van de id, lineair proberen) in de records zelf; ids worden nooit verwijderd
+- seqlock per record: oneven seq = schrijven bezig; readers lezen met struct.unpack_from rechtstreeks
+  uit de buffer en proberen opnieuw bij een half geschreven record, maximaal _READ_RETRIES keer
+  (gateway gecrasht midden in een write = seq blijft oneven): daarna None, de caller valt terug op RESULTS
+- header bevat een generatie: een herstarte gateway maakt een nieuwe tabel, workers koppelen opnieuw
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Optional
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+_NAME = os.getenv("RESULTS_SHM_NAME", "ibkr_results")
+_SLOTS = int(os.getenv("RESULTS_SHM_SLOTS", "262144"))        # 80 bytes per slot (~21 MB)
+_MAX_LOAD = 0.75
+_READ_RETRIES = 200          # een write duurt µs; 200 yields is ruim
+
+_MAGIC = b"RSHM"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIIQQ")           # magic, versie, slots, slot size, generatie, count
+_HEADER_SIZE = 64
+_SEQ = struct.Struct("<Q")
+_KEY = struct.Struct("<32s")
+_BODY = struct.Struct("<32s16sddq")
+_SLOT = struct.Struct("<Q32s16sddq")
+_SLOT_SIZE = _SLOT.size
+_KEY_MAX = 32
+_EMPTY_KEY = bytes(_KEY_MAX)
+
+
+def _attach_shm(name: str):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # < 3.13: ook attach registreert bij de resource_tracker, die de tabel bij exit zou unlinken
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        return shm
+
+
+class SharedResultTable:
+    def __init__(self, shm, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self.owner = owner
+        magic, version, slots, slot_size, gen, _ = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _VERSION or slot_size != _SLOT_SIZE:
+            raise ValueError(f"shared result table {shm.name}: onbekend formaat")
+        self.name = shm.name
+        self.slots = slots
+        self.generation = gen
+        self._wlock = threading.Lock()
+        self._count = _HEADER.unpack_from(self._buf, 0)[5]
+        self.stats = {"writes": 0, "full": 0, "retries": 0, "torn": 0}
+
+    # ---- aanmaken / koppelen ----
+
+    @classmethod
+    def create(cls, name: str = _NAME, slots: int = _SLOTS) -> "SharedResultTable":
+        from multiprocessing import shared_memory
+        size = _HEADER_SIZE + slots * _SLOT_SIZE
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # achtergebleven tabel van een gecrashte gateway (de socket-bind sluit een 2e gateway al uit)
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, _VERSION, slots, _SLOT_SIZE, time.time_ns(), 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str = _NAME) -> "SharedResultTable":
+        return cls(_attach_shm(name), owner=False)
+
+    def spec(self) -> Dict[str, Any]:
+        return {"name": self.name, "generation": self.generation, "slots": self.slots}
+
+    def close(self) -> None:
+        with self._wlock:
+            self._buf = None
+        try:
+            self._shm.close()
+            if self.owner:
+                self._shm.unlink()
+        except (OSError, BufferError):
+            pass
+
+    # ---- schrijver (gateway) ----
+
+    def put(self, internal_id: str, status: Optional[str], filled_qty: float,
+            avg_price: Optional[float], ibkr_order_id: Optional[int]) -> bool:
+        key = internal_id.encode()
+        if len(key) > _KEY_MAX:
+            return False
+        with self._wlock:
+            buf = self._buf
+            if buf is None:
+                return False
+            off = self._find(key, insert=True)
+            if off is None:
+                self.stats["full"] += 1
+                return False
+            seq = _SEQ.unpack_from(buf, off)[0]
+            _SEQ.pack_into(buf, off, seq + 1)
+            _BODY.pack_into(
+                buf, off + 8, key, (status or "unknown").encode()[:16], float(filled_qty or 0),
+                math.nan if avg_price is None else float(avg_price),
+                -1 if ibkr_order_id is None else int(ibkr_order_id),
+            )
+            _SEQ.pack_into(buf, off, seq + 2)
+            self.stats["writes"] += 1
+        return True
+
+    def _find(self, key: bytes, insert: bool = False) -> Optional[int]:
+        """Offset van het record voor key (insert: claim de eerste vrije slot)."""
+        buf, slots = self._buf, self.slots
+        padded = key.ljust(_KEY_MAX, b"\0")
+        i = zlib.crc32(key) % slots
+        for _ in range(slots):
+            off = _HEADER_SIZE + i * _SLOT_SIZE
+            k = _KEY.unpack_from(buf, off + 8)[0]
+            if k == padded:
+                return off
+            if k == _EMPTY_KEY:
+                if not insert or self._count >= slots * _MAX_LOAD:
+                    return None
+                self._count += 1
+                _HEADER.pack_into(buf, 0, _MAGIC, _VERSION, slots, _SLOT_SIZE, self.generation, self._count)
+                return off
+            i = i + 1 if i + 1 < slots else 0
+        return None
+
+    # ---- readers (elk proces) ----
+
+    def get(self, internal_id: str) -> Optional[Dict[str, Any]]:
+        """{"status", "filled_qty", "avg_price", "ibkr_order_id"} of None (onbekend, id te lang, half geschreven)."""
+        key = internal_id.encode()
+        if len(key) > _KEY_MAX:
+            return None
+        buf, slots = self._buf, self.slots
+        padded = key.ljust(_KEY_MAX, b"\0")
+        i = zlib.crc32(key) % slots
+        for _ in range(slots):
+            off = _HEADER_SIZE + i * _SLOT_SIZE
+            for _ in range(_READ_RETRIES):
+                seq, k, status, filled, avg, oid = _SLOT.unpack_from(buf, off)
+                if not seq & 1 and _SEQ.unpack_from(buf, off)[0] == seq:
+                    break
+                self.stats["retries"] += 1
+                time.sleep(0)
+            else:
+                self.stats["torn"] += 1
+                return None
+            if k == padded:
+                return {
+                    "status": status.rstrip(b"\0").decode(),
+                    "filled_qty": int(filled) if filled.is_integer() else filled,
+                    "avg_price": None if avg != avg else avg,
+                    "ibkr_order_id": None if oid < 0 else oid,
+                }
+            if k == _EMPTY_KEY:
+                return None
+            i = i + 1 if i + 1 < slots else 0
+        return None
+
+    def count(self) -> int:
+        return _HEADER.unpack_from(self._buf, 0)[5]
+
+
+# gateway: WRITER (records.publish schrijft erin); worker: READER (results.service leest eruit)
+WRITER: Optional[SharedResultTable] = None
+READER: Optional[SharedResultTable] = None
+
+
+def create_writer() -> SharedResultTable:
+    """Gateway: nieuwe tabel, gevuld met de huidige RESULTS."""
+    global WRITER
+    from server.modules.data.store import RESULTS
+    table = SharedResultTable.create()
+    for iid, r in list(RESULTS.items()):
+        table.put(iid, r.get("status"), r.get("filled_qty") or 0, r.get("avg_price"), r.get("ibkr_order_id"))
+    WRITER = table
+    return table
+
+
+def close_writer() -> None:
+    global WRITER
+    table, WRITER = WRITER, None
+    if table is not None:
+        table.close()
+
+
+def attach_reader(spec: Optional[Dict[str, Any]]) -> Optional[SharedResultTable]:
+    """Worker: koppel aan de tabel uit de gateway-HELLO (opnieuw als de generatie wijzigde)."""
+    global READER
+    cur = READER
+    if not spec:
+        READER = None
+    elif cur is None or cur.name != spec.get("name") or cur.generation != spec.get("generation"):
+        try:
+            table = SharedResultTable.attach(spec["name"])
+        except (OSError, ValueError):
+            table = None     # bv. gateway op een andere host/container: reads vallen terug op RESULTS
+        READER = table if table is not None and table.generation == spec.get("generation") else None
+    if cur is not None and cur is not READER:
+        cur.close()
+    return READER
@@ -0,0 +1,276 @@
+"""
+Pre-trade risk checks op het order-pad (enqueue_order / submit_bracket / graph nodes).
+- limieten per symbool zijn voorberekend (defaults + overrides) in 1 _Limits object
+- order-rate via token buckets (globaal + per symbool)
+- exposure = positie (positions._NET, O(1)) + gereserveerde open order-qty per symbool;
+  reservaties worden vrijgegeven via de records-listener (fills/cancels) of bij een adapter-fout
+- fat finger: limit/stop prijs t.o.v. de referentieprijs uit de quote cache
+- notional/exposure: prijs = limit/stop, anders de quote cache, anders de adapter (sim-boek, IB-snapshot),
+  anders RISK_FALLBACK_PRICE. Geen prijs: check overgeslagen, of afgewezen met RISK_REQUIRE_PRICE=1
+Elke check is een handvol dict-lookups en vergelijkingen onder 1 lock.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+import math
+import os
+import threading
+import time
+
+from server.modules.data import positions
+from server.modules.data.market import reference_price
+from server.modules.data.store import RESULTS
+from server.modules.results import records
+
+
+def _env(name: str, default: str) -> float:
+    v = float(os.getenv(name, default))
+    return v if v > 0 else math.inf     # 0 = geen limiet
+
+
+_ENABLED = os.getenv("RISK_ENABLED", "1") != "0"
+# prijs voor notional/exposure als er geen limit/stop, quote of adapterprijs is (0 = geen)
+_FALLBACK_PRICE = float(os.getenv("RISK_FALLBACK_PRICE", "0")) or None
+# 1 = order zonder enige prijs afwijzen als er een notional/exposure-limiet is; 0 = die checks overslaan
+_REQUIRE_PRICE = os.getenv("RISK_REQUIRE_PRICE", "0") == "1"
+
+_DEFAULTS: Dict[str, float] = {
+    "max_order_qty": _env("RISK_MAX_ORDER_QTY", "10000"),
+    "max_order_notional": _env("RISK_MAX_ORDER_NOTIONAL", "1000000"),
+    "max_symbol_exposure": _env("RISK_MAX_SYMBOL_EXPOSURE", "2000000"),   # |positie + open| * prijs
+    "max_price_deviation_bps": _env("RISK_MAX_PRICE_DEVIATION_BPS", "1000"),
+    "orders_per_sec": _env("RISK_ORDERS_PER_SEC", "200"),                 # globaal
+    "symbol_orders_per_sec": _env("RISK_SYMBOL_ORDERS_PER_SEC", "50"),
+}
+
+_DONE = ("filled", "cancelled", "apicancelled", "inactive", "error", "rejected")
+
+
+class _Limits:
+    __slots__ = ("max_order_qty", "max_order_notional", "max_symbol_exposure", "max_price_deviation_bps", "symbol_orders_per_sec")
+
+    def __init__(self, values: Dict[str, float]):
+        for k in self.__slots__:
+            setattr(self, k, float(values[k]))
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {k: (None if math.isinf(getattr(self, k)) else getattr(self, k)) for k in self.__slots__}
+
+
+class _Bucket:
+    """Token bucket: `rate` per seconde, burst = 1 seconde aan tokens."""
+    __slots__ = ("rate", "tokens", "ts")
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.ts = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        if math.isinf(self.rate):
+            return True
+        t = self.tokens + (now - self.ts) * self.rate
+        if t > self.rate:
+            t = self.rate
+        self.ts = now
+        if t < 1.0:
+            self.tokens = t
+            return False
+        self.tokens = t - 1.0
+        return True
+
+
+class _SymState:
+    __slots__ = ("limits", "bucket", "open_buy", "open_sell")
+
+    def __init__(self, limits: _Limits):
+        self.limits = limits
+        self.bucket = _Bucket(limits.symbol_orders_per_sec)
+        self.open_buy = 0.0
+        self.open_sell = 0.0
+
+
+_lock = threading.Lock()
+_default_limits = _Limits(_DEFAULTS)
+_overrides: Dict[str, Dict[str, float]] = {}
+_global_bucket = _Bucket(_DEFAULTS["orders_per_sec"])
+_SYMS: Dict[str, _SymState] = {}
+# internal_id -> [symbol, buy?, gereserveerde qty, al vrijgegeven (gevuld) qty]
+_RESERVED: Dict[str, List[Any]] = {}
+_stats = {"checked": 0, "rejected": 0}
+_halted: Optional[str] = None
+
+
+def _state(symbol: str) -> _SymState:
+    st = _SYMS.get(symbol)
+    if st is None:
+        ov = _overrides.get(symbol)
+        st = _SYMS[symbol] = _SymState(_Limits({**_DEFAULTS, **ov}) if ov else _default_limits)
+    return st
+
+
+def check(
+    internal_id: str, order: dict, exit_only: bool = False,
+    price_source: Optional[Callable[[str], Optional[float]]] = None,
+) -> Optional[str]:
+    """
+    Return None (ok, qty gereserveerd onder internal_id) of de reden van afwijzing.
+    exit_only: bracket-exits/OCO legs; enkel rate-limit en kill switch.
+    price_source: adapter.reference_price, enkel gevraagd (buiten de lock) als er geen limit/stop en geen quote is.
+    """
+    if not _ENABLED:
+        return None
+    symbol = order.get("symbol") or ""
+    qty = float(order.get("quantity") or 0)
+    buy = (order.get("side") or "BUY").upper() == "BUY"
+    ref = reference_price(symbol)
+    px = order.get("limit_price") or order.get("stop_price")
+    if not px and ref is None and not exit_only and price_source is not None:
+        try:
+            ref = price_source(symbol) or None
+        except Exception:
+            ref = None
+    with _lock:
+        _stats["checked"] += 1
+        reason = _check_locked(symbol, qty, buy, ref, float(px) if px else None, exit_only)
+        if reason is not None:
+            _stats["rejected"] += 1
+            return reason
+        if not exit_only:
+            st = _SYMS[symbol]
+            if buy:
+                st.open_buy += qty
+            else:
+                st.open_sell += qty
+            _RESERVED[internal_id] = [symbol, buy, qty, 0.0]
+    return None
+
+
+def _check_locked(symbol: str, qty: float, buy: bool, ref: Optional[float], px: Optional[float], exit_only: bool) -> Optional[str]:
+    if _halted:
+        return f"trading halted: {_halted}"
+    st = _state(symbol)
+    lim = st.limits
+    now = time.monotonic()
+    if not _global_bucket.take(now):
+        return f"order rate > {_global_bucket.rate:g}/s"
+    if not st.bucket.take(now):
+        return f"order rate for {symbol} > {st.bucket.rate:g}/s"
+    if exit_only:
+        return None
+    if qty > lim.max_order_qty:
+        return f"quantity {qty:g} > max {lim.max_order_qty:g}"
+    if px is not None and ref:
+        dev = abs(px - ref) / ref * 1e4
+        if dev > lim.max_price_deviation_bps:
+            return f"price {px:g} deviates {dev:.0f} bps from reference {ref:g} (max {lim.max_price_deviation_bps:g})"
+    if math.isinf(lim.max_order_notional) and math.isinf(lim.max_symbol_exposure):
+        return None
+    price = px or ref or _FALLBACK_PRICE
+    if price is None:
+        return f"no reference price for {symbol} (notional/exposure check)" if _REQUIRE_PRICE else None
+    if qty * price > lim.max_order_notional:
+        return f"notional {qty * price:,.0f} > max {lim.max_order_notional:,.0f}"
+    pos = positions.get_position(symbol)
+    worst = (pos + st.open_buy + qty) if buy else (pos - st.open_sell - qty)
+    if abs(worst) * price > lim.max_symbol_exposure:
+        return f"{symbol} exposure {abs(worst) * price:,.0f} > max {lim.max_symbol_exposure:,.0f}"
+    return None
+
+
+def release(internal_id: str) -> None:
+    """Geef de (resterende) reservatie vrij, bv. als de adapter de order weigerde."""
+    with _lock:
+        r = _RESERVED.pop(internal_id, None)
+        if r is not None:
+            _unreserve(r, r[2] - r[3])
+
+
+def _unreserve(r: List[Any], qty: float) -> None:
+    st = _SYMS.get(r[0])
+    if st is None or qty <= 0:
+        return
+    if r[1]:
+        st.open_buy = max(0.0, st.open_buy - qty)
+    else:
+        st.open_sell = max(0.0, st.open_sell - qty)
+
+
+def _on_records(ids: List[str]) -> None:
+    """records-listener: gevulde qty gaat van 'open' naar positie; eindstatus geeft de rest vrij."""
+    if not _RESERVED:
+        return
+    with _lock:
+        for iid in ids:
+            r = _RESERVED.get(iid)
+            if r is None:
+                continue
+            res = RESULTS.get(iid) or {}
+            filled = float(res.get("filled_qty") or 0)
+            if filled > r[3]:
+                _unreserve(r, min(filled, r[2]) - r[3])
+                r[3] = min(filled, r[2])
+            if (res.get("status") or "") in _DONE:
+                _unreserve(r, r[2] - r[3])
+                del _RESERVED[iid]
+
+
+records.subscribe(_on_records)
+
+
+def reject(internal_id: str, order: dict, reason: str, adapter: Optional[str] = None) -> None:
+    RESULTS[internal_id] = {
+        "status": "rejected",
+        "error": f"risk: {reason}",
+        "detail": order,
+        "adapter": adapter,
+    }
+
+
+# ---- configuratie / inzage ----
+
+def set_limits(values: Dict[str, Any], symbol: Optional[str] = None) -> Dict[str, Any]:
+    """Update defaults (symbol=None) of overrides voor 1 symbool; 0/None = geen limiet."""
+    global _default_limits, _global_bucket
+    clean = {k: (float(v) if v else math.inf) for k, v in values.items() if k in _DEFAULTS}
+    with _lock:
+        if symbol is None:
+            _DEFAULTS.update(clean)
+            _default_limits = _Limits(_DEFAULTS)
+            if "orders_per_sec" in clean:
+                _global_bucket = _Bucket(_DEFAULTS["orders_per_sec"])
+        else:
+            _overrides.setdefault(symbol, {}).update(clean)
+        # states opnieuw opbouwen (open qty blijft behouden)
+        for sym, st in list(_SYMS.items()):
+            ov = _overrides.get(sym)
+            lim = _Limits({**_DEFAULTS, **ov}) if ov else _default_limits
+            if lim.symbol_orders_per_sec != st.limits.symbol_orders_per_sec:
+                st.bucket = _Bucket(lim.symbol_orders_per_sec)
+            st.limits = lim
+    return get_limits(symbol)
+
+
+def get_limits(symbol: Optional[str] = None) -> Dict[str, Any]:
+    if symbol is None:
+        return {k: (None if math.isinf(v) else v) for k, v in _DEFAULTS.items()}
+    ov = _overrides.get(symbol)
+    return (_Limits({**_DEFAULTS, **ov}) if ov else _default_limits).as_dict()
+
+
+def halt(reason: Optional[str]) -> None:
+    """Kill switch: reason=None heft de halt op."""
+    global _halted
+    _halted = reason
+
+
+def state() -> Dict[str, Any]:
+    return {
+        "enabled": _ENABLED,
+        "halted": _halted,
+        "limits": get_limits(),
+        "overrides": {s: get_limits(s) for s in _overrides},
+        "open": {s: {"buy": st.open_buy, "sell": st.open_sell} for s, st in _SYMS.items() if st.open_buy or st.open_sell},
+        "reserved_orders": len(_RESERVED),
+        **_stats,
+    }
@@ -1,3 +1,3 @@
 from .models import StrategyGraph, Node, SingleOrderNode, BracketExitNode, SequenceNode
-from .store import GRAPH_STORE, save_graph, get_graph, list_graphs, delete_graph
+from .store import upsert_graph, get_graph, list_graphs, delete_graph
 from .executor import run_graph
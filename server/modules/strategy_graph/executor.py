@@ -1,31 +1,116 @@
 from __future__ import annotations
+import datetime as dt
+import threading
 import time
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List
 
 from server.modules.strategy_graph.models import (
     StrategyGraph, parse_node,
     SequenceNode, SingleOrderNode, BracketExitNode,
-    WaitForFillNode, WaitForStatusNode
+    WaitForFillNode, WaitForStatusNode,
+    PriceConditionNode, IndicatorConditionNode, TimeConditionNode,
 )
-from server.modules.order_transmitting.service import enqueue_order
-from server.modules.order_transmitting.adapters.ibkr.adapter import ADAPTER
+from server.modules.strategy_graph.triggers import TRIGGERS, Trigger
+from server.modules.order_transmitting.service import enqueue_order, submit_bracket, cancel_order
 from server.modules.data.store import RESULTS
+from server.modules.data.positions import get_position
+from server.modules.data import market
+
+# orders in deze statussen hoeven bij een cancel niet meer geannuleerd te worden
+_DONE = ("filled", "cancelled", "apicancelled", "inactive", "error", "rejected")
+# nodes die blokkeren tot een trigger vuurt (niet op de synchrone /run)
+_WAITING = (WaitForFillNode, WaitForStatusNode, PriceConditionNode, IndicatorConditionNode, TimeConditionNode)
+# time_condition: zoveel langer dan het tijdstip wachten op de timer-thread
+_TIME_GRACE_SEC = 5.0
+
+class RunCancelled(RuntimeError):
+    """Run gestopt via zijn CancelToken; compensation = wat er met de geplaatste orders gebeurde."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.compensation: Dict[str, Any] = {}
+
+class CancelToken:
+    """
+    Coöperatieve cancel van 1 run: gecheckt op elke node-grens; wachtende nodes registreren een hook
+    die hun trigger meteen wakker maakt. placed = internal_ids van de orders die de run plaatste.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks: List[Callable[[], None]] = []
+        self.cancelled = False
+        self.reason: str | None = None
+        self.placed: List[str] = []
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.cancelled, self.reason = True, reason
+            hooks, self._hooks = self._hooks, []
+        for fn in hooks:
+            try:
+                fn()
+            except Exception:
+                pass
+        return True
+
+    def on_cancel(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._hooks.append(fn)
+                return
+        fn()
+
+    def remove(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            if fn in self._hooks:
+                self._hooks.remove(fn)
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise RunCancelled(self.reason or "cancelled")
 
 def _status_of(internal_id: str) -> str | None:
     rec = RESULTS.get(internal_id) or {}
     s = (rec.get("status") or "").lower() or None
     return s
 
-def _wait_until(predicate, timeout_sec: int) -> bool:
-    t0 = time.time()
-    while True:
-        if predicate():
-            return True
-        if timeout_sec is not None and timeout_sec >= 0 and (time.time() - t0) >= timeout_sec:
-            return False
-        time.sleep(0.25)
+def _wait_trigger(trig: Trigger, timeout_sec: float | None, token: CancelToken) -> bool:
+    """Blokkeert op het Event van de trigger (geen polling); bij timeout of cancel wordt de trigger afgemeld."""
+    def wake() -> None:
+        TRIGGERS.cancel(trig)      # eerst afmelden: anders blijft hij in het boek staan
+        trig.event.set()
+    token.on_cancel(wake)
+    try:
+        trig.wait(timeout_sec)
+    finally:
+        token.remove(wake)
+        TRIGGERS.cancel(trig)
+    token.check()
+    # na het afmelden: een trigger die net na de timeout vuurde telt (cancel was dan een no-op)
+    return trig.fired_at is not None
+
+def compensate(token: CancelToken) -> Dict[str, Any]:
+    """Open orders die de run plaatste annuleren (bracket: parent + legs). Posities blijven staan."""
+    out: Dict[str, Any] = {"cancelled": [], "done": [], "errors": {}}
+    for iid in token.placed:
+        if (_status_of(iid) or "") in _DONE:
+            out["done"].append(iid)
+            continue
+        try:
+            res = cancel_order(iid)
+        except Exception as e:
+            out["errors"][iid] = f"{e.__class__.__name__}: {e}"
+            continue
+        if res.get("ok", True):
+            out["cancelled"].append(iid)
+        else:
+            out["errors"][iid] = res.get("error") or "cancel failed"
+    return out
 
-def _run_single_order(node: SingleOrderNode, symbol: str) -> Dict[str, Any]:
+def _run_single_order(node: SingleOrderNode, symbol: str, adapter: str | None, token: CancelToken) -> Dict[str, Any]:
     order: Dict[str, Any] = {
         "symbol": symbol,
         "side": node.side.upper(),
@@ -37,75 +122,56 @@ def _run_single_order(node: SingleOrderNode, symbol: str) -> Dict[str, Any]:
         if node.limit_price is None or float(node.limit_price) <= 0:
             raise ValueError("limit_price required for LMT")
         order["limit_price"] = float(node.limit_price)
-    ok, payload = enqueue_order(order)
-    if not ok:
-        raise RuntimeError(payload)
-    # normalize: enqueue may return dict or tuple etc.
-    if isinstance(payload, dict):
-        return {"mode": "single", **payload}
-    return {"mode": "single", "data": payload}
-
-def _run_bracket_exit(node: BracketExitNode, symbol: str) -> Dict[str, Any]:
-    # build base order for SELL parent if oco_only=False
-    if not node.oco_only:
-        base = {
-            "symbol": symbol,
-            "side": node.side.upper(),
-            "order_type": "MKT",
-            "quantity": int(node.quantity),
-            "tif": node.tif,
-        }
-    else:
-        base = {
-            "symbol": symbol,
-            "side": node.side.upper(),
-            "order_type": "NONE",  # adapter interprets oco_only
-            "quantity": int(node.quantity),
-            "tif": node.tif,
-        }
-
-    # track internally
-    import secrets
-    parent_id = secrets.token_hex(6)
-    target_id = secrets.token_hex(6)
-    stop_id   = secrets.token_hex(6)
-    RESULTS[parent_id] = {"status": "accepted", "adapter": "ibkr"}
-    RESULTS[target_id] = {"status": "accepted", "adapter": "ibkr"}
-    RESULTS[stop_id]   = {"status": "accepted", "adapter": "ibkr"}
-
-    ok, payload = ADAPTER.place_bracket(
-        base_order=base,
-        target_price=float(node.target_price),
-        stop_price=float(node.stop_price),
-        internal_ids={"parent": parent_id, "target": target_id, "stop": stop_id},
-    )
-    if not ok:
-        raise RuntimeError(payload.get("error", "bracket failed"))
-
-    ib_ids = payload.get("ibkr_order_ids", {}) or payload.get("ibkr_ids", {}) or {}
-    resp = {
-        "mode": "bracket",
-        "parent_order_id": parent_id,
-        "target_order_id": target_id,
-        "stop_order_id":   stop_id,
-        "ibkr_order_ids":  ib_ids,
-        "oca_group":       payload.get("oca_group"),  # in case adapter/service set it
+    order_id = enqueue_order(order, strategy_id="graph:single_order", adapter=adapter)
+    token.placed.append(order_id)
+    rec = RESULTS.get(order_id) or {}
+    if rec.get("status") == "error":
+        raise RuntimeError(rec.get("error") or "order failed")
+    return {"mode": "single", "order_id": order_id, "status": rec.get("status")}
+
+def _exit_size(node: BracketExitNode, symbol: str) -> tuple[str, int]:
+    """Side/quantity van de exit; uit de positie-cache wanneer gevraagd (of quantity <= 0)."""
+    if not node.size_from_position and int(node.quantity) > 0:
+        return node.side.upper(), int(node.quantity)
+    pos = get_position(symbol)
+    if not pos:
+        raise ValueError(f"bracket_exit: geen open positie voor {symbol} in cache")
+    return ("SELL" if pos > 0 else "BUY"), int(abs(pos))
+
+def _run_bracket_exit(node: BracketExitNode, symbol: str, adapter: str | None, token: CancelToken) -> Dict[str, Any]:
+    side, qty = _exit_size(node, symbol)
+    base = {
+        "symbol": symbol,
+        "side": side,
+        "quantity": qty,
+        "tif": node.tif,
     }
-    return resp
+    # oco_only: geen parent, enkel de OCO legs (submit_bracket zet order_type NONE)
+    out = submit_bracket(
+        base,
+        float(node.target_price),
+        float(node.stop_price),
+        strategy_id="graph:bracket_exit",
+        adapter=adapter,
+        oco_only=node.oco_only,
+    )
+    legs = ("target_order_id", "stop_order_id") if node.oco_only else ("parent_order_id", "target_order_id", "stop_order_id")
+    token.placed.extend(out[k] for k in legs)
+    return out
 
-def _run_wait_for_fill(node: WaitForFillNode) -> Dict[str, Any]:
+def _run_wait_for_fill(node: WaitForFillNode, token: CancelToken) -> Dict[str, Any]:
     iid = node.waits_for_internal_id
     if not iid:
         raise ValueError("wait_for_fill: waits_for_internal_id required")
-    ok = _wait_until(lambda: (_status_of(iid) == "filled"), node.timeout_sec)
+    ok = _wait_trigger(TRIGGERS.add_status(iid, ["filled"]), node.timeout_sec, token)
     if not ok and not node.proceed_on_timeout:
         raise TimeoutError(f"wait_for_fill timeout after {node.timeout_sec}s for {iid}")
     return {"mode": "wait_for_fill", "internal_id": iid, "timeout": (not ok), "proceeded": (not ok and node.proceed_on_timeout)}
 
-def _run_wait_for_status(node: WaitForStatusNode) -> Dict[str, Any]:
+def _run_wait_for_status(node: WaitForStatusNode, token: CancelToken) -> Dict[str, Any]:
     iid = node.waits_for_internal_id
     targets = [s.lower() for s in (node.statuses or ["filled"])]
-    ok = _wait_until(lambda: (_status_of(iid) in targets), node.timeout_sec)
+    ok = _wait_trigger(TRIGGERS.add_status(iid, targets), node.timeout_sec, token)
     if not ok and not node.proceed_on_timeout:
         raise TimeoutError(f"wait_for_status timeout after {node.timeout_sec}s for {iid} (wanted {targets})")
     return {
@@ -117,29 +183,140 @@ def _run_wait_for_status(node: WaitForStatusNode) -> Dict[str, Any]:
         "status": _status_of(iid),
     }
 
-def _run_sequence(node: SequenceNode, symbol: str) -> Dict[str, Any]:
+def _watch(symbol: str, register, timeout_sec: int, token: CancelToken) -> tuple[Trigger, bool]:
+    """Market data voor symbol aan (refcount) zolang de conditie wacht."""
+    sub = market.subscribe([symbol])
+    if sub["errors"]:
+        raise RuntimeError(f"market data {symbol}: {sub['errors'][symbol]}")
+    try:
+        trig = register()
+        return trig, _wait_trigger(trig, timeout_sec, token)
+    finally:
+        market.unsubscribe([symbol])
+
+def _condition_result(mode: str, trig: Trigger, ok: bool, node, symbol: str) -> Dict[str, Any]:
+    if not ok and not node.proceed_on_timeout:
+        raise TimeoutError(f"{mode} timeout after {node.timeout_sec}s for {symbol} ({node.op} {trig.spec['level']})")
+    return {
+        "mode": mode,
+        "symbol": symbol,
+        "field": node.field,
+        "op": node.op,
+        "level": trig.level,
+        "triggered": ok,
+        "value": trig.value,
+        "timeout": (not ok),
+        "proceeded": (not ok and node.proceed_on_timeout),
+    }
+
+def _run_price_condition(node: PriceConditionNode, symbol: str, token: CancelToken) -> Dict[str, Any]:
+    sym = (node.symbol or symbol).upper()
+    if float(node.price) <= 0:
+        raise ValueError("price_condition: price required")
+    trig, ok = _watch(sym, lambda: TRIGGERS.add_price(sym, node.op, node.price, node.field), node.timeout_sec, token)
+    return _condition_result("price_condition", trig, ok, node, sym)
+
+def _run_indicator_condition(node: IndicatorConditionNode, symbol: str, token: CancelToken) -> Dict[str, Any]:
+    sym = (node.symbol or symbol).upper()
+    trig, ok = _watch(
+        sym,
+        lambda: TRIGGERS.add_indicator(sym, node.indicator, node.op, node.value, node.period, node.field),
+        node.timeout_sec,
+        token,
+    )
+    out = _condition_result("indicator_condition", trig, ok, node, sym)
+    out.update(indicator=node.indicator, period=node.period, base=trig.spec.get("base"))
+    return out
+
+def _next_at(node: TimeConditionNode) -> float:
+    """Epoch-deadline: at als epoch, of de eerstvolgende HH:MM[:SS] in tz (None = lokale tijd)."""
+    if node.at is None:
+        return time.time() + max(0.0, float(node.delay_sec))
+    try:
+        return float(node.at)
+    except ValueError:
+        pass
+    try:
+        parts = [int(p) for p in node.at.split(":")]
+        hh, mm, ss = (parts + [0, 0])[:3]
+        wall = dt.time(hh, mm, ss)
+    except ValueError:
+        raise ValueError("time_condition: at must be epoch seconds or HH:MM[:SS]")
+    tz = None
+    if node.tz:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(node.tz)
+    now = dt.datetime.now(tz)
+    target = dt.datetime.combine(now.date(), wall, tzinfo=tz)
+    if target <= now:
+        target = dt.datetime.combine(now.date() + dt.timedelta(days=1), wall, tzinfo=tz)
+    return target.timestamp() + max(0.0, float(node.delay_sec))
+
+def _run_time_condition(node: TimeConditionNode, token: CancelToken) -> Dict[str, Any]:
+    at = _next_at(node)
+    wait = at - time.time()
+    if node.timeout_sec >= 0 and wait > node.timeout_sec:
+        raise ValueError(f"time_condition: {at} is {wait:.0f}s away (timeout_sec {node.timeout_sec})")
+    trig = TRIGGERS.add_time(at)
+    if not _wait_trigger(trig, None if node.timeout_sec < 0 else max(0.0, wait) + _TIME_GRACE_SEC, token):
+        raise TimeoutError(f"time_condition: timer did not fire within {_TIME_GRACE_SEC:g}s after {at}")
+    return {"mode": "time_condition", "at": at, "fired_at": trig.fired_at}
+
+def waiting_nodes(root: Dict[str, Any]) -> List[str]:
+    """Ids (of types) van de nodes die op een trigger wachten, in de volgorde van de graph."""
+    out: List[str] = []
+    stack = [parse_node(root)]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, SequenceNode):
+            stack.extend(parse_node(c) if isinstance(c, dict) else c for c in reversed(n.children))
+        elif isinstance(n, _WAITING):
+            out.append(n.id or n.type)
+    return out
+
+def _run_sequence(node: SequenceNode, symbol: str, adapter: str | None, token: CancelToken) -> Dict[str, Any]:
     out = []
     for child in node.children:
+        token.check()
         if isinstance(child, dict):
             ch = parse_node(child)
         else:
             ch = child
         if isinstance(ch, SingleOrderNode):
-            out.append(_run_single_order(ch, symbol))
+            out.append(_run_single_order(ch, symbol, adapter, token))
         elif isinstance(ch, BracketExitNode):
-            out.append(_run_bracket_exit(ch, symbol))
+            out.append(_run_bracket_exit(ch, symbol, adapter, token))
         elif isinstance(ch, WaitForFillNode):
-            out.append(_run_wait_for_fill(ch))
+            out.append(_run_wait_for_fill(ch, token))
         elif isinstance(ch, WaitForStatusNode):
-            out.append(_run_wait_for_status(ch))
+            out.append(_run_wait_for_status(ch, token))
+        elif isinstance(ch, PriceConditionNode):
+            out.append(_run_price_condition(ch, symbol, token))
+        elif isinstance(ch, IndicatorConditionNode):
+            out.append(_run_indicator_condition(ch, symbol, token))
+        elif isinstance(ch, TimeConditionNode):
+            out.append(_run_time_condition(ch, token))
         elif isinstance(ch, SequenceNode):
-            out.append(_run_sequence(ch, symbol))
+            out.append(_run_sequence(ch, symbol, adapter, token))
         else:
             raise ValueError(f"Unsupported child node: {type(ch).__name__}")
     return {"mode": "sequence", "results": out}
 
-def run_graph(g: StrategyGraph, symbol: str) -> Dict[str, Any]:
+def run_graph(
+    g: StrategyGraph, symbol: str, adapter: str | None = None, token: CancelToken | None = None,
+) -> Dict[str, Any]:
+    """
+    token: cancel van buitenaf (runs.cancel). Bij een cancel worden de open orders van deze run
+    geannuleerd en volgt RunCancelled (met .compensation), ook als de laatste node net klaar was.
+    """
     root = parse_node(g.root)
     if not isinstance(root, SequenceNode):
         raise ValueError("Root must be sequence")
-    return _run_sequence(root, symbol)
+    token = token or CancelToken()
+    try:
+        out = _run_sequence(root, symbol, adapter, token)
+        token.check()
+        return out
+    except RunCancelled as e:
+        e.compensation = compensate(token)
+        raise
@@ -27,6 +27,7 @@ class BracketExitNode(Node):
     stop_price: float = 0.0
     tif: str = "DAY"
     oco_only: bool = False       # als True: geen parent, alleen OCO legs
+    size_from_position: bool = False  # quantity/side uit de positie-cache (quantity <= 0 doet hetzelfde)
 
 @dataclass
 class WaitForFillNode(Node):
@@ -43,6 +44,36 @@ class WaitForStatusNode(Node):
     timeout_sec: int = 300
     proceed_on_timeout: bool = False
 
+@dataclass
+class PriceConditionNode(Node):
+    type: str = field(default="price_condition", init=False)
+    op: str = "above"            # above (>=) | below (<=)
+    price: float = 0.0
+    field: str = "last"          # last|bid|ask|mid
+    symbol: Optional[str] = None # None = symbool van de run (bv. SPY als filter voor AAPL)
+    timeout_sec: int = 300       # < 0 = onbeperkt
+    proceed_on_timeout: bool = False
+
+@dataclass
+class IndicatorConditionNode(Node):
+    type: str = field(default="indicator_condition", init=False)
+    indicator: str = "sma"       # sma|ema (over quote-updates) | change_pct (t.o.v. het armen)
+    period: int = 20
+    op: str = "above"
+    value: float = 0.0
+    field: str = "last"
+    symbol: Optional[str] = None
+    timeout_sec: int = 300
+    proceed_on_timeout: bool = False
+
+@dataclass
+class TimeConditionNode(Node):
+    type: str = field(default="time_condition", init=False)
+    at: Optional[str] = None     # "HH:MM[:SS]" (eerstvolgende, in tz) of epoch seconden
+    delay_sec: float = 0.0       # zonder at: zoveel seconden na het bereiken van de node
+    tz: Optional[str] = None     # bv. "America/New_York"; None = lokale tijd van de server
+    timeout_sec: int = 86400     # max. wachttijd; een verder tijdstip wordt geweigerd (< 0 = onbeperkt)
+
 @dataclass
 class SequenceNode(Node):
     type: str = field(default="sequence", init=False)
@@ -76,6 +107,7 @@ def parse_node(d: Dict[str, Any]) -> Node:
             stop_price=float(d.get("stop_price", 0)),
             tif=d.get("tif", "DAY"),
             oco_only=bool(d.get("oco_only", False)),
+            size_from_position=bool(d.get("size_from_position", False)),
         )
     if t == "wait_for_fill":
         return WaitForFillNode(
@@ -95,6 +127,36 @@ def parse_node(d: Dict[str, Any]) -> Node:
             timeout_sec=int(d.get("timeout_sec", 300)),
             proceed_on_timeout=bool(d.get("proceed_on_timeout", False)),
         )
+    if t == "price_condition":
+        return PriceConditionNode(
+            id=nid,
+            op=str(d.get("op", "above")).lower(),
+            price=float(d.get("price", 0)),
+            field=str(d.get("field", "last")).lower(),
+            symbol=(str(d["symbol"]).upper() if d.get("symbol") else None),
+            timeout_sec=int(d.get("timeout_sec", 300)),
+            proceed_on_timeout=bool(d.get("proceed_on_timeout", False)),
+        )
+    if t == "indicator_condition":
+        return IndicatorConditionNode(
+            id=nid,
+            indicator=str(d.get("indicator", "sma")).lower(),
+            period=int(d.get("period", 20)),
+            op=str(d.get("op", "above")).lower(),
+            value=float(d.get("value", 0)),
+            field=str(d.get("field", "last")).lower(),
+            symbol=(str(d["symbol"]).upper() if d.get("symbol") else None),
+            timeout_sec=int(d.get("timeout_sec", 300)),
+            proceed_on_timeout=bool(d.get("proceed_on_timeout", False)),
+        )
+    if t == "time_condition":
+        return TimeConditionNode(
+            id=nid,
+            at=(str(d["at"]) if d.get("at") is not None else None),
+            delay_sec=float(d.get("delay_sec", 0)),
+            tz=d.get("tz") or None,
+            timeout_sec=int(d.get("timeout_sec", 86400)),
+        )
     if t == "sequence":
         return SequenceNode(
             id=nid,
@@ -0,0 +1,365 @@
+"""
+Graph run engine: elke run (API of schedule) krijgt een id en een rij in graph_runs.
+- async runs op een thread pool (GRAPH_RUN_WORKERS): conditie-nodes blokkeren een thread, niet de CPU
+- sync runs (POST /strategy-graph/{id}/run) draaien in de request-thread maar komen ook in de historiek
+- status: queued -> running -> done | error | cancelled; skipped/missed enkel voor schedules (zonder uitvoering)
+- cancel(run_id): queued = meteen cancelled; running = CancelToken (wachtende nodes worden meteen wakker,
+  daarna annuleert de executor de open orders van de run). Een run van een andere worker krijgt een
+  cancel_requested in de DB; de flusher van die worker pikt het op (hooguit 1 flush-interval)
+- de graph wordt bij het indienen geladen (1 keer per graph per burst): een schedule draait de versie
+  die op het trigger-moment de huidige was
+- statuswijzigingen gaan naar een buffer; 1 flusher-thread schrijft ze in batches (GRAPH_RUNS_FLUSH_MS),
+  zodat een burst van duizenden runs geen commit per statuswijziging kost. Lezen in dit proces ziet de
+  buffer meteen; andere workers zien de DB (hooguit 1 flush-interval achter)
+- historiek begrensd per schedule (of per graph voor API-runs): GRAPH_RUNS_KEEP
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from secrets import token_hex
+from typing import Any, Dict, List, Optional, Set, Tuple
+import json
+import os
+import threading
+import time
+
+from server.modules.persistence import db
+from server.modules.strategy_graph.models import StrategyGraph
+from server.modules.strategy_graph.store import get_graph
+from server.modules.strategy_graph.executor import run_graph, CancelToken, RunCancelled
+
+_WORKERS = int(os.getenv("GRAPH_RUN_WORKERS", "16"))
+_KEEP = int(os.getenv("GRAPH_RUNS_KEEP", "200"))
+_FLUSH_SEC = float(os.getenv("GRAPH_RUNS_FLUSH_MS", "200")) / 1000.0
+# trim van de historiek niet bij elke run (1 DELETE per scope per zoveel afgewerkte runs)
+_TRIM_EVERY = 20
+_OPEN = ("queued", "running")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_flusher_started = False
+_ACTIVE: Dict[str, Dict[str, Any]] = {}          # run_id -> run (open, of afgewerkt maar nog niet geflusht)
+_BY_SCHEDULE: Dict[str, Set[str]] = {}           # schedule_id -> open run_ids
+_DIRTY: Dict[str, Dict[str, Any]] = {}           # run_id -> run, nog te schrijven
+_TOKENS: Dict[str, Tuple[CancelToken, threading.Event]] = {}   # open run_id -> (cancel token, klaar)
+_since_trim: Dict[Tuple[str, str], int] = {}
+_trim_due: Set[Tuple[str, str]] = set()
+stats = {"submitted": 0, "done": 0, "error": 0, "cancelled": 0, "skipped": 0, "missed": 0, "flushes": 0}
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, _WORKERS), thread_name_prefix="graph-run")
+        return _pool
+
+
+def _start_flusher_once() -> None:
+    global _flusher_started
+    if not _flusher_started:
+        with _lock:
+            if _flusher_started:
+                return
+            _flusher_started = True
+        threading.Thread(target=_flusher, name="graph-runs-flush", daemon=True).start()
+
+
+def _new_run(item: Dict[str, Any], status: str) -> Dict[str, Any]:
+    return {
+        "id": token_hex(8),
+        "graph_id": item["graph_id"],
+        "graph_version": None,
+        "schedule_id": item.get("schedule_id"),
+        "symbol": (item.get("symbol") or "").upper() or None,
+        "adapter": item.get("adapter"),
+        "source": item.get("source") or "api",
+        "status": status,
+        "scheduled_for": item.get("scheduled_for"),
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "result": item.get("result"),
+        "error": None,
+    }
+
+
+def _row(run: Dict[str, Any]) -> Tuple[Any, ...]:
+    out = []
+    for k in db._RUN_COLS:
+        v = run[k]
+        out.append(json.dumps(v, default=str) if k == "result" and v is not None else v)
+    return tuple(out)
+
+
+def _dirty(runs: List[Dict[str, Any]]) -> None:
+    """Onder _lock."""
+    for r in runs:
+        _DIRTY[r["id"]] = r
+
+
+def _register(run: Dict[str, Any]) -> CancelToken:
+    """Onder _lock."""
+    token = CancelToken()
+    _TOKENS[run["id"]] = (token, threading.Event())
+    _ACTIVE[run["id"]] = run
+    return token
+
+
+def _finish(run: Dict[str, Any]) -> None:
+    with _lock:
+        tok = _TOKENS.pop(run["id"], None)
+        sid = run["schedule_id"]
+        if sid is not None:
+            ids = _BY_SCHEDULE.get(sid)
+            if ids is not None:
+                ids.discard(run["id"])
+                if not ids:
+                    del _BY_SCHEDULE[sid]
+        stats[run["status"]] = stats.get(run["status"], 0) + 1
+        scope = ("schedule", sid) if sid is not None else ("graph", run["graph_id"])
+        n = _since_trim[scope] = _since_trim.get(scope, 0) + 1
+        if n >= _TRIM_EVERY:
+            _since_trim[scope] = 0
+            _trim_due.add(scope)
+        _dirty([run])
+    if tok is not None:
+        tok[1].set()
+    _start_flusher_once()
+
+
+def _execute(run: Dict[str, Any], g: Optional[Dict[str, Any]], token: CancelToken) -> Optional[Dict[str, Any]]:
+    """Voert de run uit en registreert het resultaat; exceptions gaan daarna door naar de caller."""
+    with _lock:
+        if run["status"] != "queued":
+            return None       # gecanceld voor de start
+        run["started_at"] = time.time()
+        run["status"] = "running"
+        _dirty([run])
+    try:
+        if g is None:
+            raise LookupError(f"graph {run['graph_id']} not found")
+        run["graph_version"] = g.get("version")
+        out = run_graph(
+            StrategyGraph(id=g["id"], root=g["root"]), symbol=run["symbol"], adapter=run["adapter"], token=token,
+        )
+        run["result"], run["finished_at"], run["status"] = out, time.time(), "done"
+        return out
+    except RunCancelled as e:
+        run["result"], run["error"] = {"compensation": e.compensation}, str(e)
+        run["finished_at"], run["status"] = time.time(), "cancelled"
+        raise
+    except Exception as e:
+        run["error"], run["finished_at"], run["status"] = f"{e.__class__.__name__}: {e}", time.time(), "error"
+        raise
+    finally:
+        _finish(run)
+
+
+def _execute_async(run: Dict[str, Any], g: Optional[Dict[str, Any]], token: CancelToken) -> None:
+    try:
+        _execute(run, g, token)
+    except Exception:
+        pass  # staat in de historiek
+
+
+def submit_many(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    items = [{graph_id, symbol, adapter?, schedule_id?, scheduled_for?, source?}]
+    Alle runs als 'queued' registreren en op de pool zetten. Return de runs (metadata).
+    """
+    runs = [_new_run(it, "queued") for it in items]
+    if not runs:
+        return []
+    tokens = []
+    with _lock:
+        for r in runs:
+            tokens.append(_register(r))
+            if r["schedule_id"] is not None:
+                _BY_SCHEDULE.setdefault(r["schedule_id"], set()).add(r["id"])
+        _dirty(runs)
+        stats["submitted"] += len(runs)
+    _start_flusher_once()
+    out = [dict(r) for r in runs]
+    graphs: Dict[str, Optional[Dict[str, Any]]] = {}
+    for r in runs:
+        if r["graph_id"] not in graphs:
+            graphs[r["graph_id"]] = get_graph(r["graph_id"])
+    pool = _get_pool()
+    for r, token in zip(runs, tokens):
+        pool.submit(_execute_async, r, graphs[r["graph_id"]], token)
+    return out
+
+
+def submit(graph_id: str, symbol: str, adapter: Optional[str] = None, **kw: Any) -> Dict[str, Any]:
+    return submit_many([{"graph_id": graph_id, "symbol": symbol, "adapter": adapter, **kw}])[0]
+
+
+def record_many(items: List[Dict[str, Any]], status: str) -> None:
+    """Historiek zonder uitvoering (schedule: skipped bij overlap, missed bij de missed-run policy)."""
+    runs = [_new_run(it, status) for it in items]
+    for r in runs:
+        r["finished_at"] = r["created_at"]
+    with _lock:
+        _dirty(runs)
+        stats[status] = stats.get(status, 0) + len(runs)
+    _start_flusher_once()
+
+
+def run_sync(graph: Dict[str, Any], symbol: str, adapter: Optional[str] = None) -> Dict[str, Any]:
+    """Run in de huidige thread (bestaand /run endpoint): resultaat of de exception van de executor."""
+    run = _new_run({"graph_id": graph["id"], "symbol": symbol, "adapter": adapter}, "queued")
+    with _lock:
+        token = _register(run)
+        stats["submitted"] += 1
+    return _execute(run, graph, token)
+
+
+def cancel(run_id: str, reason: str = "cancelled via API", wait_sec: float = 2.0) -> Optional[Dict[str, Any]]:
+    """
+    Run stoppen. Lokaal: queued -> meteen cancelled; running -> token + wachten (max wait_sec) tot de
+    executor klaar is (wachtende nodes zijn meteen wakker, daarna de order-cancels). Run van een andere
+    worker: cancel_requested in de DB. Return de run (None = onbekend); al afgelopen runs blijven ongewijzigd.
+    """
+    with _lock:
+        entry = _TOKENS.get(run_id)
+        run = _ACTIVE.get(run_id)
+        queued = run is not None and run["status"] == "queued"
+        if queued:
+            run["status"], run["error"], run["finished_at"] = "cancelled", reason, time.time()
+    if entry is None:
+        r = get_run(run_id)
+        if r is not None and r["status"] in _OPEN and db.graph_run_request_cancel(run_id):
+            r["cancel_requested"] = True
+        return r
+    token, done = entry
+    token.cancel(reason)
+    if queued:
+        _finish(run)
+    else:
+        done.wait(wait_sec)
+    return get_run(run_id)
+
+
+def active_for(schedule_id: str) -> int:
+    with _lock:
+        return len(_BY_SCHEDULE.get(schedule_id) or ())
+
+
+def flush() -> int:
+    """Buffer naar SQLite (1 transactie) + uitstaande trims. Return het aantal geschreven runs."""
+    with _flush_lock:
+        with _lock:
+            if not _DIRTY and not _trim_due:
+                return 0
+            dirty = list(_DIRTY.values())
+            _DIRTY.clear()
+            rows = [_row(r) for r in dirty]
+            trims = list(_trim_due)
+            _trim_due.clear()
+        try:
+            db.graph_runs_insert(rows)
+        except Exception:
+            with _lock:
+                for r in dirty:
+                    _DIRTY.setdefault(r["id"], r)
+                _trim_due.update(trims)
+            raise
+        with _lock:
+            for r in dirty:
+                if r["status"] not in _OPEN and r["id"] not in _DIRTY:
+                    _ACTIVE.pop(r["id"], None)
+            stats["flushes"] += 1
+        if _KEEP > 0:
+            for kind, key in trims:
+                if kind == "schedule":
+                    db.graph_runs_trim(_KEEP, schedule_id=key)
+                else:
+                    db.graph_runs_trim(_KEEP, graph_id=key)
+        return len(rows)
+
+
+def _poll_cancels() -> None:
+    """Cancel-verzoeken van andere workers voor runs van dit proces."""
+    with _lock:
+        if not _TOKENS:
+            return
+    for run_id in db.graph_runs_cancel_requested():
+        if run_id in _TOKENS:
+            cancel(run_id, reason="cancelled via API", wait_sec=0)
+
+
+def _flusher() -> None:
+    while True:
+        _wake.wait(_FLUSH_SEC)
+        _wake.clear()
+        try:
+            flush()
+            _poll_cancels()
+        except Exception:
+            time.sleep(1.0)    # DB tijdelijk niet beschikbaar: de buffer blijft staan
+
+
+def _public(r: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(r)
+    if isinstance(out.get("result"), str):
+        out["result"] = json.loads(out["result"])
+    return out
+
+
+def get_run(run_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        r = _ACTIVE.get(run_id) or _DIRTY.get(run_id)
+        if r is not None:
+            return dict(r)
+    rows = db.graph_runs_query(run_id=run_id, limit=1)
+    return _public(rows[0]) if rows else None
+
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """"<created_at>:<id>" -> (created_at, id); een kale timestamp (oud formaat) -> (created_at, None)."""
+    if not cursor:
+        return None, None
+    ts, _, rid = str(cursor).partition(":")
+    try:
+        return float(ts), (rid or None)
+    except ValueError:
+        raise ValueError(f"invalid cursor {cursor!r}")
+
+
+def list_runs(
+    graph_id: Optional[str] = None, schedule_id: Optional[str] = None,
+    cursor: Optional[str] = None, limit: int = 100,
+) -> Dict[str, Any]:
+    """Nieuwste eerst; next_cursor = "created_at:id" van de laatste rij (voor de volgende pagina)."""
+    before, before_id = _parse_cursor(cursor)
+    flush()
+    limit = max(1, min(int(limit), 1000))
+    items = [_public(r) for r in db.graph_runs_query(
+        graph_id=graph_id, schedule_id=schedule_id, before=before, before_id=before_id, limit=limit,
+    )]
+    last = items[-1] if len(items) == limit else None
+    return {"items": items, "next_cursor": f"{last['created_at']!r}:{last['id']}" if last else None}
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        active = sum(1 for r in _ACTIVE.values() if r["status"] in _OPEN)
+        return {"active": active, "pending_writes": len(_DIRTY), "workers": _WORKERS, **stats}
+
+
+def shutdown() -> None:
+    """Pool stoppen; runs die nog niet gestart waren worden gecanceld (reden shutdown) in de historiek."""
+    global _pool
+    with _pool_lock:
+        p, _pool = _pool, None
+    if p is not None:
+        p.shutdown(wait=False, cancel_futures=True)
+    with _lock:
+        queued = [r["id"] for r in _ACTIVE.values() if r["status"] == "queued"]
+    for run_id in queued:
+        cancel(run_id, reason="shutdown", wait_sec=0)
+    flush()
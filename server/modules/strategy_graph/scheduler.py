@@ -0,0 +1,467 @@
+"""
+Scheduler voor graph runs: cron (5 velden of alias), interval of eenmalig (at).
+- 1 heap (next_run, generatie, id) + 1 thread die tot de eerstvolgende deadline slaapt; een wijziging
+  pusht een nieuwe entry met een hogere generatie, oude entries worden lazy overgeslagen
+- alles wat op hetzelfde moment vervalt wordt samen afgehandeld: 1 claim-transactie + 1 batch-insert
+  van de runs, ook bij duizenden schedules op @open
+- persistent in graph_schedules (SQLite); de claim is een compare-and-set op next_run, zodat bij meerdere
+  uvicorn-workers elke occurrence 1 keer vuurt; wijzigingen van andere workers via SCHEDULE_RELOAD_SEC
+- missed-run policy (server lag stil, of de run is later dan misfire_grace_sec):
+  skip = enkel een 'missed' rij in de historiek, once = 1 inhaalrun, all = elke gemiste occurrence
+  (max max_catchup); daarna gewoon de volgende occurrence na nu
+- overlap: skip (default) = geen nieuwe run zolang de vorige van die schedule in dit proces nog loopt
+"""
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from secrets import token_hex
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+import datetime as dt
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from server.modules.persistence import db
+from server.modules.strategy_graph import runs
+from server.modules.strategy_graph.store import get_graph
+
+_GRACE_SEC = float(os.getenv("SCHEDULE_MISFIRE_GRACE_SEC", "60"))
+_RELOAD_SEC = float(os.getenv("SCHEDULE_RELOAD_SEC", "30"))
+_MAX_CATCHUP = int(os.getenv("SCHEDULE_MAX_CATCHUP", "10"))
+_ENUM_MAX = 10_000
+
+MISFIRE = ("skip", "once", "all")
+OVERLAP = ("skip", "allow")
+
+# aliassen; @open/@close zonder tz = New York (regular trading hours)
+ALIASES = {
+    "@hourly": ("0 * * * *", None),
+    "@daily": ("0 0 * * *", None),
+    "@weekly": ("0 0 * * 0", None),
+    "@monthly": ("0 0 1 * *", None),
+    "@open": ("30 9 * * 1-5", "America/New_York"),
+    "@close": ("0 16 * * 1-5", "America/New_York"),
+}
+_NAMES = {
+    3: {m: i for i, m in enumerate(
+        ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"), 1)},
+    4: {d: i for i, d in enumerate(("SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"))},
+}
+_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _tz(name: Optional[str]):
+    if not name:
+        return None
+    from zoneinfo import ZoneInfo
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        raise ValueError(f"unknown tz {name!r}")
+
+
+def _field(expr: str, pos: int) -> Tuple[List[int], bool]:
+    """1 cron-veld -> (gesorteerde waarden, was '*')."""
+    lo, hi = _RANGES[pos]
+    names = _NAMES.get(pos, {})
+    out: Set[int] = set()
+    for part in expr.upper().split(","):
+        rng, _, step_s = part.partition("/")
+        step = int(step_s) if step_s else 1
+        if step < 1:
+            raise ValueError(f"cron: bad step in {expr!r}")
+        if rng == "*":
+            a, b = lo, hi
+        else:
+            a_s, _, b_s = rng.partition("-")
+            a = names[a_s] if a_s in names else int(a_s)
+            b = (names[b_s] if b_s in names else int(b_s)) if b_s else (hi if step_s else a)
+        if not (lo <= a <= hi and lo <= b <= hi and a <= b):
+            raise ValueError(f"cron: {expr!r} out of range {lo}-{hi}")
+        out.update(range(a, b + 1, step))
+    if pos == 4 and 7 in out:
+        out.discard(7)
+        out.add(0)
+    return sorted(out), expr == "*"
+
+
+class Cron:
+    """5-velden cron (min uur dag maand weekdag), lijsten/ranges/steps/namen; dag OF weekdag als beide beperkt."""
+
+    def __init__(self, expr: str, tz: Optional[str] = None):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError("cron needs 5 fields: minute hour day month weekday")
+        (self.minutes, _), (self.hours, _), (days, any_dom), (months, _), (dows, any_dow) = (
+            _field(p, i) for i, p in enumerate(parts)
+        )
+        self.days, self.months, self.dows = set(days), set(months), set(dows)
+        self.any_dom, self.any_dow = any_dom, any_dow
+        self.tz = _tz(tz)
+
+    def _day_ok(self, d: dt.datetime) -> bool:
+        dom = d.day in self.days
+        dow = (d.weekday() + 1) % 7 in self.dows
+        if self.any_dom or self.any_dow:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, after: float) -> Optional[float]:
+        """Eerste occurrence strikt na after (epoch); rekent in wall time van tz (None = lokaal)."""
+        tz = self.tz
+        t = dt.datetime.fromtimestamp((int(after) // 60 + 1) * 60, tz).replace(tzinfo=None)
+        limit = t.year + 5
+        while t.year <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + dt.timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_ok(t):
+                t = (t + dt.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            h = next((x for x in self.hours if x >= t.hour), None)
+            if h is None:
+                t = (t + dt.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if h != t.hour:
+                t = t.replace(hour=h, minute=0)
+            m = next((x for x in self.minutes if x >= t.minute), None)
+            if m is None:
+                t = t.replace(minute=0) + dt.timedelta(hours=1)
+                continue
+            t = t.replace(minute=m)
+            ts = (t.replace(tzinfo=tz) if tz is not None else t).timestamp()
+            if ts > after:
+                return ts
+            t += dt.timedelta(minutes=1)   # DST: wall time bestaat niet / ligt terug
+        return None
+
+
+@dataclass
+class _Sched:
+    id: str
+    spec: Dict[str, Any]
+    enabled: bool
+    next_run: Optional[float]
+    last_run: Optional[float]
+    gen: int = 0
+    cron: Optional[Cron] = None
+
+    def next_after(self, after: float) -> Optional[float]:
+        s = self.spec
+        if s.get("cron_expr"):
+            if self.cron is None:
+                self.cron = Cron(s["cron_expr"], s.get("tz"))
+            nxt = self.cron.next_after(max(after, (s.get("start_at") or 0) - 1e-6))
+        elif s.get("interval_sec"):
+            iv = float(s["interval_sec"])
+            anchor = float(s.get("start_at") or s["created_at"])
+            k = max(0, int((after - anchor) // iv) + 1)
+            nxt = anchor + k * iv
+        else:
+            at = float(s["at"])
+            nxt = at if at > after else None
+        end = s.get("end_at")
+        if nxt is not None and end is not None and nxt > float(end):
+            return None
+        return nxt
+
+
+def normalize(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Valideer een schedule (ValueError -> 400). Precies 1 van cron / interval_sec / at."""
+    s = dict(spec)
+    # velden uit een GET (round-trip) zijn runtime-state
+    for k in ("next_run", "last_run", "active_runs", "created_at", "updated_at", "cron_expr"):
+        s.pop(k, None)
+    if not s.get("graph_id"):
+        raise ValueError("graph_id is required")
+    if not s.get("symbol"):
+        raise ValueError("symbol is required")
+    s["symbol"] = str(s["symbol"]).upper()
+    kinds = [k for k in ("cron", "interval_sec", "at") if s.get(k) not in (None, "")]
+    if len(kinds) != 1:
+        raise ValueError("exactly one of cron, interval_sec, at is required")
+    if s.get("cron"):
+        expr = str(s["cron"]).strip()
+        if expr.startswith("@"):
+            if expr not in ALIASES:
+                raise ValueError(f"unknown cron alias {expr} ({', '.join(ALIASES)})")
+            expr, tz = ALIASES[expr]
+            s["tz"] = s.get("tz") or tz
+        s["cron_expr"] = expr
+        Cron(expr, s.get("tz"))
+    elif s.get("interval_sec"):
+        s["interval_sec"] = float(s["interval_sec"])
+        if s["interval_sec"] < 1:
+            raise ValueError("interval_sec must be >= 1")
+    else:
+        s["at"] = float(s["at"])
+    _tz(s.get("tz"))
+    for k in ("start_at", "end_at"):
+        if s.get(k) is not None:
+            s[k] = float(s[k])
+    s["misfire"] = str(s.get("misfire") or "once").lower()
+    if s["misfire"] not in MISFIRE:
+        raise ValueError(f"misfire must be one of {', '.join(MISFIRE)}")
+    s["overlap"] = str(s.get("overlap") or "skip").lower()
+    if s["overlap"] not in OVERLAP:
+        raise ValueError(f"overlap must be one of {', '.join(OVERLAP)}")
+    s["misfire_grace_sec"] = float(s.get("misfire_grace_sec", _GRACE_SEC))
+    s["max_catchup"] = max(1, int(s.get("max_catchup", _MAX_CATCHUP)))
+    s["enabled"] = bool(s.get("enabled", True))
+    return s
+
+
+class Scheduler:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._scheds: Dict[str, _Sched] = {}
+        self._gens = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._signature: Optional[Tuple[int, float]] = None
+        self.stats = {"fired": 0, "missed": 0, "skipped": 0, "lost_claims": 0, "batches": 0, "reloads": 0}
+
+    # ---- state ----
+
+    def _load_row(self, row: Dict[str, Any]) -> _Sched:
+        spec = json.loads(row["spec"])
+        spec["created_at"] = row["created_at"]
+        spec["updated_at"] = row["updated_at"]
+        return _Sched(row["id"], spec, bool(row["enabled"]), row["next_run"], row["last_run"])
+
+    def _push(self, s: _Sched) -> None:
+        """Onder _cond."""
+        s.gen = next(self._gens)
+        self._scheds[s.id] = s
+        if s.enabled and s.next_run is not None:
+            heapq.heappush(self._heap, (s.next_run, s.gen, s.id))
+            if self._heap[0][2] == s.id:
+                self._cond.notify()
+
+    def _reload(self) -> None:
+        rows = db.schedules_load()
+        with self._cond:
+            self._scheds.clear()
+            self._heap = []
+            for row in rows:
+                self._push(self._load_row(row))
+            self._cond.notify()
+        self._signature = db.schedules_signature()
+        self.stats["reloads"] += 1
+
+    # ---- API ----
+
+    def upsert(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        s = normalize(spec)
+        if get_graph(s["graph_id"]) is None:
+            raise LookupError(f"graph {s['graph_id']} not found")
+        sid = s.get("id") or token_hex(6)
+        s["id"] = sid
+        old = db.schedules_load(sid)
+        created = old[0]["created_at"] if old else time.time()
+        stored = {k: v for k, v in s.items() if k not in ("created_at", "updated_at")}
+        sched = _Sched(sid, {**stored, "created_at": created}, s["enabled"], None, None)
+        sched.next_run = sched.next_after(time.time()) if s["enabled"] else None
+        if s["enabled"] and sched.next_run is None:
+            raise ValueError("schedule has no future run (at / end_at in the past?)")
+        updated = db.schedule_save(sid, s["graph_id"], stored, s["enabled"], sched.next_run)
+        sched.spec["updated_at"] = updated
+        with self._cond:
+            self._push(sched)
+        self._signature = None
+        return self._public(sched)
+
+    def delete(self, schedule_id: str) -> bool:
+        ok = db.schedule_delete(schedule_id)
+        with self._cond:
+            self._scheds.pop(schedule_id, None)    # heap-entry wordt lazy overgeslagen
+        self._signature = None
+        return ok
+
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        rows = db.schedules_load(schedule_id)
+        return self._public(self._load_row(rows[0])) if rows else None
+
+    def list(self, graph_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        out = [self._public(self._load_row(r)) for r in db.schedules_load()]
+        if graph_id is not None:
+            out = [s for s in out if s["graph_id"] == graph_id]
+        return sorted(out, key=lambda s: s["created_at"])
+
+    def _public(self, s: _Sched) -> Dict[str, Any]:
+        out = dict(s.spec)
+        out.update(
+            id=s.id, enabled=s.enabled, next_run=s.next_run, last_run=s.last_run,
+            active_runs=runs.active_for(s.id),
+        )
+        return out
+
+    # ---- vuren ----
+
+    def _missed(self, s: _Sched, due: float, now: float, keep: int) -> Tuple[int, Deque[float]]:
+        """Gemiste occurrences in [due, now]: (aantal, de laatste keep)."""
+        end = s.spec.get("end_at")
+        horizon = min(now, float(end)) if end is not None else now
+        if s.spec.get("interval_sec"):
+            iv = float(s.spec["interval_sec"])
+            k = int((horizon - due) // iv)
+            return k + 1, deque((due + j * iv for j in range(max(0, k - keep + 1), k + 1)), maxlen=keep)
+        last: Deque[float] = deque([due], maxlen=keep)
+        n, t = 1, due
+        while True:
+            if n % _ENUM_MAX == 0:
+                t = max(t, now - 86400)     # lange stilstand op een fijne cron: enkel de laatste dag tellen
+            nxt = s.next_after(t)
+            if nxt is None or nxt > horizon:
+                return n, last
+            n, t = n + 1, nxt
+            last.append(nxt)
+
+    def _plan(self, s: _Sched, due: float, now: float) -> Tuple[List[float], Optional[Dict[str, Any]], Optional[float]]:
+        """(te draaien occurrences, info over de gemiste, volgende next_run) volgens de missed-run policy."""
+        grace = float(s.spec.get("misfire_grace_sec", _GRACE_SEC))
+        if now - due <= grace:
+            return [due], None, s.next_after(max(due, now))
+        policy = s.spec.get("misfire", "once")
+        cap = int(s.spec.get("max_catchup", _MAX_CATCHUP)) if policy == "all" else (1 if policy == "once" else 0)
+        n, last = self._missed(s, due, now, cap + 1)
+        occ = list(last)
+        run = occ[len(occ) - cap:] if cap else []
+        if n > len(run):
+            skipped = occ[:len(occ) - len(run)]
+            info = {"missed": n - len(run), "first": due, "last": skipped[-1]}
+        else:
+            info = None
+        return run, info, s.next_after(now)
+
+    def _fire(self, due_ids: List[Tuple[float, str]]) -> None:
+        now = time.time()
+        plans: Dict[str, Tuple[_Sched, float, List[float], Optional[Dict[str, Any]]]] = {}
+        claims = []
+        with self._cond:
+            for due, sid in due_ids:
+                s = self._scheds.get(sid)
+                if s is None or not s.enabled or s.next_run != due:
+                    continue
+                todo, miss, nxt = self._plan(s, due, now)
+                plans[sid] = (s, due, todo, miss)
+                s.next_run, s.last_run = nxt, (todo[-1] if todo else s.last_run)
+                claims.append((sid, due, nxt, s.last_run))
+        won = set(db.schedules_claim(claims))
+        submit: List[Dict[str, Any]] = []
+        skipped: List[Dict[str, Any]] = []
+        missed: List[Dict[str, Any]] = []
+        for sid, (s, due, todo, miss) in plans.items():
+            if sid not in won:
+                continue
+            base = {"graph_id": s.spec["graph_id"], "symbol": s.spec["symbol"], "adapter": s.spec.get("adapter"),
+                    "schedule_id": sid}
+            if miss:
+                missed.append({**base, "source": "schedule", "scheduled_for": miss["last"], "result": miss})
+            overlap_skip = s.spec.get("overlap", "skip") == "skip" and runs.active_for(sid) > 0
+            late = now - due > float(s.spec.get("misfire_grace_sec", _GRACE_SEC))
+            for k, at in enumerate(todo):
+                item = {**base, "source": "catchup" if late else "schedule", "scheduled_for": at}
+                # overlap=skip geldt per trigger-moment; een inhaalreeks (misfire=all) draait wel volledig
+                if overlap_skip and k == 0:
+                    skipped.append({**item, "result": {"reason": "previous run still active"}})
+                else:
+                    submit.append(item)
+        if missed:
+            runs.record_many(missed, "missed")
+        if skipped:
+            runs.record_many(skipped, "skipped")
+        runs.submit_many(submit)
+        with self._cond:
+            for sid in [sid for sid in plans if sid not in won]:
+                self.stats["lost_claims"] += 1
+                rows = db.schedules_load(sid)     # een andere worker vuurde: diens state overnemen
+                if rows:
+                    self._push(self._load_row(rows[0]))
+                else:
+                    self._scheds.pop(sid, None)
+            for sid in won:
+                s = self._scheds.get(sid)
+                if s is not None:
+                    self._push(s)
+            self.stats["fired"] += len(submit)
+            self.stats["skipped"] += len(skipped)
+            self.stats["missed"] += sum(m["result"]["missed"] for m in missed)
+            self.stats["batches"] += 1
+
+    def _loop(self) -> None:
+        next_reload = time.time() + _RELOAD_SEC
+        while True:
+            due: List[Tuple[float, str]] = []
+            with self._cond:
+                while not self._stop:
+                    now = time.time()
+                    if now >= next_reload:
+                        break
+                    heap = self._heap
+                    # stale entries (gewijzigd / verwijderd) lazy weg
+                    while heap and (heap[0][2] not in self._scheds or self._scheds[heap[0][2]].gen != heap[0][1]):
+                        heapq.heappop(heap)
+                    if heap and heap[0][0] <= now:
+                        while heap and heap[0][0] <= now:
+                            t, gen, sid = heapq.heappop(heap)
+                            s = self._scheds.get(sid)
+                            if s is not None and s.gen == gen:
+                                due.append((t, sid))
+                        break
+                    wait = next_reload - now
+                    if heap:
+                        wait = min(wait, heap[0][0] - now)
+                    self._cond.wait(wait)
+                if self._stop:
+                    return
+            if due:
+                try:
+                    self._fire(due)
+                except Exception:
+                    # DB tijdelijk weg: alles opnieuw uit de DB bij de volgende reload
+                    next_reload = 0.0
+                continue
+            next_reload = time.time() + _RELOAD_SEC
+            try:
+                if self._signature != db.schedules_signature():
+                    self._reload()
+            except Exception:
+                pass
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return False
+        self._stop = False
+        self._reload()
+        self._thread = threading.Thread(target=self._loop, name="graph-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        t, self._thread = self._thread, None
+        if t is not None:
+            t.join(timeout=2.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = [s.next_run for s in self._scheds.values() if s.enabled and s.next_run is not None]
+            return {
+                "running": self._thread is not None,
+                "schedules": len(self._scheds),
+                "enabled": len(pending),
+                "next_run": min(pending) if pending else None,
+                **self.stats,
+                "runs": runs.snapshot(),
+            }
+
+
+SCHEDULER = Scheduler()
@@ -1,43 +1,135 @@
 from __future__ import annotations
-from typing import Dict, Any, List
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
 from secrets import token_hex
+import json
+import os
+import threading
+import time
 
-from server.modules.persistence.db import save_graph, load_graph, load_all_graphs
+from server.modules.persistence import db
 
-# In-memory registry (id -> graph dict)
-_GRAPHS: Dict[str, Dict[str, Any]] = {}
+# geparste bodies per (id, versie): een versie verandert nooit, dus geen invalidatie nodig (LRU)
+_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "256"))
+# tombstones zo lang bewaren (incrementele listings zien de delete); daarna volledig weg
+_TOMBSTONE_DAYS = float(os.getenv("GRAPH_TOMBSTONE_DAYS", "30"))
 
-def upsert_graph(graph: Dict[str, Any]) -> Dict[str, Any]:
+_BODIES: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_purged = False
+stats = {"hits": 0, "parses": 0}
+
+
+class GraphVersionConflict(RuntimeError):
+    """If-Match versie is niet (meer) de huidige."""
+
+    def __init__(self, graph_id: str, current: int):
+        super().__init__(f"graph {graph_id}: current version is {current}")
+        self.current = current
+
+
+def _cache_get(key: Tuple[str, int]) -> Dict[str, Any] | None:
+    with _cache_lock:
+        g = _BODIES.get(key)
+        if g is not None:
+            _BODIES.move_to_end(key)
+        return g
+
+
+def _cache_put(key: Tuple[str, int], graph: Dict[str, Any]) -> None:
+    with _cache_lock:
+        _BODIES[key] = graph
+        _BODIES.move_to_end(key)
+        while len(_BODIES) > _CACHE_SIZE:
+            _BODIES.popitem(last=False)
+
+
+def _cache_drop(graph_id: str) -> None:
+    with _cache_lock:
+        for key in [k for k in _BODIES if k[0] == graph_id]:
+            del _BODIES[key]
+
+
+def _purge_once() -> None:
+    global _purged
+    if not _purged:
+        _purged = True
+        db.purge_graph_tombstones(time.time() - _TOMBSTONE_DAYS * 86400)
+
+
+def upsert_graph(graph: Dict[str, Any], expected_version: int | None = None) -> Dict[str, Any]:
     """
     graph = { name, description, root={...}, (optional id) }
+    Elke save is een nieuwe versie; expected_version (If-Match) = optimistic locking.
     """
     gid = graph.get("id") or token_hex(6)
     graph["id"] = gid
-    _GRAPHS[gid] = graph
-    # persist
-    save_graph(gid, graph.get("name") or gid, graph.get("description") or "", {
-        "root": graph["root"]
-    })
-    return {"id": gid, **graph}
-
-def get_graph(graph_id: str) -> Dict[str, Any] | None:
-    # prefer memory; else load from DB and repopulate
-    g = _GRAPHS.get(graph_id)
-    if g:
+    ok, version, updated_at = db.save_graph(
+        gid, graph.get("name") or gid, graph.get("description") or "", {"root": graph["root"]}, expected_version,
+    )
+    if not ok:
+        raise GraphVersionConflict(gid, version)
+    out = {
+        "root": graph["root"], "id": gid, "name": graph.get("name") or gid,
+        "description": graph.get("description") or "", "version": version, "updated_at": updated_at,
+    }
+    _cache_put((gid, version), out)
+    return {**graph, "version": version, "updated_at": updated_at}
+
+
+def get_graph(graph_id: str, version: int | None = None) -> Dict[str, Any] | None:
+    """
+    Huidige (of een bewaarde) versie. Per call 1 metadata-lookup; de JSON-body wordt enkel
+    geparsed als die versie nog niet in de cache zit. Niet muteren: gedeeld met de cache.
+    """
+    head = db.graph_head(graph_id)
+    if head is None or (head["deleted"] and version is None):
+        return None
+    v = int(version) if version is not None else head["version"]
+    g = _cache_get((graph_id, v))
+    if g is not None:
+        stats["hits"] += 1
         return g
-    db = load_graph(graph_id)
-    if db:
-        _GRAPHS[graph_id] = db
-    return db
-
-def list_graphs() -> List[Dict[str, Any]]:
-    if _GRAPHS:
-        return list(_GRAPHS.values())
-    db_all = load_all_graphs()
-    for g in db_all:
-        _GRAPHS[g["id"]] = g
-    return db_all
-
-def delete_graph(graph_id: str) -> bool:
-    # soft delete: remove memory only. (DB cleanup out-of-scope now)
-    return _GRAPHS.pop(graph_id, None) is not None
+    if v == head["version"]:
+        raw, meta = db.load_graph_body(graph_id), head
+    else:
+        raw = db.load_graph_body(graph_id, v)
+        meta = next((m for m in db.graph_versions(graph_id) if m["version"] == v), None)
+    if raw is None or meta is None:
+        return None
+    g = json.loads(raw)
+    stats["parses"] += 1
+    g.update(id=graph_id, name=meta["name"], description=meta["description"], version=v, updated_at=meta["updated_at"])
+    _cache_put((graph_id, v), g)
+    return g
+
+
+def list_graphs(
+    limit: int = 100, cursor: float | None = None, order: str = "asc", include_deleted: bool = False,
+) -> Dict[str, Any]:
+    """
+    Pagina metadata (id, name, description, version, created_at, updated_at, deleted) zonder bodies.
+    asc + cursor + include_deleted = incrementele sync: alles wat na de cursor wijzigde, ook deletes.
+    """
+    _purge_once()
+    limit = max(1, min(int(limit), 1000))
+    items = db.graphs_page(limit, cursor, order == "desc", include_deleted)
+    for it in items:
+        it["deleted"] = bool(it["deleted"])
+    return {
+        "items": items,
+        "next_cursor": items[-1]["updated_at"] if len(items) == limit else None,
+    }
+
+
+def graph_history(graph_id: str) -> List[Dict[str, Any]]:
+    return db.graph_versions(graph_id)
+
+
+def delete_graph(graph_id: str, expected_version: int | None = None) -> bool:
+    """Tombstone in de DB (load_graph/get_graph geven daarna None) + cache leeg voor deze graph."""
+    ok, version = db.delete_graph(graph_id, expected_version)
+    if not ok and version:
+        raise GraphVersionConflict(graph_id, version)
+    _cache_drop(graph_id)
+    return ok
@@ -0,0 +1,389 @@
+"""
+Trigger engine voor de conditie-nodes van strategy graphs (prijs, indicator, tijd, order-status).
+- 1 centrale engine i.p.v. polling per graph: een wachtende node registreert een trigger en blokkeert op een Event
+- prijs- en indicator-triggers per (symbool, bron) in 2 heaps: 'above' (laagste drempel bovenaan) en
+  'below' (hoogste drempel bovenaan); een tick bekijkt enkel de heap-toppen van de boeken van dat symbool:
+  O(1) als er niets vuurt, O(log n) per trigger die vuurt
+- ticks via een QuoteCache-listener (schrijver-thread: IB, sim-engine of gateway-reader); Events worden
+  pas na het loslaten van de engine-lock gezet
+- sma/ema (over quote-updates die het bronveld zetten) bestaan enkel zolang er een trigger naar verwijst;
+  change_pct wordt bij het armen omgerekend naar een prijsniveau en zit dus in het gewone prijsboek
+- tijd-triggers: 1 heap + 1 thread die tot de eerstvolgende deadline slaapt
+- status-triggers (wait_for_fill / wait_for_status): per internal_id, gevoed door records.notify
+- geannuleerde triggers (timeout) blijven lazy in hun heap tot ze bovenkomen of het boek gecompacteerd wordt
+"""
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import heapq
+import itertools
+import threading
+import time
+
+from server.modules.data.market import QUOTES
+from server.modules.data.store import RESULTS
+from server.modules.results import records
+
+FIELDS = ("last", "bid", "ask", "mid")
+INDICATORS = ("sma", "ema", "change_pct")
+OPS = ("above", "below")
+
+
+class Trigger:
+    __slots__ = ("id", "kind", "key", "op", "level", "event", "value", "fired_at", "created", "cancelled", "spec")
+
+    def __init__(self, tid: int, kind: str, key: Any, op: Optional[str], level: Optional[float], spec: Dict[str, Any]):
+        self.id = tid
+        self.kind = kind
+        self.key = key
+        self.op = op
+        self.level = level
+        self.event = threading.Event()
+        self.value: Any = None
+        self.fired_at: Optional[float] = None
+        self.created = time.time()
+        self.cancelled = False
+        self.spec = spec
+
+    @property
+    def fired(self) -> bool:
+        return self.event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True als de trigger vuurde; timeout None of < 0 = onbeperkt wachten."""
+        return self.event.wait(None if timeout is None or timeout < 0 else timeout)
+
+
+class _Indicator:
+    __slots__ = ("kind", "period", "window", "total", "ema", "n", "alpha", "value")
+
+    def __init__(self, kind: str, period: int):
+        self.kind = kind
+        self.period = max(1, int(period))
+        self.window: Deque[float] = deque()
+        self.total = 0.0
+        self.ema: Optional[float] = None
+        self.n = 0
+        self.alpha = 2.0 / (self.period + 1)
+        self.value: Optional[float] = None
+
+    def push(self, x: float) -> Optional[float]:
+        """Nieuwe waarde; None zolang er minder dan period waarden zijn (warm-up)."""
+        self.n += 1
+        if self.kind == "sma":
+            w = self.window
+            w.append(x)
+            self.total += x
+            if len(w) > self.period:
+                self.total -= w.popleft()
+            self.value = self.total / len(w) if len(w) >= self.period else None
+        else:
+            self.ema = x if self.ema is None else self.ema + self.alpha * (x - self.ema)
+            self.value = self.ema if self.n >= self.period else None
+        return self.value
+
+
+class _Book:
+    """Wachtende triggers op 1 bron van 1 symbool (quote-veld of indicator op een quote-veld)."""
+    __slots__ = ("field", "ind", "above", "below", "live", "unarmed")
+
+    def __init__(self, field: str, ind: Optional[_Indicator]):
+        self.field = field
+        self.ind = ind
+        self.above: List[Tuple[float, int, Trigger]] = []     # vuurt bij waarde >= drempel
+        self.below: List[Tuple[float, int, Trigger]] = []     # -drempel: vuurt bij waarde <= drempel
+        self.live = 0
+        self.unarmed: List[Trigger] = []                      # change_pct zonder basisprijs
+
+
+def _hit(op: str, x: float, level: float) -> bool:
+    return x >= level if op == "above" else x <= level
+
+
+class TriggerEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._books: Dict[str, Dict[Any, _Book]] = {}              # symbool -> bron -> boek
+        self._status: Dict[str, List[Trigger]] = {}                # internal_id -> triggers
+        self._timers: List[Tuple[float, int, Trigger]] = []
+        self._tcond = threading.Condition()
+        self._timer_thread: Optional[threading.Thread] = None
+        self._quotes_bound = False
+        self._records_bound = False
+        self.stats = {"ticks": 0, "fired": 0, "cancelled": 0, "compactions": 0}
+        self._pending = {"price": 0, "indicator": 0, "time": 0, "status": 0}
+
+    # ---- registreren ----
+
+    def add_price(self, symbol: str, op: str, price: float, field: str = "last") -> Trigger:
+        """Vuurt zodra field (last|bid|ask|mid) >= price (above) of <= price (below)."""
+        return self._add_level(symbol, field, None, op, float(price), "price")
+
+    def add_indicator(
+        self, symbol: str, indicator: str, op: str, value: float, period: int = 20, field: str = "last",
+    ) -> Trigger:
+        """sma/ema(period) van field over drempel value; change_pct: % verandering t.o.v. het armen."""
+        indicator = indicator.lower()
+        if indicator not in INDICATORS:
+            raise ValueError(f"indicator must be one of {', '.join(INDICATORS)}")
+        return self._add_level(symbol, field, (indicator, int(period)), op, float(value), "indicator")
+
+    def _add_level(
+        self, symbol: str, field: str, ind: Optional[Tuple[str, int]], op: str, level: float, kind: str,
+    ) -> Trigger:
+        op, field, symbol = op.lower(), field.lower(), symbol.upper()
+        if op not in OPS:
+            raise ValueError("op must be 'above' or 'below'")
+        if field not in FIELDS:
+            raise ValueError(f"field must be one of {', '.join(FIELDS)}")
+        # change_pct = prijsniveau t.o.v. de basis bij het armen: zelfde boek als gewone prijs-triggers
+        src = ind if ind is not None and ind[0] != "change_pct" else None
+        key = (symbol, field, src)
+        spec = {"symbol": symbol, "field": field, "op": op, "level": level}
+        if ind is not None:
+            spec.update(indicator=ind[0], period=ind[1])
+        t = Trigger(next(self._ids), kind, key, op, level, spec)
+        self._bind_quotes()
+        fire = False
+        with self._lock:
+            book = self._books.setdefault(symbol, {}).get((field, src))
+            if book is None:
+                book = self._books[symbol][(field, src)] = _Book(field, _Indicator(*src) if src else None)
+            book.live += 1
+            self._pending[kind] += 1
+            cur = book.ind.value if book.ind is not None else self._current(symbol, field)
+            if ind is not None and ind[0] == "change_pct":
+                if cur is None:
+                    book.unarmed.append(t)
+                else:
+                    self._arm_change(t, cur)
+                    fire = self._push_or_fire(book, t, cur)
+            else:
+                fire = self._push_or_fire(book, t, cur)
+            if fire:
+                self._maybe_drop(symbol, (field, src), book)
+        if fire:
+            t.event.set()
+        return t
+
+    def _arm_change(self, t: Trigger, base: float) -> None:
+        t.spec["base"] = base
+        t.level = base * (1.0 + t.spec["level"] / 100.0)
+
+    def _push_or_fire(self, book: _Book, t: Trigger, cur: Optional[float]) -> bool:
+        """Onder _lock. True als de conditie nu al waar is (caller zet het Event)."""
+        if cur is not None and _hit(t.op, cur, t.level):
+            self._mark_fired(book, t, cur)
+            return True
+        if t.op == "above":
+            heapq.heappush(book.above, (t.level, t.id, t))
+        else:
+            heapq.heappush(book.below, (-t.level, t.id, t))
+        return False
+
+    def add_time(self, at: float) -> Trigger:
+        """Vuurt op epoch-tijd at (meteen als die al voorbij is)."""
+        t = Trigger(next(self._ids), "time", None, None, float(at), {"at": float(at)})
+        with self._lock:
+            self._pending["time"] += 1
+        with self._tcond:
+            heapq.heappush(self._timers, (float(at), t.id, t))
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(target=self._timer_loop, name="graph-triggers", daemon=True)
+                self._timer_thread.start()
+            self._tcond.notify()
+        return t
+
+    def add_status(self, internal_id: str, statuses: Iterable[str]) -> Trigger:
+        """Vuurt zodra RESULTS[internal_id]["status"] in statuses staat (ook als dat nu al zo is)."""
+        targets = frozenset(s.lower() for s in statuses)
+        t = Trigger(next(self._ids), "status", internal_id, None, None, {"internal_id": internal_id, "statuses": sorted(targets)})
+        if not self._records_bound:
+            self._records_bound = True
+            records.subscribe(self._on_records)
+        with self._lock:
+            self._status.setdefault(internal_id, []).append(t)
+            self._pending["status"] += 1
+        # na het registreren kijken: een statuswijziging ertussen gaat dan niet verloren
+        self._on_records([internal_id])
+        return t
+
+    def cancel(self, t: Trigger) -> None:
+        """Niet meer wachten (timeout / run geannuleerd). No-op als de trigger al vuurde."""
+        with self._lock:
+            if t.fired or t.cancelled:
+                return
+            t.cancelled = True
+            self.stats["cancelled"] += 1
+            self._pending[t.kind] -= 1
+            if t.kind == "status":
+                lst = self._status.get(t.key)
+                if lst is not None:
+                    lst[:] = [x for x in lst if x is not t]
+                    if not lst:
+                        del self._status[t.key]
+            elif t.kind in ("price", "indicator"):
+                symbol, field, src = t.key
+                books = self._books.get(symbol) or {}
+                book = books.get((field, src))
+                if book is not None:
+                    book.live -= 1
+                    if t in book.unarmed:
+                        book.unarmed.remove(t)
+                    self._maybe_drop(symbol, (field, src), book)
+        # tijd-triggers: lazy, de timer-thread slaat ze over
+
+    # ---- evaluatie ----
+
+    def _current(self, symbol: str, field: str) -> Optional[float]:
+        q = QUOTES.get(symbol)
+        if not q:
+            return None
+        if field == "mid":
+            b, a = q.get("bid"), q.get("ask")
+            return (b + a) / 2.0 if b and a and b > 0 and a > 0 else None
+        return q.get(field)
+
+    def _mark_fired(self, book: _Book, t: Trigger, x: float) -> None:
+        t.value = x
+        t.fired_at = time.time()
+        book.live -= 1
+        self._pending[t.kind] -= 1
+        self.stats["fired"] += 1
+
+    def _maybe_drop(self, symbol: str, key: Any, book: _Book) -> None:
+        """Onder _lock: leeg boek weg (ook de indicator-state), anders compacteren bij veel dode entries."""
+        if book.live <= 0:
+            books = self._books.get(symbol)
+            if books is not None:
+                books.pop(key, None)
+                if not books:
+                    del self._books[symbol]
+        elif len(book.above) + len(book.below) > 2 * book.live + 64:
+            book.above = [e for e in book.above if not e[2].cancelled]
+            book.below = [e for e in book.below if not e[2].cancelled]
+            heapq.heapify(book.above)
+            heapq.heapify(book.below)
+            self.stats["compactions"] += 1
+
+    def _on_tick(self, symbol: str, i: int, vals: Dict[str, Optional[float]]) -> None:
+        """QuoteCache-listener (onder de _wlock van de cache): enkel de boeken van dit symbool."""
+        if symbol not in self._books:
+            return
+        fired: List[Trigger] = []
+        with self._lock:
+            books = self._books.get(symbol)
+            if not books:
+                return
+            self.stats["ticks"] += 1
+            for key, book in list(books.items()):
+                f = book.field
+                if f == "mid":
+                    if vals.get("bid") is None and vals.get("ask") is None:
+                        continue
+                    b, a = QUOTES.value(i, "bid"), QUOTES.value(i, "ask")
+                    if not b or not a or b <= 0 or a <= 0:
+                        continue
+                    x = (b + a) / 2.0
+                else:
+                    x = vals.get(f)
+                    if x is None or x != x:
+                        continue
+                if book.ind is not None:
+                    x = book.ind.push(x)
+                    if x is None:
+                        continue
+                if book.unarmed:
+                    pending, book.unarmed = book.unarmed, []
+                    for t in pending:
+                        self._arm_change(t, x)
+                        if self._push_or_fire(book, t, x):
+                            fired.append(t)
+                above = book.above
+                while above and above[0][0] <= x:
+                    t = heapq.heappop(above)[2]
+                    if not t.cancelled:
+                        self._mark_fired(book, t, x)
+                        fired.append(t)
+                below = book.below
+                while below and -below[0][0] >= x:
+                    t = heapq.heappop(below)[2]
+                    if not t.cancelled:
+                        self._mark_fired(book, t, x)
+                        fired.append(t)
+                if book.live <= 0:
+                    self._maybe_drop(symbol, key, book)
+        for t in fired:
+            t.event.set()
+
+    def _on_records(self, ids: List[str]) -> None:
+        if not self._status:
+            return
+        fired: List[Trigger] = []
+        with self._lock:
+            for iid in ids:
+                lst = self._status.get(iid)
+                if not lst:
+                    continue
+                st = ((RESULTS.get(iid) or {}).get("status") or "").lower()
+                hit = [t for t in lst if st in t.spec["statuses"]]
+                if not hit:
+                    continue
+                for t in hit:
+                    t.value = st
+                    t.fired_at = time.time()
+                    self._pending["status"] -= 1
+                    self.stats["fired"] += 1
+                rest = [t for t in lst if t not in hit]
+                if rest:
+                    self._status[iid] = rest
+                else:
+                    del self._status[iid]
+                fired.extend(hit)
+        for t in fired:
+            t.event.set()
+
+    def _timer_loop(self) -> None:
+        timers = self._timers
+        while True:
+            with self._tcond:
+                while True:
+                    if not timers:
+                        self._tcond.wait()
+                        continue
+                    dt = timers[0][0] - time.time()
+                    if dt <= 0:
+                        break
+                    self._tcond.wait(dt)
+                due = []
+                now = time.time()
+                while timers and timers[0][0] <= now:
+                    due.append(heapq.heappop(timers)[2])
+            for t in due:
+                with self._lock:
+                    if t.cancelled or t.fired:
+                        continue
+                    t.value = now
+                    t.fired_at = now
+                    self._pending["time"] -= 1
+                    self.stats["fired"] += 1
+                t.event.set()
+
+    def _bind_quotes(self) -> None:
+        if not self._quotes_bound:
+            self._quotes_bound = True
+            QUOTES.add_listener(self._on_tick)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": dict(self._pending),
+                "symbols": len(self._books),
+                "books": sum(len(b) for b in self._books.values()),
+                **self.stats,
+            }
+
+
+TRIGGERS = TriggerEngine()
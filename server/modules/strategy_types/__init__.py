@@ -1,32 +1,19 @@
 from __future__ import annotations
-from typing import Dict, Callable, Any
+from typing import Any, Dict
 
-# elke strategy module exposeert:
-#   ID: str
-#   SCHEMA: dict (verwachte params)
-#   def build(symbol: str, params: dict) -> dict
+# strategies zijn BaseStrategy subclasses in .strategies (zie registry.py);
+# deze helpers bedienen /strategy-types en de backtests
 
-from . import mkt_buy, mkt_sell, lmt_buy, bracket_buy, bracket_sell
-
-REGISTRY: Dict[str, Any] = {
-    mkt_buy.ID: mkt_buy,
-    mkt_sell.ID: mkt_sell,
-    lmt_buy.ID: lmt_buy,
-    bracket_buy.ID: bracket_buy,
-    bracket_sell.ID: bracket_sell,
-}
+from . import registry
 
 def list_ids():
-    return list(REGISTRY.keys())
+    return [t["id"] for t in registry.all_types()]
 
 def get_schema(strategy_id: str) -> dict:
-    mod = REGISTRY.get(strategy_id)
-    if not mod:
+    s = registry.schema(strategy_id)
+    if s is None:
         raise KeyError(strategy_id)
-    return mod.SCHEMA
+    return s
 
-def build_order(strategy_id: str, symbol: str, params: dict) -> dict:
-    mod = REGISTRY.get(strategy_id)
-    if not mod:
-        raise KeyError(strategy_id)
-    return mod.build(symbol, params or {})
+def build_order(strategy_id: str, symbol: str, params: dict) -> Dict[str, Any]:
+    return registry.build(strategy_id, symbol, params)
@@ -3,28 +3,39 @@ from typing import Any, Tuple
 from pydantic import BaseModel
 
 class BaseStrategy:
-    """Minimal strategy interface: validate + to_order."""
+    """
+    Strategy interface: Params (Pydantic) + build().
+    Validatie gebeurt 1x in de registry (gecachete TypeAdapter); build krijgt het gevalideerde model.
+    """
     id: str = "base"
     name: str = "Base Strategy"
+    kind: str = "single"          # "single" | "bracket"
+    aliases: Tuple[str, ...] = ()
     Params: type[BaseModel] = BaseModel  # override in child
+    _validator: Any = None                # TypeAdapter(Params), gezet door de registry bij het laden
 
     @classmethod
     def schema(cls) -> dict:
         return cls.Params.model_json_schema()
 
+    @classmethod
+    def build(cls, symbol: str, p: Any) -> dict[str, Any]:
+        """
+        p = gevalideerde Params. Child classes MUST override.
+          single:  { "symbol": "AAPL", "side":"BUY", "order_type":"MKT", "quantity":1, ... }
+          bracket: { "base_order": {...}, "target_price": 110.0, "stop_price": 95.0 }
+        """
+        raise NotImplementedError(f"{cls.__name__}.build not implemented")
+
     @classmethod
     def validate_params(cls, data: dict) -> Tuple[bool, str]:
         try:
-            cls.Params(**data)
+            cls._validator.validate_python(data)
             return True, "ok"
         except Exception as e:
             return False, str(e)
 
     @classmethod
     def to_order(cls, *, symbol: str, params: dict) -> dict[str, Any]:
-        """
-        Produce a minimal order spec. Child classes MUST override.
-        Return example:
-          { "symbol": "AAPL", "side":"BUY", "order_type":"MKT", "quantity":1 }
-        """
-        raise NotImplementedError(f"{cls.__name__}.to_order not implemented")
+        """Single order spec (valideert + bouwt in 1 stap)."""
+        return cls.build(symbol, cls._validator.validate_python(params))
@@ -1,24 +1,299 @@
+"""
+Enige strategy registry: BaseStrategy subclasses in .strategies/<id>.py.
+- lazy: een module wordt pas geladen bij het eerste gebruik van zijn id (listing laadt alles);
+  een id dat niet de modulenaam is, of een numerieke index, laadt ook alles
+- per versie 1x: JSON schema + TypeAdapter validator; id/alias/numerieke index = dict-hits
+- listing en numerieke index komen uit dezelfde volgorde (modules gesorteerd, ids in registratievolgorde)
+- versie = sha256 van het bestand; refresh() herlaadt enkel gewijzigde bestanden
+- load/unload zijn atomisch: nieuwe entries komen pas na een geslaagde exec in _entries,
+  build() gebruikt de entry die het bij de start vastnam (lopende orders houden de oude versie)
+"""
+
 from __future__ import annotations
-from typing import Dict, Type
+from typing import Any, Dict, List, Optional, Type
+import hashlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+from pydantic import TypeAdapter
 from .base import BaseStrategy
+from . import strategies
+
+_PKG = strategies.__name__
+_DIR = os.path.dirname(strategies.__file__)
+
+
+class _Entry:
+    __slots__ = ("cls", "schema", "module", "version", "loaded_at", "import_ms")
+
+    def __init__(self, cls: Type[BaseStrategy], module: str, version: Optional[str], import_ms: float):
+        self.cls = cls
+        self.schema = {"id": cls.id, "name": cls.name, "kind": cls.kind, "schema": cls.schema()}
+        self.module = module
+        self.version = version
+        self.loaded_at = time.time()
+        self.import_ms = import_ms
+
+
+_entries: Dict[str, _Entry] = {}          # strategy id -> actieve versie
+_modules: Dict[str, Dict[str, Any]] = {}  # module naam -> {"ids", "version", "stat", "error", ...}
+_names: List[str] = []                    # modules op schijf (gesorteerd, zonder import)
+_index: Dict[str, str] = {}               # alias / "1", "2", ... -> id (nummers = positie in _types)
+_types: List[dict] = []                   # listing, in vaste volgorde
+_lock = threading.RLock()
+_tls = threading.local()
 
-_registry: Dict[str, Type[BaseStrategy]] = {}
 
 def register(strategy_cls: Type[BaseStrategy]) -> None:
-    _registry[strategy_cls.id] = strategy_cls
+    """Tijdens een load verzameld en pas actief na een geslaagde exec; anders meteen (plugins/tests)."""
+    captured = getattr(_tls, "capture", None)
+    if captured is not None:
+        captured.append(strategy_cls)
+        return
+    with _lock:
+        _activate(strategy_cls.__module__, [strategy_cls], None, 0.0)
+
+
+def _activate(module: str, classes: List[Type[BaseStrategy]], version: Optional[str], import_ms: float) -> List[str]:
+    new: Dict[str, _Entry] = {}
+    for c in classes:
+        c._validator = TypeAdapter(c.Params)
+        new[c.id] = _Entry(c, module, version, import_ms)
+    info = _modules.setdefault(module, {"ids": []})
+    for sid in info["ids"]:
+        if sid not in new:
+            _entries.pop(sid, None)
+    _entries.update(new)
+    info.update({"ids": list(new), "version": version, "error": None})
+    _reindex()
+    return list(new)
+
+
+def _ordered() -> List[_Entry]:
+    """Modules in _names-volgorde (ids in registratievolgorde), daarna direct geregistreerde (plugins)."""
+    out: List[_Entry] = []
+    seen = set()
+    for module in _names + sorted(m for m in _modules if m not in _names):
+        for sid in _modules.get(module, {}).get("ids") or ():
+            e = _entries.get(sid)
+            if e is not None and sid not in seen:
+                seen.add(sid)
+                out.append(e)
+    return out
+
+
+def _reindex() -> None:
+    ordered = _ordered()
+    index: Dict[str, str] = {str(i + 1): e.cls.id for i, e in enumerate(ordered)}
+    for e in ordered:
+        for a in e.cls.aliases:
+            index[a] = e.cls.id
+    _index.clear()
+    _index.update(index)
+    _types[:] = [{"id": e.cls.id, "name": e.cls.name, "kind": e.cls.kind} for e in ordered]
+
+
+def _scan() -> List[str]:
+    names = sorted(
+        f[:-3] for f in os.listdir(_DIR)
+        if f.endswith(".py") and not f.startswith("_")
+    )
+    _names[:] = names
+    return names
+
+
+def load(name: str, force: bool = False) -> Dict[str, Any]:
+    """
+    (Her)laad strategies/<name>.py als de inhoud (sha256) veranderde.
+    Bij een fout blijft de vorige versie actief; de fout wordt doorgegeven.
+    """
+    path = os.path.join(_DIR, f"{name}.py")
+    with _lock:
+        with open(path, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            data = fh.read()
+        version = hashlib.sha256(data).hexdigest()
+        info = _modules.get(name)
+        if info and info.get("version") == version and not force:
+            info["stat"] = (st.st_mtime_ns, st.st_size)
+            return {"module": name, "ids": info["ids"], "version": version[:12], "changed": False}
+        modname = f"{_PKG}.{name}"
+        spec = importlib.util.spec_from_file_location(modname, path)
+        mod = importlib.util.module_from_spec(spec)
+        prev = sys.modules.get(modname)
+        sys.modules[modname] = mod
+        _tls.capture = []
+        t0 = time.perf_counter()
+        try:
+            # exact de gehashte bytes uitvoeren (geen tweede read van het bestand)
+            exec(compile(data, path, "exec"), mod.__dict__)
+        except BaseException as e:
+            if prev is not None:
+                sys.modules[modname] = prev
+            else:
+                sys.modules.pop(modname, None)
+            info = _modules.setdefault(name, {"ids": []})
+            info["error"] = f"{e.__class__.__name__}: {e}"
+            info["stat"] = (st.st_mtime_ns, st.st_size)   # refresh() probeert opnieuw na een wijziging
+            raise
+        finally:
+            captured, _tls.capture = _tls.capture, None
+        if name not in _names:
+            _scan()
+        ids = _activate(name, captured, version, (time.perf_counter() - t0) * 1000)
+        _modules[name]["stat"] = (st.st_mtime_ns, st.st_size)
+        _modules[name]["path"] = path
+        return {"module": name, "ids": ids, "version": version[:12], "changed": True}
+
+
+def unload(name: str) -> bool:
+    """Verwijder alle strategies van module `name` (lopende builds werken af met hun entry)."""
+    with _lock:
+        info = _modules.pop(name, None)
+        if info is None:
+            return False
+        for sid in info["ids"]:
+            _entries.pop(sid, None)
+        sys.modules.pop(f"{_PKG}.{name}", None)
+        _scan()
+        _reindex()
+        return True
+
+
+def refresh() -> Dict[str, str]:
+    """Bestanden opnieuw scannen: gewijzigde geladen modules herladen, verdwenen modules unloaden."""
+    out: Dict[str, str] = {}
+    with _lock:
+        names = _scan()
+        for name in [n for n in _modules if n not in names]:
+            if _modules[name].get("path"):
+                unload(name)
+                out[name] = "unloaded"
+        for name in names:
+            info = _modules.get(name)
+            if not info or not (info.get("path") or info.get("error")):
+                continue            # nog niet gebruikt: blijft lazy
+            try:
+                st = os.stat(os.path.join(_DIR, f"{name}.py"))
+            except FileNotFoundError:
+                continue
+            if info.get("stat") == (st.st_mtime_ns, st.st_size):
+                continue
+            try:
+                if load(name)["changed"]:
+                    out[name] = "reloaded"
+            except Exception as e:
+                out[name] = f"error: {e.__class__.__name__}: {e}"
+        _reindex()
+    return out
+
+
+def _lookup(id_: str) -> Optional[_Entry]:
+    e = _entries.get(id_)
+    if e is None:
+        e = _entries.get(_index.get(id_, id_))
+    return e
+
+
+def _entry(id_: str) -> Optional[_Entry]:
+    if id_.isdigit():
+        # nummer = positie in de listing: die kent pas alle strategies als alles geladen is
+        _load_all()
+        return _lookup(id_)
+    e = _lookup(id_)
+    if e is not None:
+        return e
+    # lazy: eerst strategies/<id>.py; een id of alias uit een anders genoemde module vraagt alles
+    with _lock:
+        if id_ not in _modules and id_ in (_names or _scan()):
+            try:
+                load(id_)
+            except Exception:
+                pass        # fout staat in versions()
+            e = _lookup(id_)
+            if e is not None:
+                return e
+        _load_all()
+        return _lookup(id_)
+
+
+def _load_all() -> None:
+    with _lock:
+        for name in (_names or _scan()):
+            if name not in _modules:
+                try:
+                    load(name)
+                except Exception:
+                    pass
+
 
 def all_types() -> list[dict]:
-    return [{"id": c.id, "name": c.name} for c in _registry.values()]
+    _load_all()
+    return _types
+
 
 def get(id_: str) -> Type[BaseStrategy] | None:
-    return _registry.get(id_)
+    e = _entry(id_)
+    return e.cls if e else None
+
+
+def resolve(id_: str) -> str | None:
+    """id, alias of numerieke index ('1' = eerste strategy in all_types()) -> id."""
+    e = _entry(id_)
+    return e.cls.id if e else None
+
+
+def schema(id_: str) -> dict | None:
+    e = _entry(id_)
+    return e.schema if e else None
+
+
+def validator(id_: str) -> TypeAdapter:
+    e = _entry(id_)
+    if e is None:
+        raise KeyError(id_)
+    return e.cls._validator
+
+
+def build(id_: str, symbol: str, params: dict) -> Dict[str, Any]:
+    """
+    Valideer (1x) + bouw de spec:
+      single:  {"type": "single", "order": {...}}
+      bracket: {"type": "bracket", "base_order": {...}, "target_price": x, "stop_price": y}
+    Raise KeyError (onbekend) of ValueError (pydantic ValidationError).
+    """
+    e = _entry(id_)
+    if e is None:
+        raise KeyError(id_)
+    cls = e.cls
+    out = cls.build(symbol, cls._validator.validate_python(params or {}))
+    if cls.kind == "single":
+        return {"type": "single", "order": out}
+    return {"type": cls.kind, **out}
+
+
+def versions() -> List[Dict[str, Any]]:
+    """Geladen modules: versie (sha256 prefix), laadtijdstip en import-duur; ook laadfouten."""
+    out = []
+    for name in (_names or _scan()):
+        info = _modules.get(name)
+        if info is None:
+            out.append({"module": name, "loaded": False})
+            continue
+        ids = info.get("ids") or []
+        e = _entries.get(ids[0]) if ids else None
+        out.append({
+            "module": name,
+            "loaded": bool(ids),
+            "ids": ids,
+            "version": (info.get("version") or "")[:12] or None,
+            "loaded_at": e.loaded_at if e else None,
+            "import_ms": round(e.import_ms, 3) if e else None,
+            "error": info.get("error"),
+        })
+    return out
 
-def _bootstrap() -> None:
-    """Automatically import every module in .strategies package."""
-    import pkgutil
-    import importlib
-    from . import strategies
-    for m in pkgutil.iter_modules(strategies.__path__):
-        importlib.import_module(f"{strategies.__name__}.{m.name}")
 
-_bootstrap()
+_scan()
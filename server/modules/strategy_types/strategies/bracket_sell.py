@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from ..base import BaseStrategy
+from ..registry import register
+
+class Params(BaseModel):
+    quantity: int = Field(gt=0)
+    target_price: float = Field(gt=0)
+    stop_price: float = Field(gt=0)
+    tif: str = "DAY"
+
+class BracketSell(BaseStrategy):
+    """Parent MKT + target LMT + stop STP (OCA)."""
+    id = "bracket_sell"
+    name = "Bracket Sell"
+    kind = "bracket"
+    Params = Params
+
+    @classmethod
+    def build(cls, symbol: str, p: Params) -> dict:
+        return {
+            "base_order": {"symbol": symbol, "side": "SELL", "quantity": p.quantity, "tif": p.tif, "exchange": "SMART"},
+            "target_price": p.target_price,
+            "stop_price": p.stop_price,
+        }
+
+register(BracketSell)
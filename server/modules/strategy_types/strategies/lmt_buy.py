@@ -5,6 +5,7 @@ from ..registry import register
 class Params(BaseModel):
     quantity: int = Field(gt=0)
     limit_price: float = Field(gt=0)
+    tif: str = "DAY"
 
 class LmtBuy(BaseStrategy):
     id = "lmt_buy"
@@ -12,14 +13,15 @@ class LmtBuy(BaseStrategy):
     Params = Params
 
     @classmethod
-    def to_order(cls, *, symbol: str, params: dict) -> dict:
-        p = cls.Params(**params)
+    def build(cls, symbol: str, p: Params) -> dict:
         return {
             "symbol": symbol,
             "side": "BUY",
             "order_type": "LMT",
             "quantity": p.quantity,
             "limit_price": p.limit_price,
+            "tif": p.tif,
+            "exchange": "SMART",
         }
 
 register(LmtBuy)
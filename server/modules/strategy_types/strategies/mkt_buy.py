@@ -4,6 +4,7 @@ from ..registry import register
 
 class Params(BaseModel):
     quantity: int = Field(gt=0, description="Number of shares/contracts")
+    tif: str = "DAY"
 
 class MktBuy(BaseStrategy):
     id = "mkt_buy"
@@ -11,13 +12,14 @@ class MktBuy(BaseStrategy):
     Params = Params
 
     @classmethod
-    def to_order(cls, *, symbol: str, params: dict) -> dict:
-        p = cls.Params(**params)
+    def build(cls, symbol: str, p: Params) -> dict:
         return {
             "symbol": symbol,
             "side": "BUY",
             "order_type": "MKT",
             "quantity": p.quantity,
+            "tif": p.tif,
+            "exchange": "SMART",
         }
 
 register(MktBuy)
@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from ..base import BaseStrategy
+from ..registry import register
+
+class Params(BaseModel):
+    quantity: int = Field(gt=0, description="Number of shares/contracts")
+    tif: str = "DAY"
+
+class MktSell(BaseStrategy):
+    id = "mkt_sell"
+    name = "Market Sell"
+    Params = Params
+
+    @classmethod
+    def build(cls, symbol: str, p: Params) -> dict:
+        return {
+            "symbol": symbol,
+            "side": "SELL",
+            "order_type": "MKT",
+            "quantity": p.quantity,
+            "tif": p.tif,
+            "exchange": "SMART",
+        }
+
+register(MktSell)
@@ -0,0 +1,75 @@
+from typing import Any
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/backtest", tags=["backtest"])
+
+
+class BacktestIn(BaseModel):
+    strategy_id: str
+    symbol: str
+    bar_size: str = "1 min"
+    params: dict = {}
+    start: float | None = None
+    end: float | None = None
+    entry_every: int = 1
+    horizon: int | None = None
+    commission: float = 0.0
+    slippage_bps: float = 0.0
+
+
+class RunIn(BacktestIn):
+    trades: bool = False
+
+
+class SweepIn(BacktestIn):
+    grid: dict[str, list[Any]]
+    workers: int | None = None
+    top: int | None = 50
+    sort_by: str = "pnl"
+
+
+def _service():
+    # lazy: numpy + engine pas bij de eerste backtest (snellere startup)
+    from server.modules.backtest import service
+    return service
+
+
+def _opts(body: BacktestIn) -> dict:
+    return {
+        "entry_every": body.entry_every, "horizon": body.horizon,
+        "commission": body.commission, "slippage_bps": body.slippage_bps,
+    }
+
+
+@router.post("/run")
+def run(body: RunIn):
+    """1 parameterset over de gecachte bars (zie /data/bars)."""
+    try:
+        return _service().run(
+            body.strategy_id, body.symbol, body.bar_size, body.params,
+            start=body.start, end=body.end, trades=body.trades, **_opts(body),
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="unknown strategy")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/sweep")
+def sweep(body: SweepIn):
+    """Parameter sweep: cartesisch product van `grid`, verdeeld over een process pool."""
+    try:
+        return _service().sweep(
+            body.strategy_id, body.symbol, body.bar_size, body.grid, params=body.params,
+            start=body.start, end=body.end, workers=body.workers, top=body.top, sort_by=body.sort_by,
+            **_opts(body),
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="unknown strategy")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
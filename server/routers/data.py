@@ -1,5 +1,11 @@
-from fastapi import APIRouter
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from server.modules.data.store import get_symbols, get_status
+from server.modules.data.positions import list_positions, exposure
+from server.modules.data.market import QUOTES, subscribe, unsubscribe, subscriptions
 
 router = APIRouter(prefix="/data", tags=["data"])
 
@@ -10,3 +16,126 @@ def symbols():
 @router.get("/status")
 def status():
     return get_status()
+
+@router.get("/positions")
+def positions(symbol: str | None = None, include_flat: bool = False):
+    """Gecachte posities (geen IB round trip)."""
+    return {"positions": list_positions(symbol=symbol, include_flat=include_flat)}
+
+@router.get("/exposure")
+def get_exposure():
+    return exposure()
+
+# ---- market data ----
+
+class SymbolsIn(BaseModel):
+    symbols: list[str]
+
+def _parse_symbols(symbols: str | None) -> list[str] | None:
+    if not symbols:
+        return None
+    return [s.strip().upper() for s in symbols.split(",") if s.strip()]
+
+@router.get("/quotes")
+def quotes(symbols: str | None = None):
+    """Snapshot van meerdere symbolen in 1 call (comma-separated; leeg = alles in de cache)."""
+    return {"version": QUOTES.version, "quotes": QUOTES.snapshot(_parse_symbols(symbols))}
+
+@router.post("/quotes/subscribe")
+def quotes_subscribe(body: SymbolsIn):
+    return subscribe([s.upper() for s in body.symbols])
+
+@router.post("/quotes/unsubscribe")
+def quotes_unsubscribe(body: SymbolsIn):
+    return unsubscribe([s.upper() for s in body.symbols])
+
+@router.get("/quotes/subscriptions")
+def quotes_subscriptions():
+    return {"refs": subscriptions()}
+
+@router.get("/quotes/stream")
+async def quotes_stream(symbols: str | None = None, interval_ms: int = 250):
+    """
+    SSE: enkel gewijzigde quotes sinds het vorige event.
+    Met symbols houdt de stream zelf een (refcounted) subscription aan zolang hij open is.
+    """
+    names = _parse_symbols(symbols)
+    interval = max(10, interval_ms) / 1000.0
+
+    async def _events():
+        subscribed: list[str] = []
+        try:
+            if names:
+                res = await asyncio.to_thread(subscribe, names)
+                subscribed = list(res["refs"])
+                if res["errors"]:
+                    yield f"event: error\ndata: {json.dumps(res['errors'])}\n\n"
+            version, idle = 0, 0.0
+            while True:
+                version, delta = QUOTES.changes_since(version, names)
+                if delta:
+                    idle = 0.0
+                    yield f"data: {json.dumps(delta)}\n\n"
+                else:
+                    idle += interval
+                    if idle >= 15.0:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                await asyncio.sleep(interval)
+        finally:
+            # niet awaiten: bij een disconnect is de task al gecanceld
+            if subscribed:
+                asyncio.get_running_loop().run_in_executor(None, unsubscribe, subscribed)
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+# ---- historische bars ----
+
+def _bar_cache():
+    # lazy: numpy pas laden bij het eerste bars-request (snellere startup)
+    from server.modules.data import bars
+    return bars
+
+class BarsIn(BaseModel):
+    symbol: str
+    bar_size: str = "1 min"
+    ts: list[float]
+    open: list[float]
+    high: list[float]
+    low: list[float]
+    close: list[float]
+    volume: list[float]
+
+@router.get("/bars")
+def get_bars(
+    symbol: str, bar_size: str = "1 min", start: float | None = None, end: float | None = None,
+    fetch: bool = True, wait: float = 0.0,
+):
+    """
+    Bars uit de lokale cache (epoch seconden, kolom-georiënteerd).
+    Ontbrekende ranges worden op de achtergrond opgehaald; `wait` = max seconden wachten op die fetch.
+    """
+    try:
+        res = _bar_cache().get_bars(symbol, bar_size, start, end, fetch=fetch, wait=min(max(wait, 0.0), 60.0))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    cols = res.pop("bars")
+    res["count"] = len(cols["ts"])
+    res["bars"] = {k: v.tolist() for k, v in cols.items()}
+    return res
+
+@router.post("/bars")
+def post_bars(body: BarsIn):
+    """Bars importeren (bv. voor backtests zonder IB)."""
+    cols = body.dict(exclude={"symbol", "bar_size"})
+    if len({len(v) for v in cols.values()}) != 1:
+        raise HTTPException(status_code=400, detail="all columns must have the same length")
+    try:
+        added = _bar_cache().import_bars(body.symbol, body.bar_size, cols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"ok": True, "added": added}
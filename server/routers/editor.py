@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from server.modules.editor.service import create_strategy_file
+from server.modules.editor.service import create_strategy_file, update_strategy_file, delete_strategy_file
 from server.modules.strategy_types.service import list_types
+from server.modules.strategy_types import registry
 
 router = APIRouter(prefix="/editor", tags=["editor"])
 
@@ -23,3 +24,29 @@ def create_strategy(body: CreateStrategyIn):
         raise HTTPException(400, res.get("error", "unknown error"))
     # return updated list for convenience
     return {"created": res, "available": list_types()}
+
+@router.put("/strategy/{strategy_id}")
+def update_strategy(strategy_id: str, body: CreateStrategyIn):
+    if body.strategy_id != strategy_id:
+        raise HTTPException(400, "strategy_id in path en body verschillen")
+    res = update_strategy_file(strategy_id, body.name, [f.dict() for f in body.fields])
+    if not res.get("ok"):
+        raise HTTPException(400, res.get("error", "unknown error"))
+    return {"updated": res}
+
+@router.delete("/strategy/{strategy_id}")
+def delete_strategy(strategy_id: str):
+    res = delete_strategy_file(strategy_id)
+    if not res.get("ok"):
+        raise HTTPException(404, res.get("error", "unknown error"))
+    return {"deleted": res}
+
+@router.post("/strategy/reload")
+def reload_strategies():
+    """Bestanden opnieuw scannen: gewijzigde (sha256) geladen strategies herladen, verwijderde unloaden."""
+    return {"changes": registry.refresh()}
+
+@router.get("/strategy/versions")
+def strategy_versions():
+    """Per strategy-module: geladen versie (sha256 prefix), laadtijdstip en import-duur."""
+    return {"modules": registry.versions()}
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
-from server.modules.order_transmitting.service import queue_size
+from fastapi import APIRouter, HTTPException
+from server.modules.order_transmitting.service import queue_size, cancel_order
 from server.modules.order_transmitting.config import load_adapter
+from server.modules.order_transmitting.adapters import registry
+from server.modules.order_transmitting import reconcile as reconcile_service
 
 router = APIRouter(prefix="/transmit", tags=["order_transmitting"])
 
@@ -13,22 +15,56 @@ def get_adapter():
     name, _ = load_adapter()
     return {"adapter": name}
 
-@router.get("/diag")
-def diag():
-    name, _ = load_adapter()
-    info = {"adapter": name}
-    if name == "ibkr":
+@router.get("/adapters")
+def get_adapters():
+    """Beschikbare (ontdekte/geregistreerde) en geladen adapters + account-routes."""
+    return {
+        "default": registry.default_name(),
+        "available": registry.names(),
+        "loaded": registry.loaded(),
+        "routes": registry.routes(),
+    }
+
+@router.get("/pacer")
+def get_pacer():
+    """IBKR berichtrate (msg/s), pacing-wachttijden en queue delay; enkel als de ibkr adapter geladen is."""
+    if "gateway" in registry.loaded():
+        from server.modules.order_transmitting.adapters.gateway.adapter import pacer_stats as gateway_pacer
         try:
-            # lazy import om circulars te vermijden
-            from server.modules.order_transmitting.adapters.ibkr.adapter import _runner, _HOST, _PORT, _CLIENT_ID
-            # forceer start van de runner; geeft connect errors meteen
-            try:
-                _runner.start()
-                connected = True  # als start niet crasht, is connect gelukt of wordt lazily gedaan op eerste taak
-            except Exception as e:
-                connected = False
-                info["error"] = str(e)
-            info.update({"connected": connected, "host": _HOST, "port": _PORT, "clientId": _CLIENT_ID})
+            return gateway_pacer()
         except Exception as e:
-            info.update({"connected": False, "error": str(e)})
-    return info
+            return {"active": False, "error": str(e)}
+    if "ibkr" not in registry.loaded():
+        return {"active": False}
+    from server.modules.order_transmitting.adapters.ibkr.adapter import pacer_stats
+    return {"active": True, **pacer_stats()}
+
+@router.get("/reconcile")
+def get_reconcile():
+    """Periodieke reconciliatie: interval, kerncijfers van de laatste pass per adapter, fouten."""
+    return reconcile_service.stats()
+
+@router.post("/reconcile")
+def run_reconcile(adapter: str | None = None, dry_run: bool = False):
+    """Nu 1 pass: broker-orders in bulk ophalen, diffen op orderId en (tenzij dry_run) corrigeren."""
+    try:
+        return reconcile_service.run(adapter, dry_run=dry_run)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # niet verbonden / timeout van de bulk-fetch
+        raise HTTPException(status_code=503, detail=f"{e.__class__.__name__}: {e}")
+
+@router.post("/cancel/{order_id}")
+def cancel(order_id: str):
+    return cancel_order(order_id)
+
+@router.get("/diag")
+def diag():
+    """Default adapter + readiness (IBKR: connect-status, host/port/clientId)."""
+    try:
+        name, ad = load_adapter()
+    except Exception as e:
+        return {"adapter": registry.default_name(), "ready": False, "error": str(e)}
+    ad.start()
+    return {"adapter": name, **ad.readiness()}
@@ -1,8 +1,36 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from server.modules.results.service import get_result, list_results
+from server.modules.results.ledger import list_fills, daily_pnl
+from server.modules.results import journal
 
 router = APIRouter(prefix="/results", tags=["results"])
 
+# vaste paden vóór /{order_id}
+@router.get("/fills")
+def fills(symbol: str | None = None, day: str | None = None, internal_id: str | None = None, limit: int = 1000):
+    return {"fills": list_fills(symbol=symbol, day=day, internal_id=internal_id, limit=limit)}
+
+@router.get("/pnl")
+def pnl(day: str | None = None):
+    return daily_pnl(day)
+
+@router.get("/analytics")
+def analytics(day_from: str | None = None, day_to: str | None = None, days: int = 30):
+    """Slippage vs arrival, fill ratios en fill-tijden per strategy/symbool."""
+    # lazy: numpy pas bij het eerste analytics-request
+    from server.modules.results.analytics import compute as compute_analytics
+    try:
+        return compute_analytics(day_from=day_from, day_to=day_to, days=days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/journal")
+def journal_stats():
+    """Order journal: segment, events/bytes/fsync-batches, snapshots en de laatste replay."""
+    return journal.stats()
+
 @router.get("/{order_id}")
 def by_id(order_id: str):
     return get_result(order_id)
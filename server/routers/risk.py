@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from pydantic import BaseModel
+from server.modules.risk import service as risk
+
+router = APIRouter(prefix="/risk", tags=["risk"])
+
+
+class LimitsIn(BaseModel):
+    symbol: str | None = None          # None = defaults
+    max_order_qty: float | None = None
+    max_order_notional: float | None = None
+    max_symbol_exposure: float | None = None
+    max_price_deviation_bps: float | None = None
+    orders_per_sec: float | None = None          # enkel voor de defaults (globale bucket)
+    symbol_orders_per_sec: float | None = None
+
+
+class HaltIn(BaseModel):
+    reason: str | None = None          # None = halt opheffen
+
+
+@router.get("")
+def get_state():
+    """Limieten, open (gereserveerde) qty per symbool en reject-tellers."""
+    return risk.state()
+
+
+@router.put("/limits")
+def put_limits(body: LimitsIn):
+    """Enkel meegegeven velden wijzigen; 0 = geen limiet."""
+    values = body.dict(exclude={"symbol"}, exclude_unset=True)
+    return {"symbol": body.symbol, "limits": risk.set_limits(values, body.symbol)}
+
+
+@router.post("/halt")
+def halt(body: HaltIn):
+    """Kill switch voor alle nieuwe orders."""
+    risk.halt(body.reason)
+    return {"halted": body.reason}
@@ -1,52 +1,228 @@
 from __future__ import annotations
 from typing import Any, Dict
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Header, Query, Response
 
-from server.modules.strategy_graph.models import StrategyGraph
-from server.modules.strategy_graph.store import upsert_graph, list_graphs, get_graph, delete_graph
-from server.modules.strategy_graph.executor import run_graph
+from server.modules.strategy_graph.store import (
+    upsert_graph, list_graphs, get_graph, delete_graph, graph_history, GraphVersionConflict,
+)
+from server.modules.strategy_graph.triggers import TRIGGERS
+from server.modules.strategy_graph.scheduler import SCHEDULER
+from server.modules.strategy_graph import runs
+from server.modules.strategy_graph.executor import RunCancelled, waiting_nodes
+from server.modules.order_transmitting.idempotency import run_once, IdempotencyConflict, IdempotentFailure
+from server.modules.order_transmitting.adapters.base import AdapterUnavailable
 
 router = APIRouter(prefix="/strategy-graph", tags=["strategy-graph"])
 
+def _expected_version(if_match: str | None) -> int | None:
+    """If-Match: <versie> (ook als ETag tussen quotes); 0 = graph mag nog niet bestaan."""
+    if if_match is None:
+        return None
+    try:
+        return int(if_match.strip().strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a graph version")
+
 @router.post("")
-def create_or_upsert(graph: Dict[str, Any] = Body(...)):
+def create_or_upsert(
+    graph: Dict[str, Any] = Body(...),
+    if_match: str | None = Header(None, alias="If-Match"),
+):
     # graph: {name, description, root={...}, optional id}
     try:
         if "name" not in graph:
             raise HTTPException(status_code=400, detail="name is required")
         if "root" not in graph:
             raise HTTPException(status_code=400, detail="root is required")
-        return upsert_graph(graph)
+        return upsert_graph(graph, expected_version=_expected_version(if_match))
     except HTTPException:
         raise
+    except GraphVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("")
-def list_all():
-    return list_graphs()
+def list_all(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: float | None = None,
+    order: str = "asc",
+    include_deleted: bool = False,
+):
+    """Metadata per pagina (gesorteerd op updated_at); next_cursor als cursor voor de volgende pagina."""
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    return list_graphs(limit=limit, cursor=cursor, order=order, include_deleted=include_deleted)
+
+@router.get("/triggers")
+def triggers():
+    """Wachtende conditie-triggers per soort + engine-tellers."""
+    return TRIGGERS.snapshot()
+
+@router.get("/scheduler")
+def scheduler_stats():
+    return SCHEDULER.snapshot()
+
+@router.get("/schedules")
+def list_schedules(graph_id: str | None = None):
+    return SCHEDULER.list(graph_id=graph_id)
+
+@router.post("/schedules")
+def upsert_schedule(spec: Dict[str, Any] = Body(...)):
+    """{graph_id, symbol, adapter?, cron | interval_sec | at, tz?, start_at?, end_at?, misfire?, overlap?, enabled?, id?}"""
+    try:
+        return SCHEDULER.upsert(spec)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/schedules/{schedule_id}")
+def fetch_schedule(schedule_id: str):
+    s = SCHEDULER.get(schedule_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="not found")
+    return s
+
+@router.delete("/schedules/{schedule_id}")
+def remove_schedule(schedule_id: str):
+    if not SCHEDULER.delete(schedule_id):
+        raise HTTPException(status_code=404, detail="not found")
+    return {"deleted": True, "id": schedule_id}
+
+@router.get("/schedules/{schedule_id}/runs")
+def schedule_runs(schedule_id: str, limit: int = Query(100, ge=1, le=1000), cursor: str | None = None):
+    """Run-historiek van de schedule (nieuwste eerst, ook skipped/missed)."""
+    try:
+        return runs.list_runs(schedule_id=schedule_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/runs")
+def list_runs(
+    graph_id: str | None = None,
+    schedule_id: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+):
+    try:
+        return runs.list_runs(graph_id=graph_id, schedule_id=schedule_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/runs/{run_id}")
+def fetch_run(run_id: str):
+    r = runs.get_run(run_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="not found")
+    return r
+
+@router.delete("/runs/{run_id}")
+def cancel_run(run_id: str, wait_sec: float = Query(2.0, ge=0, le=30)):
+    """
+    Run stoppen: wachtende nodes worden meteen wakker, open orders van de run worden geannuleerd
+    (result.compensation). Wacht max wait_sec op de executor; een al afgelopen run blijft ongewijzigd.
+    """
+    r = runs.cancel(run_id, wait_sec=wait_sec)
+    if not r:
+        raise HTTPException(status_code=404, detail="not found")
+    return r
 
 @router.get("/{graph_id}")
-def fetch(graph_id: str):
-    g = get_graph(graph_id)
+def fetch(graph_id: str, version: int | None = None):
+    g = get_graph(graph_id, version=version)
     if not g:
         raise HTTPException(status_code=404, detail="not found")
     return g
 
+@router.get("/{graph_id}/versions")
+def versions(graph_id: str):
+    out = graph_history(graph_id)
+    if not out:
+        raise HTTPException(status_code=404, detail="not found")
+    return out
+
 @router.delete("/{graph_id}")
-def remove(graph_id: str):
-    ok = delete_graph(graph_id)
+def remove(graph_id: str, if_match: str | None = Header(None, alias="If-Match")):
+    try:
+        ok = delete_graph(graph_id, expected_version=_expected_version(if_match))
+    except GraphVersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not ok:
         raise HTTPException(status_code=404, detail="not found")
     return {"deleted": True, "id": graph_id}
 
 @router.post("/{graph_id}/run")
-def run(graph_id: str, symbol: str = Body(..., embed=True)):
+def run(
+    graph_id: str,
+    response: Response,
+    symbol: str = Body(..., embed=True),
+    adapter: str | None = Body(None, embed=True),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
     g = get_graph(graph_id)
     if not g:
         raise HTTPException(status_code=404, detail="not found")
+    # wachtende nodes zouden de request-thread minuten tot dagen bezet houden: enkel via de run engine
     try:
-        sg = StrategyGraph(id=g["id"], root=g["root"])
-        return run_graph(sg, symbol=symbol)
+        waiting = waiting_nodes(g["root"])
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"{e.__class__.__name__}: {e}")
+    if waiting:
+        raise HTTPException(
+            status_code=400,
+            detail=f"graph has waiting nodes ({', '.join(waiting)}): use POST /strategy-graph/{graph_id}/runs",
+        )
+
+    def _run():
+        try:
+            return runs.run_sync(g, symbol=symbol, adapter=adapter)
+        except RunCancelled as e:
+            raise HTTPException(status_code=409, detail={"error": f"run cancelled: {e}", "compensation": e.compensation})
+        except AdapterUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"{e.__class__.__name__}: {e}")
+
+    try:
+        out, replayed = run_once(idempotency_key, f"strategy-graph/{graph_id}/run", {"symbol": symbol, "adapter": adapter}, _run)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotentFailure as e:
+        # eerdere poging faalde na het versturen van orders: niet opnieuw plaatsen
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return out
+
+@router.post("/{graph_id}/runs", status_code=202)
+def submit_run(
+    graph_id: str,
+    response: Response,
+    symbol: str = Body(..., embed=True),
+    adapter: str | None = Body(None, embed=True),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    """Asynchrone run: meteen terug met de run (queued); status via GET /strategy-graph/runs/{id}."""
+    if not get_graph(graph_id):
+        raise HTTPException(status_code=404, detail="not found")
+    queued: Dict[str, Any] = {}
+
+    def _submit():
+        queued["run"] = runs.submit(graph_id, symbol, adapter)
+        return {"run_id": queued["run"]["id"]}
+
+    try:
+        out, replayed = run_once(idempotency_key, f"strategy-graph/{graph_id}/runs", {"symbol": symbol, "adapter": adapter}, _submit)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotentFailure as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    if not replayed:
+        return queued["run"]
+    # replay: dezelfde run (huidige status), geen tweede run in de queue
+    response.headers["Idempotent-Replayed"] = "true"
+    r = runs.get_run(out["run_id"])
+    if not r:
+        raise HTTPException(status_code=404, detail=f"run {out['run_id']} not found")
+    return r
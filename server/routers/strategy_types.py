@@ -1,13 +1,12 @@
 from __future__ import annotations
 from typing import Any, Tuple
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
 from pydantic import BaseModel
-from secrets import token_hex
 
 from server.modules.strategy_types import list_ids, get_schema, build_order
-from server.modules.order_transmitting.service import enqueue_order
-from server.modules.order_transmitting.adapters.ibkr.adapter import ADAPTER
-from server.modules.data.store import RESULTS
+from server.modules.order_transmitting.service import enqueue_order, submit_bracket
+from server.modules.order_transmitting.idempotency import run_once, IdempotencyConflict, IdempotentFailure
+from server.modules.order_transmitting.adapters.base import AdapterUnavailable
 from server.modules.exit_types.service import ensure_registered  # AUTO-OCA
 
 
@@ -36,6 +35,8 @@ def _auto_register_oca(run_resp: dict, symbol: str) -> dict:
                 "stop":   int(ibids["stop"]),
             },
             internal_ids=internal_ids,
+            oca_group=run_resp.get("oca_group"),
+            adapter=run_resp.get("adapter"),
         )
         if oca:
             run_resp["oca_group"] = oca
@@ -53,10 +54,15 @@ class RunRequest(BaseModel):
     symbol: str
     strategy_id: str
     params: dict = {}
+    adapter: str | None = None   # per request: andere adapter dan de default
+    account: str | None = None   # of via ADAPTER_ROUTES op account
 
 
 # -------- helpers
 def http400(e: Exception):
+    if isinstance(e, AdapterUnavailable):
+        # sessie down: fail fast, client kan later (met dezelfde Idempotency-Key) opnieuw proberen
+        raise HTTPException(status_code=503, detail=str(e))
     raise HTTPException(status_code=400, detail=f"{e.__class__.__name__}: {e}")
 
 def _normalize_enqueue_result(ret: Any) -> Tuple[bool, dict]:
@@ -119,12 +125,26 @@ def strategy_run_spec(req: RunRequest):
 
 
 @router.post("/run")
-def strategy_run(req: RunRequest):
+def strategy_run(req: RunRequest, response: Response, idempotency_key: str | None = Header(None, alias="Idempotency-Key")):
     """
     Run een strategy:
       - type == 'single'  -> enqueue_order(...)
-      - type == 'bracket' -> ADAPTER.place_bracket(...)
+      - type == 'bracket' -> submit_bracket(...)
+    Idempotency-Key (optioneel): een retry met dezelfde key geeft de originele response terug.
     """
+    try:
+        out, replayed = run_once(idempotency_key, "strategy-types/run", req.dict(), lambda: _run(req))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotentFailure as e:
+        # eerdere poging faalde na het versturen van orders: niet opnieuw plaatsen
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return out
+
+
+def _run(req: RunRequest) -> dict:
     try:
         spec = build_order(req.strategy_id, req.symbol, req.params)
     except KeyError:
@@ -138,7 +158,9 @@ def strategy_run(req: RunRequest):
     if typ == "single":
         try:
             order = spec["order"]
-            ok, payload = _normalize_enqueue_result(enqueue_order(order))
+            ok, payload = _normalize_enqueue_result(
+                enqueue_order(order, strategy_id=req.strategy_id, adapter=req.adapter, account=req.account)
+            )
             if not ok:
                 raise RuntimeError(payload)
             return {"mode": "single", **payload}
@@ -148,36 +170,14 @@ def strategy_run(req: RunRequest):
     # ----- BRACKET -----
     if typ == "bracket":
         try:
-            base = spec["base_order"]
-            tp = float(spec["target_price"])
-            sp = float(spec["stop_price"])
-
-            # interne ids voor status tracking
-            parent_id = token_hex(6)
-            target_id = token_hex(6)
-            stop_id   = token_hex(6)
-            RESULTS[parent_id] = {"status": "accepted", "adapter": "ibkr"}
-            RESULTS[target_id] = {"status": "accepted", "adapter": "ibkr"}
-            RESULTS[stop_id]   = {"status": "accepted", "adapter": "ibkr"}
-
-            ok, payload = ADAPTER.place_bracket(
-                base_order=base,
-                target_price=tp,
-                stop_price=sp,
-                internal_ids={"parent": parent_id, "target": target_id, "stop": stop_id},
+            out = submit_bracket(
+                spec["base_order"],
+                float(spec["target_price"]),
+                float(spec["stop_price"]),
+                strategy_id=req.strategy_id,
+                adapter=req.adapter,
+                account=req.account,
             )
-            if not ok:
-                raise RuntimeError(payload.get("error", "bracket failed"))
-            ib_ids = payload.get("ibkr_order_ids", {}) or payload.get("ibkr_ids", {}) or {}
-
-            # ---- wijziging: out bouwen + auto-register ----
-            out = {
-                "mode": "bracket",
-                "parent_order_id": parent_id,
-                "target_order_id": target_id,
-                "stop_order_id":   stop_id,
-                "ibkr_order_ids":  ib_ids,
-            }
             out = _auto_register_oca(out, req.symbol)  # voegt 'oca_group' toe wanneer mogelijk
             return out
         except Exception as e:
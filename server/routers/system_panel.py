@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
 from pydantic import BaseModel, Field
 from typing import Optional
+from server.modules.data.store import RESULTS
 from server.modules.order_processing.service import build_from_strategy
 from server.modules.order_transmitting.service import enqueue_order
+from server.modules.order_transmitting.idempotency import run_once, IdempotencyConflict, IdempotentFailure
+from server.modules.order_transmitting.adapters.base import AdapterUnavailable
 
 router = APIRouter(prefix="/system-panel", tags=["system_panel"])
 
@@ -10,11 +13,34 @@ class PlaceOrderIn(BaseModel):
     symbol: str = Field(..., examples=["AAPL"])
     strategy_id: str = Field(..., examples=["mkt_buy", "lmt_buy"])
     params: dict = Field(default_factory=dict)
+    adapter: Optional[str] = None
+    account: Optional[str] = None
 
 @router.post("/place-order")
-def place_order(req: PlaceOrderIn):
-    ok, msg, order = build_from_strategy(req.symbol, req.strategy_id, req.params)
-    if not ok:
-        raise HTTPException(status_code=400, detail=msg)
-    order_id = enqueue_order(order)
-    return {"status": "accepted", "order_id": order_id, "order": order}
+def place_order(req: PlaceOrderIn, response: Response, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Idempotency-Key (optioneel): retries met dezelfde key plaatsen geen tweede order."""
+    def _place():
+        ok, msg, order = build_from_strategy(req.symbol, req.strategy_id, req.params)
+        if not ok:
+            raise HTTPException(status_code=400, detail=msg)
+        try:
+            order_id = enqueue_order(order, strategy_id=req.strategy_id, adapter=req.adapter, account=req.account)
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except AdapterUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        res = RESULTS.get(order_id) or {}
+        if res.get("status") == "rejected":
+            # risk check: de order ging niet naar de adapter
+            raise HTTPException(status_code=400, detail={"status": "rejected", "order_id": order_id, "error": res.get("error")})
+        return {"status": "accepted", "order_id": order_id, "order": order}
+    try:
+        out, replayed = run_once(idempotency_key, "system-panel/place-order", req.dict(), _place)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotentFailure as e:
+        # eerdere poging faalde na het versturen van orders: niet opnieuw plaatsen
+        raise HTTPException(status_code=e.status_code, detail=e.detail())
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return out
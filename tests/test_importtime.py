@@ -0,0 +1,19 @@
+"""
+Import-time budget van `import server.main` (zie bench/importtime.py): een schone subprocess met
+-X importtime, faalt boven IMPORT_BUDGET_MS of als zware modules (numpy, ib_insync, ...) al bij import laden.
+Run (vanuit project root):
+  pytest tests/test_importtime.py
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_import_budget():
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench.importtime"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr